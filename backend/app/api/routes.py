@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,6 +19,27 @@ class QueryRequest(BaseModel):
     query: str
     ai_model_config: Dict[str, Any]
 
+class VariantPosition(BaseModel):
+    """变异位置（1-based）"""
+    chromosome: str
+    position: int
+
+class AnnotateVariantsRequest(BaseModel):
+    """批量变异注释请求"""
+    variants: List[VariantPosition]
+
+class LiftoverRegion(BaseModel):
+    """待转换的位置或区间（1-based 闭区间，省略 end 表示单个位置）"""
+    chromosome: str
+    start: int
+    end: Optional[int] = None
+
+class LiftoverRequest(BaseModel):
+    """批量坐标转换请求"""
+    regions: List[LiftoverRegion]
+    source: str = "hg19"
+    target: str = "hg38"
+
 @api_router.get("/genomics/info")
 async def get_genomics_info():
     """获取基因组学服务信息"""
@@ -126,18 +148,144 @@ async def get_available_tracks():
         ]
     }
 
+@api_router.get("/genes/suggest")
+async def suggest_genes(q: str, limit: int = 10):
+    """
+    基因名称自动补全
+    
+    前缀补全优先，不足 limit 条时用编辑距离匹配补齐（容忍拼写错误，匹配别名和曾用名）
+    """
+    from app.tools.navigation_tool import NavigationTool
+    
+    limit = max(1, min(limit, 50))
+    return {
+        "query": q,
+        "suggestions": NavigationTool().suggest_genes(q, limit)
+    }
+
+@api_router.get("/coverage")
+async def get_coverage(chromosome: str, start: int, end: int, bins: int = 500, min_mapq: int = 0):
+    """
+    区域测序深度
+    
+    bins 通常取视图宽度的像素数，返回每个分箱的平均/最小/最大深度
+    """
+    from app.tools.coverage_tool import CoverageTool
+    
+    result = await CoverageTool().get_coverage(chromosome, start, end, bins=bins, min_mapq=min_mapq)
+    if result["status"] != "success":
+        status_code = 404 if result["error_code"] in ("ALIGNMENTS_NOT_CONFIGURED", "SEQUENCE_NOT_FOUND") else 400
+        raise HTTPException(status_code=status_code, detail=result["message"])
+    return result["coverage"]
+
+@api_router.get("/features/density")
+async def get_feature_density(chromosome: str, start: int, end: int, category: str = "gene", bins: int = 500):
+    """
+    注释特征密度
+    
+    整条染色体等大区域读取预计算的汇总金字塔，返回每个分箱的平均/最小/最大特征覆盖数
+    """
+    from app.tools.jbrowse_tools import JBrowseToolkit
+    
+    result = await JBrowseToolkit().get_feature_density(chromosome, start, end, category, max(1, min(bins, 4000)))
+    if result["status"] != "success":
+        raise HTTPException(status_code=400, detail=result["message"])
+    return result["density"]
+
+@api_router.post("/variants/annotate")
+async def annotate_variants(request: AnnotateVariantsRequest):
+    """
+    批量变异注释
+    
+    返回与输入顺序一致的注释：所在基因、区域类型（exon / intron / UTR / intergenic）、是否编码区、最近基因及距离
+    """
+    from app.tools.jbrowse_tools import JBrowseToolkit
+    
+    variants = [{"chromosome": v.chromosome, "position": v.position} for v in request.variants]
+    result = await JBrowseToolkit().annotate_variants(variants)
+    if result["status"] != "success":
+        raise HTTPException(status_code=400, detail=result["message"])
+    return {
+        "count": result["count"],
+        "annotations": result["annotations"]
+    }
+
+@api_router.post("/liftover")
+async def liftover(request: LiftoverRequest):
+    """
+    批量坐标转换（如 hg19 -> hg38）
+    
+    返回与输入顺序一致的结果：mapped（一个目标区间）、split（跨多条 chain，多个目标区间）或 unmapped，
+    以及每个区间中未映射的源区间
+    """
+    from app.tools.liftover_tool import LiftoverTool
+    
+    regions = [region.model_dump() for region in request.regions]
+    result = await LiftoverTool().liftover_batch(regions, request.source, request.target)
+    if result["status"] != "success":
+        status_code = 404 if result["error_code"] == "CHAIN_NOT_FOUND" else 400
+        raise HTTPException(status_code=status_code, detail=result["message"])
+    return {
+        "source": result["source"],
+        "target": result["target"],
+        "count": result["count"],
+        "counts": result["counts"],
+        "results": result["results"]
+    }
+
 @api_router.post("/jbrowse/navigate")
 async def navigate_jbrowse(location: Dict[str, Any]):
-    """控制JBrowse导航"""
+    """
+    控制JBrowse导航
+    
+    提供 session_id 时，导航指令会通过 WebSocket 发送到该会话（无论会话位于哪个 worker）
+    """
     try:
-        # 这里应该实现实际的JBrowse控制逻辑
         logger.info(f"Navigating to: {location}")
         
+        session_id = location.get("session_id")
+        if not session_id:
+            return {
+                "status": "success",
+                "message": "导航成功",
+                "location": location
+            }
+        
+        from app.services.websocket_manager import get_websocket_manager
+        from app.tools.navigation_tool import NavigationTool, build_navigation_command
+        
+        websocket_manager = get_websocket_manager()
+        
+        navigation_data = await NavigationTool().navigate_to_location(
+            chromosome=str(location.get("chromosome", "")),
+            start=int(location.get("start", 0)),
+            end=location.get("end"),
+            gene_name=location.get("gene_name"),
+            genome_format=location.get("genome_format", "ucsc"),
+            clamp=location.get("clamp"),
+            record_history=False
+        )
+        if navigation_data["status"] != "success":
+            raise HTTPException(status_code=400, detail=navigation_data["message"])
+        
+        command = build_navigation_command(navigation_data["location"])
+        delivered = await websocket_manager.send_to_session(session_id, json.dumps(command))
+        if not delivered:
+            raise HTTPException(status_code=404, detail=f"会话不存在: {session_id}")
+        
+        # 导航历史保存在会话所在的 worker 上，会话断开时随之释放
+        if websocket_manager.get_connection(session_id) is not None:
+            from app.tools.navigation_history import get_navigation_history_store
+            get_navigation_history_store().history(session_id).record(navigation_data["location"])
+        
         return {
             "status": "success",
-            "message": "导航成功",
-            "location": location
+            "message": "导航指令已发送",
+            "location": navigation_data["location"],
+            "requestId": command["requestId"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"JBrowse navigation failed: {e}")
         raise HTTPException(status_code=400, detail=f"导航失败: {str(e)}")
\ No newline at end of file
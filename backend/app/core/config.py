@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Dict, List
 import os
 
 class Settings(BaseSettings):
@@ -32,9 +32,91 @@ class Settings(BaseSettings):
     MODELSCOPE_API_KEY: str = ""
     MODELSCOPE_MODEL_NAME: str = "ZhipuAI/GLM-4.5"
     
+    # LLM客户端连接池配置
+    LLM_CLIENT_POOL_MAX_SIZE: int = 16
+    LLM_CLIENT_IDLE_TTL: float = 600.0
+    LLM_CLIENT_MAX_CONNECTIONS: int = 20
+    LLM_CLIENT_EVICT_INTERVAL: float = 60.0
+    
+    # 模型连接测试：探测超时与成功结果缓存时间（秒）、最多缓存的配置数
+    CONNECTION_TEST_TIMEOUT: float = 10.0
+    CONNECTION_TEST_CACHE_TTL: float = 300.0
+    CONNECTION_TEST_CACHE_MAX_ENTRIES: int = 256
+    
+    # 流式响应（客户端可在消息中通过 stream 字段覆盖）
+    AI_STREAM_RESPONSES: bool = False
+    
+    # 强制所有查询走LLM（关闭位点/基因导航的快速路径）
+    AI_FORCE_LLM_MODE: bool = False
+    
+    # 导航类工具的结果直接模板化为最终回复，跳过第二次LLM调用
+    AI_TEMPLATE_TOOL_RESPONSES: bool = True
+    
+    # LLM响应缓存配置（RESPONSE_CACHE_DIR 为空时只使用内存缓存）
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    RESPONSE_CACHE_TTL: float = 3600.0
+    RESPONSE_CACHE_DIR: str = ""
+    RESPONSE_CACHE_DISK_TTL: float = 86400.0
+    
+    # WebSocket配置：每个连接同时处理的AI请求上限
+    WS_MAX_CONCURRENT_TASKS: int = 4
+    
+    # WebSocket跨worker消息后端: "memory"（单进程）或 "redis"
+    WS_PUBSUB_BACKEND: str = "memory"
+    WS_PUBSUB_URL: str = "redis://localhost:6379/0"
+    
+    # 每个连接的发送队列容量和溢出策略: "drop_oldest" / "coalesce" / "disconnect"
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_OVERFLOW_POLICY: str = "drop_oldest"
+    
+    # worker 存活标记的过期时间（秒），worker 崩溃后其会话路由在此时间后失效
+    WS_WORKER_TTL: float = 30.0
+    
+    # 工具执行超时（秒），可按工具名单独覆盖
+    TOOL_EXECUTION_TIMEOUT: float = 30.0
+    TOOL_TIMEOUTS: Dict[str, float] = {}
+    
     # JBrowse配置
     JBROWSE_CONFIG_PATH: str = "./data/jbrowse"
     
+    # 基因索引目录（python -m app.genomics.gene_index 构建），不存在时使用内置基因表
+    GENE_INDEX_PATH: str = "./data/jbrowse/gene_index"
+    
+    # 注释特征区间索引目录（python -m app.genomics.interval_index 构建）
+    FEATURE_INDEX_PATH: str = "./data/jbrowse/feature_index"
+    
+    # 变异 VCF（bgzip 压缩并带 .tbi/.csi 索引），留空则不提供变异查询
+    VARIANT_VCF_PATH: str = ""
+    
+    # 参考基因组 FASTA（需要 .fai 索引，bgzip 压缩时还需要 .gzi），留空则不提供序列查询
+    REFERENCE_FASTA_PATH: str = ""
+    
+    # 比对文件 BAM（需要 .bai 或 .csi 索引），留空则不提供覆盖度查询
+    ALIGNMENTS_BAM_PATH: str = ""
+    
+    # 多分辨率汇总金字塔目录（python -m app.genomics.summary_pyramid 构建），
+    # 子目录 coverage 为测序深度，density_<类别> 为注释特征密度
+    SUMMARY_PYRAMID_PATH: str = "./data/jbrowse/summaries"
+    
+    # 组装目录（每个组装一个子目录，含 aliases.txt / chromAlias.txt 别名文件和 .fai / chrom.sizes），
+    # 染色体名称在标准人类染色体之外再按 DEFAULT_ASSEMBLY 的别名表识别
+    ASSEMBLY_DATA_PATH: str = "./data/jbrowse/assemblies"
+    DEFAULT_ASSEMBLY: str = "hg38"
+    
+    # 组装间坐标转换的 UCSC chain 文件目录（hg19ToHg38.over.chain.gz 等）
+    LIFTOVER_CHAIN_PATH: str = "./data/jbrowse/liftover"
+    
+    # 导航终点超出染色体长度时截断到染色体末端（False 则直接返回 OUT_OF_BOUNDS 错误）
+    NAVIGATION_CLAMP_TO_CHROMOSOME: bool = True
+    
+    # 每个 WebSocket 会话保留的导航历史条数（环形缓冲区，会话断开时释放）
+    NAVIGATION_HISTORY_SIZE: int = 50
+    
+    # 所有 bgzip 读取器共享的解压块缓存大小（字节）
+    BGZF_BLOCK_CACHE_BYTES: int = 64 * 1024 * 1024
+    
     # 日志配置
     LOG_LEVEL: str = "INFO"
     
@@ -0,0 +1 @@
+# Genomic annotation indexes and file readers
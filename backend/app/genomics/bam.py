@@ -0,0 +1,395 @@
+"""
+BAM 读取和区域覆盖度计算
+通过 BAI（或 CSI）索引只读取与区域重叠的块；
+比对记录的 CIGAR 汇总成 NumPy 数组，用差分数组一次性累加出逐碱基深度
+"""
+
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import argparse
+import logging
+import os
+import struct
+
+import numpy as np
+
+from app.genomics.bgzf import BgzfError, BgzfReader, make_virtual_offset
+from app.genomics.summary_pyramid import summarize_values
+from app.genomics.tabix import BinningIndexBuilder, TabixIndex, data_end_offset
+from app.utils.chromosome_normalizer import match_chromosome
+
+logger = logging.getLogger(__name__)
+
+BAM_MAGIC = b"BAM\x01"
+
+# block_size 之后的定长字段: refID, pos, l_read_name, mapq, bin, n_cigar_op, flag, l_seq
+_CORE = struct.Struct("<iiBBHHHi")
+_CORE_SIZE = 32
+
+# 默认不计入深度的记录（与 samtools depth 一致）：未比对、次要比对、质控失败、重复
+DEFAULT_EXCLUDE_FLAGS = 0x4 | 0x100 | 0x200 | 0x400
+
+# CIGAR 操作: M I D N S H P = X
+_CONSUMES_REFERENCE = np.zeros(16, dtype=bool)
+_CONSUMES_REFERENCE[[0, 2, 3, 7, 8]] = True
+# 计入深度的操作（M / = / X；删除和跳过的内含子不计入）
+_COUNTS_DEPTH = np.zeros(16, dtype=bool)
+_COUNTS_DEPTH[[0, 7, 8]] = True
+
+# 覆盖度报告中的深度阈值
+DEPTH_THRESHOLDS = (1, 10, 30)
+
+
+def cigar_reference_length(cigar: bytes) -> int:
+    """CIGAR 在参考序列上覆盖的长度"""
+    ops = np.frombuffer(cigar, dtype="<u4")
+    return int(((ops >> 4) * _CONSUMES_REFERENCE[ops & 0xF]).sum())
+
+
+class BamReader:
+    """带索引的 BAM 读取器"""
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        """
+        Args:
+            path: BAM 文件路径
+            index_path: 索引路径，默认依次查找 path.bai、去掉 .bam 的 .bai、path.csi
+        """
+        self.path = path
+        self.bgzf = BgzfReader(path)
+        self.references: Dict[str, int] = {}
+        self.first_record_offset = self._read_header()
+        self.names = list(self.references)
+
+        index_path = index_path or self._find_index()
+        self.index = TabixIndex(index_path, names=self.names) if index_path else None
+
+    def _find_index(self) -> Optional[str]:
+        candidates = [self.path + ".bai", os.path.splitext(self.path)[0] + ".bai", self.path + ".csi"]
+        for candidate in candidates:
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def _read_header(self) -> int:
+        """读取头部的参考序列名称和长度，返回第一条记录的虚拟偏移"""
+        data = bytearray()
+        block_starts: List[Tuple[int, int]] = []  # (在 data 中的起点, 块偏移)
+        blocks = self.bgzf.iter_blocks(0)
+
+        def need(size: int):
+            while len(data) < size:
+                block = next(blocks, None)
+                if block is None:
+                    raise ValueError(f"Truncated BAM header: {self.path}")
+                block_starts.append((len(data), block[0]))
+                data.extend(block[2])
+
+        need(8)
+        if bytes(data[:4]) != BAM_MAGIC:
+            raise ValueError(f"Not a BAM file: {self.path}")
+        pos = 8 + struct.unpack_from("<i", data, 4)[0]
+        need(pos + 4)
+        n_ref = struct.unpack_from("<i", data, pos)[0]
+        pos += 4
+        for _ in range(n_ref):
+            need(pos + 4)
+            name_length = struct.unpack_from("<i", data, pos)[0]
+            need(pos + 8 + name_length)
+            name = bytes(data[pos + 4:pos + 4 + name_length - 1]).decode("utf-8")
+            self.references[name] = struct.unpack_from("<i", data, pos + 4 + name_length)[0]
+            pos += 8 + name_length
+
+        for data_start, block_offset in reversed(block_starts):
+            if data_start <= pos:
+                return make_virtual_offset(block_offset, pos - data_start)
+        return 0
+
+    def resolve_chromosome(self, chromosome: str) -> Optional[str]:
+        """把输入的染色体名称映射为 BAM 中的参考序列名"""
+        return match_chromosome(chromosome, self.references)
+
+    def iter_records(
+        self,
+        start_offset: Optional[int] = None,
+        end_offset: Optional[int] = None
+    ) -> Iterator[Tuple[int, bytes]]:
+        """
+        逐条读取比对记录
+
+        Args:
+            start_offset: 起始虚拟偏移，默认为第一条记录
+            end_offset: 结束虚拟偏移（记录起点 >= end_offset 时停止）
+
+        Yields:
+            (记录起点的虚拟偏移, 不含 block_size 的记录内容)
+        """
+        if start_offset is None:
+            start_offset = self.first_record_offset
+
+        pending = b""
+        pending_offset = 0
+        for block_offset, within, data in self.bgzf.iter_blocks(start_offset):
+            buf = pending + data if pending else data
+            pos = 0
+            while pos + 4 <= len(buf):
+                size = struct.unpack_from("<i", buf, pos)[0]
+                if pos + 4 + size > len(buf):
+                    break
+                if pos == 0 and pending:
+                    record_offset = pending_offset
+                else:
+                    record_offset = make_virtual_offset(block_offset, within + pos - len(pending))
+                if end_offset is not None and record_offset >= end_offset:
+                    return
+                yield record_offset, buf[pos + 4:pos + 4 + size]
+                pos += 4 + size
+
+            if pos < len(buf):
+                # 记录跨块：保留剩余部分，起点偏移不变或位于当前块
+                if not (pos == 0 and pending):
+                    pending_offset = make_virtual_offset(block_offset, within + pos - len(pending))
+                pending = buf[pos:]
+            else:
+                pending = b""
+
+    def _region_records(self, name: str, begin0: int, end0: int) -> Iterator[bytes]:
+        """按索引读取可能与 [begin0, end0) 重叠的记录，越过区域终点后停止"""
+        ref_id = self.names.index(name)
+        for chunk_beg, chunk_end in self.index.chunks(name, begin0, end0):
+            for _, record in self.iter_records(chunk_beg, chunk_end):
+                record_ref, pos = struct.unpack_from("<ii", record)
+                if record_ref != ref_id or pos >= end0:
+                    return  # 记录按坐标排序，后面不会再有重叠
+                yield record
+
+    def coverage(
+        self,
+        chromosome: str,
+        start: int,
+        end: int,
+        bins: int = 500,
+        min_mapq: int = 0,
+        exclude_flags: int = DEFAULT_EXCLUDE_FLAGS
+    ) -> Dict[str, Any]:
+        """
+        计算区域的覆盖度
+
+        Args:
+            chromosome: 染色体名称
+            start: 起始位置（1-based，闭区间）
+            end: 结束位置（1-based，闭区间）
+            bins: 分箱数量（通常为视图宽度的像素数），不超过区域长度
+            min_mapq: 最低比对质量
+            exclude_flags: 排除的 FLAG 位
+
+        Returns:
+            summarize_values 的结果，另加 "reads" 和 "covered_fraction": {阈值: 比例}
+
+        Raises:
+            KeyError: 参考序列不存在
+            ValueError: 区域无效或缺少索引
+        """
+        name = self.resolve_chromosome(chromosome)
+        if name is None:
+            raise KeyError(chromosome)
+        end = min(end, self.references[name])
+        depth, reads = self.depth(name, start, end, min_mapq, exclude_flags)
+        return self._summarize(name, start, end, depth, reads, bins)
+
+    def depth(
+        self,
+        chromosome: str,
+        start: int,
+        end: int,
+        min_mapq: int = 0,
+        exclude_flags: int = DEFAULT_EXCLUDE_FLAGS
+    ) -> Tuple[np.ndarray, int]:
+        """
+        计算逐碱基深度
+
+        Args:
+            chromosome: 染色体名称
+            start: 起始位置（1-based，闭区间）
+            end: 结束位置（1-based，闭区间），超出序列长度时截断
+
+        Returns:
+            (长度为区域长度的 int32 深度数组, 计入深度的记录数)
+
+        Raises:
+            KeyError: 参考序列不存在
+            ValueError: 区域无效或缺少索引
+        """
+        if self.index is None:
+            raise ValueError(f"No .bai or .csi index for {self.path}")
+        name = self.resolve_chromosome(chromosome)
+        if name is None:
+            raise KeyError(chromosome)
+        length = self.references[name]
+        if start < 1 or end < start or start > length:
+            raise ValueError(f"Invalid region {name}:{start}-{end} (length {length})")
+        end = min(end, length)
+
+        begin0, end0 = start - 1, end
+        positions: List[int] = []
+        cigar_counts: List[int] = []
+        cigars: List[bytes] = []
+
+        for record in self._region_records(name, begin0, end0):
+            _, pos, l_read_name, mapq, _, n_cigar, flag, _ = _CORE.unpack_from(record)
+            if flag & exclude_flags or mapq < min_mapq or n_cigar == 0:
+                continue
+            cigar_at = _CORE_SIZE + l_read_name
+            positions.append(pos)
+            cigar_counts.append(n_cigar)
+            cigars.append(record[cigar_at:cigar_at + 4 * n_cigar])
+
+        depth = self._accumulate_depth(positions, cigar_counts, b"".join(cigars), begin0, end0)
+        return depth, len(positions)
+
+    @staticmethod
+    def _accumulate_depth(
+        positions: List[int],
+        cigar_counts: List[int],
+        cigars: bytes,
+        begin0: int,
+        end0: int
+    ) -> np.ndarray:
+        """把所有 CIGAR 片段展开为参考坐标区间，用差分数组累加深度"""
+        length = end0 - begin0
+        if not positions:
+            return np.zeros(length, dtype=np.int32)
+
+        ops = np.frombuffer(cigars, dtype="<u4")
+        op_codes = ops & 0xF
+        ref_lengths = np.where(_CONSUMES_REFERENCE[op_codes], ops >> 4, 0).astype(np.int64)
+
+        counts = np.asarray(cigar_counts, dtype=np.int64)
+        read_of_op = np.repeat(np.arange(len(counts)), counts)
+        # 每个操作在所属记录内的参考偏移
+        before = np.cumsum(ref_lengths) - ref_lengths
+        first_op = np.cumsum(counts) - counts
+        op_start = np.asarray(positions, dtype=np.int64)[read_of_op] + before - before[first_op][read_of_op]
+
+        counted = _COUNTS_DEPTH[op_codes]
+        seg_start = np.clip(op_start[counted] - begin0, 0, length)
+        seg_end = np.clip(op_start[counted] + ref_lengths[counted] - begin0, 0, length)
+        keep = seg_start < seg_end
+
+        diff = np.bincount(seg_start[keep], minlength=length + 1)
+        diff -= np.bincount(seg_end[keep], minlength=length + 1)
+        return np.cumsum(diff[:length]).astype(np.int32)
+
+    @staticmethod
+    def _summarize(
+        name: str,
+        start: int,
+        end: int,
+        depth: np.ndarray,
+        reads: int,
+        bins: int
+    ) -> Dict[str, Any]:
+        """逐碱基深度 -> 总体统计、深度阈值覆盖比例和分箱统计"""
+        summary = summarize_values(name, start, depth, bins)
+        summary["reads"] = reads
+        summary["covered_fraction"] = {
+            f"{threshold}x": round(float(np.count_nonzero(depth >= threshold)) / len(depth), 4)
+            for threshold in DEPTH_THRESHOLDS
+        }
+        return summary
+
+    def close(self):
+        """关闭文件"""
+        self.bgzf.close()
+
+
+def build_bam_index(bam_path: str, index_path: Optional[str] = None) -> str:
+    """
+    为按坐标排序的 BAM 生成 .bai 索引
+
+    Returns:
+        索引文件路径
+    """
+    reader = BamReader(bam_path)
+    builder = BinningIndexBuilder(len(reader.names))
+    pending = None  # 上一条记录 (参考序列编号, 起点, 终点, 起始偏移)
+    previous = (-1, -1)
+    try:
+        for record_offset, record in reader.iter_records():
+            if pending is not None:
+                builder.add(*pending, record_offset)
+                pending = None
+            ref_id, pos, l_read_name, _, _, n_cigar, _, _ = _CORE.unpack_from(record)
+            if ref_id < 0 or pos < 0:
+                break  # 未定位的记录位于文件末尾
+            if (ref_id, pos) < previous:
+                raise ValueError(f"{bam_path} is not sorted at {reader.names[ref_id]}:{pos + 1}")
+            previous = (ref_id, pos)
+            cigar_at = _CORE_SIZE + l_read_name
+            end = pos + cigar_reference_length(record[cigar_at:cigar_at + 4 * n_cigar])
+            pending = (ref_id, pos, end, record_offset)
+    finally:
+        reader.close()
+
+    if pending is not None:
+        builder.add(*pending, data_end_offset(bam_path))
+
+    index_path = index_path or bam_path + ".bai"
+    with open(index_path, "wb") as f:
+        f.write(b"BAI\x01" + struct.pack("<i", len(builder.refs)) + builder.serialize())
+    logger.info(f"Built BAM index {index_path}")
+    return index_path
+
+
+# 已打开的 BAM（路径 -> BamReader），每个进程只打开一次；文件不存在或打开失败不缓存
+_open_bams: Dict[str, BamReader] = {}
+
+
+def get_bam_reader(path: Optional[str] = None) -> Optional[BamReader]:
+    """
+    获取（并缓存）比对文件读取器
+
+    Args:
+        path: BAM 路径，默认使用配置中的 ALIGNMENTS_BAM_PATH
+
+    Returns:
+        BamReader，未配置或无法打开时返回 None（下次调用重新尝试）
+    """
+    if path is None:
+        from app.core.config import settings
+        path = settings.ALIGNMENTS_BAM_PATH
+    if not path:
+        return None
+
+    if path not in _open_bams:
+        if not os.path.exists(path):
+            logger.warning(f"BAM not found: {path}")
+            return None
+        try:
+            reader = BamReader(path)
+        except (OSError, ValueError, BgzfError) as e:
+            logger.error(f"Failed to open BAM {path}: {e}")
+            return None
+        if reader.index is None:
+            logger.warning(f"BAM {path} has no index; coverage queries are unavailable")
+        logger.info(f"Opened BAM {path} ({len(reader.names)} references)")
+        _open_bams[path] = reader
+
+    return _open_bams[path]
+
+
+def main():
+    """命令行入口：为 BAM 生成 .bai 索引"""
+    parser = argparse.ArgumentParser(description="Build a .bai index for a coordinate-sorted BAM file")
+    parser.add_argument("bam", help="BAM file (absolute, or relative to JBROWSE_CONFIG_PATH)")
+    parser.add_argument("-o", "--output", help="Index path (defaults to <bam>.bai)")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    path = args.bam if os.path.exists(args.bam) else os.path.join(settings.JBROWSE_CONFIG_PATH, args.bam)
+
+    logging.basicConfig(level=logging.INFO)
+    print(build_bam_index(path, args.output))
+
+
+if __name__ == "__main__":
+    main()
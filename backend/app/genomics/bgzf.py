@@ -0,0 +1,240 @@
+"""
+BGZF（分块 gzip）读写
+bgzip 压缩的 VCF / GFF / FASTA 由独立压缩的块组成，
+虚拟偏移 = (块在压缩文件中的偏移 << 16) | 块内解压后的偏移，索引（.tbi/.csi/.gzi）据此定位
+"""
+
+from typing import Iterator, List, Optional, Tuple
+import logging
+import struct
+import threading
+import zlib
+
+from app.genomics.block_cache import BlockCache, file_identity, get_block_cache
+
+logger = logging.getLogger(__name__)
+
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"
+
+# 文件结尾的空块
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+# 每块最多存放的未压缩字节数（与 htslib 一致，保证块内偏移放得进 16 位）
+MAX_BLOCK_DATA = 0xff00
+
+_HEADER = struct.Struct("<4sIBBH")
+
+
+def make_virtual_offset(block_offset: int, within_block: int) -> int:
+    """构造虚拟偏移"""
+    return (block_offset << 16) | within_block
+
+
+def split_virtual_offset(virtual_offset: int) -> Tuple[int, int]:
+    """拆分虚拟偏移为 (块偏移, 块内偏移)"""
+    return virtual_offset >> 16, virtual_offset & 0xFFFF
+
+
+def is_bgzf(path: str) -> bool:
+    """判断文件是否为 BGZF 格式"""
+    with open(path, "rb") as f:
+        return f.read(4) == BGZF_MAGIC
+
+
+class BgzfError(Exception):
+    """BGZF 格式错误"""
+
+
+class BgzfReader:
+    """按块随机读取 BGZF 文件"""
+
+    def __init__(self, path: str, block_cache: Optional[BlockCache] = None):
+        """
+        Args:
+            path: bgzip 压缩的文件路径
+            block_cache: 解压块缓存，默认使用进程级共享缓存
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self.file_id = file_identity(path)
+        self.block_cache = block_cache if block_cache is not None else get_block_cache()
+        # 查询可能在线程池中并发执行，seek + read 需要串行
+        self._lock = threading.Lock()
+        # 实际解压的块数（不含缓存命中）
+        self.blocks_read = 0
+
+    def _read_raw_block(self, block_offset: int) -> Optional[bytes]:
+        """读取一个完整的压缩块，到达文件末尾时返回 None"""
+        with self._lock:
+            self._file.seek(block_offset)
+            header = self._file.read(12)
+            if len(header) < 12:
+                return None
+            magic, _, _, _, extra_length = _HEADER.unpack(header)
+            if magic != BGZF_MAGIC:
+                raise BgzfError(f"Not a BGZF block at offset {block_offset} in {self.path}")
+
+            extra = self._file.read(extra_length)
+            block_size = None
+            pos = 0
+            while pos + 4 <= len(extra):
+                subfield_length = struct.unpack_from("<H", extra, pos + 2)[0]
+                if extra[pos:pos + 2] == b"BC" and subfield_length == 2:
+                    block_size = struct.unpack_from("<H", extra, pos + 4)[0] + 1
+                pos += 4 + subfield_length
+            if block_size is None:
+                raise BgzfError(f"Missing BGZF block size at offset {block_offset} in {self.path}")
+
+            rest = self._file.read(block_size - 12 - extra_length)
+        return header + extra + rest
+
+    def read_block(self, block_offset: int) -> Tuple[bytes, int]:
+        """
+        读取并解压一个块（优先使用块缓存）
+
+        Returns:
+            (解压后的数据, 压缩块大小)；文件末尾返回 (b"", 0)
+        """
+        cached = self.block_cache.get(self.file_id, block_offset)
+        if cached is not None:
+            return cached
+
+        raw = self._read_raw_block(block_offset)
+        if raw is None:
+            return b"", 0
+
+        extra_length = struct.unpack_from("<H", raw, 10)[0]
+        data = zlib.decompress(raw[12 + extra_length:-8], -15)
+        if len(data) != struct.unpack_from("<I", raw, len(raw) - 4)[0]:
+            raise BgzfError(f"Corrupt BGZF block at offset {block_offset} in {self.path}")
+        self.blocks_read += 1
+        self.block_cache.put(self.file_id, block_offset, data, len(raw))
+        return data, len(raw)
+
+    def iter_blocks(self, start_offset: int = 0) -> Iterator[Tuple[int, int, bytes]]:
+        """
+        从虚拟偏移 start_offset 开始逐块读取
+
+        Yields:
+            (块偏移, 数据在块内的起始偏移, 从该偏移开始的解压数据)
+        """
+        block_offset, pos = split_virtual_offset(start_offset)
+        while True:
+            data, block_size = self.read_block(block_offset)
+            if block_size == 0:
+                return
+            yield block_offset, pos, data[pos:] if pos else data
+            block_offset += block_size
+            pos = 0
+
+    def iter_lines(
+        self,
+        start_offset: int = 0,
+        end_offset: Optional[int] = None
+    ) -> Iterator[Tuple[int, bytes]]:
+        """
+        从虚拟偏移 start_offset 开始逐行读取
+
+        Args:
+            start_offset: 起始虚拟偏移
+            end_offset: 结束虚拟偏移（行起点 >= end_offset 时停止），None 表示读到文件末尾
+
+        Yields:
+            (行起点的虚拟偏移, 不含换行符的行内容)
+        """
+        block_offset, pos = split_virtual_offset(start_offset)
+        pending: List[bytes] = []
+        pending_offset: Optional[int] = None
+
+        while True:
+            data, block_size = self.read_block(block_offset)
+            if block_size == 0:
+                break
+
+            while pos < len(data):
+                line_offset = make_virtual_offset(block_offset, pos)
+                if pending_offset is None and end_offset is not None and line_offset >= end_offset:
+                    return
+
+                newline = data.find(b"\n", pos)
+                if newline < 0:
+                    if pending_offset is None:
+                        pending_offset = line_offset
+                    pending.append(data[pos:])
+                    break
+
+                if pending_offset is not None:
+                    pending.append(data[pos:newline])
+                    yield pending_offset, b"".join(pending).rstrip(b"\r")
+                    pending, pending_offset = [], None
+                else:
+                    yield line_offset, data[pos:newline].rstrip(b"\r")
+                pos = newline + 1
+
+            block_offset += block_size
+            pos = 0
+
+        if pending_offset is not None:
+            yield pending_offset, b"".join(pending).rstrip(b"\r")
+
+    def close(self):
+        """关闭文件"""
+        self._file.close()
+
+
+class BgzfWriter:
+    """写出 BGZF 文件（用于构建索引和测试数据）"""
+
+    def __init__(self, path: str, compress_level: int = 6):
+        self.path = path
+        self.compress_level = compress_level
+        self._file = open(path, "wb")
+        self._buffer = bytearray()
+        self._block_offset = 0
+        # 每个块的 (压缩偏移, 解压偏移)，用于生成 .gzi
+        self.block_offsets: List[Tuple[int, int]] = []
+        self._uncompressed_offset = 0
+
+    def tell(self) -> int:
+        """当前写入位置的虚拟偏移"""
+        return make_virtual_offset(self._block_offset, len(self._buffer))
+
+    def write(self, data: bytes):
+        """写入数据，满一块时压缩输出"""
+        self._buffer.extend(data)
+        while len(self._buffer) >= MAX_BLOCK_DATA:
+            self._write_block(bytes(self._buffer[:MAX_BLOCK_DATA]))
+            del self._buffer[:MAX_BLOCK_DATA]
+
+    def flush(self):
+        """把缓冲区内容写成一个块（之后的数据从新块开始）"""
+        if self._buffer:
+            self._write_block(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _write_block(self, data: bytes):
+        compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, -15)
+        payload = compressor.compress(data) + compressor.flush()
+        block_size = 12 + 6 + len(payload) + 8
+        block = (
+            BGZF_MAGIC + b"\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+            + struct.pack("<H", block_size - 1)
+            + payload
+            + struct.pack("<II", zlib.crc32(data) & 0xFFFFFFFF, len(data))
+        )
+        self._file.write(block)
+        self.block_offsets.append((self._block_offset, self._uncompressed_offset))
+        self._block_offset += len(block)
+        self._uncompressed_offset += len(data)
+
+    def close(self):
+        """写出剩余数据和结尾空块"""
+        self.flush()
+        self._file.write(BGZF_EOF)
+        self._file.close()
+
+    def __enter__(self) -> "BgzfWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,110 @@
+"""
+BGZF 解压块缓存
+所有 bgzip 读取器（VCF / GFF / FASTA）共享同一个进程级缓存，
+按 (文件标识, 块偏移) 缓存解压后的块，字节数超出预算时按 LRU 淘汰
+"""
+
+from typing import Dict, Any, Hashable, Optional, Tuple
+from collections import OrderedDict
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def file_identity(path: str) -> Tuple[int, int, int, int]:
+    """
+    文件标识：(设备, inode, 大小, 修改时间)
+
+    文件被替换或重新生成后标识随之改变，旧块不会被误用
+    """
+    st = os.stat(path)
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class BlockCache:
+    """解压块的 LRU 缓存（线程安全，读取在线程池中执行）"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: 缓存的解压数据总字节上限，0 表示禁用缓存
+        """
+        self.max_bytes = max_bytes
+
+        # (文件标识, 块偏移) -> (解压数据, 压缩块大小)
+        self._blocks: "OrderedDict[Tuple[Hashable, int], Tuple[bytes, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_held = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, file_id: Hashable, block_offset: int) -> Optional[Tuple[bytes, int]]:
+        """
+        查询缓存
+
+        Returns:
+            命中时返回 (解压数据, 压缩块大小)，否则返回 None
+        """
+        key = (file_id, block_offset)
+        with self._lock:
+            entry = self._blocks.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._blocks.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, file_id: Hashable, block_offset: int, data: bytes, block_size: int):
+        """写入缓存并按字节预算淘汰最久未使用的块"""
+        size = len(data)
+        if size > self.max_bytes:
+            return
+
+        key = (file_id, block_offset)
+        with self._lock:
+            previous = self._blocks.pop(key, None)
+            if previous is not None:
+                self.bytes_held -= len(previous[0])
+            self._blocks[key] = (data, block_size)
+            self.bytes_held += size
+
+            while self.bytes_held > self.max_bytes:
+                _, (evicted, _) = self._blocks.popitem(last=False)
+                self.bytes_held -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._blocks.clear()
+            self.bytes_held = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "blocks": len(self._blocks),
+            "bytes_held": self.bytes_held,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+
+_block_cache: Optional[BlockCache] = None
+
+
+def get_block_cache() -> BlockCache:
+    """获取进程级共享的块缓存（大小由 BGZF_BLOCK_CACHE_BYTES 配置）"""
+    global _block_cache
+    if _block_cache is None:
+        from app.core.config import settings
+        _block_cache = BlockCache(max_bytes=settings.BGZF_BLOCK_CACHE_BYTES)
+    return _block_cache
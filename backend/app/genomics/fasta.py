@@ -0,0 +1,285 @@
+"""
+索引 FASTA 序列读取
+未压缩 FASTA：按 .fai 计算字节偏移，从内存映射中只切出所需的行
+bgzip FASTA：按 .gzi 把解压偏移映射到 BGZF 块，通过共享块缓存读取
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from bisect import bisect_right
+import argparse
+import gzip
+import logging
+import mmap
+import os
+import struct
+
+from app.genomics.bgzf import BgzfReader, is_bgzf
+from app.utils.chromosome_normalizer import match_chromosome
+
+logger = logging.getLogger(__name__)
+
+# 行尾字符（.fai 的 line_width - line_bases 即行尾长度）
+_LINE_TERMINATORS = b"\r\n"
+
+
+class FaiEntry(NamedTuple):
+    """.fai 中的一行"""
+    name: str
+    length: int
+    offset: int
+    line_bases: int
+    line_width: int
+
+
+def read_fai(path: str) -> Dict[str, FaiEntry]:
+    """读取 .fai 索引，返回 序列名 -> FaiEntry（保持文件中的顺序）"""
+    entries: Dict[str, FaiEntry] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\r\n").split("\t")
+            if len(fields) < 5:
+                continue
+            entries[fields[0]] = FaiEntry(fields[0], *(int(v) for v in fields[1:5]))
+    return entries
+
+
+def read_gzi(path: str) -> List[Tuple[int, int]]:
+    """
+    读取 .gzi 索引
+
+    Returns:
+        [(压缩偏移, 解压偏移)]，包含文件开头的 (0, 0)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    count = struct.unpack_from("<Q", data)[0]
+    values = struct.unpack_from(f"<{count * 2}Q", data, 8)
+    return [(0, 0)] + list(zip(values[0::2], values[1::2]))
+
+
+def write_gzi(path: str, block_offsets: List[Tuple[int, int]]):
+    """按 bgzip 的格式写出 .gzi（省略第一个块的 (0, 0)）"""
+    entries = [entry for entry in block_offsets if entry != (0, 0)]
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(entries)))
+        f.write(b"".join(struct.pack("<QQ", *entry) for entry in entries))
+
+
+def build_fai(fasta_path: str, fai_path: Optional[str] = None) -> str:
+    """
+    生成 .fai 索引（支持 bgzip 压缩的 FASTA，偏移为解压后的偏移）
+
+    Returns:
+        索引文件路径
+    """
+    fai_path = fai_path or fasta_path + ".fai"
+    opener = gzip.open if is_bgzf(fasta_path) else open
+    entries: List[FaiEntry] = []
+
+    name = None
+    length = offset = line_bases = line_width = 0
+    short_line = False
+    position = 0
+    with opener(fasta_path, "rb") as f:
+        for line in f:
+            line_start = position
+            position += len(line)
+            if line.startswith(b">"):
+                if name is not None:
+                    entries.append(FaiEntry(name, length, offset, line_bases, line_width))
+                name = line[1:].split()[0].decode("utf-8")
+                length = line_bases = line_width = 0
+                offset = position
+                short_line = False
+                continue
+
+            bases = len(line.rstrip(_LINE_TERMINATORS))
+            if bases == 0:
+                continue
+            if short_line:
+                raise ValueError(f"{fasta_path}: {name} has lines of different lengths near offset {line_start}")
+            if line_bases == 0:
+                line_bases, line_width = bases, len(line)
+            elif bases != line_bases:
+                short_line = True
+            elif len(line) != line_width:
+                raise ValueError(f"{fasta_path}: {name} has inconsistent line terminators")
+            length += bases
+
+    if name is not None:
+        entries.append(FaiEntry(name, length, offset, line_bases, line_width))
+
+    with open(fai_path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write("\t".join(str(v) for v in entry) + "\n")
+    return fai_path
+
+
+class IndexedFasta:
+    """.fai 索引的 FASTA（未压缩或 bgzip 压缩）"""
+
+    def __init__(self, path: str, fai_path: Optional[str] = None, gzi_path: Optional[str] = None):
+        """
+        Args:
+            path: FASTA 文件路径
+            fai_path: .fai 路径，默认 path + ".fai"
+            gzi_path: .gzi 路径（bgzip 压缩时需要），默认 path + ".gzi"
+        """
+        self.path = path
+        self.entries = read_fai(fai_path or path + ".fai")
+        self.compressed = is_bgzf(path)
+
+        self._mmap = None
+        self._bgzf = None
+        if self.compressed:
+            gzi_path = gzi_path or path + ".gzi"
+            if not os.path.exists(gzi_path):
+                raise ValueError(f"bgzip FASTA requires a .gzi index: {gzi_path}")
+            gzi = read_gzi(gzi_path)
+            self._block_coffsets = [c for c, _ in gzi]
+            self._block_uoffsets = [u for _, u in gzi]
+            self._bgzf = BgzfReader(path)
+        else:
+            with open(path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._resolved: Dict[str, str] = {}
+
+    def resolve_chromosome(self, chromosome: str) -> Optional[str]:
+        """把输入的染色体名称映射为 FASTA 中的序列名"""
+        name = self._resolved.get(chromosome)
+        if name is None:
+            name = match_chromosome(chromosome, self.entries)
+            # 只缓存能解析的名称，未知名称来自用户输入，缓存会无限增长
+            if name is not None:
+                self._resolved[chromosome] = name
+        return name
+
+    def get_length(self, chromosome: str) -> Optional[int]:
+        """序列长度，序列不存在时返回 None"""
+        name = self.resolve_chromosome(chromosome)
+        return self.entries[name].length if name else None
+
+    def _byte_offset(self, entry: FaiEntry, position: int) -> int:
+        """0-based 碱基位置 -> 文件（解压后）字节偏移"""
+        line, column = divmod(position, entry.line_bases)
+        return entry.offset + line * entry.line_width + column
+
+    def _read_uncompressed(self, begin: int, end: int) -> bytes:
+        """读取 bgzip 文件中解压偏移 [begin, end) 的数据"""
+        index = bisect_right(self._block_uoffsets, begin) - 1
+        block_offset = self._block_coffsets[index]
+        skip = begin - self._block_uoffsets[index]
+        needed = end - begin
+
+        parts = []
+        while needed > 0:
+            data, block_size = self._bgzf.read_block(block_offset)
+            if block_size == 0:
+                break
+            part = data[skip:skip + needed]
+            parts.append(part)
+            needed -= len(part)
+            block_offset += block_size
+            skip = 0
+        return b"".join(parts)
+
+    def fetch(self, chromosome: str, start: int, end: int) -> str:
+        """
+        读取序列
+
+        Args:
+            chromosome: 染色体名称
+            start: 起始位置（1-based，闭区间）
+            end: 结束位置（1-based，闭区间），超出序列长度时截断
+
+        Returns:
+            序列字符串
+
+        Raises:
+            KeyError: 序列不存在
+            ValueError: 区域无效
+        """
+        return self.fetch_bytes(chromosome, start, end).decode("ascii")
+
+    def fetch_bytes(self, chromosome: str, start: int, end: int) -> bytes:
+        """与 fetch 相同，但返回未解码的 ASCII 字节（可直接用 np.frombuffer 做 uint8 视图）"""
+        name = self.resolve_chromosome(chromosome)
+        if name is None:
+            raise KeyError(chromosome)
+        entry = self.entries[name]
+        if start < 1 or end < start or start > entry.length:
+            raise ValueError(f"Invalid region {name}:{start}-{end} (length {entry.length})")
+        end = min(end, entry.length)
+
+        begin = self._byte_offset(entry, start - 1)
+        # 终点按最后一个碱基计算，避免把其后的行尾算进来
+        stop = self._byte_offset(entry, end - 1) + 1
+        if self._mmap is not None:
+            raw = self._mmap[begin:stop]
+        else:
+            raw = self._read_uncompressed(begin, stop)
+
+        if entry.line_width != entry.line_bases:
+            raw = raw.translate(None, _LINE_TERMINATORS)
+        return raw
+
+    def close(self):
+        """关闭文件"""
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._bgzf is not None:
+            self._bgzf.close()
+
+
+# 已打开的 FASTA（路径 -> IndexedFasta），每个进程只打开一次；文件不存在或打开失败不缓存
+_open_fastas: Dict[str, IndexedFasta] = {}
+
+
+def get_reference_fasta(path: Optional[str] = None) -> Optional[IndexedFasta]:
+    """
+    获取（并缓存）参考基因组 FASTA
+
+    Args:
+        path: FASTA 路径，默认使用配置中的 REFERENCE_FASTA_PATH
+
+    Returns:
+        IndexedFasta，未配置或无法打开时返回 None（下次调用重新尝试）
+    """
+    if path is None:
+        from app.core.config import settings
+        path = settings.REFERENCE_FASTA_PATH
+    if not path:
+        return None
+
+    if path not in _open_fastas:
+        if not os.path.exists(path):
+            logger.warning(f"Reference FASTA not found: {path}")
+            return None
+        try:
+            fasta = IndexedFasta(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to open reference FASTA {path}: {e}")
+            return None
+        logger.info(f"Opened reference FASTA {path} ({len(fasta.entries)} sequences)")
+        _open_fastas[path] = fasta
+
+    return _open_fastas[path]
+
+
+def main():
+    """命令行入口：为 FASTA 生成 .fai 索引"""
+    parser = argparse.ArgumentParser(description="Build a .fai index for a FASTA file")
+    parser.add_argument("fasta", help="FASTA file, plain or bgzip-compressed (absolute, or relative to JBROWSE_CONFIG_PATH)")
+    parser.add_argument("-o", "--output", help="Index path (defaults to <fasta>.fai)")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    path = args.fasta if os.path.exists(args.fasta) else os.path.join(settings.JBROWSE_CONFIG_PATH, args.fasta)
+
+    logging.basicConfig(level=logging.INFO)
+    print(build_fai(path, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""
+基因注释索引
+离线从 GENCODE/Ensembl 的 GFF3 或 GTF 构建紧凑的磁盘索引（NumPy 数组目录），
+运行时以内存映射方式加载，按基因符号 / Ensembl ID / 别名 / 曾用名二分查找
+
+构建索引:
+    python -m app.genomics.gene_index gencode.v44.annotation.gff3.gz -o data/jbrowse/gene_index \
+        --hgnc hgnc_complete_set.txt
+"""
+
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from datetime import datetime
+from urllib.parse import unquote
+import argparse
+import csv
+import gzip
+import json
+import logging
+import os
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+# 视为基因记录的特征类型（Ensembl GFF3 对非编码基因和假基因使用单独的类型）
+GENE_FEATURE_TYPES = {"gene", "ncRNA_gene", "pseudogene"}
+
+# 索引键的类型，数值越小优先级越高（同一个键对应多个基因时保留优先级高的）
+KEY_SYMBOL = 0
+KEY_GENE_ID = 1
+KEY_ALIAS = 2
+KEY_PREVIOUS = 3
+
+_GTF_ATTR_RE = re.compile(r'\s*([^\s;]+)\s+"?([^";]*)"?\s*;?')
+_ENSEMBL_VERSION_RE = re.compile(r'^(ENS[A-Z]*G\d+)\.\d+(_PAR_Y)?$', re.IGNORECASE)
+
+_STRANDS = {"+": 1, "-": -1}
+
+
+def open_annotation(path: str):
+    """打开注释文件，支持 gzip / bgzip 压缩"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def parse_gff3_attributes(column: str) -> Dict[str, str]:
+    """解析 GFF3 第 9 列（key=value;...，值经过 URL 编码）"""
+    attrs = {}
+    for part in column.strip().split(";"):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            attrs[key.strip()] = unquote(value.strip())
+    return attrs
+
+
+def parse_gtf_attributes(column: str) -> Dict[str, str]:
+    """解析 GTF 第 9 列（key "value"; ...），重复的键只保留第一个值"""
+    attrs = {}
+    for key, value in _GTF_ATTR_RE.findall(column):
+        attrs.setdefault(key, value)
+    return attrs
+
+
+def strip_ensembl_version(gene_id: str) -> str:
+    """去掉 Ensembl ID 的版本号（ENSG00000012048.23 -> ENSG00000012048）"""
+    match = _ENSEMBL_VERSION_RE.match(gene_id)
+    return match.group(1) if match else gene_id
+
+
+def iter_gene_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    逐行读取注释文件中的基因记录
+
+    Yields:
+        {"chromosome", "start", "end", "strand", "gene_id", "symbol", "gene_type", "aliases"}
+    """
+    is_gtf = ".gtf" in os.path.basename(path).lower()
+    parse_attributes = parse_gtf_attributes if is_gtf else parse_gff3_attributes
+
+    with open_annotation(path) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\r\n").split("\t")
+            if len(fields) < 9 or fields[2] not in GENE_FEATURE_TYPES:
+                continue
+
+            attrs = parse_attributes(fields[8])
+            gene_id = attrs.get("gene_id") or attrs.get("ID", "")
+            if gene_id.startswith("gene:"):
+                gene_id = gene_id[5:]
+            symbol = attrs.get("gene_name") or attrs.get("Name") or gene_id
+
+            aliases = []
+            for key in ("Alias", "gene_synonym"):
+                if attrs.get(key):
+                    aliases.extend(a.strip() for a in attrs[key].split(",") if a.strip())
+
+            yield {
+                "chromosome": fields[0],
+                "start": int(fields[3]),
+                "end": int(fields[4]),
+                "strand": _STRANDS.get(fields[6], 0),
+                "gene_id": gene_id,
+                "symbol": symbol,
+                "gene_type": attrs.get("gene_type") or attrs.get("gene_biotype") or attrs.get("biotype", ""),
+                "aliases": aliases
+            }
+
+
+def load_hgnc_aliases(path: str) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """
+    读取 HGNC complete set（制表符分隔，alias_symbol / prev_symbol 列以 | 分隔）
+
+    Returns:
+        (基因符号 -> 别名列表, 基因符号 -> 曾用名列表)
+    """
+    aliases: Dict[str, List[str]] = {}
+    previous: Dict[str, List[str]] = {}
+    with open_annotation(path) as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            symbol = (row.get("symbol") or "").upper()
+            if not symbol:
+                continue
+            for column, target in (("alias_symbol", aliases), ("prev_symbol", previous)):
+                values = [v.strip() for v in (row.get(column) or "").strip('"').split("|") if v.strip()]
+                if values:
+                    target.setdefault(symbol, []).extend(values)
+    return aliases, previous
+
+
+def encode_key(name: str) -> bytes:
+    """
+    索引键统一为大写 ASCII
+
+    含非 ASCII 字符的名称返回空键（不匹配任何基因），
+    而不是丢弃这些字符后误匹配到其他基因（如 "TP53ß" -> TP53）
+    """
+    try:
+        return name.strip().upper().encode("ascii")
+    except UnicodeEncodeError:
+        return b""
+
+
+def _to_bytes_array(values: List[bytes]) -> np.ndarray:
+    """定长字节串数组（空列表时也保证是 S 类型）"""
+    width = max((len(v) for v in values), default=1) or 1
+    return np.array(values, dtype=f"S{width}")
+
+
+def build_gene_index(
+    annotation_path: str,
+    index_dir: str,
+    extra_aliases: Optional[Dict[str, List[str]]] = None,
+    previous_symbols: Optional[Dict[str, List[str]]] = None
+) -> Dict[str, Any]:
+    """
+    从 GFF3/GTF 构建基因索引
+
+    Args:
+        annotation_path: GFF3 或 GTF 文件路径（可为 .gz）
+        index_dir: 输出目录
+        extra_aliases: 额外的别名表（基因符号 -> 别名列表）
+        previous_symbols: 曾用名表（基因符号 -> 曾用名列表）
+
+    Returns:
+        索引元数据
+    """
+    chromosomes: List[str] = []
+    chrom_ids: Dict[str, int] = {}
+    chrom_col, start_col, end_col, strand_col = [], [], [], []
+    gene_id_col, symbol_col, type_col = [], [], []
+    # (键, 键类型, 基因序号)
+    keys: List[Tuple[bytes, int, int]] = []
+
+    for record in iter_gene_records(annotation_path):
+        gene = len(symbol_col)
+        chrom = record["chromosome"]
+        if chrom not in chrom_ids:
+            chrom_ids[chrom] = len(chromosomes)
+            chromosomes.append(chrom)
+
+        chrom_col.append(chrom_ids[chrom])
+        start_col.append(record["start"])
+        end_col.append(record["end"])
+        strand_col.append(record["strand"])
+        gene_id_col.append(record["gene_id"].encode("ascii", "ignore"))
+        symbol_col.append(record["symbol"].encode("ascii", "ignore"))
+        type_col.append(record["gene_type"].encode("ascii", "ignore"))
+
+        keys.append((encode_key(record["symbol"]), KEY_SYMBOL, gene))
+        if record["gene_id"]:
+            keys.append((encode_key(strip_ensembl_version(record["gene_id"])), KEY_GENE_ID, gene))
+        aliases = list(record["aliases"])
+        if extra_aliases:
+            aliases.extend(extra_aliases.get(record["symbol"].upper(), []))
+        for alias in aliases:
+            keys.append((encode_key(alias), KEY_ALIAS, gene))
+        if previous_symbols:
+            for previous in previous_symbols.get(record["symbol"].upper(), []):
+                keys.append((encode_key(previous), KEY_PREVIOUS, gene))
+
+    # 按 (键, 优先级, 文件顺序) 排序后去重，同名键保留优先级最高、最先出现的基因
+    keys.sort()
+    unique_keys, key_gene, key_kind = [], [], []
+    for key, kind, gene in keys:
+        if not key or (unique_keys and unique_keys[-1] == key):
+            continue
+        unique_keys.append(key)
+        key_gene.append(gene)
+        key_kind.append(kind)
+
+    os.makedirs(index_dir, exist_ok=True)
+    arrays = {
+        "keys": _to_bytes_array(unique_keys),
+        "key_gene": np.array(key_gene, dtype=np.int32),
+        "key_kind": np.array(key_kind, dtype=np.int8),
+        "chrom": np.array(chrom_col, dtype=np.uint16),
+        "start": np.array(start_col, dtype=np.int32),
+        "end": np.array(end_col, dtype=np.int32),
+        "strand": np.array(strand_col, dtype=np.int8),
+        "gene_id": _to_bytes_array(gene_id_col),
+        "symbol": _to_bytes_array(symbol_col),
+        "gene_type": _to_bytes_array(type_col)
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(index_dir, f"{name}.npy"), array)
+
+    meta = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "source": os.path.basename(annotation_path),
+        "built_at": datetime.now().isoformat(),
+        "genes": len(symbol_col),
+        "keys": len(unique_keys),
+        "chromosomes": chromosomes
+    }
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    logger.info(f"Built gene index {index_dir}: {meta['genes']} genes, {meta['keys']} keys")
+    return meta
+
+
+class GeneIndex:
+    """内存映射的基因索引，按名称 O(log n) 查找"""
+
+    def __init__(self, index_dir: str):
+        """
+        加载索引
+
+        Args:
+            index_dir: build_gene_index 的输出目录
+        """
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported gene index format: {self.meta.get('format_version')}")
+
+        self.chromosomes: List[str] = self.meta["chromosomes"]
+        self.keys = self._load("keys")
+        self.key_gene = self._load("key_gene")
+        self.key_kind = self._load("key_kind")
+        self.chrom = self._load("chrom")
+        self.start = self._load("start")
+        self.end = self._load("end")
+        self.strand = self._load("strand")
+        self.gene_id = self._load("gene_id")
+        self.symbol = self._load("symbol")
+        self.gene_type = self._load("gene_type")
+
+        self.lookups = 0
+        self.misses = 0
+        self._suggester = None
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.index_dir, f"{name}.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.symbol)
+
+    def __contains__(self, name: str) -> bool:
+        return self.find(name) is not None
+
+    def _search(self, key: bytes) -> Optional[int]:
+        """二分查找键，返回键序号"""
+        if not key or len(key) > self.keys.dtype.itemsize:
+            return None
+        pos = int(np.searchsorted(self.keys, key))
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return pos
+        return None
+
+    def find(self, name: str) -> Optional[int]:
+        """
+        按基因符号、Ensembl ID（可带版本号）或别名查找
+
+        Returns:
+            基因序号，未找到返回 None
+        """
+        key = encode_key(name)
+        pos = self._search(key)
+        if pos is None:
+            stripped = strip_ensembl_version(key.decode("ascii")).encode("ascii")
+            if stripped != key:
+                pos = self._search(stripped)
+        if pos is None:
+            return None
+        return int(self.key_gene[pos])
+
+    def gene_record(self, gene: int) -> Dict[str, Any]:
+        """按基因序号取出基因信息"""
+        symbol = self.symbol[gene].decode("ascii")
+        gene_type = self.gene_type[gene].decode("ascii")
+        return {
+            "chromosome": self.chromosomes[int(self.chrom[gene])],
+            "start": int(self.start[gene]),
+            "end": int(self.end[gene]),
+            "strand": int(self.strand[gene]),
+            "gene_id": self.gene_id[gene].decode("ascii"),
+            "symbol": symbol,
+            "gene_type": gene_type,
+            "description": f"{symbol} ({gene_type})" if gene_type else symbol
+        }
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        查询基因信息
+
+        Returns:
+            基因信息字典，未找到返回 None
+        """
+        self.lookups += 1
+        gene = self.find(name)
+        if gene is None:
+            self.misses += 1
+            return None
+        return self.gene_record(gene)
+
+    def get_suggester(self):
+        """获取基于本索引的补全 / 模糊匹配器（每个索引只构建一次）"""
+        if self._suggester is None:
+            from app.genomics.gene_search import GeneSuggester
+            self._suggester = GeneSuggester.from_gene_index(self)
+        return self._suggester
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        return {
+            "source": self.meta.get("source"),
+            "genes": len(self),
+            "keys": len(self.keys),
+            "lookups": self.lookups,
+            "misses": self.misses
+        }
+
+
+# 已加载的索引（目录 -> GeneIndex），每个进程只加载一次
+_loaded_indexes: Dict[str, Optional[GeneIndex]] = {}
+
+
+def get_gene_index(index_dir: Optional[str] = None) -> Optional[GeneIndex]:
+    """
+    获取（并缓存）基因索引
+
+    Args:
+        index_dir: 索引目录，默认使用配置中的 GENE_INDEX_PATH
+
+    Returns:
+        GeneIndex，索引不存在或无法加载时返回 None
+    """
+    if index_dir is None:
+        from app.core.config import settings
+        index_dir = settings.GENE_INDEX_PATH
+
+    if index_dir not in _loaded_indexes:
+        index = None
+        if index_dir and os.path.exists(os.path.join(index_dir, "meta.json")):
+            try:
+                index = GeneIndex(index_dir)
+                logger.info(f"Loaded gene index from {index_dir}: {index.get_stats()}")
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Failed to load gene index {index_dir}: {e}")
+        else:
+            logger.info(f"No gene index at {index_dir}, using built-in gene table")
+        _loaded_indexes[index_dir] = index
+
+    return _loaded_indexes[index_dir]
+
+
+def main():
+    """命令行入口：构建基因索引"""
+    parser = argparse.ArgumentParser(description="Build the gene index from a GFF3/GTF annotation")
+    parser.add_argument("annotation", help="GFF3/GTF file (absolute, or relative to JBROWSE_CONFIG_PATH)")
+    parser.add_argument("-o", "--output", help="Index directory (defaults to GENE_INDEX_PATH)")
+    parser.add_argument("--hgnc", help="HGNC complete set TSV providing alias and previous symbols")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    annotation = args.annotation
+    if not os.path.exists(annotation):
+        annotation = os.path.join(settings.JBROWSE_CONFIG_PATH, annotation)
+
+    aliases, previous = load_hgnc_aliases(args.hgnc) if args.hgnc else (None, None)
+
+    logging.basicConfig(level=logging.INFO)
+    meta = build_gene_index(annotation, args.output or settings.GENE_INDEX_PATH, aliases, previous)
+    print(json.dumps(meta, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+基因符号补全与模糊匹配
+在基因索引的有序键数组上做前缀补全（二分定位键区间），
+并在字符集签名预筛后用向量化的编辑距离 DP 做有界模糊匹配
+"""
+
+from typing import Dict, Any, List, Optional
+import logging
+
+import numpy as np
+
+from app.genomics.gene_index import GeneIndex, KEY_SYMBOL, KEY_GENE_ID, KEY_ALIAS, KEY_PREVIOUS, encode_key
+
+logger = logging.getLogger(__name__)
+
+KEY_TYPE_NAMES = {
+    KEY_SYMBOL: "symbol",
+    KEY_GENE_ID: "gene_id",
+    KEY_ALIAS: "alias",
+    KEY_PREVIOUS: "previous_symbol"
+}
+
+# 字符 -> 签名位（其他字符共用最后一位，碰撞只会让预筛更宽松，不会漏掉结果）
+_SIGNATURE_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-._"
+_SIGNATURE_BITS = np.full(256, 1 << 63, dtype=np.uint64)
+for _bit, _char in enumerate(_SIGNATURE_ALPHABET):
+    _SIGNATURE_BITS[_char] = 1 << _bit
+_SIGNATURE_BITS[0] = 0  # 定长字节串的填充
+
+_POPCOUNT16 = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """uint64 数组逐元素统计置位数"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    parts = values.view(np.uint16).reshape(-1, 4)
+    return _POPCOUNT16[parts[:, 0]] + _POPCOUNT16[parts[:, 1]] + _POPCOUNT16[parts[:, 2]] + _POPCOUNT16[parts[:, 3]]
+
+
+def default_max_distance(query: str) -> int:
+    """按查询长度决定允许的编辑距离：短符号只容忍一处拼写错误"""
+    return 1 if len(query) <= 5 else 2
+
+
+class GeneSuggester:
+    """基因符号前缀补全与模糊匹配"""
+
+    def __init__(self, keys: np.ndarray, key_symbols: List[str], key_kinds: np.ndarray):
+        """
+        Args:
+            keys: 升序排列的大写键（定长字节串数组）
+            key_symbols: 每个键对应的基因符号
+            key_kinds: 每个键的类型（KEY_SYMBOL / KEY_ALIAS ...）
+        """
+        self.keys = keys
+        self.key_symbols = key_symbols
+        self.key_kinds = np.asarray(key_kinds, dtype=np.int8)
+
+        # 键的字节矩阵视图（不复制）、长度和字符集签名，用于模糊匹配
+        self._chars = keys.view(np.uint8).reshape(len(keys), keys.dtype.itemsize)
+        self._lengths = (self._chars != 0).sum(axis=1).astype(np.int16)
+        self._signatures = np.zeros(len(keys), dtype=np.uint64)
+        for column in range(self._chars.shape[1]):
+            self._signatures |= _SIGNATURE_BITS[self._chars[:, column]]
+
+        # 按键长度分组的键序号
+        order = np.argsort(self._lengths, kind="stable")
+        bounds = np.searchsorted(self._lengths[order], np.arange(self._chars.shape[1] + 2))
+        self._by_length = [order[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+    @classmethod
+    def from_gene_index(cls, index: GeneIndex) -> "GeneSuggester":
+        """基于基因索引的全部键（符号、Ensembl ID、别名、曾用名）构建"""
+        symbols = [s.decode("ascii") for s in index.symbol]
+        key_symbols = [symbols[gene] for gene in index.key_gene]
+        return cls(index.keys, key_symbols, index.key_kind)
+
+    @classmethod
+    def from_symbols(cls, symbols: List[str]) -> "GeneSuggester":
+        """基于基因符号列表构建（内置基因表使用）"""
+        ordered = sorted({s.upper() for s in symbols})
+        width = max((len(s) for s in ordered), default=1)
+        keys = np.array([s.encode("ascii", "ignore") for s in ordered], dtype=f"S{width}")
+        return cls(keys, ordered, np.zeros(len(ordered), dtype=np.int8))
+
+    def _suggestion(self, pos: int, match_type: str, distance: int) -> Dict[str, Any]:
+        return {
+            "symbol": self.key_symbols[pos],
+            "matched": self.keys[pos].decode("ascii"),
+            "match_type": match_type,
+            "key_type": KEY_TYPE_NAMES.get(int(self.key_kinds[pos]), "symbol"),
+            "distance": distance
+        }
+
+    def _collect(self, positions, match_types, distances, limit: int, seen: set) -> List[Dict[str, Any]]:
+        """按顺序收集建议，每个基因只出现一次"""
+        results = []
+        for pos, match_type, distance in zip(positions, match_types, distances):
+            symbol = self.key_symbols[pos]
+            if symbol in seen:
+                continue
+            seen.add(symbol)
+            results.append(self._suggestion(int(pos), match_type, int(distance)))
+            if len(results) >= limit:
+                break
+        return results
+
+    def complete(self, prefix: str, limit: int = 10, seen: Optional[set] = None) -> List[Dict[str, Any]]:
+        """
+        前缀补全
+
+        精确匹配最先，其次按键类型（符号优先于别名）和长度排序
+        """
+        key = encode_key(prefix)
+        if not key or len(key) > self.keys.dtype.itemsize:
+            return []
+
+        lo = int(np.searchsorted(self.keys, key, side="left"))
+        if len(key) < self.keys.dtype.itemsize:
+            hi = int(np.searchsorted(self.keys, key + b"\xff", side="left"))
+        else:
+            # 与数组同宽的键会截断哨兵字节，此时只可能精确匹配
+            hi = int(np.searchsorted(self.keys, key, side="right"))
+        if lo >= hi:
+            return []
+
+        lengths = self._lengths[lo:hi]
+        order = np.lexsort((lengths, self.key_kinds[lo:hi], lengths != len(key)))
+        positions = order + lo
+        match_types = ("exact" if self._lengths[pos] == len(key) else "prefix" for pos in positions)
+        return self._collect(positions, match_types, np.zeros(len(positions), dtype=np.int16),
+                             limit, seen if seen is not None else set())
+
+    def _edit_distances(self, candidates: np.ndarray, query: np.ndarray, max_distance: int) -> np.ndarray:
+        """
+        批量计算查询与候选键的编辑距离（含相邻字符交换，如 BRAC1 -> BRCA1）
+
+        逐个键字符推进 DP 行，所有候选一起向量化计算；
+        插入操作的左向传播用 minimum.accumulate 完成
+        """
+        chars = self._chars[candidates]
+        lengths = self._lengths[candidates]
+        n = len(query)
+        offsets = np.arange(n + 1, dtype=np.int16)
+
+        row = np.broadcast_to(offsets, (len(candidates), n + 1)).copy()
+        before = row
+        distances = np.full(len(candidates), max_distance + 1, dtype=np.int16)
+        for d in range(int(lengths.max())):
+            cost = (chars[:, d:d + 1] != query[None, :]).astype(np.int16)
+            current = np.empty_like(row)
+            current[:, 0] = d + 1
+            current[:, 1:] = np.minimum(row[:, :-1] + cost, row[:, 1:] + 1)
+            if d > 0 and n > 1:
+                swapped = (chars[:, d:d + 1] == query[None, :-1]) & (chars[:, d - 1:d] == query[None, 1:])
+                current[:, 2:] = np.where(swapped, np.minimum(current[:, 2:], before[:, :-2] + 1), current[:, 2:])
+            current = np.minimum.accumulate(current - offsets, axis=1) + offsets
+
+            finished = lengths == d + 1
+            distances[finished] = current[finished, n]
+            before, row = row, current
+        return distances
+
+    def fuzzy(
+        self,
+        query: str,
+        max_distance: Optional[int] = None,
+        limit: int = 10,
+        seen: Optional[set] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        有界编辑距离匹配
+
+        先按长度差和字符集签名（每次编辑最多改变两个签名位）筛掉不可能的键，
+        再对剩余候选计算精确的编辑距离
+        """
+        key = encode_key(query)
+        if not key:
+            return []
+        if max_distance is None:
+            max_distance = default_max_distance(key.decode("ascii"))
+
+        query_chars = np.frombuffer(key, dtype=np.uint8)
+        query_signature = np.bitwise_or.reduce(_SIGNATURE_BITS[query_chars])
+
+        groups = self._by_length[max(len(key) - max_distance, 0):len(key) + max_distance + 1]
+        if not groups:
+            return []
+        candidates = np.concatenate(groups)
+        differing_bits = _popcount(self._signatures[candidates] ^ query_signature)
+        candidates = candidates[differing_bits <= 2 * max_distance]
+        if len(candidates) == 0:
+            return []
+
+        distances = self._edit_distances(candidates, query_chars, max_distance)
+        matched = distances <= max_distance
+        candidates, distances = candidates[matched], distances[matched]
+
+        order = np.lexsort((self._lengths[candidates], self.key_kinds[candidates], distances))
+        return self._collect(candidates[order], ["fuzzy"] * len(order), distances[order],
+                             limit, seen if seen is not None else set())
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        搜索框建议：先前缀补全，不足 limit 条时用模糊匹配补齐
+        """
+        seen: set = set()
+        results = self.complete(query, limit, seen)
+        if len(results) < limit:
+            results.extend(self.fuzzy(query, limit=limit - len(results), seen=seen))
+        return results
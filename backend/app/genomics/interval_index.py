@@ -0,0 +1,386 @@
+"""
+注释特征区间索引
+离线把 GFF3/GTF 中的基因、外显子、UTR、CDS 和调控元件按染色体排序，
+写成扁平的 NumPy 数组目录，运行时内存映射加载：
+- 计数查询: 两次二分（起点 < 区间终点的数量 - 终点 <= 区间起点的数量）
+- 重叠查询: 起点有序 + 终点前缀最大值，二分确定候选范围后向量化过滤
+
+构建索引:
+    python -m app.genomics.interval_index gencode.v44.annotation.gff3.gz regulatory.gff3.gz \\
+        -o data/jbrowse/feature_index
+"""
+
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+
+from app.genomics.gene_index import open_annotation, parse_gff3_attributes, parse_gtf_attributes
+from app.utils.chromosome_normalizer import match_chromosome
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+# GFF 特征类型 -> 索引类别
+FEATURE_CATEGORIES = {
+    "gene": "gene",
+    "ncRNA_gene": "gene",
+    "pseudogene": "gene",
+    "exon": "exon",
+    "five_prime_UTR": "utr",
+    "three_prime_UTR": "utr",
+    "UTR": "utr",
+    "CDS": "cds",
+    "regulatory_region": "regulatory",
+    "enhancer": "regulatory",
+    "promoter": "regulatory",
+    "promoter_flanking_region": "regulatory",
+    "CTCF_binding_site": "regulatory",
+    "TF_binding_site": "regulatory",
+    "open_chromatin_region": "regulatory",
+    "silencer": "regulatory",
+}
+
+CATEGORIES = ["gene", "exon", "utr", "cds", "regulatory"]
+
+_STRANDS = {"+": 1, "-": -1}
+
+_MAX_POSITION = int(np.iinfo(np.int32).max)
+
+
+def _as_position(value: int) -> np.int32:
+    """查询坐标转为与索引数组相同的 int32，避免 searchsorted 把整个数组提升为 int64"""
+    return np.int32(min(max(value, 0), _MAX_POSITION))
+
+
+def _feature_name(feature_type: str, attrs: Dict[str, str], parent_names: Dict[str, str]) -> str:
+    """
+    特征名称：基因取基因符号，调控元件取元件类型，
+    外显子等取所属基因的符号（GFF3 中通过 Parent 链追溯）
+    """
+    category = FEATURE_CATEGORIES.get(feature_type)
+    if category == "gene":
+        return attrs.get("gene_name") or attrs.get("Name") or attrs.get("gene_id") or attrs.get("ID", "")
+    if category == "regulatory":
+        return attrs.get("feature_type") or feature_type
+    if attrs.get("gene_name"):
+        return attrs["gene_name"]
+    parent = attrs.get("Parent", "").split(",")[0]
+    if parent in parent_names:
+        return parent_names[parent]
+    return attrs.get("gene_id") or attrs.get("ID", "")
+
+
+def build_feature_index(annotation_paths: List[str], index_dir: str) -> Dict[str, Any]:
+    """
+    从一个或多个 GFF3/GTF 构建特征区间索引
+
+    Args:
+        annotation_paths: 注释文件路径（可为 .gz），如基因注释 + 调控元件注释
+        index_dir: 输出目录
+
+    Returns:
+        索引元数据
+    """
+    chromosomes: List[str] = []
+    chrom_ids: Dict[str, int] = {}
+    names: List[str] = []
+    name_ids: Dict[str, int] = {}
+    # 类别 -> 列 -> 值列表
+    columns = {c: {"chrom": [], "start": [], "end": [], "name": [], "strand": []} for c in CATEGORIES}
+
+    for path in annotation_paths:
+        is_gtf = ".gtf" in os.path.basename(path).lower()
+        parse_attributes = parse_gtf_attributes if is_gtf else parse_gff3_attributes
+        parent_names: Dict[str, str] = {}
+
+        with open_annotation(path) as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                fields = line.rstrip("\r\n").split("\t")
+                if len(fields) < 9:
+                    continue
+
+                feature_type = fields[2]
+                category = FEATURE_CATEGORIES.get(feature_type)
+                if category is None and is_gtf:
+                    continue
+
+                attrs = parse_attributes(fields[8])
+                name = _feature_name(feature_type, attrs, parent_names)
+                if not is_gtf and attrs.get("ID"):
+                    parent_names[attrs["ID"]] = name
+                if category is None:
+                    continue
+
+                chrom = fields[0]
+                if chrom not in chrom_ids:
+                    chrom_ids[chrom] = len(chromosomes)
+                    chromosomes.append(chrom)
+                if name not in name_ids:
+                    name_ids[name] = len(names)
+                    names.append(name)
+
+                column = columns[category]
+                column["chrom"].append(chrom_ids[chrom])
+                # GFF 为 1-based 闭区间，索引内部使用 0-based 半开区间
+                column["start"].append(int(fields[3]) - 1)
+                column["end"].append(int(fields[4]))
+                column["name"].append(name_ids[name])
+                column["strand"].append(_STRANDS.get(fields[6], 0))
+
+    os.makedirs(index_dir, exist_ok=True)
+    segments: Dict[str, Dict[str, List[int]]] = {}
+    counts: Dict[str, int] = {}
+    for category, column in columns.items():
+        chrom = np.array(column["chrom"], dtype=np.int32)
+        start = np.array(column["start"], dtype=np.int64)
+        end = np.array(column["end"], dtype=np.int64)
+        name = np.array(column["name"], dtype=np.int32)
+        strand = np.array(column["strand"], dtype=np.int8)
+
+        # 按 (染色体, 起点, 终点, 名称) 排序并去掉重复（GTF 中同一外显子会随每个转录本重复出现）
+        order = np.lexsort((name, end, start, chrom))
+        chrom, start, end, name, strand = chrom[order], start[order], end[order], name[order], strand[order]
+        if len(order):
+            keep = np.ones(len(order), dtype=bool)
+            keep[1:] = (np.diff(chrom) != 0) | (np.diff(start) != 0) | (np.diff(end) != 0) | (np.diff(name) != 0)
+            chrom, start, end, name, strand = chrom[keep], start[keep], end[keep], name[keep], strand[keep]
+
+        max_end = np.empty_like(end)
+        end_sorted = np.empty_like(end)
+        segments[category] = {}
+        bounds = np.searchsorted(chrom, np.arange(len(chromosomes) + 1))
+        for chrom_id, chrom_name in enumerate(chromosomes):
+            lo, hi = int(bounds[chrom_id]), int(bounds[chrom_id + 1])
+            if lo == hi:
+                continue
+            max_end[lo:hi] = np.maximum.accumulate(end[lo:hi])
+            end_sorted[lo:hi] = np.sort(end[lo:hi])
+            segments[category][chrom_name] = [lo, hi - lo]
+
+        arrays = {
+            "start": start.astype(np.int32),
+            "end": end.astype(np.int32),
+            "max_end": max_end.astype(np.int32),
+            "end_sorted": end_sorted.astype(np.int32),
+            "name": name,
+            "strand": strand
+        }
+        for key, array in arrays.items():
+            np.save(os.path.join(index_dir, f"{category}.{key}.npy"), array)
+        counts[category] = int(len(start))
+
+    width = max((len(n.encode("utf-8")) for n in names), default=1) or 1
+    np.save(os.path.join(index_dir, "names.npy"), np.array([n.encode("utf-8") for n in names], dtype=f"S{width}"))
+
+    meta = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "sources": [os.path.basename(p) for p in annotation_paths],
+        "built_at": datetime.now().isoformat(),
+        "counts": counts,
+        "chromosomes": chromosomes,
+        "segments": segments
+    }
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    logger.info(f"Built feature index {index_dir}: {counts}")
+    return meta
+
+
+class FeatureIntervalIndex:
+    """内存映射的注释特征区间索引"""
+
+    def __init__(self, index_dir: str):
+        """
+        加载索引
+
+        Args:
+            index_dir: build_feature_index 的输出目录
+        """
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported feature index format: {self.meta.get('format_version')}")
+
+        self.chromosomes = set(self.meta["chromosomes"])
+        self.segments: Dict[str, Dict[str, List[int]]] = self.meta["segments"]
+        self._resolved: Dict[str, str] = {}
+        self.names = np.load(os.path.join(index_dir, "names.npy"), mmap_mode="r")
+        self.arrays: Dict[str, Dict[str, np.ndarray]] = {}
+        for category in CATEGORIES:
+            self.arrays[category] = {
+                key: np.load(os.path.join(index_dir, f"{category}.{key}.npy"), mmap_mode="r")
+                for key in ("start", "end", "max_end", "end_sorted", "name", "strand")
+            }
+
+    def resolve_chromosome(self, chromosome: str) -> Optional[str]:
+        """把输入的染色体名称映射为注释文件中的名称"""
+        name = self._resolved.get(chromosome)
+        if name is None:
+            name = match_chromosome(chromosome, self.chromosomes)
+            # 只缓存能解析的名称，未知名称来自用户输入，缓存会无限增长
+            if name is not None:
+                self._resolved[chromosome] = name
+        return name
+
+    def segment(self, category: str, chromosome: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        获取某染色体上某类特征的数组切片（内存映射视图，不复制）
+
+        Returns:
+            {"start", "end", "max_end", "end_sorted", "name", "strand"}，0-based 半开区间；
+            该染色体没有此类特征时返回 None
+        """
+        chrom = self.resolve_chromosome(chromosome)
+        if chrom is None or chrom not in self.segments.get(category, {}):
+            return None
+        offset, count = self.segments[category][chrom]
+        return {key: array[offset:offset + count] for key, array in self.arrays[category].items()}
+
+    def count(self, chromosome: str, start: int, end: int, category: str) -> int:
+        """
+        统计与区域重叠的特征数量，O(log n)
+
+        Args:
+            chromosome: 染色体名称
+            start: 起始位置（1-based，闭区间）
+            end: 结束位置（1-based，闭区间）
+            category: 特征类别（gene / exon / utr / cds / regulatory）
+        """
+        seg = self.segment(category, chromosome)
+        if seg is None:
+            return 0
+        query_start, query_end = _as_position(start - 1), _as_position(end)
+        started_before_end = np.searchsorted(seg["start"], query_end, side="left")
+        ended_before_start = np.searchsorted(seg["end_sorted"], query_start, side="right")
+        return int(started_before_end - ended_before_start)
+
+    def overlap_slice(self, seg: Dict[str, np.ndarray], query_start: int, query_end: int) -> np.ndarray:
+        """
+        在染色体切片中查找与 [query_start, query_end)（0-based 半开）重叠的特征下标
+        """
+        query_start, query_end = _as_position(query_start), _as_position(query_end)
+        hi = int(np.searchsorted(seg["start"], query_end, side="left"))
+        lo = int(np.searchsorted(seg["max_end"], query_start, side="right"))
+        if lo >= hi:
+            return np.empty(0, dtype=np.int64)
+        return lo + np.flatnonzero(seg["end"][lo:hi] > query_start)
+
+    def overlaps(
+        self,
+        chromosome: str,
+        start: int,
+        end: int,
+        category: str,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        列出与区域重叠的特征
+
+        Args:
+            chromosome: 染色体名称
+            start: 起始位置（1-based，闭区间）
+            end: 结束位置（1-based，闭区间）
+            category: 特征类别
+            limit: 最多返回的特征数量
+
+        Returns:
+            [{"name", "start", "end", "strand"}]，坐标为 1-based 闭区间
+        """
+        seg = self.segment(category, chromosome)
+        if seg is None:
+            return []
+        hits = self.overlap_slice(seg, start - 1, end)
+        if limit is not None:
+            hits = hits[:limit]
+        return [
+            {
+                "name": self.names[seg["name"][i]].decode("utf-8"),
+                "start": int(seg["start"][i]) + 1,
+                "end": int(seg["end"][i]),
+                "strand": int(seg["strand"][i])
+            }
+            for i in hits
+        ]
+
+    def count_by_name(self, chromosome: str, start: int, end: int, category: str) -> Dict[str, int]:
+        """按名称统计区域内的特征数量（如调控元件按类型统计）"""
+        seg = self.segment(category, chromosome)
+        if seg is None:
+            return {}
+        hits = self.overlap_slice(seg, start - 1, end)
+        name_ids, counts = np.unique(seg["name"][hits], return_counts=True)
+        return {self.names[n].decode("utf-8"): int(c) for n, c in zip(name_ids, counts)}
+
+    def summarize(self, chromosome: str, start: int, end: int) -> Dict[str, int]:
+        """统计区域内各类特征的数量"""
+        return {category: self.count(chromosome, start, end, category) for category in CATEGORIES}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        return {
+            "sources": self.meta.get("sources"),
+            "chromosomes": len(self.chromosomes),
+            "counts": self.meta.get("counts")
+        }
+
+
+# 已加载的索引（目录 -> FeatureIntervalIndex），每个进程只加载一次
+_loaded_indexes: Dict[str, Optional[FeatureIntervalIndex]] = {}
+
+
+def get_feature_index(index_dir: Optional[str] = None) -> Optional[FeatureIntervalIndex]:
+    """
+    获取（并缓存）特征区间索引
+
+    Args:
+        index_dir: 索引目录，默认使用配置中的 FEATURE_INDEX_PATH
+
+    Returns:
+        FeatureIntervalIndex，索引不存在或无法加载时返回 None
+    """
+    if index_dir is None:
+        from app.core.config import settings
+        index_dir = settings.FEATURE_INDEX_PATH
+
+    if index_dir not in _loaded_indexes:
+        index = None
+        if index_dir and os.path.exists(os.path.join(index_dir, "meta.json")):
+            try:
+                index = FeatureIntervalIndex(index_dir)
+                logger.info(f"Loaded feature index from {index_dir}: {index.get_stats()}")
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Failed to load feature index {index_dir}: {e}")
+        else:
+            logger.info(f"No feature index at {index_dir}")
+        _loaded_indexes[index_dir] = index
+
+    return _loaded_indexes[index_dir]
+
+
+def main():
+    """命令行入口：构建特征区间索引"""
+    parser = argparse.ArgumentParser(description="Build the feature interval index from GFF3/GTF annotations")
+    parser.add_argument("annotations", nargs="+", help="GFF3/GTF files (absolute, or relative to JBROWSE_CONFIG_PATH)")
+    parser.add_argument("-o", "--output", help="Index directory (defaults to FEATURE_INDEX_PATH)")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    paths = [p if os.path.exists(p) else os.path.join(settings.JBROWSE_CONFIG_PATH, p) for p in args.annotations]
+
+    logging.basicConfig(level=logging.INFO)
+    meta = build_feature_index(paths, args.output or settings.FEATURE_INDEX_PATH)
+    print(json.dumps({k: meta[k] for k in ("sources", "counts")}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+"""
+组装间坐标转换（liftover，如 hg19 <-> hg38）
+解析 UCSC chain 文件（hg19ToHg38.over.chain.gz 等），每条源染色体的无间隙比对块
+存为按起点排序的数组。单个位置、区间和批量列表都用 searchsorted 定位所在的比对块，
+目标坐标向量化计算：目标位置 = 块锚点 + 链方向 × (源位置 - 块起点)
+
+区间跨越多条 chain（不同染色体、链方向或重排）时按 chain 拆分为多个片段，
+不在任何 chain 中的源区间报告为未映射区域
+
+目录结构:
+    data/jbrowse/liftover/
+        hg19ToHg38.over.chain.gz
+        hg38ToHg19.over.chain.gz
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import gzip
+import logging
+import os
+import re
+
+import numpy as np
+
+from app.utils.chromosome_normalizer import match_chromosome
+
+logger = logging.getLogger(__name__)
+
+# 常用组装名称 -> UCSC 组装名称（chain 文件按 UCSC 名称命名）
+ASSEMBLY_NAMES = {
+    "hg19": "hg19",
+    "grch37": "hg19",
+    "hg38": "hg38",
+    "grch38": "hg38",
+}
+
+CHAIN_FILE_SUFFIXES = (".over.chain.gz", ".over.chain")
+
+# 其他组装名称只允许字母、数字和下划线（名称会拼进 chain 文件路径）
+_ASSEMBLY_NAME_RE = re.compile(r"[A-Za-z0-9_]+")
+
+_STRAND_NAMES = {1: "+", -1: "-"}
+
+
+def is_valid_assembly(name: str) -> bool:
+    """组装名称是否可用于查找 chain 文件（ASSEMBLY_NAMES 中的名称，或只含字母、数字和下划线）"""
+    name = name.strip()
+    return name.lower() in ASSEMBLY_NAMES or _ASSEMBLY_NAME_RE.fullmatch(name) is not None
+
+
+def canonical_assembly(name: str) -> str:
+    """
+    组装名称 -> UCSC 组装名称（GRCh38 -> hg38），不认识的有效名称原样返回
+
+    Raises:
+        ValueError: 名称无效（见 is_valid_assembly）
+    """
+    if not is_valid_assembly(name):
+        raise ValueError(f"Invalid assembly name: {name!r}")
+    return ASSEMBLY_NAMES.get(name.strip().lower(), name.strip())
+
+
+def chain_file_name(source: str, target: str) -> str:
+    """
+    UCSC 的 chain 文件命名（不含后缀）: hg19 + hg38 -> hg19ToHg38
+
+    Raises:
+        ValueError: 组装名称无效
+    """
+    target = canonical_assembly(target)
+    return f"{canonical_assembly(source)}To{target[:1].upper()}{target[1:]}"
+
+
+def _resolve_overlaps(order: np.ndarray, starts: np.ndarray, ends: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """
+    去掉源坐标重叠的比对块（重叠时保留得分更高的 chain 的块）
+
+    over.chain 文件由单覆盖的 net 生成，源坐标上通常没有重叠，只在检测到重叠时逐块处理
+
+    Args:
+        order: 按起点排序的块下标
+
+    Returns:
+        保留的块下标（仍按起点排序，互不重叠）
+    """
+    sorted_starts, sorted_ends = starts[order], ends[order]
+    if len(order) < 2 or not np.any(sorted_starts[1:] < np.maximum.accumulate(sorted_ends)[:-1]):
+        return order
+
+    kept: List[int] = []
+    for i in order.tolist():
+        while kept and starts[i] < ends[kept[-1]]:
+            if scores[i] <= scores[kept[-1]]:
+                break
+            kept.pop()
+        else:
+            kept.append(i)
+    return np.array(kept, dtype=np.int64)
+
+
+def parse_chain_file(path: str) -> Tuple[Dict[str, Dict[str, np.ndarray]], List[str]]:
+    """
+    解析 UCSC chain 文件
+
+    chain 头行: chain score tName tSize tStrand tStart tEnd qName qSize qStrand qStart qEnd id，
+    之后每行 "size dt dq"（最后一行只有 size）；t 为源组装，q 为目标组装，
+    q 链方向为 - 时 q 坐标位于反向链上
+
+    Returns:
+        ({源染色体: {"start", "end", "anchor", "sign", "target", "chain", "run", "aligned"}}, 目标染色体名称列表)；
+        start / end 为 0-based 半开区间，target 为目标染色体名称的下标，
+        run 为同一条 chain 的连续块编号，aligned 为块长度的前缀和（比 start 多一项）
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    target_ids: Dict[str, int] = {}
+    # 源染色体 -> 各列的列表
+    columns: Dict[str, Dict[str, List[int]]] = {}
+    chain_scores: List[float] = []
+
+    block = None
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            if fields[0] == "chain":
+                t_name, t_pos = fields[2], int(fields[5])
+                q_name, q_size, q_strand, q_pos = fields[7], int(fields[8]), fields[9], int(fields[10])
+                target = target_ids.setdefault(q_name, len(target_ids))
+                chain = len(chain_scores)
+                chain_scores.append(float(fields[1]))
+                block = columns.setdefault(t_name, {key: [] for key in ("start", "end", "anchor", "sign", "target", "chain")})
+                sign = -1 if q_strand == "-" else 1
+                continue
+            if block is None:
+                raise ValueError(f"Alignment data before the first chain header in {path}")
+
+            size = int(fields[0])
+            block["start"].append(t_pos)
+            block["end"].append(t_pos + size)
+            # 反向链上的 q 坐标 q_pos 对应正向链坐标 q_size - 1 - q_pos，随源坐标递减
+            block["anchor"].append(q_pos if sign > 0 else q_size - 1 - q_pos)
+            block["sign"].append(sign)
+            block["target"].append(target)
+            block["chain"].append(chain)
+            if len(fields) >= 3:
+                t_pos += size + int(fields[1])
+                q_pos += size + int(fields[2])
+
+    scores = np.array(chain_scores)
+    blocks: Dict[str, Dict[str, np.ndarray]] = {}
+    for chromosome, cols in columns.items():
+        starts = np.array(cols["start"], dtype=np.int64)
+        ends = np.array(cols["end"], dtype=np.int64)
+        chains = np.array(cols["chain"], dtype=np.int32)
+        order = _resolve_overlaps(np.argsort(starts, kind="stable"), starts, ends, scores[chains])
+        chains = chains[order]
+        blocks[chromosome] = {
+            "start": starts[order],
+            "end": ends[order],
+            "anchor": np.array(cols["anchor"], dtype=np.int64)[order],
+            "sign": np.array(cols["sign"], dtype=np.int8)[order],
+            "target": np.array(cols["target"], dtype=np.int32)[order],
+            "chain": chains,
+            "run": np.concatenate(([0], np.cumsum(chains[1:] != chains[:-1]))).astype(np.int32),
+            "aligned": np.concatenate(([0], np.cumsum(ends[order] - starts[order]))),
+        }
+    return blocks, list(target_ids)
+
+
+class LiftOver:
+    """基于 chain 比对块的坐标转换"""
+
+    def __init__(
+        self,
+        blocks: Dict[str, Dict[str, np.ndarray]],
+        target_names: List[str],
+        source: str = "hg19",
+        target: str = "hg38"
+    ):
+        """
+        Args:
+            blocks: parse_chain_file 返回的比对块数组
+            target_names: 目标染色体名称（按下标）
+            source: 源组装名称
+            target: 目标组装名称
+        """
+        self.blocks = blocks
+        self.target_names = target_names
+        self.source = source
+        self.target = target
+        self._resolved: Dict[str, str] = {}
+
+    @classmethod
+    def from_chain_file(cls, path: str, source: str, target: str) -> "LiftOver":
+        """从 chain 文件加载"""
+        blocks, target_names = parse_chain_file(path)
+        return cls(blocks, target_names, source, target)
+
+    def resolve_chromosome(self, chromosome: str) -> Optional[str]:
+        """把输入的染色体名称映射为 chain 文件中的源染色体名称"""
+        name = self._resolved.get(chromosome)
+        if name is None:
+            name = match_chromosome(chromosome, self.blocks, self.source)
+            # 只缓存能解析的名称，未知名称来自用户输入，缓存会无限增长
+            if name is not None:
+                self._resolved[chromosome] = name
+        return name
+
+    def _segment(self, chromosome: str) -> Optional[Dict[str, np.ndarray]]:
+        chrom = self.resolve_chromosome(chromosome)
+        return self.blocks.get(chrom) if chrom is not None else None
+
+    def map_positions(self, chromosome: str, positions: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        向量化转换同一条源染色体上的一组位置
+
+        Args:
+            chromosome: 源染色体名称
+            positions: 1-based 位置数组（无需有序）
+
+        Returns:
+            与 positions 等长的数组：mapped（是否落在比对块内）、target（目标染色体名称下标，未映射为 -1）、
+            position（1-based 目标位置，未映射为 0）、strand（+1 / -1，未映射为 0）
+        """
+        points = np.asarray(positions, dtype=np.int64) - 1
+        n = len(points)
+        seg = self._segment(chromosome)
+        if seg is None or n == 0 or len(seg["start"]) == 0:
+            return {
+                "mapped": np.zeros(n, dtype=bool),
+                "target": np.full(n, -1, dtype=np.int32),
+                "position": np.zeros(n, dtype=np.int64),
+                "strand": np.zeros(n, dtype=np.int8),
+            }
+
+        # 起点 <= 点的最后一个块；块互不重叠，点在该块终点之前即落在块内
+        block = np.searchsorted(seg["start"], points, side="right") - 1
+        safe = np.maximum(block, 0)
+        mapped = (block >= 0) & (points < seg["end"][safe])
+        position = seg["anchor"][safe] + seg["sign"][safe] * (points - seg["start"][safe]) + 1
+        return {
+            "mapped": mapped,
+            "target": np.where(mapped, seg["target"][safe], -1).astype(np.int32),
+            "position": np.where(mapped, position, 0),
+            "strand": np.where(mapped, seg["sign"][safe], 0).astype(np.int8),
+        }
+
+    def lift_position(self, chromosome: str, position: int) -> Optional[Dict[str, Any]]:
+        """
+        转换单个位置
+
+        Returns:
+            {"chromosome", "position", "strand"}，位置不在任何比对块内时返回 None
+        """
+        arrays = self.map_positions(chromosome, np.array([position], dtype=np.int64))
+        if not arrays["mapped"][0]:
+            return None
+        return {
+            "chromosome": self.target_names[arrays["target"][0]],
+            "position": int(arrays["position"][0]),
+            "strand": _STRAND_NAMES[int(arrays["strand"][0])],
+        }
+
+    def _interval_result(self, seg: Dict[str, np.ndarray], start: int, end: int, lo: int, hi: int) -> Dict[str, Any]:
+        """源区间 [start, end)（0-based）与比对块 lo..hi-1 重叠时的转换结果"""
+        piece_starts = np.maximum(seg["start"][lo:hi], start)
+        piece_ends = np.minimum(seg["end"][lo:hi], end)
+        runs = seg["run"][lo:hi]
+        # 相邻且属于同一条 chain 的块合并为一个片段（chain 内部的小插入缺失不拆分）
+        bounds = np.concatenate(([0], np.flatnonzero(runs[1:] != runs[:-1]) + 1, [hi - lo]))
+
+        segments = []
+        unmapped = []
+        covered_to = start
+        for first, last in zip(bounds[:-1].tolist(), (bounds[1:] - 1).tolist()):
+            src_start, src_end = int(piece_starts[first]), int(piece_ends[last])
+            a, b = lo + first, lo + last
+            from_pos = int(seg["anchor"][a] + seg["sign"][a] * (src_start - seg["start"][a]))
+            to_pos = int(seg["anchor"][b] + seg["sign"][b] * (src_end - 1 - seg["start"][b]))
+            if src_start > covered_to:
+                unmapped.append({"start": covered_to + 1, "end": src_start})
+            covered_to = max(covered_to, src_end)
+            segments.append({
+                "chromosome": self.target_names[seg["target"][a]],
+                "start": min(from_pos, to_pos) + 1,
+                "end": max(from_pos, to_pos) + 1,
+                "strand": _STRAND_NAMES[int(seg["sign"][a])],
+                "source_start": src_start + 1,
+                "source_end": src_end,
+            })
+        if covered_to < end:
+            unmapped.append({"start": covered_to + 1, "end": end})
+
+        return {
+            "status": "mapped" if len(segments) == 1 else "split",
+            "segments": segments,
+            "unmapped": unmapped,
+            "mapped_fraction": round(float(np.sum(piece_ends - piece_starts)) / (end - start), 4),
+        }
+
+    @staticmethod
+    def _unmapped_result(start: int, end: int) -> Dict[str, Any]:
+        return {
+            "status": "unmapped",
+            "segments": [],
+            "unmapped": [{"start": start + 1, "end": end}],
+            "mapped_fraction": 0.0,
+        }
+
+    def lift_intervals(self, chromosome: str, starts: np.ndarray, ends: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        批量转换同一条源染色体上的区间
+
+        两次 searchsorted 向量化找出每个区间重叠的比对块范围；只涉及一条 chain 的区间
+        （绝大多数）直接向量化计算片段、比对碱基数和两端的未映射区域，跨多条 chain 的逐个拆分
+
+        Args:
+            chromosome: 源染色体名称
+            starts: 1-based 起点数组
+            ends: 1-based 终点数组（闭区间）
+
+        Returns:
+            与输入顺序一致的结果 {"status", "segments", "unmapped", "mapped_fraction"}：
+            status 为 mapped（一个片段）、split（跨多条 chain，多个片段）或 unmapped；
+            segments 为目标区间（1-based 闭区间，含对应的源区间），unmapped 为未映射的源区间
+        """
+        lefts = np.asarray(starts, dtype=np.int64) - 1
+        rights = np.asarray(ends, dtype=np.int64)
+        seg = self._segment(chromosome)
+        if seg is None or len(seg["start"]) == 0:
+            return [self._unmapped_result(s, e) for s, e in zip(lefts.tolist(), rights.tolist())]
+
+        # 块互不重叠，终点同样有序：lo 为第一个终点 > 区间起点的块，hi 为第一个起点 >= 区间终点的块
+        lo = np.searchsorted(seg["end"], lefts, side="right")
+        hi = np.searchsorted(seg["start"], rights, side="left")
+        first = np.minimum(lo, len(seg["start"]) - 1)
+        last = np.maximum(hi - 1, 0)
+        overlaps = lo < hi
+        single = overlaps & (seg["run"][first] == seg["run"][last])
+
+        src_starts = np.maximum(lefts, seg["start"][first])
+        src_ends = np.minimum(rights, seg["end"][last])
+        aligned = (
+            seg["aligned"][last + 1] - seg["aligned"][first]
+            - (src_starts - seg["start"][first]) - (seg["end"][last] - src_ends)
+        )
+        from_pos = seg["anchor"][first] + seg["sign"][first] * (src_starts - seg["start"][first])
+        to_pos = seg["anchor"][last] + seg["sign"][last] * (src_ends - 1 - seg["start"][last])
+        columns = zip(
+            lefts.tolist(), rights.tolist(), overlaps.tolist(), single.tolist(),
+            src_starts.tolist(), src_ends.tolist(), aligned.tolist(),
+            (np.minimum(from_pos, to_pos) + 1).tolist(), (np.maximum(from_pos, to_pos) + 1).tolist(),
+            seg["target"][first].tolist(), seg["sign"][first].tolist(), lo.tolist(), hi.tolist()
+        )
+
+        results = []
+        for left, right, overlap, is_single, src_start, src_end, bases, t_start, t_end, target, sign, l, h in columns:
+            if not overlap:
+                results.append(self._unmapped_result(left, right))
+            elif not is_single:
+                results.append(self._interval_result(seg, left, right, l, h))
+            else:
+                unmapped = []
+                if src_start > left:
+                    unmapped.append({"start": left + 1, "end": src_start})
+                if src_end < right:
+                    unmapped.append({"start": src_end + 1, "end": right})
+                results.append({
+                    "status": "mapped",
+                    "segments": [{
+                        "chromosome": self.target_names[target],
+                        "start": t_start,
+                        "end": t_end,
+                        "strand": _STRAND_NAMES[sign],
+                        "source_start": src_start + 1,
+                        "source_end": src_end,
+                    }],
+                    "unmapped": unmapped,
+                    "mapped_fraction": round(bases / (right - left), 4),
+                })
+        return results
+
+    def lift_interval(self, chromosome: str, start: int, end: int) -> Dict[str, Any]:
+        """转换单个区间（1-based 闭区间），结果格式同 lift_intervals"""
+        return self.lift_intervals(chromosome, np.array([start]), np.array([end]))[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取 chain 统计信息"""
+        return {
+            "source": self.source,
+            "target": self.target,
+            "chromosomes": len(self.blocks),
+            "blocks": sum(len(seg["start"]) for seg in self.blocks.values()),
+        }
+
+
+# 已加载的 chain（文件路径 -> LiftOver），每个进程每个方向只解析一次；加载失败不缓存
+_loaded_chains: Dict[str, LiftOver] = {}
+
+
+def find_chain_file(source: str, target: str, directory: Optional[str] = None) -> Optional[str]:
+    """
+    在 chain 目录中查找 source -> target 的 chain 文件，不存在时返回 None
+
+    Raises:
+        ValueError: 组装名称无效
+    """
+    if directory is None:
+        from app.core.config import settings
+        directory = settings.LIFTOVER_CHAIN_PATH
+
+    name = chain_file_name(source, target)
+    for suffix in CHAIN_FILE_SUFFIXES:
+        path = os.path.join(directory, name + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def get_liftover(source: str, target: str, directory: Optional[str] = None) -> Optional[LiftOver]:
+    """
+    获取（并缓存）source -> target 的坐标转换
+
+    Args:
+        source: 源组装名称（hg19 / GRCh37 / hg38 / GRCh38 等）
+        target: 目标组装名称
+        directory: chain 文件目录，默认使用配置中的 LIFTOVER_CHAIN_PATH
+
+    Returns:
+        LiftOver，chain 文件不存在或无法解析时返回 None（下次调用重新尝试）
+
+    Raises:
+        ValueError: 组装名称无效
+    """
+    path = find_chain_file(source, target, directory)
+    if path is None:
+        logger.info(f"No chain file for {chain_file_name(source, target)}")
+        return None
+
+    if path not in _loaded_chains:
+        try:
+            liftover = LiftOver.from_chain_file(path, canonical_assembly(source), canonical_assembly(target))
+        except (OSError, ValueError, IndexError) as e:
+            logger.error(f"Failed to load chain file {path}: {e}")
+            return None
+        logger.info(f"Loaded chain file {path}: {liftover.get_stats()}")
+        _loaded_chains[path] = liftover
+
+    return _loaded_chains[path]
@@ -0,0 +1,170 @@
+"""
+序列组成统计
+把序列字节作为 uint8 NumPy 视图，用查表、bincount 和前缀和向量化计算
+GC 含量、CpG 观测/期望比、N 缺口和滑动窗口曲线
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+# 碱基编码：A/C/G/T -> 0..3，N -> 4，其余字符（IUPAC 简并碱基等）-> 5，大小写不敏感
+BASE_A, BASE_C, BASE_G, BASE_T, BASE_N, BASE_OTHER = range(6)
+
+_BASE_CODES = np.full(256, BASE_OTHER, dtype=np.uint8)
+for _code, _letters in enumerate((b"Aa", b"Cc", b"Gg", b"Tt", b"Nn")):
+    _BASE_CODES[np.frombuffer(_letters, dtype=np.uint8)] = _code
+
+# 软屏蔽（重复序列）用小写字母表示
+_LOWERCASE_MIN = ord("a")
+
+# CpG 岛判定阈值（Gardiner-Garden & Frommer 1987）
+CPG_ISLAND_MIN_LENGTH = 200
+CPG_ISLAND_MIN_GC = 0.5
+CPG_ISLAND_MIN_OBS_EXP = 0.6
+
+# 结果中逐条列出的 N 缺口数量上限
+MAX_LISTED_N_RUNS = 100
+
+
+def _ratio(numerator, denominator) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def _cpg_obs_exp(cpg: int, c: int, g: int, acgt: int) -> Optional[float]:
+    """CpG 观测/期望比 = CpG 数 × 有效碱基数 / (C 数 × G 数)"""
+    return _ratio(cpg * acgt, c * g)
+
+
+def find_n_runs(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """连续 N 区段，返回 (0-based 起点数组, 终点数组)，半开区间"""
+    mask = np.concatenate(([False], codes == BASE_N, [False])).view(np.int8)
+    edges = np.diff(mask)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def window_bounds(length: int, window_size: int, step: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    滑动窗口边界（0-based 半开区间）
+
+    只保留完整落在序列内的窗口；序列末尾未被覆盖时再加一个截断的窗口
+    """
+    starts = np.arange(0, length, step, dtype=np.int64)
+    full = starts + window_size <= length
+    keep = full.copy()
+    covered = starts[full][-1] + window_size if full.any() else 0
+    if covered < length:
+        keep[np.argmin(full)] = True
+    starts = starts[keep]
+    return starts, np.minimum(starts + window_size, length)
+
+
+def window_profile(codes: np.ndarray, start: int, window_size: int, step: int) -> List[Dict[str, Any]]:
+    """
+    滑动窗口的 GC 含量、CpG 观测/期望比和 N 比例
+
+    Args:
+        codes: 碱基编码数组
+        start: codes[0] 对应的位置（1-based）
+        window_size: 窗口大小（bp）
+        step: 步长（bp）
+    """
+    lo, hi = window_bounds(len(codes), window_size, step)
+
+    # 所有窗口边界把序列切成若干段：一次 bincount 得到每段各类碱基的数量，
+    # 再对段做前缀和，任意窗口的计数都是两个边界处前缀和之差
+    boundaries = np.unique(np.concatenate((lo, hi)))
+    segment_ids = np.repeat(np.arange(len(boundaries) - 1), np.diff(boundaries))
+    covered = codes[boundaries[0]:boundaries[-1]]
+    segment_counts = np.bincount(
+        segment_ids * 6 + covered, minlength=(len(boundaries) - 1) * 6
+    ).reshape(-1, 6)
+
+    # CpG 按 C 的位置计数；在窗口最后一个碱基处开始的 CpG 跨出窗口，需要减掉
+    cpg_at = np.zeros(len(codes), dtype=bool)
+    cpg_at[:-1] = (codes[:-1] == BASE_C) & (codes[1:] == BASE_G)
+    segment_cpg = np.add.reduceat(cpg_at, boundaries[:-1], dtype=np.int64)
+
+    prefix = np.zeros((len(boundaries), 7), dtype=np.int64)
+    np.cumsum(segment_counts, axis=0, out=prefix[1:, :6])
+    np.cumsum(segment_cpg, out=prefix[1:, 6])
+    sums = prefix[np.searchsorted(boundaries, hi)] - prefix[np.searchsorted(boundaries, lo)]
+
+    c, g, n = sums[:, BASE_C], sums[:, BASE_G], sums[:, BASE_N]
+    acgt = sums[:, :BASE_N].sum(axis=1)
+    cpg = sums[:, 6] - cpg_at[hi - 1]
+
+    return [
+        {
+            "start": start + int(lo[i]),
+            "end": start + int(hi[i]) - 1,
+            "gc_fraction": _ratio(int(c[i] + g[i]), int(acgt[i])),
+            "cpg_obs_exp": _cpg_obs_exp(int(cpg[i]), int(c[i]), int(g[i]), int(acgt[i])),
+            "n_fraction": round(int(n[i]) / int(hi[i] - lo[i]), 4),
+        }
+        for i in range(len(lo))
+    ]
+
+
+def sequence_stats(
+    sequence: bytes,
+    start: int = 1,
+    window_size: Optional[int] = None,
+    step: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    计算序列组成统计
+
+    Args:
+        sequence: ASCII 序列字节（如 IndexedFasta.fetch_bytes 的结果）
+        start: 序列第一个碱基的位置（1-based），用于输出坐标
+        window_size: 滑动窗口大小（bp），不提供时不计算窗口曲线
+        step: 窗口步长（bp），默认等于 window_size（不重叠）
+
+    Returns:
+        统计字典：碱基计数、gc_fraction、CpG 数量和观测/期望比、N 缺口、
+        软屏蔽比例，以及可选的 windows 曲线
+    """
+    raw = np.frombuffer(sequence, dtype=np.uint8)
+    codes = _BASE_CODES[raw]
+    length = len(codes)
+
+    counts = np.bincount(codes, minlength=6)
+    a, c, g, t, n, other = (int(x) for x in counts)
+    acgt = a + c + g + t
+    cpg = int(np.count_nonzero((codes[:-1] == BASE_C) & (codes[1:] == BASE_G)))
+    gc_fraction = _ratio(c + g, acgt)
+    cpg_obs_exp = _cpg_obs_exp(cpg, c, g, acgt)
+
+    run_starts, run_ends = find_n_runs(codes)
+    run_lengths = run_ends - run_starts
+
+    stats = {
+        "length": length,
+        "base_counts": {"A": a, "C": c, "G": g, "T": t, "N": n, "other": other},
+        "gc_fraction": gc_fraction,
+        "cpg_count": cpg,
+        "cpg_obs_exp": cpg_obs_exp,
+        "cpg_island_like": bool(
+            length >= CPG_ISLAND_MIN_LENGTH
+            and gc_fraction is not None and gc_fraction > CPG_ISLAND_MIN_GC
+            and cpg_obs_exp is not None and cpg_obs_exp > CPG_ISLAND_MIN_OBS_EXP
+        ),
+        "masked_fraction": _ratio(int(np.count_nonzero(raw >= _LOWERCASE_MIN)), length),
+        "n_runs": {
+            "count": len(run_starts),
+            "total_length": n,
+            "longest": int(run_lengths.max()) if len(run_lengths) else 0,
+            "runs": [
+                {"start": start + int(lo), "end": start + int(hi) - 1}
+                for lo, hi in zip(run_starts[:MAX_LISTED_N_RUNS], run_ends[:MAX_LISTED_N_RUNS])
+            ],
+        },
+    }
+
+    if window_size is not None and length:
+        stats["window_size"] = window_size
+        stats["step"] = step or window_size
+        stats["windows"] = window_profile(codes, start, window_size, step or window_size)
+
+    return stats
@@ -0,0 +1,380 @@
+"""
+多分辨率汇总金字塔（类似 bigWig 的 zoom level）
+离线把逐碱基数值（测序深度、特征覆盖数）汇总为多层分箱的 sum / count / min / max，
+存为一个内存映射文件；查询时选择满足分辨率要求的最粗一层，
+任意大小的窗口只需读取与请求分箱数同量级的汇总记录
+"""
+
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+
+from app.utils.chromosome_normalizer import match_chromosome
+
+logger = logging.getLogger(__name__)
+
+PYRAMID_FORMAT_VERSION = 1
+
+# 最细一层的分箱大小（bp）和相邻层的倍数
+DEFAULT_BASE_BIN_SIZE = 1024
+ZOOM_FACTOR = 4
+LEVELS = 8
+
+# 构建时每次计算的逐碱基窗口（必须是分箱大小的整数倍）
+BUILD_WINDOW_BINS = 1024
+
+SUMMARY_DTYPE = np.dtype([("sum", "<f8"), ("count", "<u4"), ("min", "<f4"), ("max", "<f4")])
+
+# (染色体, 0-based 起点, 终点) -> 逐碱基数值
+BaseValues = Callable[[str, int, int], np.ndarray]
+
+
+def _summarize_base(values: np.ndarray, bin_size: int) -> np.ndarray:
+    """逐碱基数值 -> 最细一层的分箱汇总"""
+    edges = np.arange(0, len(values), bin_size)
+    summary = np.empty(len(edges), dtype=SUMMARY_DTYPE)
+    summary["sum"] = np.add.reduceat(values, edges, dtype=np.float64)
+    summary["count"] = np.diff(np.append(edges, len(values)))
+    summary["min"] = np.minimum.reduceat(values, edges)
+    summary["max"] = np.maximum.reduceat(values, edges)
+    return summary
+
+
+def summarize_values(name: str, start: int, values: np.ndarray, bins: int) -> Dict[str, Any]:
+    """
+    逐碱基数值 -> 总体统计和分箱统计（与 SummaryPyramid.query 的返回格式相同）
+
+    Args:
+        name: 染色体名称
+        start: values[0] 对应的位置（1-based）
+        values: 逐碱基数值
+        bins: 分箱数量，不超过数值长度
+    """
+    length = len(values)
+    n_bins = max(1, min(bins, length))
+    edges = np.linspace(0, length, n_bins + 1).astype(np.int64)
+    bin_starts = edges[:-1]
+    widths = np.diff(edges)
+
+    means = np.add.reduceat(values, bin_starts, dtype=np.float64) / widths
+    mins = np.minimum.reduceat(values, bin_starts)
+    maxs = np.maximum.reduceat(values, bin_starts)
+    return {
+        "chromosome": name,
+        "start": start,
+        "end": start + length - 1,
+        "mean": round(float(values.mean()), 2),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "level_bin_size": 1,
+        "bin_size": round(length / n_bins, 2),
+        "bins": [
+            {"start": start + int(s), "end": start + int(s) + int(w) - 1,
+             "mean": round(float(m), 2), "min": float(lo), "max": float(hi)}
+            for s, w, m, lo, hi in zip(bin_starts, widths, means, mins, maxs)
+        ]
+    }
+
+
+def _merge_bins(summary: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """把相邻的分箱按 edges 合并"""
+    merged = np.empty(len(edges), dtype=SUMMARY_DTYPE)
+    merged["sum"] = np.add.reduceat(summary["sum"], edges)
+    merged["count"] = np.add.reduceat(summary["count"], edges)
+    merged["min"] = np.minimum.reduceat(summary["min"], edges)
+    merged["max"] = np.maximum.reduceat(summary["max"], edges)
+    return merged
+
+
+def build_summary_pyramid(
+    chromosome_lengths: Dict[str, int],
+    base_values: BaseValues,
+    output_dir: str,
+    source: str,
+    base_bin_size: int = DEFAULT_BASE_BIN_SIZE
+) -> Dict[str, Any]:
+    """
+    构建汇总金字塔
+
+    Args:
+        chromosome_lengths: 染色体名称 -> 长度
+        base_values: 返回 [start, end) 逐碱基数值的函数，按窗口调用以限制内存
+        output_dir: 输出目录（summaries.npy + meta.json）
+        source: 数据来源说明
+        base_bin_size: 最细一层的分箱大小
+
+    Returns:
+        元数据
+    """
+    bin_sizes = [base_bin_size * ZOOM_FACTOR ** level for level in range(LEVELS)]
+    window = base_bin_size * BUILD_WINDOW_BINS
+
+    parts: List[np.ndarray] = []
+    offset = 0
+    chromosomes: Dict[str, Any] = {}
+    for chrom, length in chromosome_lengths.items():
+        base = np.concatenate([
+            _summarize_base(base_values(chrom, window_start, min(window_start + window, length)), base_bin_size)
+            for window_start in range(0, length, window)
+        ])
+
+        levels = []
+        summary = base
+        for level in range(LEVELS):
+            if level:
+                summary = _merge_bins(summary, np.arange(0, len(summary), ZOOM_FACTOR))
+            parts.append(summary)
+            levels.append([offset, len(summary)])
+            offset += len(summary)
+        chromosomes[chrom] = {"length": length, "levels": levels}
+        logger.info(f"Summarized {chrom} ({length:,} bp, {len(base):,} base bins)")
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, "summaries.npy"), np.concatenate(parts) if parts else np.empty(0, SUMMARY_DTYPE))
+    meta = {
+        "format_version": PYRAMID_FORMAT_VERSION,
+        "source": source,
+        "bin_sizes": bin_sizes,
+        "chromosomes": chromosomes
+    }
+    with open(os.path.join(output_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def bam_depth_values(bam_path: str, min_mapq: int = 0) -> Tuple[Dict[str, int], BaseValues]:
+    """以 BAM 测序深度作为逐碱基数值，返回 (染色体长度, 取值函数)"""
+    from app.genomics.bam import BamReader
+
+    reader = BamReader(bam_path)
+
+    def values(chrom: str, start: int, end: int) -> np.ndarray:
+        return reader.depth(chrom, start + 1, end, min_mapq)[0]
+
+    return dict(reader.references), values
+
+
+def feature_depth(seg: Dict[str, np.ndarray], start: int, end: int) -> np.ndarray:
+    """
+    [start, end)（0-based）内每个碱基被多少个特征覆盖
+
+    Args:
+        seg: FeatureIntervalIndex.segment 返回的染色体切片
+    """
+    length = end - start
+    lo = int(np.searchsorted(seg["max_end"], start, side="right"))
+    hi = int(np.searchsorted(seg["start"], end, side="left"))
+    if lo >= hi:
+        return np.zeros(length, dtype=np.int32)
+    starts = np.clip(seg["start"][lo:hi].astype(np.int64) - start, 0, length)
+    ends = np.clip(seg["end"][lo:hi].astype(np.int64) - start, 0, length)
+    keep = starts < ends
+    diff = np.bincount(starts[keep], minlength=length + 1)
+    diff -= np.bincount(ends[keep], minlength=length + 1)
+    return np.cumsum(diff[:length]).astype(np.int32)
+
+
+def feature_density_values(index_dir: str, category: str) -> Tuple[Dict[str, int], BaseValues]:
+    """
+    以特征覆盖数作为逐碱基数值，返回 (染色体长度, 取值函数)
+
+    注释索引不记录染色体长度，取最后一个特征的终点
+    """
+    from app.genomics.interval_index import FeatureIntervalIndex
+
+    index = FeatureIntervalIndex(index_dir)
+
+    def values(chrom: str, start: int, end: int) -> np.ndarray:
+        return feature_depth(index.segment(category, chrom), start, end)
+
+    lengths = {}
+    for chrom in index.segments.get(category, {}):
+        seg = index.segment(category, chrom)
+        if len(seg["max_end"]):
+            lengths[chrom] = int(seg["max_end"][-1])
+    return lengths, values
+
+
+class SummaryPyramid:
+    """内存映射的汇总金字塔"""
+
+    def __init__(self, pyramid_dir: str):
+        """
+        加载金字塔
+
+        Args:
+            pyramid_dir: build_summary_pyramid 的输出目录
+        """
+        self.pyramid_dir = pyramid_dir
+        with open(os.path.join(pyramid_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != PYRAMID_FORMAT_VERSION:
+            raise ValueError(f"Unsupported summary pyramid format: {self.meta.get('format_version')}")
+
+        self.bin_sizes: List[int] = self.meta["bin_sizes"]
+        self.base_bin_size = self.bin_sizes[0]
+        self.chromosomes: Dict[str, Any] = self.meta["chromosomes"]
+        self.summaries = np.load(os.path.join(pyramid_dir, "summaries.npy"), mmap_mode="r")
+        self._resolved: Dict[str, str] = {}
+
+    def resolve_chromosome(self, chromosome: str) -> Optional[str]:
+        """把输入的染色体名称映射为金字塔中的名称"""
+        name = self._resolved.get(chromosome)
+        if name is None:
+            name = match_chromosome(chromosome, self.chromosomes)
+            # 只缓存能解析的名称，未知名称来自用户输入，缓存会无限增长
+            if name is not None:
+                self._resolved[chromosome] = name
+        return name
+
+    def select_level(self, region_length: int, bins: int) -> Optional[int]:
+        """
+        选择分箱不大于目标分辨率（region_length / bins）的最粗一层
+
+        Returns:
+            层号，目标分辨率比最细一层还细时返回 None（应读取原始数据）
+        """
+        resolution = region_length / max(bins, 1)
+        level = None
+        for i, bin_size in enumerate(self.bin_sizes):
+            if bin_size <= resolution:
+                level = i
+        return level
+
+    def query(self, chromosome: str, start: int, end: int, bins: int = 500) -> Optional[Dict[str, Any]]:
+        """
+        查询区域的分箱汇总
+
+        Args:
+            chromosome: 染色体名称
+            start: 起始位置（1-based，闭区间）
+            end: 结束位置（1-based，闭区间），超出染色体长度时截断
+            bins: 期望的分箱数量（视图宽度）
+
+        Returns:
+            {"chromosome", "start", "end", "mean", "min", "max", "level_bin_size", "bin_size",
+             "bins": [{"start", "end", "mean", "min", "max"}]}；
+            分辨率要求比最细一层还细时返回 None
+
+        Raises:
+            KeyError: 染色体不存在
+            ValueError: 区域无效
+        """
+        name = self.resolve_chromosome(chromosome)
+        if name is None:
+            raise KeyError(chromosome)
+        info = self.chromosomes[name]
+        length = info["length"]
+        if start < 1 or end < start or start > length:
+            raise ValueError(f"Invalid region {name}:{start}-{end} (length {length})")
+        end = min(end, length)
+
+        level = self.select_level(end - start + 1, bins)
+        if level is None:
+            return None
+        bin_size = self.bin_sizes[level]
+        offset, count = info["levels"][level]
+        lo = (start - 1) // bin_size
+        hi = min(count, (end - 1) // bin_size + 1)
+        level_bins = self.summaries[offset + lo:offset + hi]
+
+        # 层内分箱再合并为不超过 bins 个输出分箱（边界按层内分箱对齐）
+        n_out = max(1, min(bins, hi - lo))
+        edges = np.unique(np.linspace(0, hi - lo, n_out + 1).astype(np.int64)[:-1])
+        merged = _merge_bins(level_bins, edges)
+        bin_starts = (lo + edges) * bin_size
+        bin_ends = np.minimum(np.append((lo + edges[1:]) * bin_size, hi * bin_size), length)
+
+        total_count = int(merged["count"].sum())
+        means = merged["sum"] / np.maximum(merged["count"], 1)
+        return {
+            "chromosome": name,
+            "start": start,
+            "end": end,
+            "mean": round(float(merged["sum"].sum()) / total_count, 2) if total_count else 0.0,
+            "min": float(merged["min"].min()),
+            "max": float(merged["max"].max()),
+            "level_bin_size": bin_size,
+            "bin_size": round(float(np.mean(bin_ends - bin_starts)), 2),
+            "bins": [
+                {"start": int(s) + 1, "end": int(e), "mean": round(float(m), 2), "min": float(mn), "max": float(mx)}
+                for s, e, m, mn, mx in zip(bin_starts, bin_ends, means, merged["min"], merged["max"])
+            ]
+        }
+
+
+# 已加载的金字塔（目录 -> SummaryPyramid）；不存在或加载失败不缓存，服务运行中构建的金字塔下次调用即可使用
+_loaded_pyramids: Dict[str, SummaryPyramid] = {}
+
+
+def get_summary_pyramid(name: str, pyramid_root: Optional[str] = None) -> Optional[SummaryPyramid]:
+    """
+    获取（并缓存）汇总金字塔
+
+    Args:
+        name: 金字塔名称（"coverage"、"density_gene" 等，即 SUMMARY_PYRAMID_PATH 下的子目录）
+        pyramid_root: 金字塔根目录，默认使用配置中的 SUMMARY_PYRAMID_PATH
+
+    Returns:
+        SummaryPyramid，不存在或无法加载时返回 None（下次调用重新尝试）
+    """
+    if pyramid_root is None:
+        from app.core.config import settings
+        pyramid_root = settings.SUMMARY_PYRAMID_PATH
+
+    pyramid_dir = os.path.join(pyramid_root, name)
+    if pyramid_dir not in _loaded_pyramids:
+        if not os.path.exists(os.path.join(pyramid_dir, "meta.json")):
+            return None
+        try:
+            pyramid = SummaryPyramid(pyramid_dir)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to load summary pyramid {pyramid_dir}: {e}")
+            return None
+        logger.info(f"Loaded summary pyramid {pyramid_dir} ({pyramid.meta.get('source')})")
+        _loaded_pyramids[pyramid_dir] = pyramid
+
+    return _loaded_pyramids[pyramid_dir]
+
+
+def main():
+    """命令行入口：构建覆盖度或特征密度金字塔"""
+    parser = argparse.ArgumentParser(description="Build multi-resolution summaries for whole-chromosome views")
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+
+    coverage = subparsers.add_parser("coverage", help="Read depth from an indexed BAM")
+    coverage.add_argument("bam", help="BAM file (absolute, or relative to JBROWSE_CONFIG_PATH)")
+    coverage.add_argument("--min-mapq", type=int, default=0)
+
+    density = subparsers.add_parser("density", help="Feature density from the feature interval index")
+    density.add_argument("category", help="Feature category (gene / exon / utr / cds / regulatory)")
+    density.add_argument("--index", help="Feature index directory (defaults to FEATURE_INDEX_PATH)")
+
+    for sub in (coverage, density):
+        sub.add_argument("-o", "--output", help="Output directory (defaults to SUMMARY_PYRAMID_PATH/<name>)")
+        sub.add_argument("--base-bin-size", type=int, default=DEFAULT_BASE_BIN_SIZE)
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    logging.basicConfig(level=logging.INFO)
+
+    if args.kind == "coverage":
+        path = args.bam if os.path.exists(args.bam) else os.path.join(settings.JBROWSE_CONFIG_PATH, args.bam)
+        lengths, values = bam_depth_values(path, args.min_mapq)
+        name, source = "coverage", f"coverage:{os.path.basename(path)}"
+    else:
+        lengths, values = feature_density_values(args.index or settings.FEATURE_INDEX_PATH, args.category)
+        name, source = f"density_{args.category}", f"density:{args.category}"
+
+    output_dir = args.output or os.path.join(settings.SUMMARY_PYRAMID_PATH, name)
+    meta = build_summary_pyramid(lengths, values, output_dir, source, args.base_bin_size)
+    print(json.dumps({"source": meta["source"], "bin_sizes": meta["bin_sizes"],
+                      "chromosomes": len(meta["chromosomes"])}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Tabix / BAM 索引（.tbi / .csi / .bai）
+读取 htslib 生成的索引，按区域计算需要读取的 BGZF 虚拟偏移区间；
+也可以为按坐标排序的 bgzip 文件生成 .tbi
+"""
+
+from typing import Dict, List, Optional, Tuple
+import gzip
+import logging
+import os
+import struct
+
+from app.genomics.bgzf import BGZF_EOF, BgzfReader, BgzfWriter, make_virtual_offset
+
+logger = logging.getLogger(__name__)
+
+# TBI 固定使用 14 位最小分箱（16 kb）和 5 层
+TBI_MIN_SHIFT = 14
+TBI_DEPTH = 5
+
+# 索引中保存元数据的伪分箱
+TBI_PSEUDO_BIN = 37450
+
+# 预设格式: (format, 染色体列, 起点列, 终点列, 注释字符)；列号从 1 开始，终点列 0 表示由记录推算
+TABIX_PRESETS = {
+    "vcf": (2, 1, 2, 0, "#"),
+    "gff": (0, 1, 4, 5, "#"),
+    "bed": (0x10000, 1, 2, 3, "#"),
+}
+
+Chunk = Tuple[int, int]
+
+
+def reg2bins(beg: int, end: int, min_shift: int = TBI_MIN_SHIFT, depth: int = TBI_DEPTH) -> List[int]:
+    """
+    列出与 0-based 半开区间 [beg, end) 重叠的所有分箱
+    """
+    bins = []
+    end -= 1
+    shift = min_shift + depth * 3
+    first = 0
+    for level in range(depth + 1):
+        bins.extend(range(first + (beg >> shift), first + (end >> shift) + 1))
+        shift -= 3
+        first += 1 << (level * 3)
+    return bins
+
+
+def reg2bin(beg: int, end: int, min_shift: int = TBI_MIN_SHIFT, depth: int = TBI_DEPTH) -> int:
+    """计算能完整容纳 [beg, end) 的最小分箱"""
+    end -= 1
+    shift = min_shift
+    first = ((1 << (depth * 3)) - 1) // 7
+    for level in range(depth, 0, -1):
+        if beg >> shift == end >> shift:
+            return first + (beg >> shift)
+        shift += 3
+        first -= 1 << ((level - 1) * 3)
+    return 0
+
+
+class TabixIndex:
+    """分箱索引（支持 TBI、CSI 和 BAI）"""
+
+    def __init__(self, path: str, names: Optional[List[str]] = None):
+        """
+        加载索引
+
+        Args:
+            path: .tbi / .csi / .bai 文件路径
+            names: 参考序列名称；BAI 和 BAM 的 CSI 不含名称，需要从 BAM 头部传入
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:2] == b"\x1f\x8b":
+            data = gzip.decompress(data)
+        self.names: List[str] = list(names or [])
+
+        # 每个参考序列: 分箱 -> 块列表；TBI 另有线性索引，CSI 每个分箱带最小偏移
+        self.bins: List[Dict[int, List[Chunk]]] = []
+        self.linear: List[List[int]] = []
+        self.bin_offsets: List[Dict[int, int]] = []
+
+        magic = data[:4]
+        if magic == b"TBI\x01":
+            self.is_csi = False
+            self.min_shift, self.depth = TBI_MIN_SHIFT, TBI_DEPTH
+            n_ref = struct.unpack_from("<i", data, 4)[0]
+            pos = self._read_header(data, 8)
+            for _ in range(n_ref):
+                pos = self._read_tbi_reference(data, pos)
+        elif magic == b"BAI\x01":
+            self.is_csi = False
+            self.min_shift, self.depth = TBI_MIN_SHIFT, TBI_DEPTH
+            n_ref = struct.unpack_from("<i", data, 4)[0]
+            pos = 8
+            for _ in range(n_ref):
+                pos = self._read_tbi_reference(data, pos)
+        elif magic == b"CSI\x01":
+            self.is_csi = True
+            self.min_shift, self.depth, aux_length = struct.unpack_from("<iii", data, 4)
+            if aux_length >= 28:
+                self._read_header(data, 16)
+            elif not self.names:
+                raise ValueError(f"CSI index without tabix header needs reference names: {path}")
+            pos = 16 + aux_length
+            n_ref = struct.unpack_from("<i", data, pos)[0]
+            pos += 4
+            for _ in range(n_ref):
+                pos = self._read_csi_reference(data, pos)
+        else:
+            raise ValueError(f"Unrecognized tabix index: {path}")
+
+        self.name_to_id = {name: i for i, name in enumerate(self.names)}
+
+    @classmethod
+    def for_file(cls, data_path: str) -> "TabixIndex":
+        """查找并加载数据文件旁边的 .tbi 或 .csi"""
+        for suffix in (".tbi", ".csi"):
+            if os.path.exists(data_path + suffix):
+                return cls(data_path + suffix)
+        raise FileNotFoundError(f"No .tbi or .csi index for {data_path}")
+
+    def _read_header(self, data: bytes, pos: int) -> int:
+        """读取 tabix 头部（格式、列号、注释字符、序列名称）"""
+        (self.format, self.col_seq, self.col_beg, self.col_end,
+         meta, self.skip, names_length) = struct.unpack_from("<7i", data, pos)
+        self.meta_char = chr(meta)
+        pos += 28
+        self.names = [n.decode("utf-8") for n in data[pos:pos + names_length].split(b"\x00") if n]
+        return pos + names_length
+
+    def _read_tbi_reference(self, data: bytes, pos: int) -> int:
+        n_bin = struct.unpack_from("<i", data, pos)[0]
+        pos += 4
+        bins: Dict[int, List[Chunk]] = {}
+        for _ in range(n_bin):
+            bin_id, n_chunk = struct.unpack_from("<Ii", data, pos)
+            pos += 8
+            chunks = struct.unpack_from(f"<{n_chunk * 2}Q", data, pos)
+            pos += 16 * n_chunk
+            if bin_id != TBI_PSEUDO_BIN:
+                bins[bin_id] = list(zip(chunks[::2], chunks[1::2]))
+        n_intv = struct.unpack_from("<i", data, pos)[0]
+        pos += 4
+        self.linear.append(list(struct.unpack_from(f"<{n_intv}Q", data, pos)))
+        pos += 8 * n_intv
+        self.bins.append(bins)
+        self.bin_offsets.append({})
+        return pos
+
+    def _read_csi_reference(self, data: bytes, pos: int) -> int:
+        pseudo_bin = ((1 << ((self.depth + 1) * 3)) - 1) // 7 + 1
+        n_bin = struct.unpack_from("<i", data, pos)[0]
+        pos += 4
+        bins: Dict[int, List[Chunk]] = {}
+        offsets: Dict[int, int] = {}
+        for _ in range(n_bin):
+            bin_id, loffset, n_chunk = struct.unpack_from("<IQi", data, pos)
+            pos += 16
+            chunks = struct.unpack_from(f"<{n_chunk * 2}Q", data, pos)
+            pos += 16 * n_chunk
+            if bin_id != pseudo_bin:
+                bins[bin_id] = list(zip(chunks[::2], chunks[1::2]))
+                offsets[bin_id] = loffset
+        self.bins.append(bins)
+        self.bin_offsets.append(offsets)
+        self.linear.append([])
+        return pos
+
+    def _min_offset(self, ref_id: int, beg: int) -> int:
+        """区域起点之前的记录都在此虚拟偏移之前，可据此跳过更早的块"""
+        if not self.is_csi:
+            linear = self.linear[ref_id]
+            if not linear:
+                return 0
+            return linear[min(beg >> self.min_shift, len(linear) - 1)]
+
+        # CSI: 从最细的一层向上找包含起点且存在的分箱
+        offsets = self.bin_offsets[ref_id]
+        shift = self.min_shift
+        first = ((1 << (self.depth * 3)) - 1) // 7
+        for level in range(self.depth, -1, -1):
+            bin_id = first + (beg >> shift)
+            if bin_id in offsets:
+                return offsets[bin_id]
+            shift += 3
+            if level > 0:
+                first -= 1 << ((level - 1) * 3)
+        return 0
+
+    def chunks(self, reference: str, beg: int, end: int) -> List[Chunk]:
+        """
+        计算区域需要读取的虚拟偏移区间
+
+        Args:
+            reference: 索引中的序列名称
+            beg: 起点（0-based）
+            end: 终点（不含）
+
+        Returns:
+            合并后的 [(起始虚拟偏移, 结束虚拟偏移)]，序列不存在时返回空列表
+        """
+        ref_id = self.name_to_id.get(reference)
+        if ref_id is None or end <= beg:
+            return []
+
+        ref_bins = self.bins[ref_id]
+        min_offset = self._min_offset(ref_id, beg)
+        candidates = [
+            chunk
+            for bin_id in reg2bins(beg, end, self.min_shift, self.depth)
+            for chunk in ref_bins.get(bin_id, ())
+            if chunk[1] > min_offset
+        ]
+        candidates.sort()
+
+        merged: List[Chunk] = []
+        for chunk_beg, chunk_end in candidates:
+            chunk_beg = max(chunk_beg, min_offset)
+            if merged and chunk_beg <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], chunk_end))
+            else:
+                merged.append((chunk_beg, chunk_end))
+        return merged
+
+
+def _record_interval(fields: List[bytes], preset: Tuple[int, int, int, int, str]) -> Tuple[int, int]:
+    """计算记录的 0-based 半开区间"""
+    file_format, _, col_beg, col_end, _ = preset
+    beg = int(fields[col_beg - 1])
+    if file_format & 0x10000 == 0:
+        beg -= 1  # 1-based 格式
+    if col_end:
+        end = int(fields[col_end - 1])
+    elif file_format == 2:
+        # VCF: 终点由 REF 长度或 INFO 中的 END 决定
+        end = beg + len(fields[3])
+        if len(fields) > 7:
+            for item in fields[7].split(b";"):
+                if item.startswith(b"END="):
+                    end = max(end, int(item[4:]))
+                    break
+    else:
+        end = beg + 1
+    return beg, end
+
+
+class BinningIndexBuilder:
+    """
+    累积分箱和线性索引（TBI 与 BAI 的参考序列部分格式相同）
+
+    记录必须按坐标顺序加入；记录的结束偏移即下一条记录的起始偏移
+    """
+
+    def __init__(self, n_ref: int = 0):
+        # 每个参考序列: (分箱 -> 块列表, 线性索引)
+        self.refs: List[Tuple[Dict[int, List[List[int]]], List[int]]] = [({}, []) for _ in range(n_ref)]
+
+    def add_reference(self):
+        """追加一个参考序列"""
+        self.refs.append(({}, []))
+
+    def add(self, ref_id: int, beg: int, end: int, start_offset: int, end_offset: int):
+        """
+        加入一条记录
+
+        Args:
+            ref_id: 参考序列编号
+            beg: 起点（0-based）
+            end: 终点（不含）
+            start_offset: 记录起始的虚拟偏移
+            end_offset: 记录结束的虚拟偏移
+        """
+        end = max(end, beg + 1)
+        bins, linear = self.refs[ref_id]
+        chunks = bins.setdefault(reg2bin(beg, end), [])
+        if chunks and chunks[-1][1] == start_offset:
+            chunks[-1][1] = end_offset
+        else:
+            chunks.append([start_offset, end_offset])
+        last_window = (end - 1) >> TBI_MIN_SHIFT
+        if len(linear) <= last_window:
+            linear.extend([-1] * (last_window + 1 - len(linear)))
+        for window in range(beg >> TBI_MIN_SHIFT, last_window + 1):
+            if linear[window] < 0:
+                linear[window] = start_offset
+
+    def serialize(self) -> bytes:
+        """序列化所有参考序列的分箱和线性索引"""
+        parts = []
+        for bins, linear in self.refs:
+            parts.append(struct.pack("<i", len(bins)))
+            for bin_id in sorted(bins):
+                chunks = bins[bin_id]
+                parts.append(struct.pack("<Ii", bin_id, len(chunks)))
+                parts.append(struct.pack(f"<{len(chunks) * 2}Q", *(v for chunk in chunks for v in chunk)))
+            # 空窗口沿用前一个窗口的偏移
+            filled, last = [], 0
+            for offset in linear:
+                last = offset if offset >= 0 else last
+                filled.append(last)
+            parts.append(struct.pack("<i", len(filled)))
+            parts.append(struct.pack(f"<{len(filled)}Q", *filled))
+        return b"".join(parts)
+
+
+def data_end_offset(data_path: str) -> int:
+    """最后一条记录的结束偏移（结尾空块之前）"""
+    file_size = os.path.getsize(data_path)
+    with open(data_path, "rb") as f:
+        f.seek(max(file_size - len(BGZF_EOF), 0))
+        has_eof = f.read() == BGZF_EOF
+    return make_virtual_offset(file_size - len(BGZF_EOF) if has_eof else file_size, 0)
+
+
+def build_tabix_index(data_path: str, preset: str = "vcf", index_path: Optional[str] = None) -> str:
+    """
+    为按坐标排序的 bgzip 文件生成 .tbi 索引
+
+    Args:
+        data_path: bgzip 压缩的数据文件
+        preset: "vcf" / "gff" / "bed"
+        index_path: 索引输出路径，默认 data_path + ".tbi"
+
+    Returns:
+        索引文件路径
+    """
+    spec = TABIX_PRESETS[preset]
+    file_format, col_seq, col_beg, col_end, meta_char = spec
+    meta = meta_char.encode("ascii")
+
+    names: List[str] = []
+    builder = BinningIndexBuilder()
+    pending = None  # 上一条记录 (参考序列编号, 起点, 终点, 起始偏移)
+    previous = (-1, -1)
+
+    reader = BgzfReader(data_path)
+    try:
+        for line_offset, line in reader.iter_lines():
+            if pending is not None:
+                builder.add(*pending, line_offset)
+                pending = None
+            if not line or line.startswith(meta):
+                continue
+
+            fields = line.split(b"\t")
+            name = fields[col_seq - 1].decode("utf-8")
+            if not names or names[-1] != name:
+                if name in names:
+                    raise ValueError(f"{data_path} is not sorted: {name} appears in more than one block")
+                names.append(name)
+                builder.add_reference()
+            beg, end = _record_interval(fields, spec)
+            if (len(names), beg) < previous:
+                raise ValueError(f"{data_path} is not sorted at {name}:{beg + 1}")
+            previous = (len(names), beg)
+            pending = (len(names) - 1, beg, end, line_offset)
+    finally:
+        reader.close()
+
+    if pending is not None:
+        builder.add(*pending, data_end_offset(data_path))
+
+    names_blob = b"".join(n.encode("utf-8") + b"\x00" for n in names)
+    index_data = b"".join([
+        b"TBI\x01",
+        struct.pack("<i", len(names)),
+        struct.pack("<7i", file_format, col_seq, col_beg, col_end, ord(meta_char), 0, len(names_blob)),
+        names_blob,
+        builder.serialize()
+    ])
+
+    index_path = index_path or data_path + ".tbi"
+    with BgzfWriter(index_path) as writer:
+        writer.write(index_data)
+    logger.info(f"Built tabix index {index_path} for {len(names)} sequences")
+    return index_path
@@ -0,0 +1,171 @@
+"""
+变异批量注释
+把一条染色体上所有变异位置组成有序数组，与特征区间索引的数组做 searchsorted 连接，
+一次向量化计算出每个变异所在的基因、区域类型（外显子 / 内含子 / UTR / 基因间区）
+和最近基因的距离，不对每个变异单独查询
+"""
+
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from app.genomics.interval_index import FeatureIntervalIndex
+
+# 区域类型编码（数值越大优先级越高：UTR 同时也是外显子的一部分）
+REGION_TYPES = ["intergenic", "intron", "exon", "UTR"]
+_INTERGENIC, _INTRON, _EXON, _UTR = range(len(REGION_TYPES))
+
+_MAX_POSITION = int(np.iinfo(np.int32).max)
+
+
+def _point_counts(seg: Optional[Dict[str, np.ndarray]], points: np.ndarray) -> np.ndarray:
+    """每个点（0-based）所在的特征数量：起点 <= 点的数量 - 终点 <= 点的数量"""
+    if seg is None:
+        return np.zeros(len(points), dtype=np.int64)
+    return (
+        np.searchsorted(seg["start"], points, side="right")
+        - np.searchsorted(seg["end_sorted"], points, side="right")
+    )
+
+
+def _max_end_holders(seg: Dict[str, np.ndarray]) -> np.ndarray:
+    """holders[i] 为 seg[0..i] 中终点最大（即 max_end[i]）的特征下标"""
+    is_holder = seg["end"] == seg["max_end"]
+    return np.maximum.accumulate(np.where(is_holder, np.arange(len(is_holder)), 0))
+
+
+class VariantAnnotator:
+    """基于特征区间索引的变异批量注释"""
+
+    def __init__(self, feature_index: FeatureIntervalIndex):
+        """
+        Args:
+            feature_index: 注释特征区间索引
+        """
+        self.feature_index = feature_index
+        # 染色体 -> 基因终点前缀最大值的持有者下标
+        self._holders: Dict[str, np.ndarray] = {}
+
+    def _gene_holders(self, chromosome: str, genes: Dict[str, np.ndarray]) -> np.ndarray:
+        if chromosome not in self._holders:
+            self._holders[chromosome] = _max_end_holders(genes)
+        return self._holders[chromosome]
+
+    def annotate_positions(self, chromosome: str, positions: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        向量化注释同一条染色体上的一组位置
+
+        Args:
+            chromosome: 染色体名称
+            positions: 1-based 位置数组（无需有序）
+
+        Returns:
+            与 positions 等长的数组：
+            gene（所在基因的名称编号，-1 表示基因间区）、gene_count（重叠的基因数）、
+            region（REGION_TYPES 编码）、coding（是否落在 CDS 内）、
+            nearest（最近基因的名称编号，-1 表示该染色体没有基因）、distance（到最近基因的碱基数，重叠时为 0）
+        """
+        points = (np.clip(np.asarray(positions, dtype=np.int64), 1, _MAX_POSITION) - 1).astype(np.int32)
+        n = len(points)
+        result = {
+            "gene": np.full(n, -1, dtype=np.int64),
+            "gene_count": np.zeros(n, dtype=np.int64),
+            "region": np.full(n, _INTERGENIC, dtype=np.int8),
+            "coding": np.zeros(n, dtype=bool),
+            "nearest": np.full(n, -1, dtype=np.int64),
+            "distance": np.full(n, -1, dtype=np.int64),
+        }
+        genes = self.feature_index.segment("gene", chromosome)
+        if genes is None or n == 0:
+            return result
+
+        # 有序的查询点让 searchsorted 顺序访问索引数组，结果再按原顺序放回
+        order = np.argsort(points, kind="stable")
+        points = points[order]
+
+        chrom = self.feature_index.resolve_chromosome(chromosome)
+        holders = self._gene_holders(chrom, genes)
+        starts, ends, names = genes["start"], genes["end"], genes["name"]
+
+        # 起点 <= 点的最后一个基因；它之前（含）终点最大的基因若覆盖该点，即为所在基因
+        started = np.searchsorted(starts, points, side="right")
+        has_left = started > 0
+        left = holders[np.maximum(started - 1, 0)]
+        left_end = np.where(has_left, ends[left], -1)
+        inside = left_end > points
+
+        gene_count = _point_counts(genes, points)
+
+        # 不在基因内：左侧取终点最大的基因，右侧取第一个起点在点之后的基因
+        has_right = started < len(starts)
+        right = np.minimum(started, len(starts) - 1)
+        left_distance = np.where(has_left, points.astype(np.int64) - left_end + 1, np.iinfo(np.int64).max)
+        right_distance = np.where(has_right, starts[right].astype(np.int64) - points, np.iinfo(np.int64).max)
+        use_right = right_distance < left_distance
+
+        exon_count = _point_counts(self.feature_index.segment("exon", chromosome), points)
+        utr_count = _point_counts(self.feature_index.segment("utr", chromosome), points)
+        cds_count = _point_counts(self.feature_index.segment("cds", chromosome), points)
+        region = np.where(inside, _INTRON, _INTERGENIC)
+        region = np.where(inside & (exon_count > 0), _EXON, region)
+        region = np.where(inside & (utr_count > 0) & (cds_count == 0), _UTR, region)
+        sorted_result = {
+            "gene": np.where(inside, names[left], -1),
+            "gene_count": gene_count,
+            "region": region,
+            "coding": inside & (cds_count > 0),
+            "nearest": np.where(inside | ~use_right, names[left], names[right]),
+            "distance": np.where(inside, 0, np.minimum(left_distance, right_distance)),
+        }
+        for key, values in sorted_result.items():
+            result[key][order] = values
+        return result
+
+    def annotate(self, chromosome: str, positions: List[int]) -> List[Dict[str, Any]]:
+        """
+        注释同一条染色体上的一组位置
+
+        Returns:
+            [{"gene", "gene_count", "region", "coding", "nearest_gene", "distance"}]，与 positions 顺序一致；
+            染色体上没有基因时 nearest_gene / distance 为 None
+        """
+        arrays = self.annotate_positions(chromosome, np.asarray(positions, dtype=np.int64))
+        name_ids = np.unique(np.concatenate((arrays["gene"], arrays["nearest"])))
+        names = {int(i): self.feature_index.names[i].decode("utf-8") for i in name_ids if i >= 0}
+        names[-1] = None
+
+        return [
+            {
+                "gene": names[gene],
+                "gene_count": gene_count,
+                "region": REGION_TYPES[region],
+                "coding": coding,
+                "nearest_gene": names[nearest],
+                "distance": distance if nearest >= 0 else None,
+            }
+            for gene, gene_count, region, coding, nearest, distance in zip(
+                arrays["gene"].tolist(), arrays["gene_count"].tolist(), arrays["region"].tolist(),
+                arrays["coding"].tolist(), arrays["nearest"].tolist(), arrays["distance"].tolist()
+            )
+        ]
+
+    def annotate_variants(self, variants: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量注释变异（可跨多条染色体），按染色体分组后每组一次向量化计算
+
+        Args:
+            variants: [{"chromosome", "position", ...}]，如 VcfReader.query 的结果
+
+        Returns:
+            与 variants 顺序一致的注释列表
+        """
+        by_chromosome: Dict[str, List[int]] = {}
+        for i, variant in enumerate(variants):
+            by_chromosome.setdefault(variant["chromosome"], []).append(i)
+
+        annotations: List[Optional[Dict[str, Any]]] = [None] * len(variants)
+        for chromosome, indexes in by_chromosome.items():
+            positions = [variants[i]["position"] for i in indexes]
+            for i, annotation in zip(indexes, self.annotate(chromosome, positions)):
+                annotations[i] = annotation
+        return annotations
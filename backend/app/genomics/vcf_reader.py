@@ -0,0 +1,218 @@
+"""
+Tabix 索引的 VCF 区域查询
+只读取区域对应的 BGZF 块，逐行解析；变异类型过滤在解析 INFO 之前完成
+"""
+
+from typing import Dict, Any, Iterator, List, Optional, Set
+import logging
+import os
+import re
+
+from app.genomics.bgzf import BgzfReader
+from app.genomics.tabix import TabixIndex
+from app.utils.chromosome_normalizer import match_chromosome
+
+logger = logging.getLogger(__name__)
+
+VARIANT_TYPES = ("SNV", "MNV", "INS", "DEL", "INDEL", "SV")
+
+# 用户/模型可能使用的类型名称 -> 标准类型集合
+_VARIANT_TYPE_ALIASES = {
+    "SNV": {"SNV"},
+    "SNP": {"SNV"},
+    "MNV": {"MNV"},
+    "MNP": {"MNV"},
+    "INS": {"INS"},
+    "INSERTION": {"INS"},
+    "DEL": {"DEL"},
+    "DELETION": {"DEL"},
+    "INDEL": {"INS", "DEL", "INDEL"},
+    "SV": {"SV"},
+    "STRUCTURAL": {"SV"},
+}
+
+_AF_RE = re.compile(rb'(?:^|;)AF=([^;]+)')
+_END_RE = re.compile(rb'(?:^|;)END=(\d+)')
+
+
+def classify_variant(ref: bytes, alt: bytes) -> str:
+    """
+    根据 REF/ALT 判断变异类型
+
+    Returns:
+        SNV / MNV / INS / DEL / INDEL（复杂替换）/ SV（符号等位基因、断点）
+    """
+    if alt.startswith(b"<") or b"[" in alt or b"]" in alt or alt == b"*":
+        return "SV"
+    if len(ref) == len(alt):
+        return "SNV" if len(ref) == 1 else "MNV"
+    if len(ref) == 1 and alt[:1] == ref:
+        return "INS"
+    if len(alt) == 1 and ref[:1] == alt:
+        return "DEL"
+    return "INDEL"
+
+
+def parse_variant_types(variant_type: Optional[str]) -> Optional[Set[str]]:
+    """
+    解析变异类型过滤条件（可用逗号分隔多个类型）
+
+    Raises:
+        ValueError: 未知的变异类型
+    """
+    if not variant_type:
+        return None
+    wanted: Set[str] = set()
+    for name in variant_type.split(","):
+        types = _VARIANT_TYPE_ALIASES.get(name.strip().upper())
+        if types is None:
+            raise ValueError(f"Unknown variant type: {name.strip()} (expected one of {', '.join(VARIANT_TYPES)})")
+        wanted |= types
+    return wanted
+
+
+class VcfReader:
+    """bgzip + tabix 索引的 VCF 读取器"""
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        """
+        Args:
+            path: .vcf.gz 文件路径
+            index_path: 索引路径，默认查找 path + ".tbi" / ".csi"
+        """
+        self.path = path
+        self.index = TabixIndex(index_path) if index_path else TabixIndex.for_file(path)
+        self.bgzf = BgzfReader(path)
+        self.chromosomes = set(self.index.names)
+
+    def resolve_chromosome(self, chromosome: str) -> Optional[str]:
+        """把输入的染色体名称映射为 VCF 中的名称"""
+        return match_chromosome(chromosome, self.chromosomes)
+
+    def query(
+        self,
+        chromosome: str,
+        start: int,
+        end: int,
+        variant_type: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        查询区域内的变异
+
+        Args:
+            chromosome: 染色体名称
+            start: 起始位置（1-based，闭区间）
+            end: 结束位置（1-based，闭区间）
+            variant_type: 变异类型过滤（如 "SNV"、"indel"，可逗号分隔）
+
+        Yields:
+            {"id", "chromosome", "position", "ref", "alt", "type", "quality", "filter", "frequency"}
+        """
+        wanted = parse_variant_types(variant_type)
+        reference = self.resolve_chromosome(chromosome)
+        if reference is None:
+            return
+        ref_bytes = reference.encode("utf-8")
+
+        for chunk_beg, chunk_end in self.index.chunks(reference, start - 1, end):
+            for _, line in self.bgzf.iter_lines(chunk_beg, chunk_end):
+                if not line or line[:1] == b"#":
+                    continue
+                fields = line.split(b"\t", 8)
+                if fields[0] != ref_bytes:
+                    continue
+                position = int(fields[1])
+                if position > end:
+                    return  # 记录按位置排序，后面不会再有重叠
+                ref = fields[3]
+                if position + len(ref) - 1 < start:
+                    # 结构变异的范围由 INFO/END 给出
+                    end_match = _END_RE.search(fields[7])
+                    if end_match is None or int(end_match.group(1)) < start:
+                        continue
+
+                alts = fields[4].split(b",")
+                types = [classify_variant(ref, alt) for alt in alts]
+                if wanted is not None and wanted.isdisjoint(types):
+                    continue
+
+                # 只有通过过滤的记录才解析 INFO
+                frequency = None
+                match = _AF_RE.search(fields[7])
+                if match:
+                    try:
+                        frequency = float(match.group(1).split(b",")[0])
+                    except ValueError:
+                        pass
+
+                yield {
+                    "id": None if fields[2] == b"." else fields[2].decode("utf-8"),
+                    "chromosome": reference,
+                    "position": position,
+                    "ref": ref.decode("utf-8"),
+                    "alt": fields[4].decode("utf-8"),
+                    "type": types[0] if len(set(types)) == 1 else "MIXED",
+                    "quality": None if fields[5] == b"." else float(fields[5]),
+                    "filter": fields[6].decode("utf-8"),
+                    "frequency": frequency
+                }
+
+    def fetch(
+        self,
+        chromosome: str,
+        start: int,
+        end: int,
+        variant_type: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        查询区域内的变异（最多 limit 条）
+
+        Returns:
+            {"variants": [...], "truncated": 是否因 limit 截断}
+        """
+        variants: List[Dict[str, Any]] = []
+        for variant in self.query(chromosome, start, end, variant_type):
+            if limit is not None and len(variants) >= limit:
+                return {"variants": variants, "truncated": True}
+            variants.append(variant)
+        return {"variants": variants, "truncated": False}
+
+    def close(self):
+        """关闭文件"""
+        self.bgzf.close()
+
+
+# 已打开的 VCF（路径 -> VcfReader），每个进程只打开一次；文件不存在或打开失败不缓存
+_open_readers: Dict[str, VcfReader] = {}
+
+
+def get_vcf_reader(path: Optional[str] = None) -> Optional[VcfReader]:
+    """
+    获取（并缓存）VCF 读取器
+
+    Args:
+        path: VCF 路径，默认使用配置中的 VARIANT_VCF_PATH
+
+    Returns:
+        VcfReader，未配置或无法打开时返回 None（下次调用重新尝试）
+    """
+    if path is None:
+        from app.core.config import settings
+        path = settings.VARIANT_VCF_PATH
+    if not path:
+        return None
+
+    if path not in _open_readers:
+        if not os.path.exists(path):
+            logger.warning(f"VCF not found: {path}")
+            return None
+        try:
+            reader = VcfReader(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to open VCF {path}: {e}")
+            return None
+        logger.info(f"Opened VCF {path} ({len(reader.chromosomes)} sequences indexed)")
+        _open_readers[path] = reader
+
+    return _open_readers[path]
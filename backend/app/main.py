@@ -1,28 +1,44 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import json
 import logging
+import uuid
 
 from app.core.config import settings
 from app.api.routes import api_router
-from app.services.websocket_manager import WebSocketManager
+from app.services.websocket_manager import get_websocket_manager
 from app.services.ai_service import AIService
+from app.services.task_manager import ConnectionTaskManager
+from app.genomics.block_cache import get_block_cache
+from app.tools.navigation_history import get_navigation_history_store, navigation_session
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # WebSocket管理器
-websocket_manager = WebSocketManager()
+websocket_manager = get_websocket_manager()
 ai_service = AIService()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     logger.info("AI Genomics Assistant Backend starting...")
+    await websocket_manager.start()
+    eviction_task = asyncio.create_task(
+        ai_service.client_pool.run_eviction(settings.LLM_CLIENT_EVICT_INTERVAL)
+    )
     yield
     logger.info("AI Genomics Assistant Backend shutting down...")
+    eviction_task.cancel()
+    try:
+        await eviction_task
+    except asyncio.CancelledError:
+        pass
+    await websocket_manager.close()
+    await ai_service.aclose()
 
 app = FastAPI(
     title="AI Genomics Assistant API",
@@ -67,11 +83,27 @@ async def health_check():
         ]
     }
 
+@app.get("/metrics")
+async def metrics():
+    """运行指标"""
+    return {
+        "ai_service": ai_service.get_metrics(),
+        "websocket": websocket_manager.get_stats(),
+        "bgzf_block_cache": get_block_cache().get_stats(),
+        "navigation_history": get_navigation_history_store().get_stats()
+    }
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket连接端点"""
-    await websocket_manager.connect(websocket)
-    logger.info("WebSocket client connected")
+    session_id = await websocket_manager.connect(websocket)
+    logger.info(f"WebSocket client connected: {session_id}")
+    
+    # 发送统一经过连接的有界队列和写任务，处理器不会被慢客户端阻塞
+    connection = websocket_manager.get_connection(session_id)
+    
+    # 每条消息作为独立任务处理，避免长时间的AI查询阻塞其他消息
+    tasks = ConnectionTaskManager(max_concurrency=settings.WS_MAX_CONCURRENT_TASKS)
     
     try:
         while True:
@@ -82,44 +114,120 @@ async def websocket_endpoint(websocket: WebSocket):
             logger.info(f"Received message: {message_data}")
             
             # 处理不同类型的消息
-            if message_data.get("type") == "test_connection":
-                await handle_connection_test(websocket, message_data)
-            elif message_data.get("type") == "ai_query" or message_data.get("query"):
-                await handle_ai_query(websocket, message_data)
-            elif message_data.get("type") == "navigation_response":
-                await handle_navigation_response(websocket, message_data)
+            message_type = message_data.get("type")
+            if message_type == "cancel":
+                await handle_cancel(connection, message_data, tasks)
+            elif message_type == "session_info":
+                await connection.send_text(json.dumps({
+                    "type": "session_info",
+                    "sessionId": session_id,
+                    "workerId": websocket_manager.worker_id
+                }))
+            elif message_type == "test_connection":
+                tasks.spawn(str(uuid.uuid4()), handle_connection_test(connection, message_data))
+            elif message_type == "ai_query" or message_data.get("query"):
+                request_id = message_data.get("requestId") or str(uuid.uuid4())
+                message_data["requestId"] = request_id
+                tasks.spawn(request_id, handle_ai_query(connection, message_data))
+            elif message_type == "navigation_response":
+                tasks.spawn(
+                    str(uuid.uuid4()),
+                    handle_navigation_response(connection, message_data),
+                    limited=False
+                )
             
     except WebSocketDisconnect:
-        websocket_manager.disconnect(websocket)
         logger.info("WebSocket client disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
         await websocket.close()
+    finally:
+        # 停止该连接上仍在进行的AI调用，并注销会话
+        await tasks.cancel_all()
+        await websocket_manager.disconnect(websocket)
+
+async def handle_cancel(websocket: WebSocket, message_data: dict, tasks: ConnectionTaskManager):
+    """处理取消请求"""
+    request_id = message_data.get("requestId", "")
+    cancelled = tasks.cancel(request_id)
+    logger.info(f"Cancel request {request_id}: {'cancelled' if cancelled else 'not found'}")
+    
+    await websocket.send_text(json.dumps({
+        "type": "cancel_result",
+        "requestId": request_id,
+        "success": cancelled,
+        "message": "请求已取消" if cancelled else "未找到进行中的请求"
+    }))
 
 async def handle_ai_query(websocket: WebSocket, message_data: dict):
     """处理AI查询"""
     try:
         query = message_data.get("query", "")
         ai_model_config = message_data.get("ai_model_config", {})
+        request_id = message_data.get("requestId") or str(uuid.uuid4())
+        stream = message_data.get("stream", settings.AI_STREAM_RESPONSES)
+        
+        # 流式模式：逐块发送 ai_response_chunk
+        chunk_index = 0
+        
+        def make_chunk_sender(phase: str):
+            async def send_chunk(delta: str):
+                nonlocal chunk_index
+                await websocket.send_text(json.dumps({
+                    "type": "ai_response_chunk",
+                    "requestId": request_id,
+                    "phase": phase,
+                    "index": chunk_index,
+                    "delta": delta
+                }))
+                chunk_index += 1
+            return send_chunk
+        
+        on_chunk = make_chunk_sender("answer") if stream else None
         
-        # 使用AI服务处理查询，传递 websocket 以支持导航指令
-        response = await ai_service.process_query(query, ai_model_config, websocket=websocket)
+        # 使用AI服务处理查询，传递 websocket 以支持导航指令；导航历史记入该连接的会话
+        with navigation_session(websocket.session_id):
+            response = await ai_service.process_query(
+                query,
+                ai_model_config,
+                websocket=websocket,
+                on_chunk=on_chunk
+            )
         
         # 发送响应 - 处理datetime序列化
         response_data = {
             "type": "ai_response",
+            "requestId": request_id,
+            "streamed": bool(stream),
             "response": {
                 "content": response.get("content", ""),
                 "model_used": response.get("model_used", ""),
                 "tool_results": response.get("tool_results", []),
                 "test_mode": response.get("test_mode", False),
-                "error": response.get("error", None)
+                "fast_path": response.get("fast_path", False),
+                "templated": response.get("templated", False),
+                "cached": response.get("cached", False),
+                "error": response.get("error", None),
+                "timing": response.get("timing")
             },
             "timestamp": response.get("timestamp").isoformat() if response.get("timestamp") else ""
         }
         
         await websocket.send_text(json.dumps(response_data))
         
+        # 模板化回复（跳过了第二次LLM调用）时，按需异步生成补充说明
+        if message_data.get("enrich") and response.get("enrichment_messages"):
+            enrichment = await ai_service.enrich_response(
+                response["enrichment_messages"],
+                ai_model_config,
+                on_chunk=make_chunk_sender("enrichment") if stream else None
+            )
+            await websocket.send_text(json.dumps({
+                "type": "ai_response_enrichment",
+                "requestId": request_id,
+                "content": enrichment
+            }))
+        
     except Exception as e:
         logger.error(f"Error handling AI query: {e}")
         await websocket.send_text(json.dumps({
@@ -154,24 +262,22 @@ async def handle_connection_test(websocket: WebSocket, message_data: dict):
         
         logger.info(f"Testing connection for model: {model_name}")
         
-        # 使用AI服务进行简单测试
+        # 使用轻量探测测试配置（结果按配置缓存）
         test_config = {
             "apiBaseUrl": api_base_url,
             "apiKey": api_key,
             "modelName": model_name
         }
-        
-        # 发送简单的测试消息
-        response = await ai_service.process_query("hello", test_config)
-        
-        # 判断测试是否成功
-        success = not response.get("error")
+        result = await ai_service.test_connection(test_config)
+        success = result.get("success", False)
         
         # 发送测试结果
         await websocket.send_text(json.dumps({
             "type": "test_connection_result",
             "success": success,
-            "message": "连接测试成功" if success else f"连接测试失败: {response.get('error', '未知错误')}"
+            "message": "连接测试成功" if success else f"连接测试失败: {result.get('message', '未知错误')}",
+            "latency_ms": result.get("latency_ms"),
+            "cached": result.get("cached", False)
         }))
         
     except Exception as e:
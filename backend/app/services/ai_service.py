@@ -1,18 +1,31 @@
-from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage, AIMessage
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
 from fastapi import WebSocket
 import logging
 from datetime import datetime
+import asyncio
+import hashlib
 import json
+import time
 import uuid
 
+from app.core.config import settings
+from app.services.connection_probe import ConnectionProbe
+from app.services.intent_router import IntentRouter
+from app.services.llm_client_pool import LLMClientPool
+from app.services.response_cache import ResponseCache
 from app.tools.jbrowse_tools import JBrowseToolkit
-from app.tools.jbrowse_langchain_tools import JBROWSE_TOOLS
-from app.tools.navigation_tool import NavigationTool
+from app.tools.jbrowse_langchain_tools import JBROWSE_TOOLS, RETRY_HINT, TOOL_RESPONSE_POLICIES
+from app.tools.navigation_tool import NavigationTool, build_navigation_command
 
 logger = logging.getLogger(__name__)
 
+# 流式输出回调：接收增量文本
+ChunkCallback = Callable[[str], Awaitable[None]]
+
+# 会在前端触发导航的工具
+NAVIGATION_TOOL_NAMES = ('navigate_jbrowse', 'navigate_to_gene')
+
 class AIService:
     """AI服务核心类"""
     
@@ -21,6 +34,64 @@ class AIService:
         self.navigation_tool = NavigationTool()
         self.tools = JBROWSE_TOOLS
         self.system_prompt = self._create_system_prompt()
+        self.system_prompt_version = hashlib.sha256(self.system_prompt.encode("utf-8")).hexdigest()[:12]
+        self.client_pool = LLMClientPool(
+            self.tools,
+            max_size=settings.LLM_CLIENT_POOL_MAX_SIZE,
+            idle_ttl=settings.LLM_CLIENT_IDLE_TTL,
+            max_connections=settings.LLM_CLIENT_MAX_CONNECTIONS
+        )
+        self.connection_probe = ConnectionProbe(
+            self.client_pool,
+            timeout=settings.CONNECTION_TEST_TIMEOUT,
+            cache_ttl=settings.CONNECTION_TEST_CACHE_TTL,
+            max_entries=settings.CONNECTION_TEST_CACHE_MAX_ENTRIES
+        )
+        self.intent_router = IntentRouter(self.navigation_tool)
+        self.response_cache = ResponseCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+            ttl=settings.RESPONSE_CACHE_TTL,
+            disk_dir=settings.RESPONSE_CACHE_DIR,
+            disk_ttl=settings.RESPONSE_CACHE_DISK_TTL
+        ) if settings.RESPONSE_CACHE_ENABLED else None
+    
+    async def aclose(self):
+        """释放AI服务持有的资源（连接池等）"""
+        await self.client_pool.aclose()
+    
+    async def test_connection(self, ai_model_config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        测试模型配置（轻量探测，不调用带工具的完整查询流程）
+        
+        Args:
+            ai_model_config: 模型配置 (apiBaseUrl, apiKey, modelName)
+            
+        Returns:
+            探测结果 {"success", "message", ...}
+        """
+        api_base_url = ai_model_config.get("apiBaseUrl") or "https://api.openai.com/v1"
+        api_key = ai_model_config.get("apiKey", "")
+        model_name = ai_model_config.get("modelName") or "gpt-4"
+        
+        if api_key == "test-key":
+            return {"success": True, "message": "连接测试成功（测试模式）", "test_mode": True}
+        if not api_key:
+            return {"success": False, "message": "未设置API Key"}
+        
+        try:
+            return await self.connection_probe.probe(api_base_url, api_key, model_name)
+        except Exception as e:
+            logger.error(f"Connection probe failed: {e}", exc_info=True)
+            return {"success": False, "message": str(e)}
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取AI服务运行指标"""
+        return {
+            "llm_client_pool": self.client_pool.get_stats(),
+            "intent_router": self.intent_router.get_stats(),
+            "response_cache": self.response_cache.get_stats() if self.response_cache else None
+        }
     
     def _create_system_prompt(self) -> str:
         """创建系统提示词"""
@@ -34,6 +105,7 @@ class AIService:
 可用工具：
 - navigate_jbrowse: 导航到指定基因组位置（染色体:起始-结束）
 - navigate_to_gene: 通过基因名称导航到基因位置
+- liftover_coordinates: 把其他组装的坐标（如 hg19/GRCh37）转换到当前组装，导航前先转换
 - get_navigation_history: 查看最近的导航历史
 
 当用户想要查看特定基因组区域或基因时，请使用相应的导航工具。
@@ -45,9 +117,36 @@ class AIService:
         self, 
         query: str, 
         ai_model_config: Dict[str, Any],
-        websocket: Optional[WebSocket] = None
+        websocket: Optional[WebSocket] = None,
+        on_chunk: Optional[ChunkCallback] = None
     ) -> Dict[str, Any]:
-        """处理AI查询（带工具调用支持）"""
+        """
+        处理AI查询（带工具调用支持）
+        
+        Args:
+            query: 用户查询
+            ai_model_config: 模型配置 (apiBaseUrl, apiKey, modelName)
+            websocket: 用于发送导航指令的 WebSocket 连接，可选
+            on_chunk: 流式回调，提供时使用 astream 逐块推送生成的文本，可选
+        """
+        started_at = time.perf_counter()
+        first_chunk_at: List[float] = []
+        
+        async def emit_chunk(text: str):
+            if not first_chunk_at:
+                first_chunk_at.append(time.perf_counter())
+            await on_chunk(text)
+        
+        chunk_callback = emit_chunk if on_chunk else None
+        
+        def timing() -> Dict[str, Any]:
+            return {
+                "total_ms": round((time.perf_counter() - started_at) * 1000, 1),
+                "time_to_first_token_ms": (
+                    round((first_chunk_at[0] - started_at) * 1000, 1) if first_chunk_at else None
+                )
+            }
+        
         try:
             logger.info(f"Processing query: {query[:100]}...")
             
@@ -56,9 +155,24 @@ class AIService:
             api_key = ai_model_config.get("apiKey", "")
             model_name = ai_model_config.get("modelName", "gpt-4")
             
+            # 快速路径 - 纯位点/基因导航请求直接调用导航工具，跳过 LLM
+            if not settings.AI_FORCE_LLM_MODE:
+                route = self.intent_router.route(query)
+                if route is not None:
+                    # 有可用的模型时，工具失败交给下面的 LLM 路径解释和修正
+                    can_fall_back = bool(api_key) and api_key != "test-key"
+                    response = await self._run_fast_path(
+                        route, model_name, websocket, chunk_callback, can_fall_back
+                    )
+                    if response is not None:
+                        response["timing"] = timing()
+                        return response
+            
             # 快速测试模式 - 如果API Key是"test-key"，返回模拟响应
             if api_key == "test-key":
-                return await self._generate_test_response(query, model_name)
+                response = await self._generate_test_response(query, model_name, chunk_callback)
+                response["timing"] = timing()
+                return response
             
             if not api_key:
                 return {
@@ -67,88 +181,275 @@ class AIService:
                     "error": "missing_api_key"
                 }
             
-            # 创建LangChain ChatOpenAI实例并绑定工具
-            llm = ChatOpenAI(
-                base_url=api_base_url,
-                api_key=api_key,
-                model=model_name,
-                temperature=0.1
-            )
-            
-            # 绑定工具到 LLM
-            llm_with_tools = llm.bind_tools(self.tools)
-            
-            # 准备消息
-            messages = [
-                SystemMessage(content=self.system_prompt),
-                HumanMessage(content=query)
-            ]
-            
-            # 调用AI模型
-            response = await llm_with_tools.ainvoke(messages)
-            
-            # 检查是否有工具调用
-            tool_calls = getattr(response, 'tool_calls', [])
-            tool_results = []
+            # 响应缓存 - 只缓存没有工具调用（无导航副作用）的回复
+            cache_key = None
+            if self.response_cache is not None:
+                cache_key = ResponseCache.make_key(
+                    query, api_base_url, model_name, self.system_prompt_version
+                )
+                cached_content = await self.response_cache.get(cache_key)
+                if cached_content is not None:
+                    logger.info("Response cache hit")
+                    if chunk_callback:
+                        await chunk_callback(cached_content)
+                    return {
+                        "content": cached_content,
+                        "timestamp": datetime.now(),
+                        "tool_results": [],
+                        "model_used": model_name,
+                        "tool_calls_made": 0,
+                        "cached": True,
+                        "timing": timing()
+                    }
             
-            if tool_calls:
-                logger.info(f"LLM requested {len(tool_calls)} tool calls")
+            # 从连接池获取复用的 LLM 客户端（已绑定工具）
+            async with self.client_pool.lease(api_base_url, api_key, model_name) as client:
+                llm = client.llm
+                llm_with_tools = client.llm_with_tools
                 
-                # 执行所有工具调用
-                for tool_call in tool_calls:
-                    tool_name = tool_call.get('name')
-                    tool_args = tool_call.get('args', {})
-                    
-                    logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
-                    
-                    # 查找并执行工具
-                    tool_result = await self._execute_langchain_tool(tool_name, tool_args)
-                    tool_results.append({
-                        "tool": tool_name,
-                        "args": tool_args,
-                        "result": tool_result
-                    })
-                    
-                    # 如果是导航工具，发送导航指令到前端
-                    if websocket and tool_name in ['navigate_jbrowse', 'navigate_to_gene']:
-                        await self._send_navigation_command(websocket, tool_name, tool_args, tool_result)
+                # 准备消息
+                messages = [
+                    SystemMessage(content=self.system_prompt),
+                    HumanMessage(content=query)
+                ]
                 
-                # 构建工具结果摘要
-                tool_results_text = "\n\n".join([
-                    f"Tool: {tr['tool']}\nResult: {tr['result']}"
-                    for tr in tool_results
-                ])
+                # 调用AI模型
+                response = await self._invoke_llm(llm_with_tools, messages, chunk_callback)
                 
-                # 将工具结果添加到消息历史
-                messages.append(AIMessage(content=response.content))
-                messages.append(HumanMessage(content=f"Tool execution results:\n{tool_results_text}\n\nPlease provide a final response to the user based on these results."))
+                # 检查是否有工具调用
+                tool_calls = getattr(response, 'tool_calls', [])
+                tool_results = []
+                templated = False
                 
-                # 再次调用 LLM 生成最终回复
-                final_response = await llm.ainvoke(messages)
-                response_content = final_response.content
-            else:
-                response_content = response.content
+                if tool_calls:
+                    logger.info(f"LLM requested {len(tool_calls)} tool calls")
+                    
+                    # 并发执行所有工具调用（结果保持调用顺序）
+                    tool_results = await self._execute_tool_calls(tool_calls)
+                    
+                    # 按调用顺序发送导航指令到前端
+                    if websocket:
+                        for tr in tool_results:
+                            if tr["tool"] in NAVIGATION_TOOL_NAMES:
+                                await self._send_navigation_command(websocket, tr)
+                    
+                    # 可修正的失败（如坐标超出染色体）交回模型，同一轮内修正参数后再调用一次
+                    if any(self._is_retryable(tr) for tr in tool_results):
+                        tool_results = await self._correct_tool_calls(
+                            llm_with_tools, messages, response, tool_results, websocket
+                        )
+                    
+                    # 构建工具结果摘要
+                    tool_results_text = "\n\n".join([
+                        f"Tool: {tr['tool']}\nResult: {tr['result']}"
+                        for tr in tool_results
+                    ])
+                    
+                    # 将工具结果添加到消息历史
+                    messages.append(AIMessage(content=response.content))
+                    messages.append(HumanMessage(content=f"Tool execution results:\n{tool_results_text}\n\nPlease provide a final response to the user based on these results."))
+                    
+                    if self._can_template_response(tool_results):
+                        # 工具结果本身即可作为回复，跳过第二次 LLM 调用
+                        response_content = await self._render_templated_response(
+                            response.content, tool_results, chunk_callback
+                        )
+                        templated = True
+                    else:
+                        # 再次调用 LLM 生成最终回复
+                        final_response = await self._invoke_llm(llm, messages, chunk_callback)
+                        response_content = final_response.content
+                else:
+                    response_content = response.content
             
-            return {
+            result = {
                 "content": response_content,
                 "timestamp": datetime.now(),
                 "tool_results": tool_results,
                 "model_used": model_name,
-                "tool_calls_made": len(tool_calls)
+                "tool_calls_made": len(tool_calls),
+                "timing": timing()
             }
+            if templated:
+                result["templated"] = True
+                # 保留对话上下文，供调用方按需异步生成补充说明
+                result["enrichment_messages"] = messages
+            
+            if cache_key and not tool_calls and isinstance(response_content, str) and response_content:
+                await self.response_cache.set(cache_key, response_content)
+            
+            return result
             
         except Exception as e:
             logger.error(f"Error processing AI query: {e}", exc_info=True)
             return {
                 "content": f"处理查询时出现错误: {str(e)}",
                 "timestamp": datetime.now(),
-                "error": str(e)
+                "error": str(e),
+                "timing": timing()
             }
     
-    async def _generate_test_response(self, query: str, model_name: str) -> Dict[str, Any]:
-        """生成测试响应（快速模式）"""
-        import asyncio
+    async def _run_fast_path(
+        self,
+        route: Dict[str, Any],
+        model_name: str,
+        websocket: Optional[WebSocket] = None,
+        on_chunk: Optional[ChunkCallback] = None,
+        can_fall_back: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        执行快速路径路由结果，直接返回工具的模板化结果
+        
+        Args:
+            can_fall_back: 工具失败时是否返回 None，由调用方改走 LLM 路径
+        
+        Returns:
+            回复字典；工具失败且 can_fall_back 时返回 None
+        """
+        tool_results = await self._execute_tool_calls([
+            {"name": route["tool"], "args": route["args"]}
+        ])
+        tool_result = tool_results[0]
+        
+        if tool_result["status"] != "success":
+            if can_fall_back:
+                logger.info(f"Fast path {route['tool']} failed, falling back to the LLM")
+                return None
+            # 修正建议是写给模型的，不展示给用户
+            tool_result = {**tool_result, "result": tool_result["result"].split(RETRY_HINT)[0].strip()}
+            tool_results = [tool_result]
+        
+        if websocket:
+            await self._send_navigation_command(websocket, tool_result)
+        
+        content = await self._render_templated_response("", tool_results, on_chunk)
         
+        return {
+            "content": content,
+            "timestamp": datetime.now(),
+            "tool_results": tool_results,
+            "model_used": f"{model_name} (快速路径)",
+            "tool_calls_made": 1,
+            "fast_path": True
+        }
+    
+    async def enrich_response(
+        self,
+        messages: List[Any],
+        ai_model_config: Dict[str, Any],
+        on_chunk: Optional[ChunkCallback] = None
+    ) -> str:
+        """
+        为模板化回复生成补充说明（第二次 LLM 调用，按需异步执行）
+        
+        Args:
+            messages: process_query 返回的 enrichment_messages
+            ai_model_config: 模型配置
+            on_chunk: 流式回调，可选
+            
+        Returns:
+            补充说明文本
+        """
+        async with self.client_pool.lease(
+            ai_model_config.get("apiBaseUrl", "https://api.openai.com/v1"),
+            ai_model_config.get("apiKey", ""),
+            ai_model_config.get("modelName", "gpt-4")
+        ) as client:
+            response = await self._invoke_llm(client.llm, messages, on_chunk)
+        return response.content
+    
+    async def _correct_tool_calls(
+        self,
+        llm_with_tools: Any,
+        messages: List[Any],
+        response: Any,
+        tool_results: List[Dict[str, Any]],
+        websocket: Optional[WebSocket] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        把带修正建议（RETRY_HINT）的工具失败交回模型重新调用一次工具，只修正一轮
+        
+        Returns:
+            原工具结果加上修正后调用的结果
+        """
+        failures = "\n\n".join([
+            f"Tool: {tr['tool']}\nResult: {tr['result']}"
+            for tr in tool_results if self._is_retryable(tr)
+        ])
+        correction = await self._invoke_llm(llm_with_tools, messages + [
+            AIMessage(content=response.content),
+            HumanMessage(content=f"Tool execution failed:\n{failures}\n\nCall the tool again with corrected arguments.")
+        ])
+        tool_calls = getattr(correction, 'tool_calls', [])
+        if not tool_calls:
+            return tool_results
+        
+        logger.info(f"LLM corrected {len(tool_calls)} tool calls")
+        corrected = await self._execute_tool_calls(tool_calls)
+        if websocket:
+            for tr in corrected:
+                if tr["tool"] in NAVIGATION_TOOL_NAMES:
+                    await self._send_navigation_command(websocket, tr)
+        return tool_results + corrected
+    
+    @staticmethod
+    def _is_retryable(tool_result: Dict[str, Any]) -> bool:
+        """工具失败且附带了修正建议（RETRY_HINT）"""
+        return tool_result["status"] == "error" and RETRY_HINT in tool_result["result"]
+    
+    def _can_template_response(self, tool_results: List[Dict[str, Any]]) -> bool:
+        """判断本轮工具结果是否都可以直接模板化为最终回复"""
+        if not settings.AI_TEMPLATE_TOOL_RESPONSES:
+            return False
+        for tr in tool_results:
+            if TOOL_RESPONSE_POLICIES.get(tr["tool"], "narrate") != "template":
+                return False
+            # 工具失败时交给 LLM 解释并尝试修正
+            if tr["status"] != "success":
+                return False
+        return True
+    
+    async def _render_templated_response(
+        self,
+        preamble: Any,
+        tool_results: List[Dict[str, Any]],
+        on_chunk: Optional[ChunkCallback] = None
+    ) -> str:
+        """由模型的前置文本和工具结果拼接最终回复"""
+        tool_text = "\n\n".join(tr["result"] for tr in tool_results)
+        preamble = preamble.strip() if isinstance(preamble, str) else ""
+        
+        if on_chunk:
+            # 前置文本已在流式调用中推送，这里只推送工具结果部分
+            await on_chunk(f"\n\n{tool_text}" if preamble else tool_text)
+        
+        return f"{preamble}\n\n{tool_text}" if preamble else tool_text
+    
+    async def _invoke_llm(self, runnable: Any, messages: List[Any], on_chunk: Optional[ChunkCallback] = None):
+        """
+        调用 LLM
+        
+        未提供 on_chunk 时直接 ainvoke；否则使用 astream 逐块推送文本内容，
+        并将所有块合并为完整消息（包括 tool_calls）返回
+        """
+        if on_chunk is None:
+            return await runnable.ainvoke(messages)
+        
+        gathered = None
+        async for chunk in runnable.astream(messages):
+            gathered = chunk if gathered is None else gathered + chunk
+            if isinstance(chunk.content, str) and chunk.content:
+                await on_chunk(chunk.content)
+        
+        return gathered if gathered is not None else AIMessage(content="")
+    
+    async def _generate_test_response(
+        self,
+        query: str,
+        model_name: str,
+        on_chunk: Optional[ChunkCallback] = None
+    ) -> Dict[str, Any]:
+        """生成测试响应（快速模式）"""
         # 模拟少量延迟
         await asyncio.sleep(0.1)
         
@@ -206,6 +507,11 @@ class AIService:
 
 请告诉我您想了解的具体基因或基因组学概念，我会为您提供详细的专业解答。"""
 
+        # 流式模式下按行推送，便于前端调试增量渲染
+        if on_chunk:
+            for line in content.splitlines(keepends=True):
+                await on_chunk(line)
+
         return {
             "content": content,
             "timestamp": datetime.now(),
@@ -214,8 +520,52 @@ class AIService:
             "test_mode": True
         }
     
-    async def _execute_langchain_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> str:
-        """执行 LangChain 工具"""
+    async def _execute_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        并发执行同一轮中的多个工具调用
+        
+        每个工具有独立的超时时间，结果顺序与调用顺序一致；
+        每项结果为 {"tool", "args", "result", "status"}，status 为 "success" 或 "error"
+        """
+        async def run_one(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+            tool_name = tool_call.get('name')
+            tool_args = tool_call.get('args', {})
+            timeout = settings.TOOL_TIMEOUTS.get(tool_name, settings.TOOL_EXECUTION_TIMEOUT)
+            
+            logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
+            
+            try:
+                tool_result, status = await asyncio.wait_for(
+                    self._execute_langchain_tool(tool_name, tool_args, tool_call.get('id')),
+                    timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Tool {tool_name} timed out after {timeout}s")
+                tool_result, status = f"Error executing tool: timed out after {timeout}s", "error"
+            
+            return {
+                "tool": tool_name,
+                "args": tool_args,
+                "result": tool_result,
+                "status": status
+            }
+        
+        return list(await asyncio.gather(*(run_one(tc) for tc in tool_calls)))
+    
+    async def _execute_langchain_tool(
+        self,
+        tool_name: str,
+        tool_args: Dict[str, Any],
+        tool_call_id: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """
+        执行 LangChain 工具
+        
+        以 ToolCall 形式调用，工具抛出的 ToolException 体现在返回的 ToolMessage.status 中
+        
+        Returns:
+            (结果文本, 状态 "success" / "error")
+        """
         try:
             # 查找工具
             tool_func = None
@@ -225,32 +575,38 @@ class AIService:
                     break
             
             if tool_func is None:
-                return f"Error: Tool '{tool_name}' not found"
+                return f"Error: Tool '{tool_name}' not found", "error"
             
             # 执行工具（支持异步和同步）
+            tool_call = {
+                "name": tool_name,
+                "args": tool_args,
+                "id": tool_call_id or uuid.uuid4().hex,
+                "type": "tool_call"
+            }
             if hasattr(tool_func, 'ainvoke'):
-                result = await tool_func.ainvoke(tool_args)
+                message = await tool_func.ainvoke(tool_call)
             else:
-                result = tool_func.invoke(tool_args)
+                message = tool_func.invoke(tool_call)
             
-            return str(result)
+            return str(message.content), getattr(message, "status", "success")
             
         except Exception as e:
             logger.error(f"Error executing tool {tool_name}: {e}", exc_info=True)
-            return f"Error executing tool: {str(e)}"
+            return f"Error executing tool: {str(e)}", "error"
     
     async def _send_navigation_command(
         self,
         websocket: WebSocket,
-        tool_name: str,
-        tool_args: Dict[str, Any],
-        tool_result: str
+        tool_result: Dict[str, Any]
     ):
-        """发送导航指令到前端"""
+        """发送导航指令到前端（tool_result 为 _execute_tool_calls 返回的单项结果）"""
+        tool_name = tool_result["tool"]
+        tool_args = tool_result["args"]
         try:
             # 检查工具是否成功执行
-            if "failed" in tool_result.lower() or "error" in tool_result.lower():
-                logger.warning(f"Tool execution failed, not sending navigation command: {tool_result}")
+            if tool_result["status"] != "success":
+                logger.warning(f"Tool execution failed, not sending navigation command: {tool_result['result']}")
                 return
             
             # 根据工具类型构建导航指令
@@ -260,13 +616,15 @@ class AIService:
                     chromosome=tool_args.get('chromosome'),
                     start=tool_args.get('start'),
                     end=tool_args.get('end'),
-                    genome_format=tool_args.get('genome_format', 'ucsc')
+                    genome_format=tool_args.get('genome_format', 'ucsc'),
+                    record_history=False
                 )
             elif tool_name == 'navigate_to_gene':
                 # 通过基因名称获取位置
                 navigation_data = await self.navigation_tool.navigate_by_gene(
                     gene_name=tool_args.get('gene_name'),
-                    genome_format=tool_args.get('genome_format', 'ucsc')
+                    genome_format=tool_args.get('genome_format', 'ucsc'),
+                    record_history=False
                 )
             else:
                 return
@@ -277,23 +635,8 @@ class AIService:
                 return
             
             # 构建 WebSocket 消息
-            request_id = str(uuid.uuid4())
-            location = navigation_data['location']
-            
-            navigation_command = {
-                "type": "navigation",
-                "action": "navigate_to_location",
-                "payload": {
-                    "chromosome": location['chromosome'],
-                    "chromosome_ucsc": location['chromosome_ucsc'],
-                    "chromosome_ensembl": location['chromosome_ensembl'],
-                    "start": location['start'],
-                    "end": location['end'],
-                    "gene_name": location.get('gene_name')
-                },
-                "requestId": request_id,
-                "timestamp": datetime.now().isoformat()
-            }
+            navigation_command = build_navigation_command(navigation_data['location'])
+            request_id = navigation_command["requestId"]
             
             # 发送导航指令
             await websocket.send_text(json.dumps(navigation_command))
@@ -0,0 +1,135 @@
+"""
+模型连接探测
+用最小请求（模型列表 / max_tokens=1 补全）验证模型配置，并按配置缓存结果
+"""
+
+from typing import Dict, Any, Tuple
+from collections import OrderedDict
+import logging
+import time
+
+import httpx
+
+from app.services.llm_client_pool import LLMClientPool
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionProbe:
+    """轻量级模型连接测试"""
+
+    def __init__(
+        self,
+        client_pool: LLMClientPool,
+        timeout: float = 10.0,
+        cache_ttl: float = 300.0,
+        max_entries: int = 256
+    ):
+        """
+        初始化连接探测
+
+        Args:
+            client_pool: LLM 客户端连接池，探测复用其共享的 HTTP 客户端
+            timeout: 单次探测请求的超时时间（秒）
+            cache_ttl: 成功结果的缓存时间（秒）
+            max_entries: 最多缓存的配置数，超出时淘汰最久未使用的条目
+        """
+        self.client_pool = client_pool
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        # 配置键 -> (过期时间, 结果)，按最近使用排序
+        self._cache: "OrderedDict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    async def probe(self, api_base_url: str, api_key: str, model_name: str) -> Dict[str, Any]:
+        """
+        测试模型配置是否可用
+
+        Returns:
+            {"success", "message", "method", "latency_ms", "cached"}
+        """
+        key = LLMClientPool.make_key(api_base_url, api_key, model_name)
+        now = time.monotonic()
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            if cached[0] > now:
+                self._cache.move_to_end(key)
+                return {**cached[1], "cached": True}
+            del self._cache[key]
+
+        started_at = time.perf_counter()
+        try:
+            result = await self._probe_with_client(
+                self.client_pool.get_http_client(), api_base_url, api_key, model_name
+            )
+        except httpx.TimeoutException:
+            result = {"success": False, "message": f"连接超时（{self.timeout}s）", "method": None}
+        except httpx.HTTPError as e:
+            result = {"success": False, "message": f"网络错误: {str(e)}", "method": None}
+
+        result["latency_ms"] = round((time.perf_counter() - started_at) * 1000, 1)
+        result["cached"] = False
+
+        if result["success"]:
+            self._store(key, result, now)
+        else:
+            self._cache.pop(key, None)
+
+        logger.info(f"Connection probe for {model_name}: {result}")
+        return result
+
+    async def _probe_with_client(
+        self,
+        http_client: httpx.AsyncClient,
+        api_base_url: str,
+        api_key: str,
+        model_name: str
+    ) -> Dict[str, Any]:
+        """先尝试模型列表接口，不支持或找不到模型时退回到 max_tokens=1 的补全请求"""
+        base_url = api_base_url.rstrip("/")
+        headers = {"Authorization": f"Bearer {api_key}"}
+
+        response = await http_client.get(f"{base_url}/models", headers=headers, timeout=self.timeout)
+        if response.status_code in (401, 403):
+            return {"success": False, "message": f"API Key 无效 (HTTP {response.status_code})", "method": "models"}
+        if response.status_code == 200:
+            try:
+                model_ids = {m.get("id") for m in response.json().get("data", [])}
+            except (ValueError, AttributeError):
+                model_ids = set()
+            if model_name in model_ids:
+                return {"success": True, "message": "连接测试成功", "method": "models"}
+
+        # 模型列表不可用或未列出该模型，用最小补全请求确认
+        response = await http_client.post(
+            f"{base_url}/chat/completions",
+            headers=headers,
+            json={
+                "model": model_name,
+                "messages": [{"role": "user", "content": "ping"}],
+                "max_tokens": 1
+            },
+            timeout=self.timeout
+        )
+        if response.status_code == 200:
+            return {"success": True, "message": "连接测试成功", "method": "completion"}
+
+        return {
+            "success": False,
+            "message": f"HTTP {response.status_code}: {response.text[:200]}",
+            "method": "completion"
+        }
+
+    def _store(self, key: Tuple[str, str, str], result: Dict[str, Any], now: float):
+        """缓存成功结果：先清除过期条目，再按 LRU 限制条目数"""
+        for expired in [k for k, (expires_at, _) in self._cache.items() if expires_at <= now]:
+            del self._cache[expired]
+        self._cache[key] = (now + self.cache_ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        self._cache.clear()
@@ -0,0 +1,122 @@
+"""
+查询意图快速路由
+对纯位点 / 基因导航请求直接调用导航工具，跳过 LLM 往返
+"""
+
+from typing import Dict, Any, Optional
+import logging
+import re
+
+from app.tools.navigation_tool import NavigationTool
+from app.utils.chromosome_normalizer import is_valid_chromosome, normalize_chromosome
+
+logger = logging.getLogger(__name__)
+
+# 可选的导航动词前缀（中英文）
+_VERB_PATTERN = (
+    r'(?:(?:please\s+)?(?:show(?:\s+me)?|go\s+to|goto|navigate\s+to|jump\s+to|view|open|display|'
+    r'显示|查看|跳转到|导航到|定位到|打开)\s*)?'
+)
+
+# 位点：chr17:43,044,295-43,125,483 / 17:43044295 / chrX 1000-2000
+_LOCUS_RE = re.compile(
+    r'^\s*' + _VERB_PATTERN +
+    r'(?P<chrom>(?:chr)?[0-9A-Za-z_.]+?)\s*[:\s]\s*'
+    r'(?P<start>\d[\d,]*)'
+    r'(?:\s*(?:-|–|\.\.)\s*(?P<end>\d[\d,]*))?'
+    r'\s*[.。!！]?\s*$',
+    re.IGNORECASE
+)
+
+# 基因：TP53 / show BRCA1 / navigate to gene EGFR / 显示 MYC 基因
+_GENE_RE = re.compile(
+    r'^\s*' + _VERB_PATTERN +
+    r'(?P<prefix>(?:the\s+)?gene\s+)?(?P<gene>[A-Za-z][A-Za-z0-9-]*)(?P<suffix>\s*(?:gene|基因))?'
+    r'\s*[.。!！]?\s*$',
+    re.IGNORECASE
+)
+
+
+class IntentRouter:
+    """基于规则的意图路由器（LLM 前置快速路径）"""
+
+    def __init__(self, navigation_tool: NavigationTool):
+        """
+        初始化路由器
+
+        Args:
+            navigation_tool: 提供基因数据源的导航工具
+        """
+        self.navigation_tool = navigation_tool
+        self.hits = 0
+        self.misses = 0
+        self.hits_by_intent: Dict[str, int] = {"locus": 0, "gene": 0}
+
+    def route(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        尝试将查询路由到导航工具
+
+        Args:
+            query: 用户查询
+
+        Returns:
+            命中时返回 {"intent", "tool", "args"}，否则返回 None
+        """
+        route = self._match_locus(query) or self._match_gene(query)
+
+        if route is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.hits_by_intent[route["intent"]] += 1
+        logger.info(f"Fast-path route hit: {route}")
+        return route
+
+    def _match_locus(self, query: str) -> Optional[Dict[str, Any]]:
+        """匹配位点字符串"""
+        match = _LOCUS_RE.match(query)
+        if not match or not is_valid_chromosome(match.group("chrom")):
+            return None
+
+        start = int(match.group("start").replace(",", ""))
+        end = match.group("end")
+        args: Dict[str, Any] = {
+            "chromosome": normalize_chromosome(match.group("chrom"), 'ucsc'),
+            "start": start
+        }
+        if end is not None:
+            args["end"] = int(end.replace(",", ""))
+
+        return {"intent": "locus", "tool": "navigate_jbrowse", "args": args}
+
+    def _match_gene(self, query: str) -> Optional[Dict[str, Any]]:
+        """匹配已知基因符号"""
+        match = _GENE_RE.match(query)
+        if not match:
+            return None
+
+        gene = match.group("gene")
+        # 仅接受形似基因符号的输入（全大写或含数字），避免 "show max" 之类的普通单词误命中基因；
+        # 明确写出 "gene" / "基因" 时允许小写
+        explicit = match.group("prefix") or match.group("suffix")
+        if not explicit and not (gene.isupper() or any(c.isdigit() for c in gene)):
+            return None
+        if not self.navigation_tool.is_known_gene(gene):
+            return None
+
+        return {
+            "intent": "gene",
+            "tool": "navigate_to_gene",
+            "args": {"gene_name": gene.upper()}
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取路由命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "hits_by_intent": dict(self.hits_by_intent)
+        }
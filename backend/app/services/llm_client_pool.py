@@ -0,0 +1,241 @@
+"""
+LLM 客户端连接池
+按 (apiBaseUrl, apiKey 哈希, modelName) 复用 ChatOpenAI 实例、HTTP 连接池和已绑定工具的 runnable
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import logging
+import time
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+ClientKey = Tuple[str, str, str]
+
+
+class PooledLLMClient:
+    """连接池中的单个客户端条目"""
+
+    def __init__(self, key: ClientKey, llm: ChatOpenAI, llm_with_tools: Any, http_client: httpx.AsyncClient):
+        self.key = key
+        self.llm = llm
+        self.llm_with_tools = llm_with_tools
+        self.http_client = http_client
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.evicted = False
+        self.closed = False
+
+    async def aclose(self):
+        """关闭底层 HTTP 客户端"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.http_client.aclose()
+        except Exception as e:
+            logger.error(f"Error closing LLM http client: {e}")
+
+
+class LLMClientPool:
+    """LLM 客户端注册表（LRU + 空闲 TTL 淘汰）"""
+
+    def __init__(
+        self,
+        tools: List[Any],
+        max_size: int = 16,
+        idle_ttl: float = 600.0,
+        max_connections: int = 20,
+        temperature: float = 0.1
+    ):
+        """
+        初始化连接池
+
+        Args:
+            tools: 预绑定到 LLM 的 LangChain 工具列表
+            max_size: 最多保留的客户端数量，超出时淘汰最久未使用的条目
+            idle_ttl: 空闲超时（秒），超过此时间未使用的客户端会被关闭
+            max_connections: 每个客户端 HTTP 连接池的最大连接数
+            temperature: 模型温度
+        """
+        self.tools = tools
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.max_connections = max_connections
+        self.temperature = temperature
+        self._clients: "OrderedDict[ClientKey, PooledLLMClient]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(api_base_url: str, api_key: str, model_name: str) -> ClientKey:
+        """构建客户端键，API Key 只以哈希形式保存"""
+        key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        return (api_base_url.rstrip("/"), key_hash, model_name)
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        """
+        共享的普通 HTTP 客户端（不创建 ChatOpenAI、不绑定工具）
+
+        供连接探测等直接调用 OpenAI 兼容接口的轻量请求使用，随连接池一起关闭
+        """
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = self._create_http_client()
+        return self._http_client
+
+    @asynccontextmanager
+    async def lease(self, api_base_url: str, api_key: str, model_name: str):
+        """
+        租用一个客户端，使用期间不会被关闭
+
+        用法:
+            async with pool.lease(base_url, key, model) as client:
+                await client.llm_with_tools.ainvoke(messages)
+        """
+        client = await self._acquire(api_base_url, api_key, model_name)
+        try:
+            yield client
+        finally:
+            await self._release(client)
+
+    async def _acquire(self, api_base_url: str, api_key: str, model_name: str) -> PooledLLMClient:
+        """获取（或创建）客户端并增加引用计数"""
+        key = self.make_key(api_base_url, api_key, model_name)
+        to_close: List[PooledLLMClient] = []
+
+        async with self._lock:
+            now = time.monotonic()
+            to_close.extend(self._pop_expired(now))
+
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                self._clients.move_to_end(key)
+            else:
+                self.misses += 1
+                client = self._create_client(key, api_base_url, api_key, model_name)
+                self._clients[key] = client
+                while len(self._clients) > self.max_size:
+                    _, oldest = self._clients.popitem(last=False)
+                    oldest.evicted = True
+                    self.evictions += 1
+                    to_close.append(oldest)
+
+            client.in_use += 1
+            client.last_used = now
+
+        await self._close_idle(to_close)
+        return client
+
+    async def _release(self, client: PooledLLMClient):
+        """归还客户端，已被淘汰且无人使用的客户端在此关闭"""
+        client.in_use -= 1
+        client.last_used = time.monotonic()
+        if client.evicted and client.in_use <= 0:
+            await client.aclose()
+
+    def _create_client(
+        self,
+        key: ClientKey,
+        api_base_url: str,
+        api_key: str,
+        model_name: str
+    ) -> PooledLLMClient:
+        """创建 ChatOpenAI 实例并预先绑定工具"""
+        logger.info(f"Creating pooled LLM client for model: {model_name} ({key[0]})")
+
+        http_client = self._create_http_client()
+        llm = ChatOpenAI(
+            base_url=api_base_url,
+            api_key=api_key,
+            model=model_name,
+            temperature=self.temperature,
+            http_async_client=http_client
+        )
+        llm_with_tools = llm.bind_tools(self.tools)
+
+        return PooledLLMClient(key, llm, llm_with_tools, http_client)
+
+    def _create_http_client(self) -> httpx.AsyncClient:
+        """创建带连接数上限和 keep-alive 过期时间的 HTTP 客户端"""
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.idle_ttl
+            )
+        )
+
+    def _pop_expired(self, now: float) -> List[PooledLLMClient]:
+        """移除空闲超时的客户端（调用方需持有锁）"""
+        expired = [
+            key for key, client in self._clients.items()
+            if client.in_use <= 0 and now - client.last_used > self.idle_ttl
+        ]
+        removed = []
+        for key in expired:
+            client = self._clients.pop(key)
+            client.evicted = True
+            self.evictions += 1
+            removed.append(client)
+        return removed
+
+    async def _close_idle(self, clients: List[PooledLLMClient]):
+        """关闭已淘汰且当前没有被使用的客户端"""
+        for client in clients:
+            if client.in_use <= 0:
+                await client.aclose()
+
+    async def evict_idle(self):
+        """主动清理空闲超时的客户端"""
+        async with self._lock:
+            expired = self._pop_expired(time.monotonic())
+        await self._close_idle(expired)
+
+    async def run_eviction(self, interval: float):
+        """
+        周期性清理空闲客户端，直到任务被取消（由应用生命周期启动）
+
+        Args:
+            interval: 清理间隔（秒）
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"Error evicting idle LLM clients: {e}", exc_info=True)
+
+    async def aclose(self):
+        """关闭所有客户端（应用关闭时调用）"""
+        async with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.evicted = True
+            await client.aclose()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        logger.info(f"LLM client pool closed ({len(clients)} clients)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接池统计信息"""
+        return {
+            "size": len(self._clients),
+            "max_size": self.max_size,
+            "in_use": sum(1 for c in self._clients.values() if c.in_use > 0),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
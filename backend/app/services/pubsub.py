@@ -0,0 +1,359 @@
+"""
+WebSocket 跨进程消息后端
+提供发布/订阅和会话路由（session -> worker）接口，会话只在其 worker 存活（心跳未过期）时有效：
+- InProcessBackend: 单进程实现（默认）
+- RedisPubSubBackend: 基于 Redis 协议（RESP）的网络实现，多个 uvicorn worker 共享
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Set
+from urllib.parse import urlparse
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 消息回调: (channel, data)
+MessageHandler = Callable[[str, str], Awaitable[None]]
+
+# 会话路由表的 Redis 哈希键
+SESSION_REGISTRY_KEY = "ws:sessions"
+
+# worker 存活标记的 Redis 键前缀（带过期时间，由心跳续期）
+WORKER_ALIVE_KEY_PREFIX = "ws:worker-alive:"
+
+
+class PubSubBackend(ABC):
+    """发布/订阅与会话路由后端接口"""
+
+    @abstractmethod
+    async def start(self, handler: MessageHandler):
+        """启动后端，订阅频道收到的消息交给 handler 处理"""
+
+    @abstractmethod
+    async def subscribe(self, channel: str):
+        """订阅频道"""
+
+    @abstractmethod
+    async def publish(self, channel: str, data: str):
+        """向频道发布消息"""
+
+    @abstractmethod
+    async def register_session(self, session_id: str, worker_id: str):
+        """记录会话所在的 worker"""
+
+    @abstractmethod
+    async def unregister_session(self, session_id: str):
+        """移除会话路由"""
+
+    @abstractmethod
+    async def lookup_session(self, session_id: str) -> Optional[str]:
+        """查询会话所在的 worker，不存在或 worker 已失效时返回 None"""
+
+    @abstractmethod
+    async def refresh_worker(self, worker_id: str, session_ids: List[str], ttl: float):
+        """心跳：标记 worker 在 ttl 秒内存活，并重新登记其会话"""
+
+    @abstractmethod
+    async def remove_worker(self, worker_id: str):
+        """worker 正常退出时清除存活标记"""
+
+    @abstractmethod
+    async def prune_sessions(self) -> int:
+        """清除失效 worker 的会话路由，返回清除的数量"""
+
+    @abstractmethod
+    async def close(self):
+        """关闭后端"""
+
+
+class InProcessBackend(PubSubBackend):
+    """单进程后端：消息直接在本进程内分发"""
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+        self._channels: Set[str] = set()
+        self._sessions: Dict[str, str] = {}
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+
+    async def subscribe(self, channel: str):
+        self._channels.add(channel)
+
+    async def publish(self, channel: str, data: str):
+        if self._handler is not None and channel in self._channels:
+            await self._handler(channel, data)
+
+    async def register_session(self, session_id: str, worker_id: str):
+        self._sessions[session_id] = worker_id
+
+    async def unregister_session(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    async def lookup_session(self, session_id: str) -> Optional[str]:
+        return self._sessions.get(session_id)
+
+    # 单进程内会话与 worker 同生共死，不需要存活标记
+    async def refresh_worker(self, worker_id: str, session_ids: List[str], ttl: float):
+        pass
+
+    async def remove_worker(self, worker_id: str):
+        pass
+
+    async def prune_sessions(self) -> int:
+        return 0
+
+    async def close(self):
+        self._handler = None
+        self._channels.clear()
+        self._sessions.clear()
+
+
+class RespError(Exception):
+    """Redis 服务端返回的错误"""
+
+
+class RespConnection:
+    """最小化的 RESP（Redis 序列化协议）连接"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def open(cls, url: str) -> "RespConnection":
+        """
+        按 URL 建立连接
+
+        Args:
+            url: redis://[:password@]host[:port][/db]
+        """
+        parsed = urlparse(url)
+        reader, writer = await asyncio.open_connection(parsed.hostname or "localhost", parsed.port or 6379)
+        conn = cls(reader, writer)
+
+        if parsed.password:
+            await conn.command("AUTH", parsed.password)
+        db = parsed.path.lstrip("/")
+        if db and db != "0":
+            await conn.command("SELECT", db)
+        return conn
+
+    @staticmethod
+    def encode(*args: Any) -> bytes:
+        """将命令编码为 RESP 数组"""
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def send(self, *args: Any):
+        """只发送命令，不读取回复（用于订阅连接）"""
+        self.writer.write(self.encode(*args))
+        await self.writer.drain()
+
+    async def command(self, *args: Any) -> Any:
+        """发送命令并读取回复"""
+        async with self._lock:
+            await self.send(*args)
+            return await self.read_reply()
+
+    async def read_reply(self) -> Any:
+        """读取一条 RESP 回复"""
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by broker")
+
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode("utf-8")
+        if prefix == b"-":
+            raise RespError(payload.decode("utf-8"))
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2].decode("utf-8")
+        if prefix == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [await self.read_reply() for _ in range(count)]
+        raise RespError(f"Unexpected reply: {line!r}")
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+class RedisPubSubBackend(PubSubBackend):
+    """
+    基于 Redis 的后端：PUBLISH/SUBSCRIBE 分发消息，哈希表保存会话路由，
+    每个 worker 一个带过期时间的存活键，worker 崩溃后其会话路由随存活键过期而失效
+
+    连接断开时自动重连：订阅连接按指数退避重连并重新订阅所有频道，
+    命令连接在下一次命令失败时重连并重试该命令一次
+    """
+
+    def __init__(self, url: str, reconnect_delay: float = 0.5, max_reconnect_delay: float = 30.0):
+        """
+        Args:
+            url: Redis 连接地址，如 redis://localhost:6379/0
+            reconnect_delay: 订阅连接首次重连前的等待时间（秒），之后每次失败加倍
+            max_reconnect_delay: 重连等待时间上限（秒）
+        """
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._handler: Optional[MessageHandler] = None
+        self._command_conn: Optional[RespConnection] = None
+        self._subscriber_conn: Optional[RespConnection] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._channels: List[str] = []
+        self._reconnect_lock = asyncio.Lock()
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+        self._command_conn = await RespConnection.open(self.url)
+        self._subscriber_conn = await RespConnection.open(self.url)
+        self._reader_task = asyncio.create_task(self._read_messages())
+        logger.info(f"Connected to pub/sub broker at {self.url}")
+
+    async def subscribe(self, channel: str):
+        self._channels.append(channel)
+        try:
+            await self._subscriber_conn.send("SUBSCRIBE", channel)
+        except OSError as e:
+            # 读取循环重连后会重新订阅所有频道
+            logger.warning(f"Subscribe to {channel} deferred until reconnect: {e}")
+
+    async def publish(self, channel: str, data: str):
+        await self._command("PUBLISH", channel, data)
+
+    async def register_session(self, session_id: str, worker_id: str):
+        await self._command("HSET", SESSION_REGISTRY_KEY, session_id, worker_id)
+
+    async def unregister_session(self, session_id: str):
+        await self._command("HDEL", SESSION_REGISTRY_KEY, session_id)
+
+    async def lookup_session(self, session_id: str) -> Optional[str]:
+        worker_id = await self._command("HGET", SESSION_REGISTRY_KEY, session_id)
+        if worker_id is None:
+            return None
+        if not await self._command("EXISTS", WORKER_ALIVE_KEY_PREFIX + worker_id):
+            logger.info(f"Dropping session {session_id} of expired worker {worker_id}")
+            await self._command("HDEL", SESSION_REGISTRY_KEY, session_id)
+            return None
+        return worker_id
+
+    async def refresh_worker(self, worker_id: str, session_ids: List[str], ttl: float):
+        await self._command("SET", WORKER_ALIVE_KEY_PREFIX + worker_id, "1", "PX", int(ttl * 1000))
+        # 重新登记会话：代理重启或存活键曾短暂过期被清理后恢复路由
+        if session_ids:
+            pairs = [value for session_id in session_ids for value in (session_id, worker_id)]
+            await self._command("HSET", SESSION_REGISTRY_KEY, *pairs)
+
+    async def remove_worker(self, worker_id: str):
+        await self._command("DEL", WORKER_ALIVE_KEY_PREFIX + worker_id)
+
+    async def prune_sessions(self) -> int:
+        flat = await self._command("HGETALL", SESSION_REGISTRY_KEY) or []
+        sessions = dict(zip(flat[::2], flat[1::2]))
+        alive: Dict[str, bool] = {}
+        for worker_id in set(sessions.values()):
+            alive[worker_id] = bool(await self._command("EXISTS", WORKER_ALIVE_KEY_PREFIX + worker_id))
+        stale = [session_id for session_id, worker_id in sessions.items() if not alive[worker_id]]
+        if stale:
+            await self._command("HDEL", SESSION_REGISTRY_KEY, *stale)
+            logger.info(f"Pruned {len(stale)} sessions of expired workers")
+        return len(stale)
+
+    async def _command(self, *args: Any) -> Any:
+        """在命令连接上执行命令，连接已断开时重连并重试一次"""
+        conn = self._command_conn
+        try:
+            return await conn.command(*args)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"Pub/sub command connection lost ({e}), reconnecting")
+
+        async with self._reconnect_lock:
+            # 并发的命令可能已经完成了重连
+            if self._command_conn is conn:
+                await conn.close()
+                self._command_conn = await RespConnection.open(self.url)
+        return await self._command_conn.command(*args)
+
+    async def _read_messages(self):
+        """订阅连接的读取循环，连接断开时重连"""
+        while True:
+            try:
+                reply = await self._subscriber_conn.read_reply()
+            except Exception as e:
+                logger.warning(f"Pub/sub subscriber connection lost: {e}")
+                await self._reconnect_subscriber()
+                continue
+
+            if isinstance(reply, list) and len(reply) == 3 and reply[0] == "message":
+                try:
+                    await self._handler(reply[1], reply[2])
+                except Exception as e:
+                    logger.error(f"Error handling pub/sub message on {reply[1]}: {e}", exc_info=True)
+
+    async def _reconnect_subscriber(self):
+        """按指数退避重连订阅连接，成功后重新订阅所有频道"""
+        await self._subscriber_conn.close()
+        delay = self.reconnect_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                conn = await RespConnection.open(self.url)
+            except Exception as e:
+                delay = min(delay * 2, self.max_reconnect_delay)
+                logger.warning(f"Pub/sub reconnect failed: {e}; retrying in {delay:g}s")
+                continue
+
+            # 先替换连接，重连期间新增的订阅直接发到新连接上（重复订阅无副作用）
+            self._subscriber_conn = conn
+            try:
+                if self._channels:
+                    await conn.send("SUBSCRIBE", *self._channels)
+            except OSError as e:
+                delay = min(delay * 2, self.max_reconnect_delay)
+                logger.warning(f"Pub/sub resubscribe failed: {e}; retrying in {delay:g}s")
+                await conn.close()
+                continue
+            logger.info(f"Reconnected to pub/sub broker, resubscribed {len(self._channels)} channels")
+            return
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        for conn in (self._subscriber_conn, self._command_conn):
+            if conn is not None:
+                await conn.close()
+        self._handler = None
+
+
+def create_pubsub_backend(backend: str, url: str = "") -> PubSubBackend:
+    """
+    按配置创建后端
+
+    Args:
+        backend: "memory" 或 "redis"
+        url: 网络后端的连接地址
+    """
+    if backend == "memory":
+        return InProcessBackend()
+    if backend == "redis":
+        return RedisPubSubBackend(url)
+    raise ValueError(f"Unknown pub/sub backend: {backend}")
@@ -0,0 +1,185 @@
+"""
+LLM 响应缓存
+按 (规范化查询, 模型名称, 系统提示词版本) 缓存无副作用的回复
+内存 LRU 一级缓存 + 可选的磁盘二级缓存
+"""
+
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_TRAILING_PUNCT_RE = re.compile(r'[\s?？!！.。,，;；~]+$')
+
+
+def normalize_query(query: str) -> str:
+    """
+    规范化查询文本，使措辞上等价的问题命中同一缓存
+
+    NFKC 归一化（全角转半角）、大小写折叠、合并空白、去除结尾标点
+    """
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return _TRAILING_PUNCT_RE.sub("", text)
+
+
+class ResponseCache:
+    """LLM 响应缓存（内存 LRU + 可选磁盘层）"""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl: float = 3600.0,
+        disk_dir: Optional[str] = None,
+        disk_ttl: float = 86400.0
+    ):
+        """
+        初始化响应缓存
+
+        Args:
+            max_entries: 内存中最多缓存的条目数
+            max_bytes: 内存中缓存内容的总字节上限
+            ttl: 内存条目有效期（秒）
+            disk_dir: 磁盘缓存目录，为空时不启用磁盘层
+            disk_ttl: 磁盘条目有效期（秒）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self.disk_ttl = disk_ttl
+
+        # key -> (expires_at, content, size)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.bytes_held = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(query: str, api_base_url: str, model_name: str, prompt_version: str) -> str:
+        """构建缓存键（同名模型在不同服务商处是不同的模型，API 地址也是键的一部分）"""
+        raw = "\x1f".join([normalize_query(query), api_base_url.rstrip("/"), model_name, prompt_version])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        查询缓存
+
+        Returns:
+            命中时返回缓存的回复内容，否则返回 None
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._remove(key)
+
+        if self.disk_dir:
+            content = await asyncio.to_thread(self._read_disk, key, now)
+            if content is not None:
+                self.disk_hits += 1
+                self._store_memory(key, content, now)
+                return content
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, content: str):
+        """写入缓存"""
+        now = time.time()
+        self._store_memory(key, content, now)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, content, now)
+
+    def _store_memory(self, key: str, content: str, now: float):
+        """写入内存层并按条目数 / 字节数淘汰"""
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (now + self.ttl, content, size)
+        self.bytes_held += size
+
+        while len(self._entries) > self.max_entries or self.bytes_held > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        """移除内存条目"""
+        _, _, size = self._entries.pop(key)
+        self.bytes_held -= size
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str, now: float) -> Optional[str]:
+        """读取磁盘条目（过期则删除）"""
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read response cache entry {path}: {e}")
+            return None
+
+        if record.get("expires_at", 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return record.get("content")
+
+    def _write_disk(self, key: str, content: str, now: float):
+        """写入磁盘条目（先写临时文件再原子替换）"""
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": now + self.disk_ttl, "content": content}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write response cache entry {path}: {e}")
+
+    def clear(self):
+        """清空内存层"""
+        self._entries.clear()
+        self.bytes_held = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes_held": self.bytes_held,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "disk_enabled": self.disk_dir is not None
+        }
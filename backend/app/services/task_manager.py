@@ -0,0 +1,94 @@
+"""
+WebSocket 连接任务管理
+将每条消息的处理放到独立任务中执行，支持并发上限和按请求 ID 取消
+"""
+
+from typing import Dict, Awaitable, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionTaskManager:
+    """单个 WebSocket 连接上的消息处理任务管理器"""
+
+    def __init__(self, max_concurrency: int = 4):
+        """
+        初始化任务管理器
+
+        Args:
+            max_concurrency: 受限任务（如 AI 查询）的最大并发数，超出的任务排队等待
+        """
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def active_count(self) -> int:
+        """当前未完成的任务数量"""
+        return len(self._tasks)
+
+    def spawn(self, request_id: str, coro: Awaitable, limited: bool = True) -> asyncio.Task:
+        """
+        以任务方式运行消息处理协程
+
+        Args:
+            request_id: 请求 ID，用于后续取消
+            coro: 消息处理协程
+            limited: 是否受并发上限约束（轻量消息如导航回执可设为 False）
+
+        Returns:
+            创建的任务
+        """
+        if request_id in self._tasks:
+            # 同一 ID 的旧任务被新请求替换
+            logger.warning(f"Request id reused, cancelling previous task: {request_id}")
+            self._tasks[request_id].cancel()
+
+        task = asyncio.create_task(self._run(coro, limited))
+        self._tasks[request_id] = task
+        task.add_done_callback(lambda t: self._on_done(request_id, t, coro))
+        return task
+
+    async def _run(self, coro: Awaitable, limited: bool):
+        """执行协程（受限任务先获取信号量）"""
+        if not limited:
+            return await coro
+        async with self._semaphore:
+            return await coro
+
+    def _on_done(self, request_id: str, task: asyncio.Task, coro: Awaitable):
+        """任务完成回调：移除记录并记录异常"""
+        if self._tasks.get(request_id) is task:
+            del self._tasks[request_id]
+        if task.cancelled():
+            # 排队期间被取消时协程从未开始执行，需要显式关闭
+            if hasattr(coro, "close"):
+                coro.close()
+            logger.info(f"Task cancelled: {request_id}")
+        elif task.exception() is not None:
+            logger.error(f"Task {request_id} failed: {task.exception()}")
+
+    def cancel(self, request_id: str) -> bool:
+        """
+        取消指定请求的任务
+
+        Returns:
+            是否找到并取消了任务
+        """
+        task: Optional[asyncio.Task] = self._tasks.get(request_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def cancel_all(self):
+        """取消所有未完成的任务并等待其结束（连接断开时调用）"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"Cancelled {len(tasks)} in-flight tasks")
+        self._tasks.clear()
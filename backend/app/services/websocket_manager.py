@@ -1,45 +1,366 @@
 from fastapi import WebSocket
-from typing import List
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from collections import deque
+import asyncio
+import json
 import logging
+import uuid
+
+from app.services.pubsub import PubSubBackend, InProcessBackend, create_pubsub_backend
+from app.tools.navigation_history import get_navigation_history_store
 
 logger = logging.getLogger(__name__)
 
+# 所有 worker 都订阅的广播频道
+BROADCAST_CHANNEL = "ws:broadcast"
+
+# 发送队列溢出策略
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# coalesce 策略下可合并的消息类型（只保留最新一条）
+COALESCE_MESSAGE_TYPES = ("navigation",)
+
+# 慢消费者被断开时使用的关闭码（Try Again Later）
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+class ManagedConnection:
+    """带有界发送队列和独立写任务的 WebSocket 连接"""
+    
+    def __init__(
+        self,
+        websocket: WebSocket,
+        session_id: str,
+        max_queue_size: int,
+        overflow_policy: str,
+        stats: Dict[str, int],
+        on_failed: Callable[[WebSocket], Awaitable[None]]
+    ):
+        """
+        Args:
+            websocket: 底层 WebSocket 连接
+            session_id: 会话ID
+            max_queue_size: 发送队列容量
+            overflow_policy: 队列满时的处理策略（drop_oldest / coalesce / disconnect）
+            stats: 管理器共享的计数器
+            on_failed: 发送失败或慢消费者被断开时的回调
+        """
+        self.websocket = websocket
+        self.session_id = session_id
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.closed = False
+        self.dropped = 0
+        
+        # 队列元素: [message, message_type]，message_type 在需要合并时才解析
+        self._queue: Deque[List[Any]] = deque()
+        self._ready = asyncio.Event()
+        self._stats = stats
+        self._on_failed = on_failed
+        self._close_task: Optional[asyncio.Task] = None
+        self._writer_task = asyncio.create_task(self._write_loop())
+    
+    @property
+    def queue_depth(self) -> int:
+        """当前待发送的消息数"""
+        return len(self._queue)
+    
+    async def send_text(self, message: str):
+        """入队消息（不等待网络发送），与 WebSocket.send_text 接口兼容"""
+        self.enqueue(message)
+    
+    async def receive_text(self) -> str:
+        return await self.websocket.receive_text()
+    
+    async def close(self, code: int = 1000):
+        await self.websocket.close(code=code)
+    
+    def enqueue(self, message: str) -> bool:
+        """
+        将消息放入发送队列
+        
+        Returns:
+            消息是否被接受
+        """
+        if self.closed:
+            return False
+        
+        if len(self._queue) >= self.max_queue_size:
+            if not self._handle_overflow(message):
+                return False
+        else:
+            self._queue.append([message, None])
+        
+        self._ready.set()
+        return True
+    
+    def _handle_overflow(self, message: str) -> bool:
+        """按策略处理队列溢出，返回新消息是否已入队"""
+        if self.overflow_policy == "disconnect":
+            logger.warning(f"Slow consumer disconnected: {self.session_id} (queue depth {len(self._queue)})")
+            self._stats["slow_consumer_disconnects"] += 1
+            self.closed = True
+            self._queue.clear()
+            self._close_task = asyncio.create_task(self._close_slow_consumer())
+            return False
+        
+        if self.overflow_policy == "coalesce":
+            message_type = self._message_type(message)
+            if message_type in COALESCE_MESSAGE_TYPES:
+                # 用最新消息替换队列中同类型的最后一条
+                for item in reversed(self._queue):
+                    if self._item_type(item) == message_type:
+                        item[0], item[1] = message, message_type
+                        self._stats["coalesced"] += 1
+                        return True
+        
+        # drop_oldest（以及无法合并的 coalesce）：丢弃最旧的消息
+        self._queue.popleft()
+        self._queue.append([message, None])
+        self.dropped += 1
+        self._stats["dropped"] += 1
+        return True
+    
+    def _item_type(self, item: List[Any]) -> Optional[str]:
+        if item[1] is None:
+            item[1] = self._message_type(item[0]) or ""
+        return item[1]
+    
+    @staticmethod
+    def _message_type(message: str) -> Optional[str]:
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return None
+        return data.get("type") if isinstance(data, dict) else None
+    
+    async def _write_loop(self):
+        """写任务：按顺序发送队列中的消息"""
+        try:
+            while True:
+                while not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                message = self._queue.popleft()[0]
+                await self.websocket.send_text(message)
+                self._stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending message to {self.session_id}: {e}")
+            self.closed = True
+            await self._on_failed(self.websocket)
+    
+    async def _close_slow_consumer(self):
+        """关闭慢消费者连接"""
+        try:
+            await self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception as e:
+            logger.debug(f"Error closing slow consumer {self.session_id}: {e}")
+        await self._on_failed(self.websocket)
+    
+    async def aclose(self):
+        """停止写任务，丢弃未发送的消息"""
+        self.closed = True
+        self._queue.clear()
+        if self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+
 class WebSocketManager:
     """WebSocket连接管理器"""
     
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(
+        self,
+        backend: Optional[PubSubBackend] = None,
+        max_queue_size: int = 256,
+        overflow_policy: str = "drop_oldest",
+        worker_ttl: float = 30.0
+    ):
+        """
+        Args:
+            backend: 跨进程消息后端
+            max_queue_size: 每个连接的发送队列容量
+            overflow_policy: 发送队列溢出策略
+            worker_ttl: worker 存活标记的过期时间（秒），每 1/3 周期心跳续期一次
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        
+        # 跨进程消息后端，默认仅在本进程内分发
+        self.backend = backend or InProcessBackend()
+        self.worker_id = uuid.uuid4().hex
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.worker_ttl = worker_ttl
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        # 本 worker 上的连接: session_id -> ManagedConnection
+        self.active_connections: Dict[str, ManagedConnection] = {}
+        self._session_ids: Dict[WebSocket, str] = {}
+        self._started = False
+        self._stats = {"sent": 0, "dropped": 0, "coalesced": 0, "slow_consumer_disconnects": 0}
+    
+    @property
+    def worker_channel(self) -> str:
+        """本 worker 的私有频道（定向消息）"""
+        return f"ws:worker:{self.worker_id}"
+    
+    async def start(self):
+        """启动消息后端并订阅广播频道和本 worker 频道"""
+        if self._started:
+            return
+        self._started = True
+        await self.backend.start(self._on_backend_message)
+        await self.backend.subscribe(BROADCAST_CHANNEL)
+        await self.backend.subscribe(self.worker_channel)
+        await self.backend.refresh_worker(self.worker_id, [], self.worker_ttl)
+        # 清理已崩溃 worker 遗留的会话路由
+        await self.backend.prune_sessions()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"WebSocket manager started (worker {self.worker_id})")
+    
+    async def close(self):
+        """注销本 worker 的会话并关闭消息后端"""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        for connection in list(self.active_connections.values()):
+            await self.disconnect(connection.websocket)
+        if self._started:
+            try:
+                await self.backend.remove_worker(self.worker_id)
+            except Exception as e:
+                logger.warning(f"Failed to remove worker liveness key: {e}")
+            await self.backend.close()
+            self._started = False
+    
+    async def _heartbeat_loop(self):
+        """定期续期本 worker 的存活标记并重新登记其会话"""
+        while True:
+            await asyncio.sleep(self.worker_ttl / 3)
+            try:
+                await self.backend.refresh_worker(
+                    self.worker_id, list(self.active_connections), self.worker_ttl
+                )
+            except Exception as e:
+                logger.warning(f"Worker heartbeat failed: {e}")
     
-    async def connect(self, websocket: WebSocket):
-        """接受WebSocket连接"""
+    async def connect(self, websocket: WebSocket) -> str:
+        """
+        接受WebSocket连接
+        
+        Returns:
+            分配给该连接的会话ID
+        """
+        await self.start()
         await websocket.accept()
-        self.active_connections.append(websocket)
+        session_id = uuid.uuid4().hex
+        self.active_connections[session_id] = ManagedConnection(
+            websocket,
+            session_id,
+            max_queue_size=self.max_queue_size,
+            overflow_policy=self.overflow_policy,
+            stats=self._stats,
+            on_failed=self.disconnect
+        )
+        self._session_ids[websocket] = session_id
+        await self.backend.register_session(session_id, self.worker_id)
         logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
+        return session_id
     
-    def disconnect(self, websocket: WebSocket):
+    async def disconnect(self, websocket: WebSocket):
         """断开WebSocket连接"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        session_id = self._session_ids.pop(websocket, None)
+        if session_id is None:
+            return
+        connection = self.active_connections.pop(session_id, None)
+        if connection is not None:
+            await connection.aclose()
+        get_navigation_history_store().release(session_id)
+        await self.backend.unregister_session(session_id)
         logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
     
+    def get_session_id(self, websocket: WebSocket) -> Optional[str]:
+        """获取连接的会话ID"""
+        return self._session_ids.get(websocket)
+    
+    def get_connection(self, session_id: str) -> Optional[ManagedConnection]:
+        """获取会话对应的连接（发送经过队列）"""
+        return self.active_connections.get(session_id)
+    
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        """发送个人消息"""
-        try:
-            await websocket.send_text(message)
-        except Exception as e:
-            logger.error(f"Error sending personal message: {e}")
-            self.disconnect(websocket)
+        """发送个人消息（放入该连接的发送队列）"""
+        connection = self.active_connections.get(self._session_ids.get(websocket))
+        if connection is None:
+            logger.warning("Attempted to send to an unknown connection")
+            return
+        connection.enqueue(message)
     
-    async def broadcast(self, message: str):
-        """广播消息给所有连接"""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting message: {e}")
-                disconnected.append(connection)
+    async def send_to_session(self, session_id: str, message: str) -> bool:
+        """
+        向指定会话发送消息（会话可能位于其他 worker）
         
-        # 清理断开的连接
-        for connection in disconnected:
-            self.disconnect(connection)
\ No newline at end of file
+        Returns:
+            是否找到会话并已投递（跨 worker 时为已发布）
+        """
+        connection = self.active_connections.get(session_id)
+        if connection is not None:
+            return connection.enqueue(message)
+        
+        worker_id = await self.backend.lookup_session(session_id)
+        if worker_id is None:
+            logger.warning(f"Session not found: {session_id}")
+            return False
+        
+        await self.backend.publish(
+            f"ws:worker:{worker_id}",
+            json.dumps({"session_id": session_id, "message": message})
+        )
+        return True
+    
+    async def broadcast(self, message: str):
+        """广播消息给所有连接（所有 worker）"""
+        await self.backend.publish(BROADCAST_CHANNEL, message)
+    
+    async def _on_backend_message(self, channel: str, data: str):
+        """处理从消息后端收到的广播 / 定向消息"""
+        if channel == BROADCAST_CHANNEL:
+            self._broadcast_local(data)
+        elif channel == self.worker_channel:
+            envelope = json.loads(data)
+            connection = self.active_connections.get(envelope.get("session_id"))
+            if connection is not None:
+                connection.enqueue(envelope["message"])
+    
+    def _broadcast_local(self, message: str):
+        """广播消息给本 worker 上的所有连接（只入队，不等待任何连接）"""
+        for connection in list(self.active_connections.values()):
+            connection.enqueue(message)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接和发送队列统计信息"""
+        depths = [c.queue_depth for c in self.active_connections.values()]
+        return {
+            "connections": len(self.active_connections),
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_capacity": self.max_queue_size,
+            "overflow_policy": self.overflow_policy,
+            **self._stats
+        }
+
+_websocket_manager: Optional[WebSocketManager] = None
+
+
+def get_websocket_manager() -> WebSocketManager:
+    """获取进程内的全局连接管理器（WebSocket 端点与 API 路由共用，按配置创建消息后端）"""
+    global _websocket_manager
+    if _websocket_manager is None:
+        from app.core.config import settings
+        _websocket_manager = WebSocketManager(
+            create_pubsub_backend(settings.WS_PUBSUB_BACKEND, settings.WS_PUBSUB_URL),
+            max_queue_size=settings.WS_SEND_QUEUE_SIZE,
+            overflow_policy=settings.WS_OVERFLOW_POLICY,
+            worker_ttl=settings.WS_WORKER_TTL
+        )
+    return _websocket_manager
\ No newline at end of file
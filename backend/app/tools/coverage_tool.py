@@ -0,0 +1,145 @@
+"""
+比对覆盖度工具
+从带索引的 BAM 中计算区域的测序深度；大区域优先读取预计算的汇总金字塔
+"""
+
+from typing import Dict, Any, Optional
+import asyncio
+import logging
+from datetime import datetime
+
+from app.genomics.bam import BamReader, get_bam_reader
+from app.genomics.summary_pyramid import SummaryPyramid, get_summary_pyramid
+
+logger = logging.getLogger(__name__)
+
+# 单次计算覆盖度的最大区域（bp），逐碱基深度数组按区域长度分配
+MAX_COVERAGE_REGION = 5_000_000
+
+# 分箱数量上限（对应视图宽度的像素数）
+MAX_COVERAGE_BINS = 4000
+
+# 超过此长度的区域优先使用覆盖度汇总金字塔（bp）
+PYRAMID_MIN_REGION = 1_000_000
+
+
+class CoverageTool:
+    """覆盖度计算工具类"""
+
+    def __init__(self, bam_reader: Optional[BamReader] = None, pyramid: Optional[SummaryPyramid] = None):
+        """
+        Args:
+            bam_reader: BAM 读取器，默认打开 ALIGNMENTS_BAM_PATH
+            pyramid: 覆盖度汇总金字塔，默认加载 SUMMARY_PYRAMID_PATH/coverage
+        """
+        self.bam_reader = bam_reader if bam_reader is not None else get_bam_reader()
+        self.pyramid = pyramid if pyramid is not None else get_summary_pyramid("coverage")
+
+    def _error(self, message: str, error_code: str) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "message": message,
+            "error_code": error_code,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    async def get_coverage(
+        self,
+        chromosome: str,
+        start: int,
+        end: int,
+        bins: int = 500,
+        min_mapq: int = 0
+    ) -> Dict[str, Any]:
+        """
+        计算区域覆盖度
+
+        Args:
+            chromosome: 染色体名称 (如 "chr1", "1", "X")
+            start: 起始位置（1-based，闭区间）
+            end: 结束位置（1-based，闭区间）
+            bins: 分箱数量（视图宽度），上限 MAX_COVERAGE_BINS
+            min_mapq: 最低比对质量
+
+        Returns:
+            结果字典，成功时 coverage 字段包含总体统计和分箱统计，
+            source 为 "alignments"（逐碱基计算）或 "summary"（汇总金字塔）
+        """
+        try:
+            if self.bam_reader is None and self.pyramid is None:
+                return self._error("No alignment file configured", "ALIGNMENTS_NOT_CONFIGURED")
+            bins = max(1, min(bins, MAX_COVERAGE_BINS))
+            
+            # 大区域（或没有 BAM 时）使用预计算的汇总；分辨率要求太细时 query 返回 None，
+            # 汇总中没有的染色体交给 BAM 计算
+            use_pyramid = self.pyramid is not None and (
+                self.bam_reader is None
+                or (end - start + 1 > PYRAMID_MIN_REGION and self.pyramid.resolve_chromosome(chromosome) is not None)
+            )
+            if use_pyramid:
+                summary = self._query_pyramid(chromosome, start, end, bins)
+                if summary is not None:
+                    return summary
+                if self.bam_reader is None:
+                    return self._error("Region too small for precomputed coverage summaries", "REGION_TOO_SMALL")
+            
+            if self.bam_reader.index is None:
+                return self._error("Alignment file has no .bai/.csi index", "INDEX_NOT_FOUND")
+
+            name = self.bam_reader.resolve_chromosome(chromosome)
+            if name is None:
+                return self._error(f"Chromosome {chromosome} not found in alignments", "SEQUENCE_NOT_FOUND")
+
+            length = self.bam_reader.references[name]
+            if start <= 0 or end < start or start > length:
+                return self._error(
+                    f"Invalid region {name}:{start}-{end} (chromosome length {length:,} bp)",
+                    "INVALID_RANGE"
+                )
+            end = min(end, length)
+            if end - start + 1 > MAX_COVERAGE_REGION:
+                return self._error(
+                    f"Region too large: {end - start + 1:,} bp (maximum {MAX_COVERAGE_REGION:,} bp)",
+                    "REGION_TOO_LARGE"
+                )
+
+            coverage = await asyncio.to_thread(
+                self.bam_reader.coverage, name, start, end, bins, min_mapq
+            )
+
+            return {
+                "status": "success",
+                "message": (
+                    f"Mean depth {coverage['mean']}x over {name}:{start}-{end} "
+                    f"({coverage['reads']:,} reads)"
+                ),
+                "coverage": coverage,
+                "source": "alignments",
+                "timestamp": datetime.now().isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"Error in get_coverage: {e}", exc_info=True)
+            return self._error(f"Failed to compute coverage: {str(e)}", "COVERAGE_ERROR")
+    
+    def _query_pyramid(self, chromosome: str, start: int, end: int, bins: int) -> Optional[Dict[str, Any]]:
+        """从汇总金字塔读取覆盖度，分辨率要求比最细一层还细时返回 None"""
+        try:
+            coverage = self.pyramid.query(chromosome, start, end, bins)
+        except KeyError:
+            return self._error(f"Chromosome {chromosome} not found in coverage summaries", "SEQUENCE_NOT_FOUND")
+        except ValueError as e:
+            return self._error(str(e), "INVALID_RANGE")
+        if coverage is None:
+            return None
+        
+        return {
+            "status": "success",
+            "message": (
+                f"Mean depth {coverage['mean']}x over {coverage['chromosome']}:{coverage['start']}-{coverage['end']} "
+                f"(precomputed at {coverage['level_bin_size']:,} bp resolution)"
+            ),
+            "coverage": coverage,
+            "source": "summary",
+            "timestamp": datetime.now().isoformat()
+        }
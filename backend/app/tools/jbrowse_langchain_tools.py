@@ -4,15 +4,27 @@ JBrowse LangChain 工具定义
 """
 
 from typing import Optional
-from langchain.tools import tool
+from langchain.tools import ToolException, tool
 import logging
 
 from app.tools.navigation_tool import NavigationTool
+from app.tools.sequence_tool import SequenceTool
+from app.tools.coverage_tool import CoverageTool
+from app.tools.liftover_tool import LiftoverTool, format_interval
 
 logger = logging.getLogger(__name__)
 
-# 创建全局 NavigationTool 实例
+# 创建全局 NavigationTool 实例（导航历史按当前 WebSocket 会话分开保存，见 navigation_history）
 _navigation_tool = NavigationTool()
+_sequence_tool = SequenceTool()
+_coverage_tool = CoverageTool()
+_liftover_tool = LiftoverTool()
+
+# 工具回复中完整显示的最长序列（bp），更长的序列只显示首尾
+MAX_DISPLAYED_SEQUENCE = 1000
+
+# 可由模型修正参数后重试的失败回复前缀（坐标超出染色体等）
+RETRY_HINT = "Retry with "
 
 
 @tool
@@ -29,6 +41,10 @@ async def navigate_jbrowse(
     The tool accepts chromosome names in various formats (chr1, 1, chrX, X, etc.)
     and automatically normalizes them to match the genome assembly format.
     
+    Coordinates are checked against the chromosome length. An end past the
+    chromosome end is clamped; a start past it fails with the chromosome length
+    and a suggested call to retry with.
+    
     Args:
         chromosome: Chromosome name (e.g., "chr1", "1", "X", "chrX")
         start: Start position in base pairs (must be positive integer)
@@ -53,17 +69,29 @@ async def navigate_jbrowse(
         
         if result["status"] == "success":
             location = result["location"]
+            clamped = ""
+            if "clamped_from" in location:
+                clamped = f"Requested end {location['clamped_from']:,} was past the chromosome end and was clamped. "
             return (
                 f"Successfully navigated to {location['chromosome']}:{location['start']}-{location['end']}. "
-                f"Region size: {location['region_size']:,} bp. "
+                f"Region size: {location['region_size']:,} bp. {clamped}"
                 f"The genome browser view has been updated."
             )
+        elif result.get("error_code") == "OUT_OF_BOUNDS":
+            suggested = result["suggested_location"]
+            raise ToolException(
+                f"Navigation failed: {result['message']}. {RETRY_HINT}"
+                f"navigate_jbrowse(chromosome=\"{suggested['chromosome']}\", "
+                f"start={suggested['start']}, end={suggested['end']})"
+            )
         else:
-            return f"Navigation failed: {result['message']}"
+            raise ToolException(f"Navigation failed: {result['message']}")
             
+    except ToolException:
+        raise
     except Exception as e:
         logger.error(f"Error in navigate_jbrowse tool: {e}", exc_info=True)
-        return f"Navigation error: {str(e)}"
+        raise ToolException(f"Navigation error: {str(e)}")
 
 
 @tool
@@ -96,24 +124,101 @@ async def navigate_to_gene(
         
         if result["status"] == "success":
             location = result["location"]
+            correction = ""
+            if result.get("corrected_from"):
+                correction = f"No gene named {result['corrected_from']}; using closest match. "
             return (
-                f"Successfully navigated to {gene_name} gene at "
+                f"{correction}Successfully navigated to {location.get('gene_name', gene_name)} gene at "
                 f"{location['chromosome']}:{location['start']}-{location['end']}. "
                 f"Gene region size: {location['region_size']:,} bp. "
                 f"The genome browser view has been updated."
             )
         else:
-            return f"Gene navigation failed: {result['message']}"
+            raise ToolException(f"Gene navigation failed: {result['message']}")
             
+    except ToolException:
+        raise
     except Exception as e:
         logger.error(f"Error in navigate_to_gene tool: {e}", exc_info=True)
-        return f"Gene navigation error: {str(e)}"
+        raise ToolException(f"Gene navigation error: {str(e)}")
+
+
+@tool
+async def liftover_coordinates(
+    chromosome: str,
+    start: int,
+    end: Optional[int] = None,
+    source_assembly: str = "hg19",
+    target_assembly: str = "hg38"
+) -> str:
+    """
+    Convert genomic coordinates between genome assemblies (liftover), e.g. from
+    GRCh37/hg19 to GRCh38/hg38.
+    
+    Use this tool when the user gives coordinates from an older assembly
+    (e.g. "chr17:41196312-41277500 in hg19", "GRCh37 position 7:140453136"),
+    before navigating to them with navigate_jbrowse. Never convert coordinates
+    between assemblies by guessing.
+    
+    Args:
+        chromosome: Chromosome name (e.g., "chr17", "17")
+        start: Start position in base pairs (1-based)
+        end: End position in base pairs (inclusive, optional; omit for a single position)
+        source_assembly: Assembly of the given coordinates ("hg19"/"GRCh37" or "hg38"/"GRCh38")
+        target_assembly: Assembly to convert to ("hg38"/"GRCh38" or "hg19"/"GRCh37")
+    
+    Returns:
+        The converted location(s), including split and unmapped parts
+    
+    Examples:
+        - liftover_coordinates("chr17", 41196312, 41277500) -> BRCA1 from hg19 to hg38
+        - liftover_coordinates("7", 140453136) -> BRAF V600 position from hg19 to hg38
+    """
+    try:
+        result = await _liftover_tool.liftover(chromosome, start, end, source_assembly, target_assembly)
+        
+        if result["status"] != "success":
+            raise ToolException(f"Liftover failed: {result['message']}")
+        
+        query = result["query"]
+        lifted = result["liftover"]
+        source = f"{format_interval(query['chromosome'], query['start'], query['end'])} ({result['source']})"
+        if lifted["status"] == "unmapped":
+            return f"{source} has no equivalent in {result['target']}; it lies outside the aligned regions."
+        
+        segments = lifted["segments"]
+        if lifted["status"] == "mapped":
+            segment = segments[0]
+            lines = [
+                f"{source} corresponds to "
+                f"{format_interval(segment['chromosome'], segment['start'], segment['end'])} ({result['target']})."
+            ]
+        else:
+            lines = [f"{source} is split across {len(segments)} regions in {result['target']}:"]
+            for i, segment in enumerate(segments, 1):
+                lines.append(
+                    f"{i}. {format_interval(segment['chromosome'], segment['start'], segment['end'])} "
+                    f"({segment['strand']} strand, from {result['source']} "
+                    f"{segment['source_start']}-{segment['source_end']})"
+                )
+        if lifted["unmapped"]:
+            gaps = ", ".join(
+                format_interval(query["chromosome"], gap["start"], gap["end"]) for gap in lifted["unmapped"]
+            )
+            lines.append(f"Not present in {result['target']}: {gaps} ({lifted['mapped_fraction']:.1%} of bases aligned).")
+        return "\n".join(lines)
+        
+    except ToolException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in liftover_coordinates tool: {e}", exc_info=True)
+        raise ToolException(f"Liftover error: {str(e)}")
 
 
 @tool
 def get_navigation_history(limit: int = 5) -> str:
     """
-    Get the recent navigation history.
+    Get the recent navigation history of the current user's session.
     
     Use this tool when the user asks about previous locations they viewed
     or wants to go back to a previous location.
@@ -146,14 +251,209 @@ def get_navigation_history(limit: int = 5) -> str:
         
         return "\n".join(history_lines)
         
+    except ToolException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_navigation_history tool: {e}", exc_info=True)
-        return f"Error retrieving navigation history: {str(e)}"
+        raise ToolException(f"Error retrieving navigation history: {str(e)}")
+
+
+@tool
+async def get_sequence(
+    chromosome: str,
+    start: int,
+    end: int
+) -> str:
+    """
+    Get the reference genome DNA sequence of a region.
+    
+    Use this tool when the user asks for the nucleotide sequence of a region
+    (e.g. "show me the sequence of chr17:43044295-43044395").
+    Coordinates are 1-based and inclusive.
+    
+    Args:
+        chromosome: Chromosome name (e.g., "chr1", "1", "X", "chrX")
+        start: Start position in base pairs (1-based)
+        end: End position in base pairs (inclusive)
+    
+    Returns:
+        The sequence (abbreviated to its first and last bases for long regions)
+    
+    Examples:
+        - get_sequence("chr17", 43044295, 43044394) -> 100 bp of BRCA1
+        - get_sequence("7", 55019017, 55019116) -> 100 bp of EGFR
+    """
+    try:
+        result = await _sequence_tool.get_sequence(chromosome, start, end)
+        
+        if result["status"] != "success":
+            raise ToolException(f"Sequence retrieval failed: {result['message']}")
+        
+        location = result["location"]
+        sequence = result["sequence"]
+        header = f"{location['chromosome']}:{location['start']}-{location['end']} ({location['length']:,} bp)"
+        if len(sequence) <= MAX_DISPLAYED_SEQUENCE:
+            return f"{header}:\n{sequence}"
+        return (
+            f"{header}, too long to show in full. "
+            f"First 60 bp: {sequence[:60]} ... last 60 bp: {sequence[-60:]}"
+        )
+        
+    except ToolException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_sequence tool: {e}", exc_info=True)
+        raise ToolException(f"Sequence retrieval error: {str(e)}")
+
+
+@tool
+async def get_coverage(
+    chromosome: str,
+    start: int,
+    end: int
+) -> str:
+    """
+    Get the sequencing depth (read coverage) of a region from the loaded alignments.
+    
+    Use this tool when the user asks about read depth or coverage, e.g.
+    "what's the depth over this exon" or "is chr17:43044295-43045000 well covered".
+    Coordinates are 1-based and inclusive.
+    
+    Args:
+        chromosome: Chromosome name (e.g., "chr1", "1", "X", "chrX")
+        start: Start position in base pairs (1-based)
+        end: End position in base pairs (inclusive)
+    
+    Returns:
+        Mean/min/max depth and the fraction of bases covered at 1x, 10x and 30x
+    
+    Examples:
+        - get_coverage("chr17", 43124017, 43125483) -> Depth over a BRCA1 exon
+    """
+    try:
+        result = await _coverage_tool.get_coverage(chromosome, start, end, bins=10)
+        
+        if result["status"] != "success":
+            raise ToolException(f"Coverage calculation failed: {result['message']}")
+        
+        coverage = result["coverage"]
+        if result["source"] == "summary":
+            return (
+                f"Coverage of {coverage['chromosome']}:{coverage['start']}-{coverage['end']} "
+                f"(precomputed, {coverage['level_bin_size']:,} bp resolution): mean {coverage['mean']}x, "
+                f"min {coverage['min']:g}x, max {coverage['max']:g}x."
+            )
+        fractions = ", ".join(
+            f"{threshold}: {fraction:.1%}" for threshold, fraction in coverage["covered_fraction"].items()
+        )
+        return (
+            f"Coverage of {coverage['chromosome']}:{coverage['start']}-{coverage['end']} "
+            f"from {coverage['reads']:,} reads: mean {coverage['mean']}x, "
+            f"min {coverage['min']:g}x, max {coverage['max']:g}x. "
+            f"Bases covered at {fractions}."
+        )
+        
+    except ToolException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_coverage tool: {e}", exc_info=True)
+        raise ToolException(f"Coverage calculation error: {str(e)}")
+
+
+@tool
+async def get_sequence_stats(
+    chromosome: str,
+    start: int,
+    end: int
+) -> str:
+    """
+    Get the base composition of a reference region: GC content, CpG
+    observed/expected ratio, N gaps and repeat-masked fraction.
+    
+    Use this tool when the user asks whether a region is GC-rich, contains a
+    CpG island, has assembly gaps, etc. (e.g. "is the TP53 promoter GC-rich").
+    Always use this instead of guessing the composition. Coordinates are
+    1-based and inclusive; regions up to 10 Mb are supported.
+    
+    Args:
+        chromosome: Chromosome name (e.g., "chr1", "1", "X", "chrX")
+        start: Start position in base pairs (1-based)
+        end: End position in base pairs (inclusive)
+    
+    Returns:
+        Composition summary, including the GC range across 100 sub-windows
+    
+    Examples:
+        - get_sequence_stats("chr17", 7687490, 7689490) -> GC and CpG around the TP53 promoter
+    """
+    try:
+        result = await _sequence_tool.get_sequence_stats(chromosome, start, end)
+        
+        if result["status"] != "success":
+            raise ToolException(f"Sequence statistics failed: {result['message']}")
+        
+        location = result["location"]
+        stats = result["stats"]
+        if stats["gc_fraction"] is None:
+            return (
+                f"{location['chromosome']}:{location['start']}-{location['end']} "
+                f"({location['length']:,} bp) is entirely unresolved (N) sequence."
+            )
+        
+        lines = [
+            f"Composition of {location['chromosome']}:{location['start']}-{location['end']} "
+            f"({location['length']:,} bp):",
+            f"- GC content: {stats['gc_fraction']:.1%}",
+        ]
+        if stats["cpg_obs_exp"] is not None:
+            island = " (CpG island-like)" if stats["cpg_island_like"] else ""
+            lines.append(f"- CpG: {stats['cpg_count']:,} sites, observed/expected {stats['cpg_obs_exp']:.2f}{island}")
+        window_gc = [w["gc_fraction"] for w in stats.get("windows", []) if w["gc_fraction"] is not None]
+        if len(window_gc) > 1:
+            lines.append(
+                f"- GC across {stats['window_size']:,} bp windows: {min(window_gc):.1%} to {max(window_gc):.1%}"
+            )
+        n_runs = stats["n_runs"]
+        if n_runs["count"]:
+            lines.append(
+                f"- N gaps: {n_runs['count']:,} ({n_runs['total_length']:,} bp, longest {n_runs['longest']:,} bp)"
+            )
+        if stats["masked_fraction"]:
+            lines.append(f"- Repeat-masked (lowercase): {stats['masked_fraction']:.1%}")
+        return "\n".join(lines)
+        
+    except ToolException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_sequence_stats tool: {e}", exc_info=True)
+        raise ToolException(f"Sequence statistics error: {str(e)}")
 
 
 # 导出所有工具
 JBROWSE_TOOLS = [
     navigate_jbrowse,
     navigate_to_gene,
+    liftover_coordinates,
     get_navigation_history,
+    get_sequence,
+    get_sequence_stats,
+    get_coverage,
 ]
+
+# 工具失败时抛出 ToolException：直接调用返回错误文本，按 ToolCall 调用时 ToolMessage.status 为 "error"
+for _tool in JBROWSE_TOOLS:
+    _tool.handle_tool_error = True
+
+
+# 工具结果的回复策略:
+#   "template" - 工具结果本身就是面向用户的文本，可直接作为最终回复，跳过第二次 LLM 调用（导航类工具和导航历史查询）
+#   "narrate"  - 需要 LLM 根据工具结果组织回复（未列出的工具默认使用此策略）
+TOOL_RESPONSE_POLICIES = {
+    "navigate_jbrowse": "template",
+    "navigate_to_gene": "template",
+    "get_navigation_history": "template",
+    "liftover_coordinates": "narrate",
+    "get_sequence": "narrate",
+    "get_sequence_stats": "narrate",
+    "get_coverage": "narrate",
+}
@@ -1,14 +1,43 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import logging
 import asyncio
 
+import numpy as np
+
+from app.genomics.interval_index import CATEGORIES, FeatureIntervalIndex, get_feature_index
+from app.genomics.summary_pyramid import feature_depth, get_summary_pyramid, summarize_values
+from app.genomics.variant_annotator import VariantAnnotator
+from app.genomics.vcf_reader import VcfReader, get_vcf_reader
+
 logger = logging.getLogger(__name__)
 
+# 区域解释中最多列出的基因数量
+MAX_REGION_GENES = 20
+
+# 变异搜索最多返回的记录数量
+MAX_VARIANT_RESULTS = 500
+
+# 单次批量注释的最大变异数量
+MAX_ANNOTATION_BATCH = 100_000
+
+# 没有密度汇总金字塔时，直接从注释索引计算的最大区域（bp）
+MAX_DENSITY_REGION = 5_000_000
+
 class JBrowseToolkit:
     """JBrowse 2 控制工具集"""
     
-    def __init__(self):
+    def __init__(self,
+                 feature_index: Optional[FeatureIntervalIndex] = None,
+                 vcf_reader: Optional[VcfReader] = None):
+        """
+        Args:
+            feature_index: 注释特征区间索引，默认加载 FEATURE_INDEX_PATH 下的索引
+            vcf_reader: 变异 VCF 读取器，默认打开 VARIANT_VCF_PATH
+        """
         self.session_data = {}
+        self.feature_index = feature_index if feature_index is not None else get_feature_index()
+        self.vcf_reader = vcf_reader if vcf_reader is not None else get_vcf_reader()
+        self.variant_annotator = VariantAnnotator(self.feature_index) if self.feature_index is not None else None
     
     async def navigate_to_locus(self, 
                                chromosome: str, 
@@ -88,45 +117,51 @@ class JBrowseToolkit:
                              chromosome: str,
                              start: int,
                              end: int,
-                             variant_type: Optional[str] = None) -> Dict[str, Any]:
-        """搜索指定区域的遗传变异"""
+                             variant_type: Optional[str] = None,
+                             annotate: bool = True) -> Dict[str, Any]:
+        """
+        搜索指定区域的遗传变异
+        
+        annotate 为 True 且已构建注释索引时，每个变异附带 annotation（所在基因、区域类型、最近基因距离）
+        """
         try:
             logger.info(f"Searching variants in {chromosome}:{start}-{end}")
             
-            # 模拟变异搜索
-            variants = [
-                {
-                    "id": "rs123456",
-                    "chromosome": chromosome,
-                    "position": start + 1000,
-                    "ref": "A",
-                    "alt": "G",
-                    "type": "SNV",
-                    "frequency": 0.15
-                },
-                {
-                    "id": "rs789012", 
-                    "chromosome": chromosome,
-                    "position": start + 5000,
-                    "ref": "T",
-                    "alt": "C",
-                    "type": "SNV",
-                    "frequency": 0.08
+            if self.vcf_reader is None:
+                return {
+                    "action": "search_variants",
+                    "status": "error",
+                    "message": "搜索变异失败: 未配置变异 VCF 文件"
+                }
+            if start <= 0 or end < start:
+                return {
+                    "action": "search_variants",
+                    "status": "error",
+                    "message": f"搜索变异失败: 无效的区域 {chromosome}:{start}-{end}"
                 }
-            ]
             
-            if variant_type:
-                variants = [v for v in variants if v["type"] == variant_type]
+            # 解压、解析和注释在线程池中执行，不阻塞事件循环
+            result = await asyncio.to_thread(
+                self.vcf_reader.fetch, chromosome, start, end, variant_type, MAX_VARIANT_RESULTS
+            )
+            variants = result["variants"]
+            if annotate and self.variant_annotator is not None and variants:
+                annotations = await asyncio.to_thread(self.variant_annotator.annotate_variants, variants)
+                for variant, annotation in zip(variants, annotations):
+                    variant["annotation"] = annotation
             
-            await asyncio.sleep(0.1)  # 模拟异步搜索
+            message = f"在 {chromosome}:{start}-{end} 找到 {len(variants)} 个变异"
+            if result["truncated"]:
+                message += f"（仅显示前 {MAX_VARIANT_RESULTS} 个）"
             
             return {
                 "action": "search_variants",
                 "variants": variants,
                 "region": f"{chromosome}:{start}-{end}",
                 "count": len(variants),
+                "truncated": result["truncated"],
                 "status": "success",
-                "message": f"在 {chromosome}:{start}-{end} 找到 {len(variants)} 个变异"
+                "message": message
             }
             
         except Exception as e:
@@ -145,21 +180,41 @@ class JBrowseToolkit:
         try:
             logger.info(f"Explaining genomic region {chromosome}:{start}-{end}")
             
-            # 模拟区域功能分析
+            if self.feature_index is None:
+                return {
+                    "action": "explain_region",
+                    "status": "error",
+                    "message": "区域分析失败: 未构建注释特征索引"
+                }
+            if start <= 0 or end < start:
+                return {
+                    "action": "explain_region",
+                    "status": "error",
+                    "message": f"区域分析失败: 无效的区域 {chromosome}:{start}-{end}"
+                }
+            
+            counts = self.feature_index.summarize(chromosome, start, end)
+            genes = self.feature_index.overlaps(chromosome, start, end, "gene", limit=MAX_REGION_GENES)
+            regulatory = self.feature_index.count_by_name(chromosome, start, end, "regulatory")
+            
+            gene_names = ", ".join(g["name"] for g in genes)
+            if counts["gene"] > len(genes):
+                gene_names += ", ..."
+            annotation = (
+                f"This region overlaps {counts['gene']} genes"
+                f"{f' ({gene_names})' if genes else ''}, {counts['exon']} exons "
+                f"and {counts['regulatory']} regulatory elements."
+            )
+            
             region_info = {
                 "region": f"{chromosome}:{start}-{end}",
                 "size": end - start,
-                "features": [
-                    {"type": "gene", "count": 3},
-                    {"type": "exon", "count": 15},
-                    {"type": "regulatory", "count": 8}
-                ],
-                "functional_annotation": "This region contains protein-coding genes involved in DNA repair pathways.",
-                "conservation_score": 0.85
+                "features": [{"type": category, "count": count} for category, count in counts.items()],
+                "genes": genes,
+                "regulatory_elements": regulatory,
+                "functional_annotation": annotation
             }
             
-            await asyncio.sleep(0.1)  # 模拟异步分析
-            
             return {
                 "action": "explain_region",
                 "region_info": region_info,
@@ -173,4 +228,104 @@ class JBrowseToolkit:
                 "action": "explain_region",
                 "status": "error",
                 "message": f"区域分析失败: {str(e)}"
+            }
+    
+    async def get_feature_density(self,
+                                  chromosome: str,
+                                  start: int,
+                                  end: int,
+                                  category: str = "gene",
+                                  bins: int = 500) -> Dict[str, Any]:
+        """
+        注释特征密度（每个碱基被多少个特征覆盖）的分箱统计
+        
+        优先读取预计算的 density_<类别> 汇总金字塔，分辨率要求更细时从注释索引直接计算
+        """
+        try:
+            if category not in CATEGORIES:
+                return {
+                    "action": "feature_density",
+                    "status": "error",
+                    "message": f"密度计算失败: 未知的特征类别 {category}"
+                }
+            bins = max(1, bins)
+            
+            pyramid = get_summary_pyramid(f"density_{category}")
+            density = None
+            if pyramid is not None and pyramid.resolve_chromosome(chromosome) is not None:
+                density = pyramid.query(chromosome, start, end, bins)
+            
+            if density is None:
+                if self.feature_index is None:
+                    return {
+                        "action": "feature_density",
+                        "status": "error",
+                        "message": "密度计算失败: 未构建注释特征索引"
+                    }
+                if start <= 0 or end < start or end - start + 1 > MAX_DENSITY_REGION:
+                    return {
+                        "action": "feature_density",
+                        "status": "error",
+                        "message": f"密度计算失败: 区域无效或超过 {MAX_DENSITY_REGION:,} bp（未构建密度汇总）"
+                    }
+                seg = self.feature_index.segment(category, chromosome)
+                if seg is None:
+                    values = np.zeros(end - start + 1, dtype=np.int32)
+                else:
+                    values = feature_depth(seg, start - 1, end)
+                name = self.feature_index.resolve_chromosome(chromosome) or chromosome
+                density = summarize_values(name, start, values, bins)
+            
+            return {
+                "action": "feature_density",
+                "density": density,
+                "status": "success",
+                "message": f"已计算 {density['chromosome']}:{density['start']}-{density['end']} 的{category}密度"
+            }
+            
+        except Exception as e:
+            logger.error(f"Error computing feature density: {e}")
+            return {
+                "action": "feature_density",
+                "status": "error",
+                "message": f"密度计算失败: {str(e)}"
+            }
+    
+    async def annotate_variants(self, variants: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量注释变异位置：所在基因、区域类型（exon / intron / UTR / intergenic）和最近基因距离
+        
+        Args:
+            variants: [{"chromosome", "position"}]，position 为 1-based
+        """
+        try:
+            if self.variant_annotator is None:
+                return {
+                    "action": "annotate_variants",
+                    "status": "error",
+                    "message": "变异注释失败: 未构建注释特征索引"
+                }
+            if len(variants) > MAX_ANNOTATION_BATCH:
+                return {
+                    "action": "annotate_variants",
+                    "status": "error",
+                    "message": f"变异注释失败: 单次最多注释 {MAX_ANNOTATION_BATCH:,} 个变异"
+                }
+            
+            annotations = await asyncio.to_thread(self.variant_annotator.annotate_variants, variants)
+            
+            return {
+                "action": "annotate_variants",
+                "annotations": annotations,
+                "count": len(annotations),
+                "status": "success",
+                "message": f"已注释 {len(annotations)} 个变异"
+            }
+            
+        except Exception as e:
+            logger.error(f"Error annotating variants: {e}")
+            return {
+                "action": "annotate_variants",
+                "status": "error",
+                "message": f"变异注释失败: {str(e)}"
             }
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+坐标转换工具
+把旧组装（如 GRCh37 / hg19）的坐标转换到当前会话使用的组装（如 GRCh38 / hg38）
+"""
+
+from typing import Dict, Any, List, Optional, Union
+import asyncio
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from app.genomics.liftover import LiftOver, canonical_assembly, chain_file_name, get_liftover, is_valid_assembly
+
+logger = logging.getLogger(__name__)
+
+# 单次批量转换的区间数量上限
+MAX_LIFTOVER_BATCH = 100_000
+
+
+def format_interval(chromosome: str, start: int, end: int) -> str:
+    """chr1:100-200，单个位置只显示 chr1:100"""
+    return f"{chromosome}:{start}" if start == end else f"{chromosome}:{start}-{end}"
+
+
+class LiftoverTool:
+    """组装间坐标转换工具类"""
+
+    def _error(self, message: str, error_code: str) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "message": message,
+            "error_code": error_code,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    async def _get_liftover(self, source: str, target: str) -> Union[LiftOver, Dict[str, Any]]:
+        """加载 chain 文件（首次解析在线程池中执行），返回 LiftOver 或错误结果"""
+        for name in (source, target):
+            if not is_valid_assembly(name):
+                return self._error(f"Unknown assembly: {name}", "INVALID_ASSEMBLY")
+        if canonical_assembly(source) == canonical_assembly(target):
+            return self._error(f"Source and target assemblies are both {canonical_assembly(source)}", "INVALID_ASSEMBLY")
+        liftover = await asyncio.to_thread(get_liftover, source, target)
+        if liftover is None:
+            return self._error(f"No chain file available for {chain_file_name(source, target)}", "CHAIN_NOT_FOUND")
+        return liftover
+
+    async def liftover(
+        self,
+        chromosome: str,
+        start: int,
+        end: Optional[int] = None,
+        source: str = "hg19",
+        target: str = "hg38"
+    ) -> Dict[str, Any]:
+        """
+        转换单个位置或区间
+
+        Args:
+            chromosome: 源染色体名称 (如 "chr17", "17")
+            start: 起始位置（1-based）
+            end: 结束位置（1-based，闭区间），省略时只转换 start 一个位置
+            source: 源组装名称（hg19 / GRCh37 / hg38 / GRCh38）
+            target: 目标组装名称
+
+        Returns:
+            结果字典，成功时 liftover 字段为 LiftOver.lift_interval 的结果
+        """
+        try:
+            if end is None:
+                end = start
+            if start <= 0 or end < start:
+                return self._error(f"Invalid region {chromosome}:{start}-{end}", "INVALID_RANGE")
+
+            liftover = await self._get_liftover(source, target)
+            if isinstance(liftover, dict):
+                return liftover
+            name = liftover.resolve_chromosome(chromosome)
+            if name is None:
+                return self._error(
+                    f"Chromosome {chromosome} not found in {liftover.source} chain file", "SEQUENCE_NOT_FOUND"
+                )
+
+            result = liftover.lift_interval(name, start, end)
+            query = format_interval(name, start, end)
+            if result["status"] == "unmapped":
+                message = f"{query} ({liftover.source}) has no equivalent in {liftover.target}"
+            else:
+                lifted = ", ".join(
+                    format_interval(s["chromosome"], s["start"], s["end"]) for s in result["segments"]
+                )
+                message = f"Lifted {query} ({liftover.source}) to {lifted} ({liftover.target})"
+
+            return {
+                "status": "success",
+                "message": message,
+                "source": liftover.source,
+                "target": liftover.target,
+                "query": {"chromosome": name, "start": start, "end": end},
+                "liftover": result,
+                "timestamp": datetime.now().isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"Error in liftover: {e}", exc_info=True)
+            return self._error(f"Liftover failed: {str(e)}", "LIFTOVER_ERROR")
+
+    async def liftover_batch(
+        self,
+        regions: List[Dict[str, Any]],
+        source: str = "hg19",
+        target: str = "hg38"
+    ) -> Dict[str, Any]:
+        """
+        批量转换（可跨多条染色体），按染色体分组后每组一次向量化计算
+
+        Args:
+            regions: [{"chromosome", "start", "end"(可选)}]，1-based 闭区间
+            source: 源组装名称
+            target: 目标组装名称
+
+        Returns:
+            结果字典，results 与 regions 顺序一致，每项为查询区间加上 lift_interval 的结果；
+            chain 文件中没有的染色体记为 unmapped
+        """
+        try:
+            if len(regions) > MAX_LIFTOVER_BATCH:
+                return self._error(
+                    f"Too many regions: {len(regions):,} (maximum {MAX_LIFTOVER_BATCH:,})", "BATCH_TOO_LARGE"
+                )
+            for i, region in enumerate(regions):
+                end = region.get("end") or region["start"]
+                if region["start"] <= 0 or end < region["start"]:
+                    return self._error(
+                        f"Invalid region #{i}: {region['chromosome']}:{region['start']}-{end}", "INVALID_RANGE"
+                    )
+
+            liftover = await self._get_liftover(source, target)
+            if isinstance(liftover, dict):
+                return liftover
+
+            def compute() -> List[Dict[str, Any]]:
+                by_chromosome: Dict[str, List[int]] = {}
+                for i, region in enumerate(regions):
+                    by_chromosome.setdefault(region["chromosome"], []).append(i)
+
+                results: List[Optional[Dict[str, Any]]] = [None] * len(regions)
+                for chromosome, indexes in by_chromosome.items():
+                    starts = np.array([regions[i]["start"] for i in indexes], dtype=np.int64)
+                    ends = np.array([regions[i].get("end") or regions[i]["start"] for i in indexes], dtype=np.int64)
+                    lifted = liftover.lift_intervals(chromosome, starts, ends)
+                    for i, start, end, result in zip(indexes, starts.tolist(), ends.tolist(), lifted):
+                        results[i] = {"chromosome": chromosome, "start": start, "end": end, **result}
+                return results
+
+            results = await asyncio.to_thread(compute)
+            counts = {status: 0 for status in ("mapped", "split", "unmapped")}
+            for result in results:
+                counts[result["status"]] += 1
+
+            return {
+                "status": "success",
+                "message": (
+                    f"Lifted {len(results):,} regions from {liftover.source} to {liftover.target}: "
+                    f"{counts['mapped']:,} mapped, {counts['split']:,} split, {counts['unmapped']:,} unmapped"
+                ),
+                "source": liftover.source,
+                "target": liftover.target,
+                "count": len(results),
+                "counts": counts,
+                "results": results,
+                "timestamp": datetime.now().isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"Error in liftover_batch: {e}", exc_info=True)
+            return self._error(f"Liftover failed: {str(e)}", "LIFTOVER_ERROR")
@@ -0,0 +1,150 @@
+"""
+按会话隔离的导航历史
+每个 WebSocket 会话一个固定容量的环形缓冲区，条目为 __slots__ 紧凑对象；
+会话断开时释放，长时间运行下内存只随在线会话数变化，不随导航次数增长
+
+当前会话通过 contextvars 传递：处理 AI 查询时用 navigation_session(session_id) 包住，
+同一任务（及其创建的工具调用任务）中的导航工具自动读写该会话的历史
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 当前请求所属的 WebSocket 会话（无会话时为 None）
+_current_session: ContextVar[Optional[str]] = ContextVar("navigation_session", default=None)
+
+
+class HistoryEntry:
+    """一条导航记录"""
+
+    __slots__ = ("chromosome", "start", "end", "gene_name", "timestamp")
+
+    def __init__(self, chromosome: str, start: int, end: int, gene_name: Optional[str], timestamp: float):
+        self.chromosome = chromosome
+        self.start = start
+        self.end = end
+        self.gene_name = gene_name
+        self.timestamp = timestamp
+
+    def to_dict(self) -> Dict[str, Any]:
+        location = {"chromosome": self.chromosome, "start": self.start, "end": self.end}
+        if self.gene_name:
+            location["gene_name"] = self.gene_name
+        return {
+            "location": location,
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat()
+        }
+
+
+class NavigationHistory:
+    """固定容量的导航历史环形缓冲区，写满后覆盖最旧的记录"""
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: 保留的最大记录数
+        """
+        if capacity <= 0:
+            raise ValueError(f"History capacity must be positive: {capacity}")
+        self.capacity = capacity
+        self._entries: List[Optional[HistoryEntry]] = [None] * capacity
+        self._next = 0
+        self._count = 0
+
+    def record(self, location: Dict[str, Any]):
+        """记录一次导航（navigate_to_location 返回结果中的 location）"""
+        self._entries[self._next] = HistoryEntry(
+            location["chromosome"], location["start"], location["end"], location.get("gene_name"), time.time()
+        )
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        最近的导航记录
+
+        Returns:
+            [{"location", "timestamp"}]，按时间顺序（最新的在最后）
+        """
+        limit = max(0, min(limit, self._count))
+        return [
+            self._entries[(self._next - i) % self.capacity].to_dict()
+            for i in range(limit, 0, -1)
+        ]
+
+    def clear(self):
+        """清空记录"""
+        self._entries = [None] * self.capacity
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class NavigationHistoryStore:
+    """会话 ID -> 导航历史"""
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: 每个会话保留的最大记录数
+        """
+        self.capacity = capacity
+        self._histories: Dict[str, NavigationHistory] = {}
+
+    def history(self, session_id: str) -> NavigationHistory:
+        """获取会话的导航历史（首次使用时创建）"""
+        history = self._histories.get(session_id)
+        if history is None:
+            history = self._histories[session_id] = NavigationHistory(self.capacity)
+        return history
+
+    def release(self, session_id: str):
+        """会话断开时释放其导航历史"""
+        if self._histories.pop(session_id, None) is not None:
+            logger.debug(f"Released navigation history of session {session_id}")
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._histories
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "sessions": len(self._histories),
+            "entries": sum(len(h) for h in self._histories.values()),
+            "capacity_per_session": self.capacity
+        }
+
+
+_store: Optional[NavigationHistoryStore] = None
+
+
+def get_navigation_history_store() -> NavigationHistoryStore:
+    """获取进程内的会话导航历史存储（容量为 NAVIGATION_HISTORY_SIZE）"""
+    global _store
+    if _store is None:
+        from app.core.config import settings
+        _store = NavigationHistoryStore(settings.NAVIGATION_HISTORY_SIZE)
+    return _store
+
+
+def current_session() -> Optional[str]:
+    """当前请求所属的会话 ID"""
+    return _current_session.get()
+
+
+@contextmanager
+def navigation_session(session_id: Optional[str]) -> Iterator[None]:
+    """在该上下文中（包括其中创建的任务）导航工具使用 session_id 的历史"""
+    token = _current_session.set(session_id)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
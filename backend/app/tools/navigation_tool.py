@@ -3,25 +3,107 @@ JBrowse 导航工具
 提供基因组位置导航功能
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import logging
 from datetime import datetime
+import uuid
 
+from app.core.config import settings
+from app.utils.assembly_aliases import get_chromosome_length
 from app.utils.chromosome_normalizer import (
     normalize_chromosome,
     is_valid_chromosome,
     get_chromosome_aliases
 )
+from app.genomics.gene_index import GeneIndex, get_gene_index
+from app.genomics.gene_search import GeneSuggester
+from app.tools.navigation_history import NavigationHistory, current_session, get_navigation_history_store
 
 logger = logging.getLogger(__name__)
 
+# 内置基因表（基因符号 -> 坐标），未构建基因索引时使用
+GENE_DATABASE = {
+    "BRCA1": {
+        "chromosome": "chr17",
+        "start": 43044295,
+        "end": 43125483,
+        "description": "Breast Cancer 1, Early Onset"
+    },
+    "BRCA2": {
+        "chromosome": "chr13",
+        "start": 32315086,
+        "end": 32400266,
+        "description": "Breast Cancer 2, Early Onset"
+    },
+    "TP53": {
+        "chromosome": "chr17",
+        "start": 7661779,
+        "end": 7687550,
+        "description": "Tumor Protein P53"
+    },
+    "EGFR": {
+        "chromosome": "chr7",
+        "start": 55019017,
+        "end": 55211628,
+        "description": "Epidermal Growth Factor Receptor"
+    },
+    "MYC": {
+        "chromosome": "chr8",
+        "start": 127735434,
+        "end": 127742951,
+        "description": "MYC Proto-Oncogene"
+    },
+}
+
+
+def build_navigation_command(location: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    构建发送给前端的导航指令消息
+    
+    Args:
+        location: navigate_to_location 返回结果中的 location 字段
+        
+    Returns:
+        WebSocket 导航指令
+    """
+    return {
+        "type": "navigation",
+        "action": "navigate_to_location",
+        "payload": {
+            "chromosome": location['chromosome'],
+            "chromosome_ucsc": location['chromosome_ucsc'],
+            "chromosome_ensembl": location['chromosome_ensembl'],
+            "start": location['start'],
+            "end": location['end'],
+            "gene_name": location.get('gene_name')
+        },
+        "requestId": str(uuid.uuid4()),
+        "timestamp": datetime.now().isoformat()
+    }
+
 
 class NavigationTool:
     """JBrowse 导航工具类"""
     
-    def __init__(self):
-        """初始化导航工具"""
-        self.navigation_history = []
+    def __init__(self, gene_index: Optional[GeneIndex] = None):
+        """
+        初始化导航工具
+        
+        Args:
+            gene_index: 基因索引，默认加载 GENE_INDEX_PATH 下的索引（不存在时使用内置基因表）
+        """
+        # 不在 WebSocket 会话中调用时使用的历史（同样有界）
+        self._history = NavigationHistory(settings.NAVIGATION_HISTORY_SIZE)
+        self.gene_index = gene_index if gene_index is not None else get_gene_index()
+        self._gene_suggester: Optional[GeneSuggester] = None
+    
+    @property
+    def navigation_history(self) -> NavigationHistory:
+        """当前会话的导航历史，不在会话中时使用本实例自己的历史"""
+        session_id = current_session()
+        if session_id is None:
+            return self._history
+        return get_navigation_history_store().history(session_id)
     
     async def navigate_to_location(
         self,
@@ -29,20 +111,28 @@ class NavigationTool:
         start: int,
         end: Optional[int] = None,
         gene_name: Optional[str] = None,
-        genome_format: str = 'ucsc'
+        genome_format: str = 'ucsc',
+        clamp: Optional[bool] = None,
+        record_history: bool = True
     ) -> Dict[str, Any]:
         """
         导航到指定基因组位置
         
+        染色体长度已知时（组装目录或参考基因组的 .fai / chrom.sizes）先校验坐标：
+        起点超出染色体返回 OUT_OF_BOUNDS 错误，并附带染色体长度和建议的区域，
+        调用方（模型）可以据此在同一轮内修正后重试
+        
         Args:
             chromosome: 染色体名称 (如 "chr1", "1", "X")
             start: 起始位置 (bp)
             end: 结束位置 (bp)，可选，默认为 start + 10000
             gene_name: 基因名称，用于显示，可选
             genome_format: 目标基因组格式 ('ucsc' 或 'ensembl')
+            clamp: 终点超出染色体时是否截断到染色体末端，默认使用 NAVIGATION_CLAMP_TO_CHROMOSOME
+            record_history: 是否记入导航历史（为已记录的导航重新生成指令时传 False）
             
         Returns:
-            导航结果字典，包含状态、消息和位置信息
+            导航结果字典，包含状态、消息和位置信息；截断时 location 中带 clamped_from（原始终点）
         """
         try:
             logger.info(f"Navigating to: {chromosome}:{start}-{end}")
@@ -86,7 +176,21 @@ class NavigationTool:
             # 根据目标格式选择主要染色体名称
             primary_chromosome = chromosome_ucsc if genome_format == 'ucsc' else chromosome_ensembl
             
-            # 6. 构建导航结果
+            # 6. 按染色体长度校验坐标（长度未知时跳过）
+            requested_end = end
+            chromosome_length = get_chromosome_length(chromosome)
+            if chromosome_length is not None:
+                if clamp is None:
+                    clamp = settings.NAVIGATION_CLAMP_TO_CHROMOSOME
+                if start > chromosome_length or (end > chromosome_length and not clamp):
+                    return self._out_of_bounds(primary_chromosome, start, end, chromosome_length)
+                if end > chromosome_length:
+                    end = chromosome_length
+                    if end <= start:
+                        start = max(1, end - 1)
+                    logger.info(f"Clamped navigation end {requested_end} to {primary_chromosome} length {end}")
+            
+            # 7. 构建导航结果
             result = {
                 "status": "success",
                 "message": f"Successfully prepared navigation to {primary_chromosome}:{start}-{end}",
@@ -101,16 +205,21 @@ class NavigationTool:
                 "timestamp": datetime.now().isoformat()
             }
             
-            # 7. 添加基因名称（如果提供）
+            # 8. 添加基因名称（如果提供）
             if gene_name:
                 result["location"]["gene_name"] = gene_name
                 result["message"] = f"Successfully prepared navigation to {gene_name} ({primary_chromosome}:{start}-{end})"
             
-            # 8. 记录导航历史
-            self.navigation_history.append({
-                "location": result["location"],
-                "timestamp": result["timestamp"]
-            })
+            if end != requested_end:
+                result["location"]["clamped_from"] = requested_end
+                result["message"] += (
+                    f" (end {requested_end:,} exceeds {primary_chromosome} length {chromosome_length:,}; "
+                    f"clamped to chromosome end)"
+                )
+            
+            # 9. 记录导航历史
+            if record_history:
+                self.navigation_history.record(result["location"])
             
             logger.info(f"Navigation prepared successfully: {result}")
             return result
@@ -124,10 +233,32 @@ class NavigationTool:
                 "timestamp": datetime.now().isoformat()
             }
     
+    def _out_of_bounds(self, chromosome: str, start: int, end: int, length: int) -> Dict[str, Any]:
+        """
+        坐标超出染色体时的结构化错误：带染色体长度、有效范围和建议区域
+        （保持请求的区域大小并移到染色体末端）
+        """
+        span = min(end - start, length - 1)
+        suggested = {"chromosome": chromosome, "start": length - span, "end": length}
+        return {
+            "status": "error",
+            "message": (
+                f"Position {chromosome}:{start}-{end} is outside the chromosome "
+                f"({chromosome} is {length:,} bp; valid positions are 1-{length}). "
+                f"Suggested region: {chromosome}:{suggested['start']}-{suggested['end']}"
+            ),
+            "error_code": "OUT_OF_BOUNDS",
+            "chromosome_length": length,
+            "valid_range": {"chromosome": chromosome, "start": 1, "end": length},
+            "suggested_location": suggested,
+            "timestamp": datetime.now().isoformat()
+        }
+    
     async def navigate_by_gene(
         self,
         gene_name: str,
-        genome_format: str = 'ucsc'
+        genome_format: str = 'ucsc',
+        record_history: bool = True
     ) -> Dict[str, Any]:
         """
         通过基因名称导航
@@ -135,6 +266,7 @@ class NavigationTool:
         Args:
             gene_name: 基因名称 (如 "BRCA1", "TP53")
             genome_format: 目标基因组格式 ('ucsc' 或 'ensembl')
+            record_history: 是否记入导航历史
             
         Returns:
             导航结果字典
@@ -145,22 +277,40 @@ class NavigationTool:
             # 查询基因信息
             gene_info = await self._query_gene_info(gene_name)
             
+            corrected_from = None
             if gene_info is None:
-                return {
-                    "status": "error",
-                    "message": f"Gene not found: {gene_name}",
-                    "error_code": "GENE_NOT_FOUND",
-                    "timestamp": datetime.now().isoformat()
-                }
+                # 拼写错误或旧名称：唯一的近似匹配直接纠正，否则把候选返回给模型
+                correction = self._find_gene_correction(gene_name)
+                if correction is not None:
+                    gene_info = await self._query_gene_info(correction)
+                if gene_info is None:
+                    suggestions = [s["symbol"] for s in self.suggest_genes(gene_name, limit=5)]
+                    message = f"Gene not found: {gene_name}"
+                    if suggestions:
+                        message += f". Did you mean: {', '.join(suggestions)}?"
+                    return {
+                        "status": "error",
+                        "message": message,
+                        "error_code": "GENE_NOT_FOUND",
+                        "suggestions": suggestions,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                logger.info(f"Corrected gene name {gene_name} -> {correction}")
+                corrected_from, gene_name = gene_name, correction
             
             # 使用基因坐标进行导航
-            return await self.navigate_to_location(
+            result = await self.navigate_to_location(
                 chromosome=gene_info["chromosome"],
                 start=gene_info["start"],
                 end=gene_info["end"],
                 gene_name=gene_name,
-                genome_format=genome_format
+                genome_format=genome_format,
+                record_history=record_history
             )
+            if corrected_from and result["status"] == "success":
+                result["corrected_from"] = corrected_from
+                result["message"] += f" (no gene named {corrected_from}, using closest match {gene_name})"
+            return result
             
         except Exception as e:
             logger.error(f"Error in navigate_by_gene: {e}", exc_info=True)
@@ -181,64 +331,81 @@ class NavigationTool:
         Returns:
             基因信息字典，如果未找到返回 None
         """
-        # TODO: 实现真实的基因数据库查询
-        # 目前使用模拟数据
+        if self.gene_index is not None:
+            gene_info = self.gene_index.lookup(gene_name)
+            if gene_info is not None:
+                return gene_info
+        else:
+            # 大小写不敏感查询
+            gene_upper = gene_name.upper()
+            if gene_upper in GENE_DATABASE:
+                return GENE_DATABASE[gene_upper]
         
-        gene_database = {
-            "BRCA1": {
-                "chromosome": "chr17",
-                "start": 43044295,
-                "end": 43125483,
-                "description": "Breast Cancer 1, Early Onset"
-            },
-            "BRCA2": {
-                "chromosome": "chr13",
-                "start": 32315086,
-                "end": 32400266,
-                "description": "Breast Cancer 2, Early Onset"
-            },
-            "TP53": {
-                "chromosome": "chr17",
-                "start": 7661779,
-                "end": 7687550,
-                "description": "Tumor Protein P53"
-            },
-            "EGFR": {
-                "chromosome": "chr7",
-                "start": 55019017,
-                "end": 55211628,
-                "description": "Epidermal Growth Factor Receptor"
-            },
-            "MYC": {
-                "chromosome": "chr8",
-                "start": 127735434,
-                "end": 127742951,
-                "description": "MYC Proto-Oncogene"
-            },
-        }
+        logger.warning(f"Gene not found in database: {gene_name}")
+        return None
+    
+    def is_known_gene(self, gene_name: str) -> bool:
+        """
+        判断基因名称是否存在于基因数据源中
         
-        # 大小写不敏感查询
-        gene_upper = gene_name.upper()
+        Args:
+            gene_name: 基因名称
+            
+        Returns:
+            是否存在
+        """
+        if self.gene_index is not None:
+            return gene_name in self.gene_index
+        return gene_name.upper() in GENE_DATABASE
+    
+    @property
+    def gene_suggester(self) -> GeneSuggester:
+        """基因名称补全 / 模糊匹配器（首次使用时构建）"""
+        if self._gene_suggester is None:
+            if self.gene_index is not None:
+                self._gene_suggester = self.gene_index.get_suggester()
+            else:
+                self._gene_suggester = GeneSuggester.from_symbols(list(GENE_DATABASE))
+        return self._gene_suggester
+    
+    def suggest_genes(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        基因名称建议（前缀补全 + 模糊匹配）
         
-        if gene_upper in gene_database:
-            return gene_database[gene_upper]
+        Args:
+            query: 用户输入的（部分）基因名称
+            limit: 最多返回的建议数量
+            
+        Returns:
+            建议列表，每项包含 symbol、matched、match_type、key_type、distance
+        """
+        return self.gene_suggester.suggest(query, limit)
+    
+    def _find_gene_correction(self, gene_name: str) -> Optional[str]:
+        """
+        查找拼写纠正：只有编辑距离为 1 的唯一匹配才会被自动采用
         
-        logger.warning(f"Gene not found in database: {gene_name}")
+        Returns:
+            纠正后的基因符号，没有可靠的纠正时返回 None
+        """
+        matches = self.gene_suggester.fuzzy(gene_name, max_distance=1, limit=2)
+        if len(matches) == 1:
+            return matches[0]["symbol"]
         return None
     
     def get_navigation_history(self, limit: int = 10) -> list:
         """
-        获取导航历史
+        获取当前会话的导航历史
         
         Args:
             limit: 返回的历史记录数量限制
             
         Returns:
-            导航历史列表
+            导航历史列表 [{"location", "timestamp"}]，最新的在最后
         """
-        return self.navigation_history[-limit:]
+        return self.navigation_history.recent(limit)
     
     def clear_navigation_history(self):
-        """清空导航历史"""
+        """清空当前会话的导航历史"""
         self.navigation_history.clear()
         logger.info("Navigation history cleared")
@@ -0,0 +1,165 @@
+"""
+参考序列工具
+从索引 FASTA 中读取指定区域的序列，计算 GC 含量、CpG 等组成统计
+"""
+
+from typing import Dict, Any, Optional, Tuple, Union
+import asyncio
+import logging
+import math
+from datetime import datetime
+
+from app.genomics.fasta import IndexedFasta, get_reference_fasta
+from app.genomics.sequence_stats import sequence_stats
+
+logger = logging.getLogger(__name__)
+
+# 单次最多读取的序列长度（bp）
+MAX_SEQUENCE_LENGTH = 10_000_000
+
+# 组成统计默认的窗口数量和窗口数量上限
+DEFAULT_STATS_WINDOWS = 100
+MAX_STATS_WINDOWS = 4000
+
+
+class SequenceTool:
+    """参考序列读取工具类"""
+
+    def __init__(self, fasta: Optional[IndexedFasta] = None):
+        """
+        Args:
+            fasta: 索引 FASTA，默认打开 REFERENCE_FASTA_PATH
+        """
+        self.fasta = fasta if fasta is not None else get_reference_fasta()
+
+    def _error(self, message: str, error_code: str) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "message": message,
+            "error_code": error_code,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def _resolve_region(self, chromosome: str, start: int, end: int) -> Union[Tuple[str, int], Dict[str, Any]]:
+        """校验区域，返回 (序列名, 截断后的 end) 或错误结果"""
+        if self.fasta is None:
+            return self._error("No reference FASTA configured", "REFERENCE_NOT_CONFIGURED")
+
+        name = self.fasta.resolve_chromosome(chromosome)
+        if name is None:
+            return self._error(f"Chromosome {chromosome} not found in reference", "SEQUENCE_NOT_FOUND")
+
+        length = self.fasta.entries[name].length
+        if start <= 0 or end < start or start > length:
+            return self._error(
+                f"Invalid region {name}:{start}-{end} (chromosome length {length:,} bp)",
+                "INVALID_RANGE"
+            )
+        end = min(end, length)
+        if end - start + 1 > MAX_SEQUENCE_LENGTH:
+            return self._error(
+                f"Region too large: {end - start + 1:,} bp (maximum {MAX_SEQUENCE_LENGTH:,} bp)",
+                "REGION_TOO_LARGE"
+            )
+        return name, end
+
+    async def get_sequence(self, chromosome: str, start: int, end: int) -> Dict[str, Any]:
+        """
+        读取参考序列
+
+        Args:
+            chromosome: 染色体名称 (如 "chr1", "1", "X")
+            start: 起始位置（1-based，闭区间）
+            end: 结束位置（1-based，闭区间），超出染色体长度时截断
+
+        Returns:
+            结果字典，成功时包含 sequence 和实际读取的 location
+        """
+        try:
+            region = self._resolve_region(chromosome, start, end)
+            if isinstance(region, dict):
+                return region
+            name, end = region
+
+            # bgzip FASTA 可能需要解压，放到线程池中执行
+            sequence = await asyncio.to_thread(self.fasta.fetch, name, start, end)
+
+            return {
+                "status": "success",
+                "message": f"Retrieved {len(sequence):,} bp from {name}:{start}-{end}",
+                "sequence": sequence,
+                "location": {
+                    "chromosome": name,
+                    "start": start,
+                    "end": end,
+                    "length": len(sequence)
+                },
+                "timestamp": datetime.now().isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"Error in get_sequence: {e}", exc_info=True)
+            return self._error(f"Failed to read sequence: {str(e)}", "SEQUENCE_ERROR")
+
+    async def get_sequence_stats(
+        self,
+        chromosome: str,
+        start: int,
+        end: int,
+        window_size: Optional[int] = None,
+        step: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        计算区域的序列组成统计（GC 含量、CpG 观测/期望比、N 缺口、滑动窗口曲线）
+
+        Args:
+            chromosome: 染色体名称 (如 "chr1", "1", "X")
+            start: 起始位置（1-based，闭区间）
+            end: 结束位置（1-based，闭区间），超出染色体长度时截断
+            window_size: 滑动窗口大小（bp），默认把区域分为 DEFAULT_STATS_WINDOWS 个窗口
+            step: 窗口步长（bp），默认等于 window_size
+
+        Returns:
+            结果字典，成功时 stats 字段包含统计结果
+        """
+        try:
+            region = self._resolve_region(chromosome, start, end)
+            if isinstance(region, dict):
+                return region
+            name, end = region
+
+            length = end - start + 1
+            if window_size is None:
+                window_size = math.ceil(length / DEFAULT_STATS_WINDOWS)
+            step = step or window_size
+            if window_size <= 0 or step <= 0:
+                return self._error("Window size and step must be positive", "INVALID_RANGE")
+            if math.ceil(length / step) > MAX_STATS_WINDOWS:
+                return self._error(
+                    f"Too many windows: step {step:,} bp over {length:,} bp (maximum {MAX_STATS_WINDOWS:,} windows)",
+                    "INVALID_RANGE"
+                )
+
+            def compute() -> Dict[str, Any]:
+                sequence = self.fasta.fetch_bytes(name, start, end)
+                return sequence_stats(sequence, start, window_size, step)
+
+            stats = await asyncio.to_thread(compute)
+            gc_text = f"{stats['gc_fraction']:.1%}" if stats["gc_fraction"] is not None else "n/a"
+
+            return {
+                "status": "success",
+                "message": f"GC {gc_text} over {name}:{start}-{end} ({length:,} bp)",
+                "stats": stats,
+                "location": {
+                    "chromosome": name,
+                    "start": start,
+                    "end": end,
+                    "length": length
+                },
+                "timestamp": datetime.now().isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"Error in get_sequence_stats: {e}", exc_info=True)
+            return self._error(f"Failed to compute sequence statistics: {str(e)}", "SEQUENCE_ERROR")
@@ -0,0 +1,246 @@
+"""
+基因组组装的染色体别名表
+从组装目录中的别名文件和序列列表加载每个组装自己的命名：
+- aliases.txt / chromAlias.txt: JBrowse RefNameAliasAdapter 或 UCSC chromAlias 格式，
+  每行是同一条序列的各种名称（制表符分隔，# 开头为注释）
+- *.fai / *.chrom.sizes: 组装实际使用的序列名称和长度（导航时用于坐标校验）
+
+别名表以字典形式常驻内存，任意数量的 contig 查找都是 O(1)。
+解析结果另存为 .alias_cache.json，同一组装目录下的其他 worker 进程直接加载，
+源文件变化（大小或修改时间不同）时自动重建
+
+目录结构:
+    data/jbrowse/assemblies/hg38/
+        aliases.txt
+        hg38.fa.fai
+"""
+
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+ALIAS_CACHE_VERSION = 1
+ALIAS_CACHE_FILE = ".alias_cache.json"
+
+
+def _source_files(directory: str) -> Tuple[List[str], List[str]]:
+    """组装目录中的 (别名文件, 序列列表文件)"""
+    alias_files, size_files = [], []
+    for filename in sorted(os.listdir(directory)):
+        lower = filename.lower()
+        if lower.endswith(".fai") or lower.endswith("chrom.sizes"):
+            size_files.append(filename)
+        elif lower.endswith(".txt") and "alias" in lower:
+            alias_files.append(filename)
+    return alias_files, size_files
+
+
+def _read_rows(path: str) -> Iterable[List[str]]:
+    """按行读取制表符分隔的文件，跳过注释和空行"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            yield [field.strip() for field in line.rstrip("\r\n").split("\t") if field.strip()]
+
+
+def parse_assembly_directory(directory: str) -> Dict[str, Any]:
+    """
+    解析组装目录
+
+    Returns:
+        {"lengths": {序列名: 长度}, "rows": [[标准名称, 别名...]]}；
+        标准名称优先取序列列表（.fai / chrom.sizes）中的名称，否则取别名行的第一列
+    """
+    alias_files, size_files = _source_files(directory)
+
+    lengths: Dict[str, int] = {}
+    for filename in size_files:
+        for fields in _read_rows(os.path.join(directory, filename)):
+            if len(fields) >= 2:
+                lengths.setdefault(fields[0], int(fields[1]))
+
+    rows: List[List[str]] = []
+    seen = set()
+    for filename in alias_files:
+        for fields in _read_rows(os.path.join(directory, filename)):
+            canonical = next((name for name in fields if name in lengths), fields[0])
+            rows.append([canonical] + [name for name in fields if name != canonical])
+            seen.add(canonical)
+    # 没有别名行的序列也要能识别
+    rows.extend([name] for name in lengths if name not in seen)
+
+    return {"lengths": lengths, "rows": rows}
+
+
+def _source_identity(directory: str) -> Dict[str, List[int]]:
+    """源文件的 (大小, 修改时间)，用于判断缓存是否过期"""
+    alias_files, size_files = _source_files(directory)
+    identity = {}
+    for filename in alias_files + size_files:
+        st = os.stat(os.path.join(directory, filename))
+        identity[filename] = [st.st_size, st.st_mtime_ns]
+    return identity
+
+
+def load_assembly_directory(directory: str) -> Dict[str, Any]:
+    """
+    加载组装目录（优先使用未过期的解析缓存，缓存缺失或过期时解析后写回）
+
+    Returns:
+        parse_assembly_directory 的结果
+    """
+    sources = _source_identity(directory)
+    cache_path = os.path.join(directory, ALIAS_CACHE_FILE)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("version") == ALIAS_CACHE_VERSION and cached.get("sources") == sources:
+            return cached["table"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    table = parse_assembly_directory(directory)
+    # 先写临时文件再原子替换，并发启动的 worker 不会读到写了一半的缓存
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": ALIAS_CACHE_VERSION, "sources": sources, "table": table}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Failed to write alias cache {cache_path}: {e}")
+    return table
+
+
+class AssemblyAliases:
+    """单个组装的染色体别名表"""
+
+    def __init__(self, name: str, lengths: Dict[str, int], rows: List[List[str]]):
+        """
+        Args:
+            name: 组装名称（如 "hg38"）
+            lengths: 序列名 -> 长度（来自 .fai / chrom.sizes，可为空）
+            rows: [[标准名称, 别名...]]
+        """
+        self.name = name
+        self.lengths = lengths
+        self._aliases: Dict[str, List[str]] = {}
+        # 精确名称和大小写折叠后的名称 -> 标准名称；同一别名出现在多行时保留第一个
+        self._exact: Dict[str, str] = {}
+        self._folded: Dict[str, str] = {}
+        for row in rows:
+            canonical = row[0]
+            self._aliases.setdefault(canonical, [])
+            for alias in row:
+                if alias not in self._aliases[canonical]:
+                    self._aliases[canonical].append(alias)
+                self._exact.setdefault(alias, canonical)
+                self._folded.setdefault(alias.casefold(), canonical)
+
+    @classmethod
+    def from_directory(cls, directory: str, name: Optional[str] = None) -> "AssemblyAliases":
+        """从组装目录加载，组装名称默认取目录名"""
+        table = load_assembly_directory(directory)
+        return cls(name or os.path.basename(os.path.normpath(directory)), table["lengths"], table["rows"])
+
+    def resolve(self, chromosome: str) -> Optional[str]:
+        """
+        输入名称 -> 组装的标准序列名称，O(1)
+
+        依次尝试：原样、去空格并折叠大小写、添加或去掉 chr 前缀
+        """
+        canonical = self._exact.get(chromosome)
+        if canonical is not None:
+            return canonical
+        folded = chromosome.strip().casefold()
+        canonical = self._folded.get(folded)
+        if canonical is None:
+            canonical = self._folded.get(folded[3:] if folded.startswith("chr") else "chr" + folded)
+        return canonical
+
+    def aliases(self, chromosome: str) -> List[str]:
+        """序列的所有名称（标准名称在前），不认识的名称返回空列表"""
+        canonical = self.resolve(chromosome)
+        return self._aliases[canonical] if canonical is not None else []
+
+    def get_length(self, chromosome: str) -> Optional[int]:
+        """序列长度，序列不存在或没有长度信息时返回 None"""
+        canonical = self.resolve(chromosome)
+        return self.lengths.get(canonical) if canonical is not None else None
+
+    def __contains__(self, chromosome: str) -> bool:
+        return self.resolve(chromosome) is not None
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取别名表统计信息"""
+        return {
+            "assembly": self.name,
+            "sequences": len(self._aliases),
+            "aliases": len(self._exact),
+            "with_lengths": len(self.lengths)
+        }
+
+
+# 已加载的别名表（组装目录 -> AssemblyAliases），每个进程每个组装只加载一次
+_loaded_assemblies: Dict[str, Optional[AssemblyAliases]] = {}
+
+
+def get_assembly_aliases(assembly: Optional[str] = None) -> Optional[AssemblyAliases]:
+    """
+    获取（并缓存）组装的别名表
+
+    Args:
+        assembly: 组装名称，默认使用配置中的 DEFAULT_ASSEMBLY；
+            别名文件位于 ASSEMBLY_DATA_PATH/<组装名称>/
+
+    Returns:
+        AssemblyAliases，组装目录不存在或无法加载时返回 None
+    """
+    from app.core.config import settings
+    if assembly is None:
+        assembly = settings.DEFAULT_ASSEMBLY
+    directory = os.path.join(settings.ASSEMBLY_DATA_PATH, assembly) if assembly else ""
+
+    if directory not in _loaded_assemblies:
+        aliases = None
+        if directory and os.path.isdir(directory):
+            try:
+                aliases = AssemblyAliases.from_directory(directory, assembly)
+                logger.info(f"Loaded chromosome aliases for {assembly}: {aliases.get_stats()}")
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to load chromosome aliases from {directory}: {e}")
+        _loaded_assemblies[directory] = aliases
+
+    return _loaded_assemblies[directory]
+
+
+def get_chromosome_length(chromosome: str, assembly: Optional[str] = None) -> Optional[int]:
+    """
+    染色体长度：优先取组装目录中的 .fai / chrom.sizes，
+    默认组装没有长度信息时再取参考基因组 FASTA（REFERENCE_FASTA_PATH）的 .fai
+
+    Returns:
+        长度（bp），无法确定时返回 None
+    """
+    from app.utils.chromosome_normalizer import match_chromosome
+
+    aliases = get_assembly_aliases(assembly)
+    if aliases is not None and aliases.lengths:
+        # 经标准化和别名匹配（如 MT -> chrM），与数据文件的染色体匹配方式一致
+        name = match_chromosome(chromosome, aliases.lengths, assembly)
+        if name is not None:
+            return aliases.lengths[name]
+
+    from app.core.config import settings
+    if assembly is None or assembly == settings.DEFAULT_ASSEMBLY:
+        from app.genomics.fasta import get_reference_fasta
+        fasta = get_reference_fasta()
+        if fasta is not None:
+            return fasta.get_length(chromosome)
+    return None
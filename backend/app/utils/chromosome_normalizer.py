@@ -1,10 +1,13 @@
 """
 染色体名称标准化工具
-处理不同的染色体命名约定（chr1 vs 1）
+处理不同的染色体命名约定（chr1 vs 1）；标准人类染色体之外的名称
+（scaffold、alt contig、RefSeq 编号等）按组装的别名表识别
 """
 
-import re
-from typing import Literal, List, Optional
+from functools import lru_cache
+from typing import Collection, Dict, Iterable, Literal, List, Optional, Union
+
+import numpy as np
 
 # 染色体别名映射
 CHROMOSOME_ALIASES = {
@@ -42,9 +45,49 @@ CHROMOSOME_ALIASES = {
 }
 
 
+# 预计算的查找表（导入时构建一次）：大写别名 -> CHROMOSOME_ALIASES 的键；
+# 同一别名出现在多个键下时保留第一个（与按顺序扫描的结果一致）
+_ALIAS_KEYS: Dict[str, str] = {}
+for _key, _aliases in CHROMOSOME_ALIASES.items():
+    for _alias in _aliases:
+        _ALIAS_KEYS.setdefault(_alias.upper(), _key)
+
+# 键 -> 各格式的标准名称
+_CANONICAL_NAMES: Dict[str, Dict[str, str]] = {
+    key: {
+        'ucsc': 'chrM' if key in ('M', 'MT') else f'chr{key}',
+        'ensembl': 'MT' if key == 'M' else key,
+    }
+    for key in CHROMOSOME_ALIASES
+}
+
+# 记忆化的输入名称数量上限（scaffold 很多的组装也够用）
+_MEMO_SIZE = 65536
+
+
+@lru_cache(maxsize=_MEMO_SIZE)
+def _alias_key(chromosome: str) -> Optional[str]:
+    """输入名称 -> CHROMOSOME_ALIASES 的键，不是标准染色体时返回 None"""
+    cleaned = chromosome.strip().upper()
+    key = _ALIAS_KEYS.get(cleaned)
+    if key is None and cleaned.startswith('CHR'):
+        # 移除 chr 前缀再查找
+        key = _ALIAS_KEYS.get(cleaned[3:])
+    return key
+
+
+def _assembly_canonical(chromosome: str, assembly: Optional[str]) -> Optional[str]:
+    """组装别名表中的标准名称，未配置组装或不认识该名称时返回 None"""
+    from app.utils.assembly_aliases import get_assembly_aliases
+    
+    aliases = get_assembly_aliases(assembly)
+    return aliases.resolve(chromosome) if aliases is not None else None
+
+
 def normalize_chromosome(
     chromosome: str,
-    format: Literal['ucsc', 'ensembl'] = 'ucsc'
+    format: Literal['ucsc', 'ensembl'] = 'ucsc',
+    assembly: Optional[str] = None
 ) -> str:
     """
     标准化染色体名称
@@ -52,77 +95,100 @@ def normalize_chromosome(
     Args:
         chromosome: 输入的染色体名称
         format: 目标格式 ('ucsc' = 带chr前缀, 'ensembl' = 不带chr前缀)
+        assembly: 组装名称，默认使用 DEFAULT_ASSEMBLY 的别名表
     
     Returns:
         标准化后的染色体名称
     """
-    # 移除空格并转大写
-    cleaned = chromosome.strip().upper()
+    key = _alias_key(chromosome)
+    if key is None:
+        canonical = _assembly_canonical(chromosome, assembly)
+        if canonical is None:
+            # 如果没找到，返回原始输入（可能是非标准染色体）
+            return chromosome
+        key = _alias_key(canonical)
+        if key is None:
+            # 组装特有的序列（scaffold、alt contig 等）使用组装自己的命名
+            return canonical
+    
+    # UCSC 格式: chr1, chr2, chrX, chrM；Ensembl 格式: 1, 2, X, MT
+    return _CANONICAL_NAMES[key]['ucsc' if format == 'ucsc' else 'ensembl']
+
+
+def normalize_many(
+    chromosomes: Union[Iterable[str], np.ndarray],
+    format: Literal['ucsc', 'ensembl'] = 'ucsc',
+    assembly: Optional[str] = None
+) -> Union[List[str], np.ndarray]:
+    """
+    批量标准化染色体名称（如 VCF/BED 的整列染色体名称）
+    
+    每个不同的名称只标准化一次（局部字典缓存）；NumPy 数组先向量化找出相邻相同名称的连续段，
+    只标准化每段的第一个名称再用 np.repeat 展开，按坐标排序的 VCF/BED 整列只需处理几十个段
+    
+    Args:
+        chromosomes: 染色体名称序列，或 str / bytes / object 类型的 NumPy 数组
+        format: 目标格式
+        assembly: 组装名称，默认使用 DEFAULT_ASSEMBLY 的别名表
+    
+    Returns:
+        输入为 NumPy 数组时返回同形状的 str 数组，否则返回列表
+    """
+    normalized: Dict[str, str] = {}
+    
+    def normalize(name) -> str:
+        if name not in normalized:
+            text = name.decode('utf-8') if isinstance(name, bytes) else str(name)
+            normalized[name] = normalize_chromosome(text, format, assembly)
+        return normalized[name]
+    
+    if isinstance(chromosomes, np.ndarray):
+        flat = chromosomes.ravel()
+        if flat.size == 0:
+            return chromosomes.astype(str)
+        run_starts = np.flatnonzero(np.concatenate(([True], flat[1:] != flat[:-1])))
+        run_lengths = np.diff(np.append(run_starts, flat.size))
+        names = np.array([normalize(name) for name in flat[run_starts].tolist()])
+        return np.repeat(names, run_lengths).reshape(chromosomes.shape)
     
-    # 移除 chr 前缀用于查找
-    without_chr = re.sub(r'^CHR', '', cleaned, flags=re.IGNORECASE)
-    
-    # 在别名映射中查找
-    for key, aliases in CHROMOSOME_ALIASES.items():
-        aliases_upper = [a.upper() for a in aliases]
-        if cleaned in aliases_upper or without_chr in aliases_upper:
-            # 根据目标格式返回
-            if format == 'ucsc':
-                # UCSC 格式: chr1, chr2, chrX, chrM
-                if key in ('M', 'MT'):
-                    return 'chrM'
-                return f'chr{key}'
-            else:
-                # Ensembl 格式: 1, 2, X, MT
-                if key == 'M':
-                    return 'MT'
-                return key
-    
-    # 如果没找到，返回原始输入（可能是非标准染色体）
-    return chromosome
-
-
-def is_valid_chromosome(chromosome: str) -> bool:
+    return [normalize(name) for name in chromosomes]
+
+
+def is_valid_chromosome(chromosome: str, assembly: Optional[str] = None) -> bool:
     """
     验证染色体名称是否有效
     
     Args:
         chromosome: 染色体名称
+        assembly: 组装名称，默认使用 DEFAULT_ASSEMBLY 的别名表
     
     Returns:
         是否有效
     """
-    cleaned = chromosome.strip().upper()
-    without_chr = re.sub(r'^CHR', '', cleaned, flags=re.IGNORECASE)
-    
-    # 检查是否在别名映射中
-    for aliases in CHROMOSOME_ALIASES.values():
-        aliases_upper = [a.upper() for a in aliases]
-        if cleaned in aliases_upper or without_chr in aliases_upper:
-            return True
-    
-    return False
+    return _alias_key(chromosome) is not None or _assembly_canonical(chromosome, assembly) is not None
 
 
-def get_chromosome_aliases(chromosome: str) -> List[str]:
+def get_chromosome_aliases(chromosome: str, assembly: Optional[str] = None) -> List[str]:
     """
     获取染色体的所有别名
     
     Args:
         chromosome: 染色体名称
+        assembly: 组装名称，默认使用 DEFAULT_ASSEMBLY 的别名表
     
     Returns:
-        所有别名数组
+        所有别名数组（标准别名在前，其后是组装别名表中的其他名称）
     """
-    cleaned = chromosome.strip().upper()
-    without_chr = re.sub(r'^CHR', '', cleaned, flags=re.IGNORECASE)
+    from app.utils.assembly_aliases import get_assembly_aliases
     
-    for aliases in CHROMOSOME_ALIASES.values():
-        aliases_upper = [a.upper() for a in aliases]
-        if cleaned in aliases_upper or without_chr in aliases_upper:
-            return aliases
-    
-    return [chromosome]
+    key = _alias_key(chromosome)
+    assembly_aliases = get_assembly_aliases(assembly)
+    extra = assembly_aliases.aliases(chromosome) if assembly_aliases is not None else []
+    if key is None:
+        return extra or [chromosome]
+    if not extra:
+        return CHROMOSOME_ALIASES[key]
+    return CHROMOSOME_ALIASES[key] + [a for a in extra if a not in CHROMOSOME_ALIASES[key]]
 
 
 def detect_chromosome_format(chromosome: str) -> Literal['ucsc', 'ensembl']:
@@ -160,3 +226,35 @@ def smart_normalize_chromosome(
         target_format = detect_chromosome_format(chromosome)
     
     return normalize_chromosome(chromosome, target_format)
+
+
+def match_chromosome(
+    chromosome: str,
+    available: Collection[str],
+    assembly: Optional[str] = None
+) -> Optional[str]:
+    """
+    在数据文件的染色体集合中查找与输入名称对应的名称
+    （数据文件可能使用 chr1、1 或组装别名表中的其他命名，如 NC_000017.11）
+    
+    Args:
+        chromosome: 输入的染色体名称
+        available: 数据文件中的染色体名称集合
+        assembly: 组装名称，默认使用 DEFAULT_ASSEMBLY 的别名表
+    
+    Returns:
+        数据文件中的染色体名称，不存在时返回 None
+    """
+    if chromosome in available:
+        return chromosome
+    
+    candidates = [
+        normalize_chromosome(chromosome, 'ucsc', assembly),
+        normalize_chromosome(chromosome, 'ensembl', assembly)
+    ]
+    candidates.extend(get_chromosome_aliases(chromosome, assembly))
+    for candidate in candidates:
+        if candidate in available:
+            return candidate
+    
+    return None
@@ -0,0 +1,219 @@
+"""
+测试 AI 服务的流式输出（chunk_callback）、工具超时和工具结果状态
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+import httpx
+from langchain.tools import tool
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from app.core.config import settings
+from app.services.ai_service import AIService
+from app.tools.jbrowse_langchain_tools import RETRY_HINT
+from app.services.llm_client_pool import PooledLLMClient
+
+MODEL_CONFIG = {"apiBaseUrl": "https://api.example.com/v1", "apiKey": "sk-fake", "modelName": "gpt-4"}
+
+
+class FakeLLM:
+    """按给定文本块流式返回的假模型"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.stream_calls = 0
+        self.invoke_calls = 0
+
+    async def astream(self, messages):
+        self.stream_calls += 1
+        for text in self.chunks:
+            await asyncio.sleep(0)
+            yield AIMessageChunk(content=text)
+
+    async def ainvoke(self, messages):
+        self.invoke_calls += 1
+        return AIMessage(content="".join(self.chunks))
+
+
+slow_tool_cancelled = []
+
+
+@tool
+async def slow_lookup(query: str) -> str:
+    """Look something up slowly."""
+    try:
+        await asyncio.sleep(60)
+        return f"slow result for {query}"
+    except asyncio.CancelledError:
+        slow_tool_cancelled.append(query)
+        raise
+
+
+@tool
+async def quick_lookup(query: str) -> str:
+    """Look something up quickly."""
+    await asyncio.sleep(0.01)
+    return f"quick result for {query}"
+
+
+def make_service(llm: FakeLLM) -> AIService:
+    """连接池返回假模型的 AI 服务（关闭响应缓存）"""
+    service = AIService()
+    service.response_cache = None
+    service.client_pool._create_client = lambda key, *args: PooledLLMClient(key, llm, llm, httpx.AsyncClient())
+    return service
+
+
+async def test_streaming():
+    """生成的文本通过 chunk_callback 逐块推送"""
+    print("\n" + "="*60)
+    print("测试 1: 流式推送")
+    print("="*60)
+
+    chunks = ["SNP ", "is a ", "single-nucleotide ", "", "polymorphism."]
+    llm = FakeLLM(chunks)
+    service = make_service(llm)
+
+    received = []
+
+    async def on_chunk(text: str):
+        received.append(text)
+
+    message = await service._invoke_llm(llm, [], on_chunk)
+    assert received == [c for c in chunks if c], "Empty chunks are not pushed"
+    assert message.content == "".join(chunks)
+    print(f"✅ PASSED: _invoke_llm pushed {len(received)} chunks and merged the message")
+
+    received.clear()
+    result = await service.process_query("What is a SNP?", MODEL_CONFIG, on_chunk=on_chunk)
+    assert "error" not in result, result
+    assert "".join(received) == result["content"] == "".join(chunks)
+    assert llm.stream_calls == 2 and llm.invoke_calls == 0, "on_chunk switches the LLM call to astream"
+    assert result["timing"]["time_to_first_token_ms"] is not None
+    print(f"✅ PASSED: process_query streamed the answer (first token after {result['timing']['time_to_first_token_ms']} ms)")
+
+    result = await service.process_query("What is a SNP?", MODEL_CONFIG)
+    assert result["content"] == "".join(chunks) and result["timing"]["time_to_first_token_ms"] is None
+    assert llm.invoke_calls == 1, "Without on_chunk the LLM is invoked once"
+    print("✅ PASSED: no callback, no streaming")
+
+    received.clear()
+    result = await service.process_query("什么是基因组学?", {**MODEL_CONFIG, "apiKey": "test-key"}, on_chunk=on_chunk)
+    assert len(received) > 1 and "".join(received) == result["content"]
+    print(f"✅ PASSED: test mode streamed {len(received)} lines")
+
+    await service.aclose()
+
+
+async def test_tool_timeouts():
+    """TOOL_TIMEOUTS 中的单个工具超时不影响同一轮的其他工具"""
+    print("\n" + "="*60)
+    print("测试 2: 工具超时")
+    print("="*60)
+
+    service = AIService()
+    service.tools = [slow_lookup, quick_lookup]
+    original = settings.TOOL_TIMEOUTS
+    settings.TOOL_TIMEOUTS = {"slow_lookup": 0.05}
+    try:
+        results = await service._execute_tool_calls([
+            {"name": "slow_lookup", "args": {"query": "a"}},
+            {"name": "quick_lookup", "args": {"query": "b"}},
+            {"name": "missing_tool", "args": {}},
+        ])
+    finally:
+        settings.TOOL_TIMEOUTS = original
+
+    assert [r["tool"] for r in results] == ["slow_lookup", "quick_lookup", "missing_tool"], "Results keep call order"
+    assert [r["status"] for r in results] == ["error", "success", "error"]
+    assert results[0]["result"] == "Error executing tool: timed out after 0.05s", results[0]
+    assert slow_tool_cancelled == ["a"], "Timed-out tool is cancelled"
+    assert results[1]["result"] == "quick result for b"
+    assert results[2]["result"] == "Error: Tool 'missing_tool' not found"
+    print(f"✅ PASSED: {results[0]['result']}; the other tools completed")
+
+    await service.aclose()
+
+
+async def test_tool_status():
+    """工具失败通过结构化状态识别，只有导航类工具的成功结果直接作为回复"""
+    print("\n" + "="*60)
+    print("测试 3: 工具状态与模板化回复")
+    print("="*60)
+
+    service = AIService()
+    results = await service._execute_tool_calls([
+        {"name": "navigate_to_gene", "args": {"gene_name": "TP53"}, "id": "call-1"},
+        {"name": "navigate_to_gene", "args": {"gene_name": "NOTAGENE1"}, "id": "call-2"},
+        {"name": "navigate_jbrowse", "args": {"chromosome": "chrZZ", "start": 100}},
+    ])
+    assert [r["status"] for r in results] == ["success", "error", "error"], results
+    assert results[1]["result"] == "Gene navigation failed: Gene not found: NOTAGENE1"
+    print("✅ PASSED: ToolException surfaces as status 'error'")
+
+    retry = {"tool": "navigate_jbrowse", "args": {}, "status": "error",
+             "result": f"Navigation failed: start is past the chromosome end. {RETRY_HINT}navigate_jbrowse(...)"}
+    assert service._is_retryable(retry) and not service._is_retryable(results[1])
+    assert not service._is_retryable({**retry, "status": "success"})
+
+    # 成功文本中出现 "error" 不影响判断
+    history = {"tool": "get_navigation_history", "args": {}, "status": "success",
+               "result": "1. chr1:1-100 (error-prone region) at 2024-01-01T00:00:00"}
+    assert service._can_template_response([results[0], history])
+    assert not service._can_template_response([results[0], results[1]]), "Failures go to the LLM"
+    for tool_name in ("get_coverage", "get_sequence", "get_sequence_stats", "liftover_coordinates"):
+        narrated = {"tool": tool_name, "args": {}, "result": "ok", "status": "success"}
+        assert not service._can_template_response([narrated]), f"{tool_name} is narrated by the LLM"
+    print("✅ PASSED: only successful navigation tools are templated")
+
+    class RecordingWebSocket:
+        def __init__(self):
+            self.sent = []
+
+        async def send_text(self, message: str):
+            self.sent.append(message)
+
+    websocket = RecordingWebSocket()
+    for tr in results[:3]:
+        await service._send_navigation_command(websocket, tr)
+    assert len(websocket.sent) == 1 and "TP53" in websocket.sent[0], websocket.sent
+    print("✅ PASSED: navigation commands sent only for successful tool calls")
+
+    await service.aclose()
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("AI 服务测试套件")
+    print("🧪"*30)
+
+    try:
+        await test_streaming()
+        await test_tool_timeouts()
+        await test_tool_status()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
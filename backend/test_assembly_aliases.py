@@ -0,0 +1,155 @@
+"""
+测试组装别名表（chromAlias / refNameAliases + .fai）
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.core.config import settings
+from app.tools.navigation_tool import NavigationTool
+from app.utils.assembly_aliases import ALIAS_CACHE_FILE, AssemblyAliases, get_assembly_aliases
+from app.utils.chromosome_normalizer import (
+    get_chromosome_aliases,
+    is_valid_chromosome,
+    match_chromosome,
+    normalize_chromosome,
+    normalize_many,
+)
+
+# UCSC chromAlias.txt：第一列是 UCSC 名称
+CHROM_ALIAS = """# ucsc\tassembly\tgenbank\trefseq
+chr17\t17\tCM000679.2\tNC_000017.11
+chrM\tMT\tJ01415.2\tNC_012920.1
+chr1_KI270706v1_random\tHSCHR1_RANDOM_CTG1\tKI270706.1
+chrUn_KI270742v1\tHSCHRUN_RANDOM_CTG22\tKI270742.1
+"""
+
+
+def write_assembly(root: str, name: str, contigs: int) -> str:
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+    with open(os.path.join(directory, "chromAlias.txt"), "w") as f:
+        f.write(CHROM_ALIAS)
+        for i in range(contigs):
+            f.write(f"scaffold_{i}\tSCAF{i}\tNW_{i:09d}.1\n")
+    with open(os.path.join(directory, f"{name}.fa.fai"), "w") as f:
+        for contig, length in (("chr17", 83257441), ("chrM", 16569), ("chrUn_KI270742v1", 186739),
+                               ("chr1_KI270706v1_random", 175055), ("chrEBV", 171823)):
+            f.write(f"{contig}\t{length}\t0\t60\t61\n")
+    return directory
+
+
+def test_alias_table(root: str):
+    """别名解析、长度和解析缓存"""
+    print("\n" + "="*60)
+    print("测试 1: 组装别名表")
+    print("="*60)
+
+    directory = write_assembly(root, "hg38", 20000)
+    aliases = AssemblyAliases.from_directory(directory)
+    assert aliases.name == "hg38" and len(aliases) == 20005, len(aliases)
+    assert aliases.resolve("NC_000017.11") == "chr17"
+    assert aliases.resolve(" cm000679.2 ") == "chr17"
+    assert aliases.resolve("KI270742.1") == "chrUn_KI270742v1"
+    assert aliases.resolve("EBV") == "chrEBV", "Contigs from the .fai without an alias row"
+    assert aliases.resolve("NW_000012345.1") == "scaffold_12345"
+    assert aliases.resolve("chr99") is None
+    assert aliases.get_length("MT") == 16569 and aliases.get_length("scaffold_1") is None
+    assert aliases.aliases("17") == ["chr17", "17", "CM000679.2", "NC_000017.11"]
+    print(f"✅ PASSED: {aliases.get_stats()}")
+
+    cache_path = os.path.join(directory, ALIAS_CACHE_FILE)
+    with open(cache_path) as f:
+        cached = json.load(f)
+    cached["table"]["rows"].append(["from_cache"])
+    with open(cache_path, "w") as f:
+        json.dump(cached, f)
+    assert AssemblyAliases.from_directory(directory).resolve("from_cache") == "from_cache"
+    with open(os.path.join(directory, "chromAlias.txt"), "a") as f:
+        f.write("chrNew\tNEW1\n")
+    rebuilt = AssemblyAliases.from_directory(directory)
+    assert rebuilt.resolve("from_cache") is None and rebuilt.resolve("NEW1") == "chrNew"
+    print("✅ PASSED: parsed table cached and rebuilt when sources change")
+
+    started_at = time.perf_counter()
+    for i in range(100_000):
+        aliases.resolve(f"NW_{i % 20000:09d}.1")
+    elapsed_us = (time.perf_counter() - started_at) / 100_000 * 1e6
+    print(f"✅ PASSED: {elapsed_us:.2f} µs per lookup across {len(aliases):,} sequences")
+
+
+async def test_normalizer_integration(root: str):
+    """标准化函数和导航使用默认组装的别名表"""
+    print("\n" + "="*60)
+    print("测试 2: 标准化函数使用组装别名")
+    print("="*60)
+
+    assert not is_valid_chromosome("NC_000017.11"), "No assembly configured yet"
+    settings.ASSEMBLY_DATA_PATH = root
+    settings.DEFAULT_ASSEMBLY = "hg38"
+
+    assert is_valid_chromosome("NC_000017.11") and is_valid_chromosome("KI270742.1")
+    assert not is_valid_chromosome("NC_999999.1")
+    assert normalize_chromosome("NC_000017.11", "ucsc") == "chr17"
+    assert normalize_chromosome("NC_000017.11", "ensembl") == "17"
+    assert normalize_chromosome("NC_012920.1", "ensembl") == "MT"
+    assert normalize_chromosome("KI270742.1") == "chrUn_KI270742v1"
+    assert normalize_chromosome("chr1", "ensembl") == "1"
+    assert normalize_many(["NC_000017.11", "chr1", "nope"], "ensembl") == ["17", "1", "nope"]
+    assert "NC_000017.11" in get_chromosome_aliases("chr17")
+    assert match_chromosome("NC_000017.11", {"17", "X"}) == "17"
+    assert match_chromosome("chr17", {"NC_000017.11"}) == "NC_000017.11"
+    assert match_chromosome("HSCHR1_RANDOM_CTG1", {"chr1_KI270706v1_random"}) == "chr1_KI270706v1_random"
+    print("✅ PASSED: RefSeq / GenBank / scaffold names normalized and matched")
+
+    assert get_assembly_aliases("mm39") is None
+    assert not is_valid_chromosome("NC_000017.11", assembly="mm39")
+
+    result = await NavigationTool().navigate_to_location("NC_000017.11", 7_668_402, 7_687_550)
+    assert result["status"] == "success", result
+    assert result["location"]["chromosome"] == "chr17"
+    result = await NavigationTool().navigate_to_location("KI270742.1", 1000, 2000)
+    assert result["location"]["chromosome"] == "chrUn_KI270742v1", result
+    print("✅ PASSED: navigation accepts assembly-specific names")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("组装别名表测试套件")
+    print("🧪"*30)
+
+    original = (settings.ASSEMBLY_DATA_PATH, settings.DEFAULT_ASSEMBLY)
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            test_alias_table(root)
+            await test_normalizer_integration(root)
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        settings.ASSEMBLY_DATA_PATH, settings.DEFAULT_ASSEMBLY = original
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,112 @@
+"""
+测试 BGZF 解压块共享缓存
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.genomics.block_cache import BlockCache
+from app.genomics.bgzf import BgzfReader, BgzfWriter
+
+
+def test_lru_eviction():
+    """测试字节预算和 LRU 淘汰"""
+    print("\n" + "="*60)
+    print("测试 1: LRU 淘汰")
+    print("="*60)
+
+    cache = BlockCache(max_bytes=300)
+    cache.put("a", 0, b"x" * 100, 40)
+    cache.put("a", 40, b"y" * 100, 40)
+    cache.put("b", 0, b"z" * 100, 40)
+    assert cache.get("a", 0) == (b"x" * 100, 40)  # a:0 变为最近使用
+
+    cache.put("b", 40, b"w" * 100, 40)
+    assert cache.get("a", 40) is None, "Least recently used block should be evicted"
+    assert cache.get("a", 0) is not None and cache.get("b", 0) is not None
+    assert cache.bytes_held == 300 and cache.evictions == 1
+
+    cache.put("c", 0, b"q" * 1000, 40)
+    assert cache.get("c", 0) is None, "Blocks larger than the budget are not cached"
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 3 and stats["misses"] == 2, stats
+    print(f"✅ PASSED: {stats}")
+
+
+def test_shared_between_readers(tmp_dir: str):
+    """同一文件的多个读取器共享缓存，重复平移不重复解压"""
+    print("\n" + "="*60)
+    print("测试 2: 读取器共享缓存")
+    print("="*60)
+
+    path = os.path.join(tmp_dir, "data.gz")
+    with BgzfWriter(path) as writer:
+        for i in range(20000):
+            writer.write(f"line {i}\n".encode("ascii"))
+            if i % 1000 == 999:
+                writer.flush()
+    offsets = [offset for offset, _ in writer.block_offsets]
+
+    cache = BlockCache(max_bytes=1024 * 1024)
+    first = BgzfReader(path, block_cache=cache)
+    second = BgzfReader(path, block_cache=cache)
+
+    # 模拟在同几个块之间来回平移
+    for _ in range(100):
+        for offset in offsets[5:8]:
+            first.read_block(offset)
+            second.read_block(offset)
+    assert first.blocks_read + second.blocks_read == 3, (first.blocks_read, second.blocks_read)
+    assert cache.hits == 597 and cache.misses == 3, cache.get_stats()
+    print(f"✅ PASSED: 600 reads, {cache.misses} decompressions")
+
+    lines = [line for _, line in first.iter_lines()]
+    assert len(lines) == 20000 and lines[-1] == b"line 19999"
+    first.close()
+    second.close()
+
+    # 文件被重新生成后不会读到旧块
+    with BgzfWriter(path) as writer:
+        writer.write(b"replaced\n")
+    reader = BgzfReader(path, block_cache=cache)
+    assert [line for _, line in reader.iter_lines()] == [b"replaced"]
+    reader.close()
+    print("✅ PASSED: rewritten file gets a new cache identity")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("BGZF 块缓存测试套件")
+    print("🧪"*30)
+
+    try:
+        test_lru_eviction()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test_shared_between_readers(tmp_dir)
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
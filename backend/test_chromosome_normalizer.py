@@ -0,0 +1,140 @@
+"""
+测试染色体名称标准化（预计算查找表、记忆化和批量接口）
+"""
+
+import asyncio
+import random
+import re
+import sys
+import os
+import time
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+import numpy as np
+
+from app.utils.chromosome_normalizer import (
+    CHROMOSOME_ALIASES,
+    get_chromosome_aliases,
+    is_valid_chromosome,
+    normalize_chromosome,
+    normalize_many,
+)
+
+
+def scan_key(chromosome: str):
+    """逐项扫描别名表的参考实现"""
+    cleaned = chromosome.strip().upper()
+    without_chr = re.sub(r'^CHR', '', cleaned, flags=re.IGNORECASE)
+    for key, aliases in CHROMOSOME_ALIASES.items():
+        aliases_upper = [a.upper() for a in aliases]
+        if cleaned in aliases_upper or without_chr in aliases_upper:
+            return key
+    return None
+
+
+def scan_normalize(chromosome: str, format: str) -> str:
+    key = scan_key(chromosome)
+    if key is None:
+        return chromosome
+    if format == 'ucsc':
+        return 'chrM' if key in ('M', 'MT') else f'chr{key}'
+    return 'MT' if key == 'M' else key
+
+
+def random_names(rng: random.Random, count: int):
+    bases = [str(i) for i in range(0, 25)] + ["X", "Y", "M", "MT", "Un", "GL000220.1", "KI270728.1", "chrchr1", ""]
+    names = []
+    for _ in range(count):
+        name = rng.choice(bases)
+        if rng.random() < 0.5:
+            name = rng.choice(["chr", "CHR", "Chr"]) + name
+        if rng.random() < 0.3:
+            name = name.lower() if rng.random() < 0.5 else name.upper()
+        if rng.random() < 0.1:
+            name = f" {name}\t"
+        names.append(name)
+    return names
+
+
+def test_matches_scan():
+    """与逐项扫描的结果一致"""
+    print("\n" + "="*60)
+    print("测试 1: 查找表与逐项扫描一致")
+    print("="*60)
+
+    names = random_names(random.Random(1), 5000)
+    for name in names:
+        for format in ("ucsc", "ensembl"):
+            assert normalize_chromosome(name, format) == scan_normalize(name, format), (name, format)
+        key = scan_key(name)
+        assert is_valid_chromosome(name) == (key is not None), name
+        assert get_chromosome_aliases(name) == (CHROMOSOME_ALIASES[key] if key else [name]), name
+    assert get_chromosome_aliases("chrmt") == ['chrM', 'M', 'MT', 'chrMT']
+    assert get_chromosome_aliases("scaffold_7") == ["scaffold_7"]
+    print("✅ PASSED: 5,000 random names in both formats")
+
+
+def test_normalize_many():
+    """批量接口"""
+    print("\n" + "="*60)
+    print("测试 2: normalize_many")
+    print("="*60)
+
+    names = random_names(random.Random(2), 2000)
+    expected = [normalize_chromosome(n, "ensembl") for n in names]
+    assert normalize_many(names, "ensembl") == expected
+    assert normalize_many(iter(names), "ensembl") == expected
+
+    column = np.array(names)
+    result = normalize_many(column, "ensembl")
+    assert isinstance(result, np.ndarray) and result.tolist() == expected
+    result = normalize_many(np.array([n.encode() for n in names]).reshape(40, 50), "ensembl")
+    assert result.shape == (40, 50) and result.ravel().tolist() == expected
+    assert normalize_many(np.array([], dtype="S1")).size == 0
+    print("✅ PASSED: lists, iterators, str/bytes arrays")
+
+    # 按坐标排序的文件中同一染色体的名称连续出现
+    column = np.repeat(np.array([b"1", b"2", b"X", b"MT", b"chrUn_KI270742v1"]), 200_000)
+    started_at = time.perf_counter()
+    result = normalize_many(column)
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    assert result[0] == "chr1" and result[-1] == "chrUn_KI270742v1" and len(result) == len(column)
+    print(f"✅ PASSED: {len(column):,} sorted names (bytes array) in {elapsed_ms:.0f} ms")
+
+    started_at = time.perf_counter()
+    normalize_many(names * 500)
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    print(f"✅ PASSED: {len(names) * 500:,} unsorted names (list) in {elapsed_ms:.0f} ms")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("染色体名称标准化测试套件")
+    print("🧪"*30)
+
+    try:
+        test_matches_scan()
+        test_normalize_many()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,151 @@
+"""
+测试模型连接探测（/models 与 max_tokens=1 补全回退、结果缓存）
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+import httpx
+
+from app.services.connection_probe import ConnectionProbe
+
+BASE_URL = "https://api.example.com/v1"
+
+
+class FakeProvider:
+    """模拟 OpenAI 兼容接口，记录收到的请求"""
+
+    def __init__(self, models_status=200, models=("gpt-4",), completion_status=200):
+        self.models_status = models_status
+        self.models = models
+        self.completion_status = completion_status
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.method, request.url.path))
+        if request.url.path.endswith("/models"):
+            if self.models_status == "timeout":
+                raise httpx.ConnectTimeout("timed out", request=request)
+            return httpx.Response(self.models_status, json={"data": [{"id": m} for m in self.models]})
+        body = json.loads(request.content)
+        assert body["max_tokens"] == 1, body
+        return httpx.Response(self.completion_status, text="model not found" if self.completion_status != 200 else "{}")
+
+
+class FakePool:
+    """只提供共享 HTTP 客户端的连接池"""
+
+    def __init__(self, provider: FakeProvider):
+        self.http_client = httpx.AsyncClient(transport=httpx.MockTransport(provider.handler))
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        return self.http_client
+
+
+async def probe_once(provider: FakeProvider, model_name: str = "gpt-4"):
+    probe = ConnectionProbe(FakePool(provider))
+    return await probe.probe(BASE_URL, "sk-test", model_name)
+
+
+async def test_fallback():
+    """模型列表接口不可用或未列出模型时退回补全请求"""
+    print("\n" + "="*60)
+    print("测试 1: /models 与补全回退")
+    print("="*60)
+
+    provider = FakeProvider()
+    result = await probe_once(provider)
+    assert result["success"] and result["method"] == "models", result
+    assert provider.requests == [("GET", "/v1/models")], "Listed model needs no completion"
+    print("✅ PASSED: model listed by /models")
+
+    for provider, reason in (
+        (FakeProvider(models_status=404), "/models not supported"),
+        (FakeProvider(models=("other-model",)), "model not listed"),
+    ):
+        result = await probe_once(provider)
+        assert result["success"] and result["method"] == "completion", result
+        assert provider.requests == [("GET", "/v1/models"), ("POST", "/v1/chat/completions")]
+        print(f"✅ PASSED: {reason} -> 1-token completion")
+
+    provider = FakeProvider(models_status=404, completion_status=404)
+    result = await probe_once(provider)
+    assert not result["success"] and result["message"] == "HTTP 404: model not found", result
+    print(f"✅ PASSED: failed completion reported ({result['message']})")
+
+    provider = FakeProvider(models_status=401)
+    result = await probe_once(provider)
+    assert not result["success"] and result["method"] == "models" and len(provider.requests) == 1
+    print(f"✅ PASSED: {result['message']}, no completion attempted")
+
+    result = await probe_once(FakeProvider(models_status="timeout"))
+    assert not result["success"] and "超时" in result["message"], result
+    print(f"✅ PASSED: {result['message']}")
+
+
+async def test_cache():
+    """只缓存成功结果，条目数有上限，过期条目在写入时清除"""
+    print("\n" + "="*60)
+    print("测试 2: 结果缓存")
+    print("="*60)
+
+    provider = FakeProvider(models=("a", "b", "c"), completion_status=404)
+    probe = ConnectionProbe(FakePool(provider), max_entries=2)
+    assert not (await probe.probe(BASE_URL, "sk-test", "a"))["cached"]
+    assert (await probe.probe(BASE_URL, "sk-test", "a"))["cached"]
+    assert len(provider.requests) == 1
+    assert not (await probe.probe(BASE_URL, "sk-test", "missing"))["success"]
+    assert len(probe._cache) == 1, "Failures are not cached"
+    print("✅ PASSED: successes cached, failures re-probed")
+
+    await probe.probe(BASE_URL, "sk-test", "b")
+    await probe.probe(BASE_URL, "sk-test", "a")
+    await probe.probe(BASE_URL, "sk-test", "c")
+    assert len(probe._cache) == 2
+    assert (await probe.probe(BASE_URL, "sk-test", "a"))["cached"], "Recently used entry kept"
+    assert not (await probe.probe(BASE_URL, "sk-test", "b"))["cached"], "Least recently used entry evicted"
+    print("✅ PASSED: cache bounded by max_entries (LRU)")
+
+    probe = ConnectionProbe(FakePool(provider), cache_ttl=0.05)
+    await probe.probe(BASE_URL, "sk-test", "a")
+    await probe.probe(BASE_URL, "sk-test", "b")
+    await asyncio.sleep(0.1)
+    await probe.probe(BASE_URL, "sk-test", "c")
+    assert list(k[2] for k in probe._cache) == ["c"], "Expired entries purged on insert"
+    print("✅ PASSED: expired entries purged on insert")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("模型连接探测测试套件")
+    print("🧪"*30)
+
+    try:
+        await test_fallback()
+        await test_cache()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,248 @@
+"""
+测试 BAM 覆盖度计算（BAI 索引 + NumPy 差分数组）
+"""
+
+import asyncio
+import random
+import struct
+import sys
+import os
+import tempfile
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+import numpy as np
+
+from app.genomics.bam import BamReader, build_bam_index, get_bam_reader
+from app.genomics.bgzf import BgzfWriter
+from app.genomics.summary_pyramid import SummaryPyramid, build_summary_pyramid
+from app.genomics.tabix import reg2bin
+from app.tools.coverage_tool import CoverageTool
+
+REFERENCES = [("chr1", 2_000_000), ("chr2", 500_000)]
+CIGAR_OPS = "MIDNSHP=X"
+CIGARS = [
+    [(100, "M")],
+    [(50, "M"), (10, "D"), (50, "M")],
+    [(30, "S"), (70, "M")],
+    [(40, "M"), (500, "N"), (60, "M")],
+    [(50, "M"), (5, "I"), (45, "M")],
+    [(60, "="), (1, "X"), (39, "=")],
+]
+
+
+def encode_record(ref_id: int, pos: int, name: str, cigar, flag: int, mapq: int) -> bytes:
+    ref_length = sum(n for n, op in cigar if op in "MDN=X")
+    query_length = sum(n for n, op in cigar if op in "MIS=X")
+    read_name = name.encode("ascii") + b"\x00"
+    body = struct.pack(
+        "<iiBBHHHiiii", ref_id, pos, len(read_name), mapq, reg2bin(pos, pos + ref_length),
+        len(cigar), flag, query_length, -1, -1, 0
+    )
+    body += read_name
+    body += b"".join(struct.pack("<I", n << 4 | CIGAR_OPS.index(op)) for n, op in cigar)
+    body += b"\x00" * ((query_length + 1) // 2) + b"\xff" * query_length
+    return struct.pack("<i", len(body)) + body
+
+
+def random_reads(seed: int = 17):
+    """按坐标排序的随机记录 [(参考序列编号, 起点, CIGAR, FLAG, MAPQ)]"""
+    rng = random.Random(seed)
+    reads = []
+    for ref_id, (_, length) in enumerate(REFERENCES):
+        positions = sorted(rng.randint(0, length - 1000) for _ in range(length // 40))
+        for pos in positions:
+            flag = rng.choice([0, 0, 0, 16, 0x400, 0x100])
+            reads.append((ref_id, pos, rng.choice(CIGARS), flag, rng.randint(0, 60)))
+    return reads
+
+
+def write_bam(path: str, reads) -> BamReader:
+    """写入 BAM 并建立索引"""
+    header_text = b"@HD\tVN:1.6\tSO:coordinate\n"
+    with BgzfWriter(path) as writer:
+        writer.write(b"BAM\x01" + struct.pack("<i", len(header_text)) + header_text)
+        writer.write(struct.pack("<i", len(REFERENCES)))
+        for name, length in REFERENCES:
+            writer.write(struct.pack("<i", len(name) + 1) + name.encode("ascii") + b"\x00" + struct.pack("<i", length))
+        for i, (ref_id, pos, cigar, flag, mapq) in enumerate(reads):
+            writer.write(encode_record(ref_id, pos, f"read{i}", cigar, flag, mapq))
+    build_bam_index(path)
+    return BamReader(path)
+
+
+def brute_force_depth(reads, ref_id: int, start: int, end: int, min_mapq: int = 0) -> np.ndarray:
+    """逐条逐操作累加深度（1-based 闭区间）"""
+    depth = np.zeros(end - start + 1, dtype=np.int64)
+    for read_ref, pos, cigar, flag, mapq in reads:
+        if read_ref != ref_id or flag & 0x704 or mapq < min_mapq:
+            continue
+        ref_pos = pos
+        for n, op in cigar:
+            if op in "M=X":
+                lo, hi = max(ref_pos, start - 1), min(ref_pos + n, end)
+                if lo < hi:
+                    depth[lo - start + 1:hi - start + 1] += 1
+            if op in "MDN=X":
+                ref_pos += n
+    return depth
+
+
+def test_coverage_against_brute_force(tmp_dir: str) -> BamReader:
+    """与逐碱基暴力计算对比"""
+    print("\n" + "="*60)
+    print("测试 1: 覆盖度对比暴力计算")
+    print("="*60)
+
+    reads = random_reads()
+    reader = write_bam(os.path.join(tmp_dir, "reads.bam"), reads)
+    assert reader.references == dict(REFERENCES)
+
+    rng = random.Random(4)
+    for _ in range(40):
+        ref_id = rng.randrange(len(REFERENCES))
+        name, length = REFERENCES[ref_id]
+        start = rng.randint(1, length - 20_000)
+        end = start + rng.choice([0, 99, 5000, 20_000])
+        min_mapq = rng.choice([0, 20])
+        expected = brute_force_depth(reads, ref_id, start, end, min_mapq)
+        coverage = reader.coverage(name, start, end, bins=7, min_mapq=min_mapq)
+        assert coverage["max"] == expected.max() and coverage["min"] == expected.min(), (name, start, end)
+        assert abs(coverage["mean"] - expected.mean()) < 0.01
+
+        edges = np.linspace(0, len(expected), min(7, len(expected)) + 1).astype(int)
+        for bin_info, lo, hi in zip(coverage["bins"], edges[:-1], edges[1:]):
+            assert bin_info["start"] == start + lo and bin_info["end"] == start + hi - 1
+            assert bin_info["max"] == expected[lo:hi].max()
+            assert abs(bin_info["mean"] - expected[lo:hi].mean()) < 0.01
+    print("✅ PASSED: 40 random windows match brute force (bins, mean/min/max)")
+
+    assert reader.coverage("2", 1, 10)["chromosome"] == "chr2"
+    return reader
+
+
+def test_mapq_at_bin_edges(tmp_dir: str):
+    """比对质量过滤、FLAG 过滤和缺失恰好落在分箱边界上"""
+    print("\n" + "="*60)
+    print("测试 2: 分箱边界上的 MAPQ 过滤")
+    print("="*60)
+
+    # chr2:1001-1100 分为 4 箱：1001-1025, 1026-1050, 1051-1075, 1076-1100
+    reads = [
+        (1, 990, [(10, "M")], 0, 60),                          # 991-1000，紧邻窗口左侧
+        (1, 995, [(10, "M")], 0, 29),                          # 996-1005，跨越窗口起点
+        (1, 1024, [(2, "M")], 0, 30),                          # 1025-1026，跨越第 1/2 箱边界
+        (1, 1025, [(25, "M")], 0, 29),                         # 1026-1050，恰好填满第 2 箱
+        (1, 1049, [(1, "M"), (1, "D"), (1, "M")], 16, 30),     # 1050 和 1052，缺失落在边界 1051
+        (1, 1050, [(25, "M")], 0x400, 60),                     # 重复记录，始终排除
+        (1, 1074, [(1, "M"), (20, "N"), (5, "M")], 0, 30),     # 1075 和 1096-1100
+        (1, 1100, [(10, "M")], 0, 60),                         # 1101-1110，紧邻窗口右侧
+    ]
+    reader = write_bam(os.path.join(tmp_dir, "edges.bam"), reads)
+
+    expected_max = {0: [1, 2, 1, 1], 30: [1, 1, 1, 1], 31: [0, 0, 0, 0]}
+    expected_sum = {0: [5 + 1, 1 + 25 + 1, 1 + 1, 5], 30: [1, 1 + 1, 1 + 1, 5], 31: [0, 0, 0, 0]}
+    for min_mapq in (0, 30, 31):
+        expected = brute_force_depth(reads, 1, 1001, 1100, min_mapq)
+        coverage = reader.coverage("chr2", 1001, 1100, bins=4, min_mapq=min_mapq)
+        depth, _ = reader.depth("chr2", 1001, 1100, min_mapq)
+        assert np.array_equal(depth, expected), min_mapq
+        assert [(b["start"], b["end"]) for b in coverage["bins"]] == [
+            (1001, 1025), (1026, 1050), (1051, 1075), (1076, 1100)
+        ]
+        assert [b["max"] for b in coverage["bins"]] == expected_max[min_mapq], (min_mapq, coverage["bins"])
+        sums = [int(depth[lo:lo + 25].sum()) for lo in range(0, 100, 25)]
+        assert sums == expected_sum[min_mapq], (min_mapq, sums)
+    assert reader.depth("chr2", 1051, 1051, 30)[0].tolist() == [0], "Deletion does not add depth"
+    print("✅ PASSED: MAPQ threshold is inclusive, reads split across bin edges counted once per base")
+    reader.close()
+
+
+def test_region_scaling(reader: BamReader):
+    """小窗口只解压少量块"""
+    print("\n" + "="*60)
+    print("测试 3: 读取量")
+    print("="*60)
+
+    reader.bgzf.block_cache.clear()
+    reader.bgzf.blocks_read = 0
+    reader.coverage("chr1", 1_000_000, 1_000_200)
+    assert reader.bgzf.blocks_read <= 3, reader.bgzf.blocks_read
+    print(f"✅ PASSED: 200 bp window decompressed {reader.bgzf.blocks_read} block(s)")
+
+
+def test_reader_cache(tmp_dir: str):
+    """打开失败的 BAM 在文件修复后下次调用即可打开"""
+    print("\n" + "="*60)
+    print("测试 5: 读取器缓存")
+    print("="*60)
+
+    path = os.path.join(tmp_dir, "later.bam")
+    assert get_bam_reader(path) is None, "BAM not written yet"
+    with open(path, "wb") as f:
+        f.write(b"not a bam file")
+    assert get_bam_reader(path) is None, "Unreadable BAM"
+    write_bam(path, random_reads(3)).close()
+    reader = get_bam_reader(path)
+    assert reader is not None and get_bam_reader(path) is reader
+    assert get_bam_reader("") is None
+    reader.close()
+    print("✅ PASSED: missing and unreadable BAM retried, successful open cached")
+
+
+async def test_pyramid_fallback(tmp_dir: str, reader: BamReader):
+    """汇总中没有的染色体由 BAM 计算"""
+    print("\n" + "="*60)
+    print("测试 4: 汇总缺少染色体时回退到 BAM")
+    print("="*60)
+
+    pyramid_dir = os.path.join(tmp_dir, "summary")
+    build_summary_pyramid(
+        {"chr1": 2_000_000}, lambda chrom, start, end: np.ones(end - start, dtype=np.int32), pyramid_dir, "test"
+    )
+    tool = CoverageTool(bam_reader=reader, pyramid=SummaryPyramid(pyramid_dir))
+    result = await tool.get_coverage("chr1", 1, 2_000_000)
+    assert result["source"] == "summary", result
+    result = await tool.get_coverage("chr2", 1, 2_000_000)
+    assert result["status"] == "success" and result["source"] == "alignments", result
+    assert result["coverage"]["end"] == 500_000
+    result = await CoverageTool(pyramid=SummaryPyramid(pyramid_dir)).get_coverage("chr2", 1, 2_000_000)
+    assert result["error_code"] == "SEQUENCE_NOT_FOUND", result
+    print("✅ PASSED: chr2 (BAM only) computed from alignments")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("BAM 覆盖度测试套件")
+    print("🧪"*30)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            reader = test_coverage_against_brute_force(tmp_dir)
+            test_mapq_at_bin_edges(tmp_dir)
+            test_region_scaling(reader)
+            await test_pyramid_fallback(tmp_dir, reader)
+            test_reader_cache(tmp_dir)
+            reader.close()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,188 @@
+"""
+测试索引 FASTA 序列读取和 SequenceTool
+"""
+
+import asyncio
+import random
+import sys
+import os
+import tempfile
+import time
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.genomics.bgzf import BgzfWriter
+from app.genomics.fasta import IndexedFasta, build_fai, get_reference_fasta, read_fai, write_gzi
+from app.tools.sequence_tool import SequenceTool
+
+
+def make_sequences(seed: int = 5):
+    rng = random.Random(seed)
+    return {
+        "chr1": "".join(rng.choice("ACGTN") for _ in range(3_000_000)),
+        "chr2": "".join(rng.choice("acgt") for _ in range(12345)),
+        "chrM": "GATCACAGGTCTATCACCC",
+    }
+
+
+def fasta_text(sequences, line_bases: int, newline: str) -> str:
+    parts = []
+    for name, sequence in sequences.items():
+        parts.append(f">{name} test sequence{newline}")
+        for i in range(0, len(sequence), line_bases):
+            parts.append(sequence[i:i + line_bases] + newline)
+    return "".join(parts)
+
+
+def check_random_slices(fasta: IndexedFasta, sequences, rng: random.Random):
+    for _ in range(300):
+        name = rng.choice(list(sequences))
+        sequence = sequences[name]
+        start = rng.randint(1, len(sequence))
+        end = min(len(sequence), start + rng.choice([0, 1, 59, 60, 61, 5000]))
+        assert fasta.fetch(name, start, end) == sequence[start - 1:end], (name, start, end)
+
+
+def test_plain_fasta(tmp_dir: str, sequences) -> IndexedFasta:
+    """测试未压缩 FASTA（不同行宽和行尾）"""
+    print("\n" + "="*60)
+    print("测试 1: 未压缩 FASTA")
+    print("="*60)
+
+    rng = random.Random(1)
+    for line_bases, newline in ((60, "\n"), (80, "\r\n"), (70, "\n")):
+        path = os.path.join(tmp_dir, f"ref_{line_bases}.fa")
+        with open(path, "w", newline="") as f:
+            f.write(fasta_text(sequences, line_bases, newline))
+        build_fai(path)
+        fasta = IndexedFasta(path)
+        assert fasta.entries["chr2"].length == 12345
+        check_random_slices(fasta, sequences, rng)
+        print(f"✅ PASSED: {line_bases} bp lines, {newline!r} terminators")
+
+    # 染色体名称标准化和越界截断
+    assert fasta.fetch("1", 1, 10) == sequences["chr1"][:10]
+    assert fasta.fetch("MT", 1, 1000) == sequences["chrM"]
+    for i in range(100):
+        assert fasta.resolve_chromosome(f"unknown{i}") is None
+    assert set(fasta._resolved) <= {"1", "MT", "chr1", "chr2", "chrM"}, "Unknown names are not cached"
+    print("✅ PASSED: chromosome aliases and end clamping")
+    return fasta
+
+
+def test_bgzip_fasta(tmp_dir: str, sequences):
+    """测试 bgzip 压缩的 FASTA（.gzi + 块缓存）"""
+    print("\n" + "="*60)
+    print("测试 2: bgzip FASTA")
+    print("="*60)
+
+    path = os.path.join(tmp_dir, "ref.fa.gz")
+    with BgzfWriter(path) as writer:
+        writer.write(fasta_text(sequences, 60, "\n").encode("ascii"))
+    write_gzi(path + ".gzi", writer.block_offsets)
+    build_fai(path)
+    assert read_fai(path + ".fai") == read_fai(os.path.join(tmp_dir, "ref_60.fa.fai"))
+
+    fasta = IndexedFasta(path)
+    assert fasta.compressed
+    check_random_slices(fasta, sequences, random.Random(2))
+    print("✅ PASSED: 300 random slices across block boundaries")
+
+    fasta._bgzf.block_cache.clear()
+    fasta._bgzf.blocks_read = 0
+    for _ in range(50):
+        fasta.fetch("chr1", 1_000_000, 1_000_500)
+    assert fasta._bgzf.blocks_read <= 2, fasta._bgzf.blocks_read
+    print(f"✅ PASSED: 50 repeated reads decompressed {fasta._bgzf.blocks_read} block(s)")
+
+
+def test_large_slice(fasta: IndexedFasta, sequences):
+    """1 Mb 切片耗时"""
+    print("\n" + "="*60)
+    print("测试 3: 1 Mb 切片")
+    print("="*60)
+
+    started_at = time.perf_counter()
+    for _ in range(20):
+        sequence = fasta.fetch("chr1", 1_000_001, 2_000_000)
+    elapsed_ms = (time.perf_counter() - started_at) / 20 * 1000
+    assert sequence == sequences["chr1"][1_000_000:2_000_000]
+    print(f"✅ PASSED: {elapsed_ms:.2f} ms per 1 Mb slice")
+
+
+async def test_sequence_tool(fasta: IndexedFasta, sequences):
+    """测试 SequenceTool"""
+    print("\n" + "="*60)
+    print("测试 4: SequenceTool")
+    print("="*60)
+
+    tool = SequenceTool(fasta=fasta)
+    result = await tool.get_sequence("2", 100, 199)
+    assert result["status"] == "success", result
+    assert result["sequence"] == sequences["chr2"][99:199]
+    assert result["location"]["chromosome"] == "chr2"
+
+    result = await tool.get_sequence("chr22", 1, 100)
+    assert result["error_code"] == "SEQUENCE_NOT_FOUND", result
+    result = await tool.get_sequence("chr2", 20000, 20100)
+    assert result["error_code"] == "INVALID_RANGE", result
+    result = await SequenceTool().get_sequence("chr1", 1, 100)
+    assert result["error_code"] == "REFERENCE_NOT_CONFIGURED", result
+    print("✅ PASSED: success and error results")
+
+
+def test_fasta_cache(tmp_dir: str, sequences):
+    """FASTA 或 .fai 稍后才出现时，下次调用即可打开"""
+    print("\n" + "="*60)
+    print("测试 5: 参考序列缓存")
+    print("="*60)
+
+    path = os.path.join(tmp_dir, "later.fa")
+    assert get_reference_fasta(path) is None, "FASTA not written yet"
+    with open(path, "w") as f:
+        f.write(fasta_text(sequences, 60, "\n"))
+    assert get_reference_fasta(path) is None, "No .fai yet"
+    build_fai(path)
+    fasta = get_reference_fasta(path)
+    assert fasta is not None and get_reference_fasta(path) is fasta
+    assert get_reference_fasta("") is None
+    fasta.close()
+    print("✅ PASSED: missing file and index retried, successful open cached")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("索引 FASTA 测试套件")
+    print("🧪"*30)
+
+    try:
+        sequences = make_sequences()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fasta = test_plain_fasta(tmp_dir, sequences)
+            test_bgzip_fasta(tmp_dir, sequences)
+            test_large_slice(fasta, sequences)
+            await test_sequence_tool(fasta, sequences)
+            test_fasta_cache(tmp_dir, sequences)
+            fasta.close()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,143 @@
+"""
+测试基因注释索引
+用合成的 GFF3 / GTF 构建索引并通过 NavigationTool 查询
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.genomics.gene_index import GeneIndex, build_gene_index
+from app.tools.navigation_tool import NavigationTool
+
+GFF3 = """##gff-version 3
+chr17\tHAVANA\tgene\t43044295\t43125483\t.\t-\t.\tID=ENSG00000012048.23;gene_id=ENSG00000012048.23;gene_type=protein_coding;gene_name=BRCA1;Alias=RNF53,PPP1R53
+chr17\tHAVANA\ttranscript\t43044295\t43125483\t.\t-\t.\tID=ENST00000357654.9;Parent=ENSG00000012048.23;gene_name=BRCA1
+chr17\tHAVANA\tgene\t7661779\t7687550\t.\t-\t.\tID=ENSG00000141510.18;gene_id=ENSG00000141510.18;gene_type=protein_coding;gene_name=TP53;Alias=P53
+chrX\tHAVANA\tgene\t276322\t303356\t.\t+\t.\tID=ENSG00000182378.15;gene_id=ENSG00000182378.15;gene_type=protein_coding;gene_name=PLCXD1
+chrY\tHAVANA\tgene\t276322\t303356\t.\t+\t.\tID=ENSG00000182378.15_PAR_Y;gene_id=ENSG00000182378.15_PAR_Y;gene_type=protein_coding;gene_name=PLCXD1
+chr1\tHAVANA\tgene\t100\t200\t.\t+\t.\tID=ENSG00000000001.1;gene_id=ENSG00000000001.1;gene_type=lncRNA;gene_name=P53
+"""
+
+GTF = """#!genome-build GRCh38
+7\tensembl_havana\tgene\t55019017\t55211628\t.\t+\t.\tgene_id "ENSG00000146648"; gene_version "21"; gene_name "EGFR"; gene_biotype "protein_coding";
+7\tensembl_havana\texon\t55019017\t55019365\t.\t+\t.\tgene_id "ENSG00000146648"; gene_name "EGFR"; exon_number "1";
+"""
+
+
+def build(tmp_dir: str, name: str, content: str) -> GeneIndex:
+    """写出注释文件并构建索引"""
+    path = os.path.join(tmp_dir, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    index_dir = os.path.join(tmp_dir, name + ".idx")
+    build_gene_index(path, index_dir)
+    return GeneIndex(index_dir)
+
+
+def test_gff3_index(tmp_dir: str):
+    """测试 GFF3 索引"""
+    print("\n" + "="*60)
+    print("测试 1: GFF3 索引查找")
+    print("="*60)
+
+    index = build(tmp_dir, "genes.gff3", GFF3)
+    assert len(index) == 5, "Only gene features should be indexed"
+
+    brca1 = index.lookup("brca1")
+    assert brca1["chromosome"] == "chr17"
+    assert (brca1["start"], brca1["end"], brca1["strand"]) == (43044295, 43125483, -1)
+    assert brca1["gene_id"] == "ENSG00000012048.23"
+    print(f"✅ PASSED: {brca1}")
+
+    assert index.lookup("RNF53")["symbol"] == "BRCA1", "Alias lookup"
+    assert index.lookup("ENSG00000012048")["symbol"] == "BRCA1", "Versionless Ensembl ID"
+    assert index.lookup("ENSG00000012048.99")["symbol"] == "BRCA1", "Other Ensembl versions"
+    print("✅ PASSED: aliases and Ensembl IDs")
+
+    # 符号优先于别名；PAR 基因保留文件中先出现的 chrX 拷贝
+    assert index.lookup("P53")["chromosome"] == "chr1"
+    assert index.lookup("PLCXD1")["chromosome"] == "chrX"
+    assert index.lookup("NOT_A_GENE") is None
+    assert index.lookup("TP53é") is None and index.lookup("éTP53") is None, "Non-ASCII queries are misses"
+    print("✅ PASSED: key priority and misses")
+
+
+def test_gtf_index(tmp_dir: str):
+    """测试 GTF 索引"""
+    print("\n" + "="*60)
+    print("测试 2: GTF 索引查找")
+    print("="*60)
+
+    index = build(tmp_dir, "genes.gtf", GTF)
+    egfr = index.lookup("EGFR")
+    assert egfr["chromosome"] == "7"
+    assert egfr["gene_type"] == "protein_coding"
+    assert index.lookup("ENSG00000146648")["symbol"] == "EGFR"
+    print(f"✅ PASSED: {egfr}")
+
+
+async def test_navigation_with_index(tmp_dir: str):
+    """测试 NavigationTool 使用基因索引"""
+    print("\n" + "="*60)
+    print("测试 3: NavigationTool 使用索引")
+    print("="*60)
+
+    index = build(tmp_dir, "nav.gff3", GFF3)
+    tool = NavigationTool(gene_index=index)
+
+    result = await tool.navigate_by_gene("RNF53")
+    assert result["status"] == "success", result
+    assert result["location"]["start"] == 43044295
+    assert tool.is_known_gene("tp53")
+    assert not tool.is_known_gene("MYC"), "Built-in table is only a fallback"
+
+    started_at = time.perf_counter()
+    for _ in range(10000):
+        index.find("TP53")
+    per_lookup_us = (time.perf_counter() - started_at) / 10000 * 1e6
+    print(f"✅ PASSED: {per_lookup_us:.1f} µs per lookup")
+
+    # 没有索引时退回内置基因表
+    fallback = NavigationTool()
+    assert fallback.gene_index is None
+    assert fallback.is_known_gene("MYC")
+    print("✅ PASSED: built-in fallback")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("GeneIndex 测试套件")
+    print("🧪"*30)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test_gff3_index(tmp_dir)
+            test_gtf_index(tmp_dir)
+            await test_navigation_with_index(tmp_dir)
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,146 @@
+"""
+测试基因名称补全与模糊匹配
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.genomics.gene_index import GeneIndex, build_gene_index, load_hgnc_aliases
+from app.genomics.gene_search import GeneSuggester
+from app.tools.navigation_tool import NavigationTool
+
+GFF3 = """##gff-version 3
+chr17\tHAVANA\tgene\t43044295\t43125483\t.\t-\t.\tID=ENSG00000012048.23;gene_id=ENSG00000012048.23;gene_type=protein_coding;gene_name=BRCA1
+chr13\tHAVANA\tgene\t32315086\t32400266\t.\t+\t.\tID=ENSG00000139618.16;gene_id=ENSG00000139618.16;gene_type=protein_coding;gene_name=BRCA2
+chr17\tHAVANA\tgene\t7661779\t7687550\t.\t-\t.\tID=ENSG00000141510.18;gene_id=ENSG00000141510.18;gene_type=protein_coding;gene_name=TP53
+chr3\tHAVANA\tgene\t189631389\t189897279\t.\t+\t.\tID=ENSG00000073282.14;gene_id=ENSG00000073282.14;gene_type=protein_coding;gene_name=TP63
+chr16\tHAVANA\tgene\t89737549\t89741000\t.\t+\t.\tID=ENSG00000187741.16;gene_id=ENSG00000187741.16;gene_type=protein_coding;gene_name=FANCA
+"""
+
+HGNC = """hgnc_id\tsymbol\tname\talias_symbol\tprev_symbol
+HGNC:1100\tBRCA1\tBRCA1 DNA repair associated\tRNF53|PPP1R53\t
+HGNC:676\tFANCA\tFA complementation group A\tFACA|FAA\tFACA1
+"""
+
+
+def build_index(tmp_dir: str) -> GeneIndex:
+    """构建带 HGNC 别名的测试索引"""
+    gff_path = os.path.join(tmp_dir, "genes.gff3")
+    hgnc_path = os.path.join(tmp_dir, "hgnc.txt")
+    with open(gff_path, "w", encoding="utf-8") as f:
+        f.write(GFF3)
+    with open(hgnc_path, "w", encoding="utf-8") as f:
+        f.write(HGNC)
+
+    aliases, previous = load_hgnc_aliases(hgnc_path)
+    index_dir = os.path.join(tmp_dir, "index")
+    build_gene_index(gff_path, index_dir, aliases, previous)
+    return GeneIndex(index_dir)
+
+
+def test_completion_and_fuzzy(index: GeneIndex):
+    """测试前缀补全和模糊匹配"""
+    print("\n" + "="*60)
+    print("测试 1: 前缀补全与模糊匹配")
+    print("="*60)
+
+    suggester = index.get_suggester()
+    assert [s["symbol"] for s in suggester.complete("brc")] == ["BRCA1", "BRCA2"]
+    exact = suggester.complete("TP53")[0]
+    assert exact["match_type"] == "exact" and exact["symbol"] == "TP53"
+    assert suggester.complete("brcé") == [] and suggester.suggest("TP53é") == [], "Non-ASCII queries are misses"
+    print("✅ PASSED: prefix completion")
+
+    assert suggester.fuzzy("BRAC1")[0]["symbol"] == "BRCA1", "Transposition counts as one edit"
+    assert suggester.fuzzy("TP54")[0]["distance"] == 1
+    assert suggester.fuzzy("XYZZY") == []
+    print("✅ PASSED: bounded edit distance")
+
+    previous = suggester.suggest("FACA1")[0]
+    assert previous["symbol"] == "FANCA" and previous["key_type"] == "previous_symbol"
+    alias = suggester.suggest("RNF5")[0]
+    assert alias["symbol"] == "BRCA1" and alias["key_type"] == "alias"
+    print("✅ PASSED: HGNC aliases and previous symbols")
+
+    # 与数组同宽的键不能截断
+    width = index.keys.dtype.itemsize
+    longest = [k.decode() for k in index.keys if len(k) == width][0]
+    assert suggester.complete(longest)[0]["match_type"] == "exact"
+    print("✅ PASSED: full-width keys")
+
+
+def test_suggestion_latency():
+    """测试大规模键集合上的建议延迟"""
+    print("\n" + "="*60)
+    print("测试 2: 建议延迟")
+    print("="*60)
+
+    symbols = [f"{prefix}{i}" for prefix in ("ZNF", "SLC", "KRT", "OR", "LINC") for i in range(30000)]
+    suggester = GeneSuggester.from_symbols(symbols + ["BRCA1"])
+
+    started_at = time.perf_counter()
+    for query in ("ZNF12", "SLC2A", "BRAC1", "KTR12", "LINC0099"):
+        suggester.suggest(query)
+    elapsed_ms = (time.perf_counter() - started_at) * 1000 / 5
+    print(f"✅ PASSED: {elapsed_ms:.2f} ms per query over {len(symbols)} keys")
+
+
+async def test_navigation_fallback(index: GeneIndex):
+    """测试 navigate_by_gene 的纠错回退"""
+    print("\n" + "="*60)
+    print("测试 3: navigate_by_gene 纠错")
+    print("="*60)
+
+    tool = NavigationTool(gene_index=index)
+
+    result = await tool.navigate_by_gene("BRAC1")
+    assert result["status"] == "success", result
+    assert result["corrected_from"] == "BRAC1"
+    assert result["location"]["gene_name"] == "BRCA1"
+    print(f"✅ PASSED: {result['message']}")
+
+    # TPX3 与 TP53/TP63 距离相同，不自动纠正而是返回候选
+    result = await tool.navigate_by_gene("TPX3")
+    assert result["error_code"] == "GENE_NOT_FOUND"
+    assert set(result["suggestions"]) >= {"TP53", "TP63"}, result
+    print(f"✅ PASSED: {result['message']}")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("GeneSuggester 测试套件")
+    print("🧪"*30)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = build_index(tmp_dir)
+            test_completion_and_fuzzy(index)
+            test_suggestion_latency()
+            await test_navigation_fallback(index)
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,126 @@
+"""
+测试查询意图快速路由
+"""
+
+import sys
+import os
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.services.intent_router import IntentRouter
+from app.tools.navigation_tool import NavigationTool
+
+
+class EnglishWordGeneTool(NavigationTool):
+    """基因索引中包含与英文单词同名的基因（MAX、SET、REST、WAS）"""
+
+    def is_known_gene(self, gene_name: str) -> bool:
+        return gene_name.upper() in {"MAX", "SET", "REST", "WAS"} or super().is_known_gene(gene_name)
+
+
+def test_locus_routing():
+    """测试位点路由"""
+    print("\n" + "="*60)
+    print("测试 1: 位点路由")
+    print("="*60)
+
+    router = IntentRouter(NavigationTool())
+
+    route = router.route("chr17:43,044,295-43,125,483")
+    assert route["tool"] == "navigate_jbrowse"
+    assert route["args"] == {"chromosome": "chr17", "start": 43044295, "end": 43125483}
+    print(f"✅ PASSED: {route['args']}")
+
+    route = router.route("go to X:1000-2000")
+    assert route["args"]["chromosome"] == "chrX"
+    print(f"✅ PASSED: {route['args']}")
+
+    route = router.route("17:100")
+    assert "end" not in route["args"], "End should be left to the tool default"
+    print(f"✅ PASSED: {route['args']}")
+
+    assert router.route("chr99:1-100") is None, "Invalid chromosome should fall through"
+    print("✅ PASSED: invalid chromosome not routed")
+
+    print("\n✅ All locus routing tests passed!")
+
+
+def test_gene_routing():
+    """测试基因路由"""
+    print("\n" + "="*60)
+    print("测试 2: 基因路由")
+    print("="*60)
+
+    router = IntentRouter(NavigationTool())
+
+    for query in ["show TP53", "BRCA1", "navigate to gene brca1", "显示 MYC 基因"]:
+        route = router.route(query)
+        assert route is not None and route["tool"] == "navigate_to_gene", f"Expected gene route for {query!r}"
+        print(f"✅ {query!r} -> {route['args']['gene_name']}")
+
+    for query in ["what is BRCA1", "explain genomics", "show UNKNOWN_GENE"]:
+        assert router.route(query) is None, f"{query!r} should go to the LLM"
+        print(f"✅ {query!r} -> LLM")
+
+    # 与英文单词同名的基因：小写单词不路由，大写符号或明确写出 gene / 基因 时才路由
+    router = IntentRouter(EnglishWordGeneTool())
+    for query in ["show max", "go to rest", "display was", "open set", "view Max"]:
+        assert router.route(query) is None, f"{query!r} is an English word, not a gene"
+        print(f"✅ {query!r} -> LLM")
+    for query in ["show MAX", "go to gene rest", "显示 was 基因", "SET"]:
+        route = router.route(query)
+        assert route is not None and route["tool"] == "navigate_to_gene", f"Expected gene route for {query!r}"
+        print(f"✅ {query!r} -> {route['args']['gene_name']}")
+
+    print("\n✅ All gene routing tests passed!")
+
+
+def test_router_stats():
+    """测试命中统计"""
+    print("\n" + "="*60)
+    print("测试 3: 命中统计")
+    print("="*60)
+
+    router = IntentRouter(NavigationTool())
+    router.route("show TP53")
+    router.route("chr1:100-200")
+    router.route("what is genomics")
+
+    stats = router.get_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert stats["hits_by_intent"] == {"locus": 1, "gene": 1}
+    print(f"✅ PASSED: {stats}")
+
+    print("\n✅ All router stats tests passed!")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("IntentRouter 测试套件")
+    print("🧪"*30)
+
+    try:
+        test_locus_routing()
+        test_gene_routing()
+        test_router_stats()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
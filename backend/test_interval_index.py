@@ -0,0 +1,165 @@
+"""
+测试注释特征区间索引和 explain_genomic_region
+"""
+
+import asyncio
+import random
+import sys
+import os
+import tempfile
+import time
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.genomics.interval_index import FeatureIntervalIndex, build_feature_index
+from app.tools.jbrowse_tools import JBrowseToolkit
+
+# Ensembl 风格：外显子只通过 Parent 关联到转录本和基因
+GFF3 = """##gff-version 3
+17\tensembl\tgene\t43044295\t43125483\t.\t-\t.\tID=gene:ENSG00000012048;Name=BRCA1;biotype=protein_coding
+17\tensembl\tmRNA\t43044295\t43125483\t.\t-\t.\tID=transcript:ENST00000357654;Parent=gene:ENSG00000012048;Name=BRCA1-203
+17\tensembl\texon\t43124017\t43125483\t.\t-\t.\tParent=transcript:ENST00000357654
+17\tensembl\texon\t43115726\t43115779\t.\t-\t.\tParent=transcript:ENST00000357654
+17\tensembl\tfive_prime_UTR\t43124097\t43125483\t.\t-\t.\tParent=transcript:ENST00000357654
+17\tensembl\tgene\t43125364\t43153671\t.\t+\t.\tID=gene:ENSG00000267681;Name=NBR2;biotype=lncRNA
+17\tensembl\texon\t43125364\t43125500\t.\t+\t.\tParent=gene:ENSG00000267681
+"""
+
+# GTF 中同一外显子随每个转录本重复出现
+GTF = """13\thavana\tgene\t32315086\t32400266\t.\t+\t.\tgene_id "ENSG00000139618"; gene_name "BRCA2";
+13\thavana\texon\t32315508\t32315667\t.\t+\t.\tgene_id "ENSG00000139618"; transcript_id "ENST00000380152"; gene_name "BRCA2";
+13\thavana\texon\t32315508\t32315667\t.\t+\t.\tgene_id "ENSG00000139618"; transcript_id "ENST00000544455"; gene_name "BRCA2";
+"""
+
+REGULATORY = """##gff-version 3
+17\tRegulatory_Build\tenhancer\t43100000\t43100600\t.\t.\t.\tID=enhancer:ENSR1;feature_type=Enhancer
+17\tRegulatory_Build\tpromoter\t43125200\t43126000\t.\t.\t.\tID=promoter:ENSR2;feature_type=Promoter
+17\tRegulatory_Build\tCTCF_binding_site\t43130000\t43130300\t.\t.\t.\tID=ctcf:ENSR3;feature_type=CTCF Binding Site
+"""
+
+
+def write(tmp_dir: str, name: str, content: str) -> str:
+    path = os.path.join(tmp_dir, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+def test_annotation_queries(tmp_dir: str) -> FeatureIntervalIndex:
+    """测试注释文件的计数和重叠查询"""
+    print("\n" + "="*60)
+    print("测试 1: 注释特征查询")
+    print("="*60)
+
+    paths = [write(tmp_dir, "genes.gff3", GFF3), write(tmp_dir, "genes.gtf", GTF),
+             write(tmp_dir, "regulatory.gff3", REGULATORY)]
+    index_dir = os.path.join(tmp_dir, "features")
+    meta = build_feature_index(paths, index_dir)
+    assert meta["counts"]["exon"] == 4, "Duplicate GTF exons should be collapsed"
+    index = FeatureIntervalIndex(index_dir)
+
+    # 输入使用 chr17，注释文件使用 17
+    assert index.summarize("chr17", 43044295, 43125483) == {
+        "gene": 2, "exon": 3, "utr": 1, "cds": 0, "regulatory": 2
+    }, index.summarize("chr17", 43044295, 43125483)
+    exons = index.overlaps("chr17", 43115700, 43115800, "exon")
+    assert exons == [{"name": "BRCA1", "start": 43115726, "end": 43115779, "strand": -1}], exons
+    assert index.count("chr17", 43115780, 43115780, "exon") == 0, "Closed-interval boundary"
+    assert index.count("chr17", 43115779, 43115779, "exon") == 1
+    assert index.count_by_name("17", 43000000, 43200000, "regulatory") == {
+        "Enhancer": 1, "Promoter": 1, "CTCF Binding Site": 1
+    }
+    assert index.count("chrY", 1, 1000, "gene") == 0
+    for i in range(100):
+        assert index.resolve_chromosome(f"unknown{i}") is None
+    assert set(index._resolved) <= {"chr17", "17", "chrY"}, "Unknown names are not cached"
+    print("✅ PASSED: counts, overlaps and chromosome name matching")
+    return index
+
+
+def test_against_brute_force(tmp_dir: str):
+    """与暴力扫描对比，并测量大窗口查询耗时"""
+    print("\n" + "="*60)
+    print("测试 2: 随机区间对比暴力扫描")
+    print("="*60)
+
+    rng = random.Random(7)
+    features = []
+    lines = []
+    for i in range(50000):
+        start = rng.randint(1, 50_000_000)
+        length = rng.choice([rng.randint(100, 5000), rng.randint(10_000, 2_000_000)])
+        features.append((start, start + length))
+        lines.append(f"chr1\tsim\tgene\t{start}\t{start + length}\t.\t+\t.\tID=g{i};Name=G{i}")
+    path = write(tmp_dir, "random.gff3", "\n".join(lines) + "\n")
+    index_dir = os.path.join(tmp_dir, "random")
+    build_feature_index([path], index_dir)
+    index = FeatureIntervalIndex(index_dir)
+
+    for _ in range(200):
+        qs = rng.randint(1, 50_000_000)
+        qe = qs + rng.choice([0, 1000, 1_000_000])
+        expected = sorted((s, e) for s, e in features if s <= qe and e >= qs)
+        found = sorted((f["start"], f["end"]) for f in index.overlaps("chr1", qs, qe, "gene"))
+        assert found == expected, (qs, qe)
+        assert index.count("chr1", qs, qe, "gene") == len(expected)
+    print("✅ PASSED: 200 random windows match brute force")
+
+    started_at = time.perf_counter()
+    for i in range(1000):
+        index.count("chr1", 10_000_000 + i * 1000, 15_000_000 + i * 1000, "gene")
+    per_query_us = (time.perf_counter() - started_at) / 1000 * 1e6
+    print(f"✅ PASSED: {per_query_us:.1f} µs per 5 Mb count query")
+
+
+async def test_explain_region(index: FeatureIntervalIndex):
+    """测试 JBrowseToolkit.explain_genomic_region"""
+    print("\n" + "="*60)
+    print("测试 3: explain_genomic_region")
+    print("="*60)
+
+    toolkit = JBrowseToolkit(feature_index=index)
+    result = await toolkit.explain_genomic_region("chr17", 43044295, 43125483)
+    assert result["status"] == "success", result
+    region_info = result["region_info"]
+    assert [g["name"] for g in region_info["genes"]] == ["BRCA1", "NBR2"]
+    assert {"type": "exon", "count": 3} in region_info["features"]
+    print(f"✅ PASSED: {region_info['functional_annotation']}")
+
+    result = await JBrowseToolkit().explain_genomic_region("chr17", 1, 100)
+    assert result["status"] == "error", "No index configured"
+    print("✅ PASSED: missing index reported")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("FeatureIntervalIndex 测试套件")
+    print("🧪"*30)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = test_annotation_queries(tmp_dir)
+            test_against_brute_force(tmp_dir)
+            await test_explain_region(index)
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,302 @@
+"""
+测试组装间坐标转换（chain 文件解析、位置 / 区间 / 批量转换）
+"""
+
+import asyncio
+import gzip
+import os
+import random
+import sys
+import tempfile
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+import numpy as np
+
+from app.core.config import settings
+from app.genomics.liftover import LiftOver, _loaded_chains, chain_file_name, get_liftover, is_valid_assembly
+from app.tools.jbrowse_langchain_tools import liftover_coordinates
+from app.tools.liftover_tool import LiftoverTool
+
+# chain 1: chr1:100-500 -> chr1 正向（含源端和目标端缺口）
+# chain 2: chr1:600-700 -> chr5 反向链
+# chain 3: chr2:0-50 -> chr2
+# chain 4: 与 chain 1 重叠的低分 chain，应被丢弃
+CHAINS = """chain 1000 chr1 1000 + 100 500 chr1 1200 + 150 560 1
+100\t10\t0
+50\t0\t20
+240
+
+chain 500 chr1 1000 + 600 700 chr5 5000 - 1000 1100 2
+100
+
+chain 300 chr2 800 + 0 50 chr2 900 + 10 60 3
+50
+
+chain 10 chr1 1000 + 150 160 chrX 3000 + 0 10 4
+10
+"""
+
+
+def write_chain(directory: str) -> str:
+    path = os.path.join(directory, chain_file_name("hg19", "hg38") + ".over.chain.gz")
+    with gzip.open(path, "wt") as f:
+        f.write(CHAINS)
+    return path
+
+
+def brute_force_map():
+    """逐碱基展开的参考映射：(源染色体, 0-based 源位置) -> (目标染色体, 0-based 目标位置, 链方向)"""
+    mapping = {}
+    blocks = [
+        ("chr1", 100, 150, 100, "chr1", "+"),
+        ("chr1", 210, 250, 50, "chr1", "+"),
+        ("chr1", 260, 320, 240, "chr1", "+"),
+        ("chr1", 600, 1000, 100, "chr5", "-"),
+        ("chr2", 0, 10, 50, "chr2", "+"),
+    ]
+    sizes = {"chr5": 5000}
+    for source, t_start, q_start, size, target, strand in blocks:
+        for offset in range(size):
+            q = q_start + offset
+            mapping[(source, t_start + offset)] = (target, q if strand == "+" else sizes[target] - 1 - q, strand)
+    return mapping
+
+
+def test_positions(liftover: LiftOver):
+    """位置转换与逐碱基参考一致"""
+    print("\n" + "="*60)
+    print("测试 1: 位置转换")
+    print("="*60)
+
+    expected = brute_force_map()
+    assert liftover.get_stats()["blocks"] == 5, "Overlapping low-score chain dropped"
+    for chromosome in ("chr1", "chr2", "chr7"):
+        positions = np.arange(1, 1001)
+        arrays = liftover.map_positions(chromosome, positions)
+        for pos, mapped, target, lifted, strand in zip(
+            positions.tolist(), arrays["mapped"].tolist(), arrays["target"].tolist(),
+            arrays["position"].tolist(), arrays["strand"].tolist()
+        ):
+            ref = expected.get((chromosome, pos - 1))
+            if ref is None:
+                assert not mapped, (chromosome, pos)
+            else:
+                assert mapped and liftover.target_names[target] == ref[0], (chromosome, pos)
+                assert lifted == ref[1] + 1 and strand == (1 if ref[2] == "+" else -1), (chromosome, pos, lifted, ref)
+    assert liftover.lift_position("1", 101) == {"chromosome": "chr1", "position": 151, "strand": "+"}
+    assert liftover.lift_position("chr1", 601) == {"chromosome": "chr5", "position": 4000, "strand": "-"}
+    assert liftover.lift_position("chr1", 205) is None
+    print("✅ PASSED: every base on 3 chromosomes matches the block-by-block reference")
+
+
+def test_intervals(liftover: LiftOver):
+    """区间转换、拆分和未映射区域"""
+    print("\n" + "="*60)
+    print("测试 2: 区间转换")
+    print("="*60)
+
+    result = liftover.lift_interval("chr1", 121, 180)
+    assert result["status"] == "mapped" and result["mapped_fraction"] == 1.0
+    assert result["segments"][0]["start"] == 171 and result["segments"][0]["end"] == 230
+
+    # 跨越 chain 1 的源端缺口：同一片段，缺口不计入比对碱基
+    result = liftover.lift_interval("chr1", 191, 230)
+    assert result["status"] == "mapped" and result["unmapped"] == [], result
+    assert (result["segments"][0]["start"], result["segments"][0]["end"]) == (241, 270)
+    assert result["mapped_fraction"] == 0.75
+
+    result = liftover.lift_interval("chr1", 451, 650)
+    assert result["status"] == "split", result
+    first, second = result["segments"]
+    assert (first["chromosome"], first["start"], first["end"], first["source_end"]) == ("chr1", 511, 560, 500)
+    assert (second["chromosome"], second["strand"], second["start"], second["end"]) == ("chr5", "-", 3951, 4000)
+    assert result["unmapped"] == [{"start": 501, "end": 600}]
+    assert result["mapped_fraction"] == 0.5
+
+    assert liftover.lift_interval("chr1", 801, 900)["status"] == "unmapped"
+    assert liftover.lift_interval("chr7", 1, 10)["unmapped"] == [{"start": 1, "end": 10}]
+    print("✅ PASSED: contained, gapped, split and unmapped intervals")
+
+    # 批量结果与逐个计算一致，并与逐碱基参考比对
+    expected = brute_force_map()
+    rng = random.Random(7)
+    starts = np.array([rng.randint(1, 950) for _ in range(2000)])
+    ends = starts + np.array([rng.choice([0, 5, 30, 200, 600]) for _ in range(2000)])
+    results = liftover.lift_intervals("chr1", starts, ends)
+    for start, end, result in zip(starts.tolist(), ends.tolist(), results):
+        aligned = [expected[("chr1", p - 1)] for p in range(start, end + 1) if ("chr1", p - 1) in expected]
+        assert result["mapped_fraction"] == round(len(aligned) / (end - start + 1), 4), (start, end, result)
+        assert (result["status"] == "unmapped") == (not aligned)
+        for segment in result["segments"]:
+            lifted = [
+                expected[("chr1", p - 1)][1] + 1 for p in range(segment["source_start"], segment["source_end"] + 1)
+                if ("chr1", p - 1) in expected
+            ]
+            assert (segment["start"], segment["end"]) == (min(lifted), max(lifted)), (start, end, segment)
+        assert result == liftover.lift_interval("chr1", start, end)
+    print("✅ PASSED: 2,000 random intervals match the reference")
+
+
+# 两条反向链 chain 拆分同一个区间：chain 5 在目标端有 10 bp 缺口，chain 6 紧接其后
+REVERSE_CHAINS = """chain 900 chr4 1000 + 100 300 chr9 2000 - 500 710 5
+100\t0\t10
+100
+
+chain 800 chr4 1000 + 300 400 chr9 2000 - 100 200 6
+100
+"""
+
+
+def test_reverse_strand_split(directory: str):
+    """区间跨越两条反向链 chain"""
+    print("\n" + "="*60)
+    print("测试 3: 反向链拆分")
+    print("="*60)
+
+    path = os.path.join(directory, "reverse.over.chain")
+    with open(path, "w") as f:
+        f.write(REVERSE_CHAINS)
+    liftover = LiftOver.from_chain_file(path, "hg19", "hg38")
+
+    assert liftover.lift_position("chr4", 101) == {"chromosome": "chr9", "position": 1500, "strand": "-"}
+    assert liftover.lift_position("chr4", 300) == {"chromosome": "chr9", "position": 1291, "strand": "-"}
+    assert liftover.lift_position("chr4", 301) == {"chromosome": "chr9", "position": 1900, "strand": "-"}
+
+    # 目标端缺口不拆分片段，目标区间仍为 start <= end
+    result = liftover.lift_interval("chr4", 181, 230)
+    assert result["status"] == "mapped" and result["mapped_fraction"] == 1.0, result
+    assert (result["segments"][0]["start"], result["segments"][0]["end"]) == (1361, 1420)
+
+    result = liftover.lift_interval("chr4", 151, 350)
+    assert result["status"] == "split" and result["unmapped"] == [] and result["mapped_fraction"] == 1.0, result
+    assert [
+        (s["chromosome"], s["strand"], s["start"], s["end"], s["source_start"], s["source_end"])
+        for s in result["segments"]
+    ] == [("chr9", "-", 1291, 1450, 151, 300), ("chr9", "-", 1851, 1900, 301, 350)]
+
+    result = liftover.lift_interval("chr4", 51, 450)
+    assert result["unmapped"] == [{"start": 51, "end": 100}, {"start": 401, "end": 450}]
+    assert result["mapped_fraction"] == 0.75
+    starts, ends = np.array([151, 181, 51]), np.array([350, 230, 450])
+    assert liftover.lift_intervals("chr4", starts, ends)[2] == result
+    print("✅ PASSED: reverse-strand interval split at the chain boundary, target gap kept in one segment")
+
+
+async def test_assembly_names(directory: str):
+    """组装名称校验：拒绝会拼出目录外路径的名称"""
+    print("\n" + "="*60)
+    print("测试 4: 组装名称校验")
+    print("="*60)
+
+    assert all(is_valid_assembly(name) for name in ("hg19", "GRCh38", " grch37 ", "mm10", "panTro_6"))
+    for name in ("../../../../tmp/x", "../x", "hg19/..", "hg 19", "", "hg19\x00"):
+        assert not is_valid_assembly(name), name
+    try:
+        chain_file_name("../x", "hg38")
+        assert False, "Traversal in a chain file name"
+    except ValueError:
+        pass
+
+    # 目录外放一个 chain 文件，带 ../ 的名称不能加载它
+    outside = os.path.join(directory, os.pardir, "xToHg38.over.chain")
+    with open(outside, "w") as f:
+        f.write(REVERSE_CHAINS)
+    tool = LiftoverTool()
+    try:
+        for source, target in (("../x", "hg38"), ("hg19", "../../../../tmp/x")):
+            result = await tool.liftover("chr4", 101, source=source, target=target)
+            assert result["error_code"] == "INVALID_ASSEMBLY", result
+            result = await tool.liftover_batch([{"chromosome": "chr4", "start": 101}], source, target)
+            assert result["error_code"] == "INVALID_ASSEMBLY", result
+    finally:
+        os.remove(outside)
+    print("✅ PASSED: path-like assembly names rejected with INVALID_ASSEMBLY")
+
+
+def test_loader_cache(directory: str, liftover: LiftOver):
+    """加载失败不缓存，未知染色体名称不缓存"""
+    print("\n" + "="*60)
+    print("测试 5: 缓存")
+    print("="*60)
+
+    path = os.path.join(directory, chain_file_name("hg38", "hg19") + ".over.chain")
+    with open(path, "w") as f:
+        f.write("100\n")
+    assert get_liftover("hg38", "hg19") is None and path not in _loaded_chains
+    with open(path, "w") as f:
+        f.write(CHAINS)
+    assert get_liftover("GRCh38", "GRCh37") is not None, "Fixed chain file is loaded on the next call"
+    print("✅ PASSED: failed load retried once the chain file is fixed")
+
+    for i in range(100):
+        assert liftover.resolve_chromosome(f"unknown{i}") is None
+    assert set(liftover._resolved) <= {"1", "chr1", "2", "chr2"}, liftover._resolved
+    print("✅ PASSED: unknown chromosome names are not cached")
+
+
+async def test_tools():
+    """批量转换和 LangChain 工具回复"""
+    print("\n" + "="*60)
+    print("测试 6: 工具")
+    print("="*60)
+
+    batch = await LiftoverTool().liftover_batch([
+        {"chromosome": "chr1", "start": 121, "end": 180},
+        {"chromosome": "chr9", "start": 5},
+        {"chromosome": "2", "start": 1, "end": 10},
+        {"chromosome": "chr1", "start": 451, "end": 650},
+    ], source="GRCh37", target="GRCh38")
+    assert batch["counts"] == {"mapped": 2, "split": 1, "unmapped": 1}, batch["counts"]
+    assert [r["status"] for r in batch["results"]] == ["mapped", "unmapped", "mapped", "split"]
+    assert batch["results"][2]["segments"][0]["start"] == 11
+    print(f"✅ PASSED: {batch['message']}")
+
+    text = await liftover_coordinates.ainvoke({"chromosome": "chr1", "start": 451, "end": 650})
+    assert "split across 2 regions" in text and "chr5:3951-4000" in text and "chr1:501-600" in text, text
+    print(f"✅ PASSED: {text}")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("坐标转换测试套件")
+    print("🧪"*30)
+
+    original = settings.LIFTOVER_CHAIN_PATH
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            write_chain(directory)
+            settings.LIFTOVER_CHAIN_PATH = directory
+            liftover = get_liftover("hg19", "hg38")
+            assert liftover is not None and get_liftover("hg19", "hg38") is liftover
+
+            test_positions(liftover)
+            test_intervals(liftover)
+            test_reverse_strand_split(directory)
+            await test_assembly_names(directory)
+            test_loader_cache(directory, liftover)
+            await test_tools()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        settings.LIFTOVER_CHAIN_PATH = original
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
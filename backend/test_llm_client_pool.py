@@ -0,0 +1,138 @@
+"""
+测试 LLM 客户端连接池（复用、LRU 淘汰、空闲 TTL 淘汰）
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from langchain.tools import tool
+
+from app.services.llm_client_pool import LLMClientPool
+
+BASE_URL = "https://api.example.com/v1"
+
+
+@tool
+def echo(text: str) -> str:
+    """Echo the text back."""
+    return text
+
+
+async def test_lease_reuse():
+    """相同配置复用同一客户端"""
+    print("\n" + "="*60)
+    print("测试 1: 客户端复用")
+    print("="*60)
+
+    pool = LLMClientPool([echo], max_size=4)
+    async with pool.lease(BASE_URL, "key-a", "gpt-4") as first:
+        assert first.in_use == 1
+    async with pool.lease(BASE_URL + "/", "key-a", "gpt-4") as second:
+        assert second is first, "Trailing slash does not create a new client"
+    async with pool.lease(BASE_URL, "key-b", "gpt-4") as other:
+        assert other is not first
+    assert "key-a" not in str(pool.make_key(BASE_URL, "key-a", "gpt-4")), "API key only stored as hash"
+
+    stats = pool.get_stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["in_use"]) == (2, 1, 2, 0), stats
+    http_client = pool.get_http_client()
+    assert pool.get_http_client() is http_client and pool.get_stats()["size"] == 2, "Plain client is shared, no LLM created"
+    await pool.aclose()
+    assert first.closed and other.closed and pool.get_stats()["size"] == 0
+    assert http_client.is_closed
+    print("✅ PASSED: same config reuses the client, different key creates a new one")
+
+
+async def test_lru_eviction():
+    """超出 max_size 时淘汰最久未使用的客户端，租用中的客户端延迟关闭"""
+    print("\n" + "="*60)
+    print("测试 2: LRU 淘汰")
+    print("="*60)
+
+    pool = LLMClientPool([echo], max_size=2)
+    async with pool.lease(BASE_URL, "key", "model-a") as a:
+        pass
+    async with pool.lease(BASE_URL, "key", "model-b") as b:
+        pass
+    async with pool.lease(BASE_URL, "key", "model-a"):
+        pass
+    async with pool.lease(BASE_URL, "key", "model-c"):
+        pass
+    assert b.evicted and b.closed, "model-b was least recently used"
+    assert not a.evicted and not a.closed
+    assert pool.get_stats()["evictions"] == 1
+    print("✅ PASSED: least recently used client evicted and closed")
+
+    async with pool.lease(BASE_URL, "key", "model-a") as leased:
+        async with pool.lease(BASE_URL, "key", "model-d"):
+            async with pool.lease(BASE_URL, "key", "model-e"):
+                assert leased.evicted and not leased.closed, "Leased client stays open"
+        assert not leased.closed
+    assert leased.closed, "Closed once the lease is released"
+    await pool.aclose()
+    print("✅ PASSED: evicted client closed only after its lease ends")
+
+
+async def test_idle_ttl():
+    """空闲超时淘汰（按需和周期任务）"""
+    print("\n" + "="*60)
+    print("测试 3: 空闲 TTL 淘汰")
+    print("="*60)
+
+    pool = LLMClientPool([echo], idle_ttl=0.05)
+    async with pool.lease(BASE_URL, "key", "model-a") as idle:
+        pass
+    async with pool.lease(BASE_URL, "key", "model-b") as busy:
+        await asyncio.sleep(0.1)
+        await pool.evict_idle()
+        assert idle.evicted and idle.closed
+        assert not busy.evicted, "Leased client is never idle"
+    assert pool.get_stats()["size"] == 1
+    print("✅ PASSED: evict_idle closes only idle clients")
+
+    task = asyncio.create_task(pool.run_eviction(0.02))
+    await asyncio.sleep(0.15)
+    assert busy.closed and pool.get_stats()["size"] == 0, "Periodic eviction closed the expired client"
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    await pool.aclose()
+    print("✅ PASSED: periodic eviction task closes expired clients and stops on cancel")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("LLM 客户端连接池测试套件")
+    print("🧪"*30)
+
+    try:
+        await test_lease_reuse()
+        await test_lru_eviction()
+        await test_idle_ttl()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
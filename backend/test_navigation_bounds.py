@@ -0,0 +1,168 @@
+"""
+测试导航坐标的染色体长度校验与截断
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+import httpx
+from langchain_core.messages import AIMessage
+
+from app.core.config import settings
+from app.services.ai_service import AIService
+from app.services.llm_client_pool import PooledLLMClient
+from app.tools.jbrowse_langchain_tools import RETRY_HINT, navigate_jbrowse
+from app.tools.navigation_tool import NavigationTool
+from app.utils.assembly_aliases import get_chromosome_length
+
+CHROMOSOMES = (("chr1", 248956422), ("chr17", 83257441), ("chrM", 16569))
+
+
+def write_assembly(root: str, name: str) -> None:
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+    with open(os.path.join(directory, f"{name}.chrom.sizes"), "w") as f:
+        for chromosome, length in CHROMOSOMES:
+            f.write(f"{chromosome}\t{length}\n")
+
+
+async def test_validation():
+    """起点越界返回结构化错误，终点越界按配置截断"""
+    print("\n" + "="*60)
+    print("测试 1: 坐标校验")
+    print("="*60)
+
+    assert get_chromosome_length("1") == 248956422 and get_chromosome_length("MT") == 16569
+    assert get_chromosome_length("chr2") is None
+
+    tool = NavigationTool()
+    result = await tool.navigate_to_location("chr1", 300_000_000, 300_010_000)
+    assert result["status"] == "error" and result["error_code"] == "OUT_OF_BOUNDS", result
+    assert result["chromosome_length"] == 248956422
+    assert result["valid_range"] == {"chromosome": "chr1", "start": 1, "end": 248956422}
+    assert result["suggested_location"] == {"chromosome": "chr1", "start": 248946422, "end": 248956422}
+    assert tool.get_navigation_history() == []
+    print(f"✅ PASSED: {result['message']}")
+
+    result = await tool.navigate_to_location("1", 248_950_000, 248_960_000, genome_format="ensembl")
+    assert result["status"] == "success", result
+    location = result["location"]
+    assert (location["chromosome"], location["start"], location["end"]) == ("1", 248950000, 248956422)
+    assert location["clamped_from"] == 248960000 and location["region_size"] == 6422
+    print(f"✅ PASSED: {result['message']}")
+
+    result = await tool.navigate_to_location("chrM", 16569)
+    assert (result["location"]["start"], result["location"]["end"]) == (16568, 16569), result
+    result = await tool.navigate_to_location("chrM", 16000, 17000, clamp=False)
+    assert result["error_code"] == "OUT_OF_BOUNDS"
+    assert result["suggested_location"] == {"chromosome": "chrM", "start": 15569, "end": 16569}
+    print("✅ PASSED: chromosome end edge and clamp=False")
+
+    result = await tool.navigate_to_location("chr1", 1_000_000, 2_000_000)
+    assert "clamped_from" not in result["location"]
+    result = await tool.navigate_to_location("chr2", 300_000_000, 300_010_000)
+    assert result["status"] == "success", "Unknown lengths are not checked"
+    print("✅ PASSED: in-range and unknown-length chromosomes unchanged")
+
+
+async def test_tool_message():
+    """LangChain 工具回复中带修正建议"""
+    print("\n" + "="*60)
+    print("测试 2: 工具回复")
+    print("="*60)
+
+    result = await navigate_jbrowse.ainvoke({"chromosome": "chr1", "start": 300000000, "end": 300010000})
+    assert result.startswith("Navigation failed:") and RETRY_HINT in result, result
+    assert 'navigate_jbrowse(chromosome="chr1", start=248946422, end=248956422)' in result
+    print(f"✅ PASSED: {result}")
+
+    result = await navigate_jbrowse.ainvoke({"chromosome": "chr17", "start": 83250000, "end": 83300000})
+    assert result.startswith("Successfully") and "clamped" in result, result
+    assert "failed" not in result.lower() and "error" not in result.lower()
+    print(f"✅ PASSED: {result}")
+
+
+class FakeLLM:
+    """不调用工具、直接回答的假模型"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return AIMessage(content="chr1 is 248,956,422 bp long; try chr1:248,946,422-248,956,422.")
+
+
+async def test_fast_path():
+    """快速路径导航失败时交给 LLM，没有可用模型时不向用户展示修正建议"""
+    print("\n" + "="*60)
+    print("测试 3: 快速路径越界")
+    print("="*60)
+
+    llm = FakeLLM()
+    service = AIService()
+    service.response_cache = None
+    service.client_pool._create_client = lambda key, *args: PooledLLMClient(key, llm, llm, httpx.AsyncClient())
+    query = "chr1:300,000,000-300,010,000"
+
+    for api_key in ("", "test-key"):
+        result = await service.process_query(query, {"apiKey": api_key})
+        assert result["fast_path"] and result["tool_results"][0]["status"] == "error", result
+        assert result["content"].startswith("Navigation failed:") and RETRY_HINT not in result["content"], result
+    print(f"✅ PASSED: without a model -> {result['content']}")
+
+    result = await service.process_query(query, {"apiKey": "sk-fake"})
+    assert "fast_path" not in result and llm.calls == 1, result
+    assert result["content"] == "chr1 is 248,956,422 bp long; try chr1:248,946,422-248,956,422."
+    print("✅ PASSED: failed fast path falls through to the LLM")
+
+    result = await service.process_query("chr1:1,000,000-2,000,000", {"apiKey": "sk-fake"})
+    assert result["fast_path"] and llm.calls == 1
+    print("✅ PASSED: in-range locus still skips the LLM")
+
+    await service.aclose()
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("导航坐标校验测试套件")
+    print("🧪"*30)
+
+    original = (settings.ASSEMBLY_DATA_PATH, settings.DEFAULT_ASSEMBLY)
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            write_assembly(root, "bounds_test")
+            settings.ASSEMBLY_DATA_PATH = root
+            settings.DEFAULT_ASSEMBLY = "bounds_test"
+
+            await test_validation()
+            await test_tool_message()
+            await test_fast_path()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        settings.ASSEMBLY_DATA_PATH, settings.DEFAULT_ASSEMBLY = original
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,164 @@
+"""
+测试按会话隔离的有界导航历史
+"""
+
+import asyncio
+import os
+import sys
+import tracemalloc
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.services.pubsub import InProcessBackend
+from app.services.websocket_manager import WebSocketManager
+from app.tools.jbrowse_langchain_tools import _navigation_tool, get_navigation_history, navigate_jbrowse
+from app.tools.navigation_history import (
+    HistoryEntry,
+    NavigationHistory,
+    get_navigation_history_store,
+    navigation_session,
+)
+from app.tools.navigation_tool import NavigationTool
+
+
+class FakeWebSocket:
+    """不发送任何内容的假 WebSocket"""
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def location(i: int):
+    return {"chromosome": "chr1", "start": i * 1000 + 1, "end": i * 1000 + 500}
+
+
+def test_ring_buffer():
+    """固定容量的环形缓冲区"""
+    print("\n" + "="*60)
+    print("测试 1: 环形缓冲区")
+    print("="*60)
+
+    history = NavigationHistory(5)
+    assert history.recent() == []
+    for i in range(12):
+        history.record(location(i))
+    assert len(history) == 5
+    assert [e["location"]["start"] for e in history.recent(10)] == [7001, 8001, 9001, 10001, 11001]
+    assert [e["location"]["start"] for e in history.recent(2)] == [10001, 11001]
+    assert history.recent(0) == []
+    history.record({**location(12), "gene_name": "TP53"})
+    assert history.recent(1)[0]["location"]["gene_name"] == "TP53"
+    history.clear()
+    assert len(history) == 0 and history.recent() == []
+    assert not hasattr(HistoryEntry("chr1", 1, 2, None, 0.0), "__dict__")
+    print("✅ PASSED: keeps the newest entries in order, slotted entries")
+
+
+async def test_session_isolation():
+    """并发会话各自的历史"""
+    print("\n" + "="*60)
+    print("测试 2: 会话隔离")
+    print("="*60)
+
+    store = get_navigation_history_store()
+
+    async def session_queries(session_id: str, chromosome: str):
+        with navigation_session(session_id):
+            for start in range(1_000_000, 6_000_000, 1_000_000):
+                # 与 AIService 一样，工具调用在新任务中执行
+                await asyncio.gather(navigate_jbrowse.ainvoke({"chromosome": chromosome, "start": start}))
+                await asyncio.sleep(0)
+            return get_navigation_history.invoke({"limit": 10})
+
+    result_a, result_b = await asyncio.gather(session_queries("a", "chr1"), session_queries("b", "chr2"))
+    assert "chr1:" in result_a and "chr2:" not in result_a, result_a
+    assert "chr2:" in result_b and "chr1:" not in result_b, result_b
+    assert len(store.history("a")) == 5 and len(store.history("b")) == 5
+    assert len(_navigation_tool._history) == 0, "Session navigations do not go into the shared history"
+    print("✅ PASSED: concurrent sessions only see their own locations")
+
+    tool = NavigationTool()
+    await tool.navigate_to_location("chr3", 100, 200)
+    await tool.navigate_to_location("chr3", 300, 400, record_history=False)
+    assert len(tool.get_navigation_history()) == 1
+    with navigation_session("a"):
+        assert len(tool.get_navigation_history(50)) == 5
+        await tool.navigate_by_gene("BRCA1")
+        assert tool.get_navigation_history(1)[0]["location"]["gene_name"] == "BRCA1"
+    print("✅ PASSED: sessionless history and record_history=False")
+
+    store.release("a")
+    store.release("b")
+    assert "a" not in store and "b" not in store
+
+
+async def test_release_and_memory():
+    """断开时释放，长时间运行内存不增长"""
+    print("\n" + "="*60)
+    print("测试 3: 释放与内存")
+    print("="*60)
+
+    store = get_navigation_history_store()
+    manager = WebSocketManager(InProcessBackend())
+    websocket = FakeWebSocket()
+    session_id = await manager.connect(websocket)
+    with navigation_session(session_id):
+        await NavigationTool().navigate_to_location("chr1", 1000, 2000)
+    assert session_id in store
+    await manager.disconnect(websocket)
+    assert session_id not in store
+    print("✅ PASSED: history released on disconnect")
+
+    history = store.history("long-running")
+    for i in range(store.capacity):
+        history.record(location(i))
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for i in range(100_000):
+        history.record(location(i))
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(history) == store.capacity
+    assert after - before < 16 * 1024, after - before
+    store.release("long-running")
+    await manager.close()
+    print(f"✅ PASSED: 100,000 navigations, memory change {after - before:+,} bytes")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("导航历史测试套件")
+    print("🧪"*30)
+
+    try:
+        test_ring_buffer()
+        await test_session_isolation()
+        await test_release_and_memory()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,107 @@
+"""
+测试 LLM 响应缓存
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.services.response_cache import ResponseCache, normalize_query
+
+
+def test_normalization():
+    """测试查询规范化"""
+    print("\n" + "="*60)
+    print("测试 1: 查询规范化")
+    print("="*60)
+
+    assert normalize_query("  What is   BRCA1? ") == "what is brca1"
+    assert normalize_query("什么是基因组学？") == normalize_query("什么是基因组学")
+    base_url = "https://api.openai.com/v1"
+    key_a = ResponseCache.make_key("Explain genomics.", base_url, "gpt-4", "v1")
+    key_b = ResponseCache.make_key("explain GENOMICS", base_url + "/", "gpt-4", "v1")
+    assert key_a == key_b, "Equivalent queries should share a key"
+    assert key_a != ResponseCache.make_key("explain genomics", base_url, "gpt-4", "v2"), "Prompt version must be part of the key"
+    assert key_a != ResponseCache.make_key("explain genomics", "https://proxy.example.com/v1", "gpt-4", "v1"), \
+        "API base URL must be part of the key"
+    print("✅ PASSED")
+
+
+async def test_lru_eviction():
+    """测试 LRU 淘汰和字节统计"""
+    print("\n" + "="*60)
+    print("测试 2: LRU 淘汰")
+    print("="*60)
+
+    cache = ResponseCache(max_entries=2)
+    await cache.set("a", "alpha")
+    await cache.set("b", "beta")
+    assert await cache.get("a") == "alpha"  # a 变为最近使用
+    await cache.set("c", "gamma")
+
+    assert await cache.get("b") is None, "Least recently used entry should be evicted"
+    assert await cache.get("c") == "gamma"
+    stats = cache.get_stats()
+    assert stats["entries"] == 2
+    assert stats["bytes_held"] == len("alpha") + len("gamma")
+    assert stats["evictions"] == 1
+    print(f"✅ PASSED: {stats}")
+
+
+async def test_ttl_and_disk_tier():
+    """测试过期和磁盘层"""
+    print("\n" + "="*60)
+    print("测试 3: TTL 与磁盘缓存")
+    print("="*60)
+
+    cache = ResponseCache(ttl=-1)
+    await cache.set("a", "alpha")
+    assert await cache.get("a") is None, "Expired entry should miss"
+    print("✅ PASSED: expired entry")
+
+    with tempfile.TemporaryDirectory() as disk_dir:
+        writer = ResponseCache(disk_dir=disk_dir)
+        await writer.set("k", "cached on disk")
+
+        reader = ResponseCache(disk_dir=disk_dir)
+        assert await reader.get("k") == "cached on disk"
+        assert reader.get_stats()["disk_hits"] == 1
+        assert await reader.get("k") == "cached on disk"
+        assert reader.get_stats()["hits"] == 1, "Disk hit should be promoted to memory"
+        print(f"✅ PASSED: {reader.get_stats()}")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("ResponseCache 测试套件")
+    print("🧪"*30)
+
+    try:
+        test_normalization()
+        await test_lru_eviction()
+        await test_ttl_and_disk_tier()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
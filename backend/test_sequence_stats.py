@@ -0,0 +1,186 @@
+"""
+测试序列组成统计（GC 含量、CpG 观测/期望比、N 缺口、滑动窗口）
+"""
+
+import asyncio
+import random
+import sys
+import os
+import tempfile
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.genomics.fasta import IndexedFasta, build_fai
+from app.genomics.sequence_stats import sequence_stats
+
+
+def random_sequence(rng: random.Random, length: int) -> str:
+    """带大小写（软屏蔽）、N 缺口和少量简并碱基的随机序列"""
+    parts = []
+    while sum(map(len, parts)) < length:
+        kind = rng.random()
+        size = rng.randint(1, 300)
+        if kind < 0.05:
+            parts.append("N" * size)
+        elif kind < 0.07:
+            parts.append(rng.choice("RYKM"))
+        else:
+            letters = "".join(rng.choice("ACGT" if rng.random() < 0.5 else "CCGG") for _ in range(size))
+            parts.append(letters.lower() if rng.random() < 0.3 else letters)
+    return "".join(parts)[:length]
+
+
+def brute_force(sequence: str):
+    upper = sequence.upper()
+    c, g = upper.count("C"), upper.count("G")
+    acgt = sum(upper.count(b) for b in "ACGT")
+    cpg = sum(1 for i in range(len(upper) - 1) if upper[i:i + 2] == "CG")
+    runs = []
+    i = 0
+    while i < len(upper):
+        if upper[i] == "N":
+            j = i
+            while j < len(upper) and upper[j] == "N":
+                j += 1
+            runs.append((i, j))
+            i = j
+        else:
+            i += 1
+    return {
+        "gc": (c + g) / acgt if acgt else None,
+        "obs_exp": cpg * acgt / (c * g) if c * g else None,
+        "cpg": cpg,
+        "runs": runs,
+        "masked": sum(1 for ch in sequence if ch.islower()) / len(sequence),
+    }
+
+
+def close(a, b) -> bool:
+    return (a is None and b is None) or (a is not None and b is not None and abs(a - b) < 1e-4)
+
+
+def test_against_brute_force():
+    """与逐字符计算对比"""
+    print("\n" + "="*60)
+    print("测试 1: 统计结果对比逐字符计算")
+    print("="*60)
+
+    rng = random.Random(3)
+    for _ in range(30):
+        sequence = random_sequence(rng, rng.choice([1, 2, 150, 2000, 7777]))
+        offset = rng.randint(1, 10_000)
+        window_size = rng.choice([1, 50, 333, 1000])
+        step = rng.choice([None, 17, window_size])
+        stats = sequence_stats(sequence.encode("ascii"), offset, window_size, step)
+        expected = brute_force(sequence)
+
+        assert stats["length"] == len(sequence)
+        assert close(stats["gc_fraction"], expected["gc"]), (stats["gc_fraction"], expected["gc"])
+        assert close(stats["cpg_obs_exp"], expected["obs_exp"])
+        assert stats["cpg_count"] == expected["cpg"]
+        assert close(stats["masked_fraction"], expected["masked"])
+        assert stats["n_runs"]["count"] == len(expected["runs"])
+        for run, (lo, hi) in zip(stats["n_runs"]["runs"], expected["runs"]):
+            assert (run["start"], run["end"]) == (offset + lo, offset + hi - 1)
+
+        windows = stats["windows"]
+        assert windows[0]["start"] == offset
+        if (step or window_size) <= window_size:
+            assert windows[-1]["end"] == offset + len(sequence) - 1
+        for window in windows:
+            part = sequence[window["start"] - offset:window["end"] - offset + 1]
+            assert len(part) == min(window_size, len(sequence)) or window is windows[-1], window
+            part_expected = brute_force(part)
+            assert close(window["gc_fraction"], part_expected["gc"]), (window, part_expected)
+            assert close(window["cpg_obs_exp"], part_expected["obs_exp"]), (window, part_expected)
+    print("✅ PASSED: 30 random sequences (totals, N runs, sliding windows)")
+
+    island = sequence_stats(b"CG" * 150)
+    assert island["cpg_island_like"] and island["gc_fraction"] == 1.0
+    assert not sequence_stats(b"AT" * 150)["cpg_island_like"]
+    assert sequence_stats(b"NNNN")["gc_fraction"] is None
+    print("✅ PASSED: CpG island flag and all-N sequence")
+
+
+def test_edge_cases():
+    """窗口边界上的 CpG、软屏蔽、序列两端的 N 缺口和截断的末尾窗口"""
+    print("\n" + "="*60)
+    print("测试 2: 边界情况")
+    print("="*60)
+
+    sequence = b"AAACGTTTCGAA"
+    stats = sequence_stats(sequence, 1, 4)
+    assert stats["cpg_count"] == 2
+    assert [w["cpg_obs_exp"] for w in stats["windows"]] == [None, None, 4.0], "CpG split across windows is not counted"
+    overlapping = sequence_stats(sequence, 1, 4, 2)["windows"]
+    assert [(w["start"], w["cpg_obs_exp"]) for w in overlapping] == [(1, None), (3, 4.0), (5, None), (7, 4.0), (9, 4.0)]
+    print("✅ PASSED: CpG counted only in windows that contain both bases")
+
+    masked = sequence_stats(b"acgTTcG")
+    assert masked["cpg_count"] == 2 and masked["masked_fraction"] == round(4 / 7, 4)
+    print("✅ PASSED: soft-masked bases counted case-insensitively")
+
+    gaps = sequence_stats(b"NNACGNN", 101)
+    assert gaps["n_runs"]["runs"] == [{"start": 101, "end": 102}, {"start": 106, "end": 107}]
+    assert gaps["gc_fraction"] == round(2 / 3, 4)
+    many = sequence_stats(b"NA" * 150)["n_runs"]
+    assert (many["count"], many["total_length"], many["longest"], len(many["runs"])) == (150, 150, 1, 100)
+    print("✅ PASSED: N runs at both ends, listed runs capped")
+
+    windows = sequence_stats(b"ACGTACGTAC", 1, 3, 4)["windows"]
+    assert [(w["start"], w["end"]) for w in windows] == [(1, 3), (5, 7), (9, 10)]
+    windows = sequence_stats(b"ACGTACGTAC", 1, 4, 3)["windows"]
+    assert [(w["start"], w["end"]) for w in windows] == [(1, 4), (4, 7), (7, 10)]
+    print("✅ PASSED: truncated last window only when the end is not covered")
+
+
+def test_fasta_region(tmp_dir: str):
+    """FASTA 区域统计：CpG 跨越行尾和区域边界"""
+    print("\n" + "="*60)
+    print("测试 3: FASTA 区域")
+    print("="*60)
+
+    path = os.path.join(tmp_dir, "ref.fa")
+    with open(path, "w") as f:
+        f.write(">chr1\n" + "A" * 59 + "C\n" + "G" + "T" * 59 + "\n")
+    build_fai(path)
+    fasta = IndexedFasta(path)
+    assert sequence_stats(fasta.fetch_bytes("chr1", 1, 60))["cpg_count"] == 0
+    assert sequence_stats(fasta.fetch_bytes("chr1", 1, 61))["cpg_count"] == 1, "Line break is not part of the sequence"
+    assert sequence_stats(fasta.fetch_bytes("chr1", 61, 120), 61)["gc_fraction"] == round(1 / 60, 4)
+    fasta.close()
+    print("✅ PASSED: CpG across a line break counted only when the region includes both bases")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("序列组成统计测试套件")
+    print("🧪"*30)
+
+    try:
+        test_against_brute_force()
+        test_edge_cases()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test_fasta_region(tmp_dir)
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,203 @@
+"""
+测试多分辨率汇总金字塔（覆盖度 / 特征密度）
+"""
+
+import asyncio
+import random
+import sys
+import os
+import tempfile
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+import numpy as np
+
+from app.core.config import settings
+from app.genomics.interval_index import FeatureIntervalIndex, build_feature_index
+from app.genomics.summary_pyramid import (
+    SummaryPyramid,
+    build_summary_pyramid,
+    feature_density_values,
+    get_summary_pyramid,
+)
+from app.tools.jbrowse_tools import JBrowseToolkit
+
+
+PATTERN = np.random.default_rng(1).integers(0, 40, size=1 << 20).astype(np.int32)
+
+
+def patterned_depth(chrom: str, start: int, end: int) -> np.ndarray:
+    """确定性的伪随机深度（构建窗口与 PATTERN 长度对齐，每个窗口整体偏移）"""
+    offset = start % len(PATTERN)
+    return PATTERN[offset:offset + end - start] + (start // len(PATTERN)) % 7
+
+
+def raw_depth(length: int) -> np.ndarray:
+    return np.concatenate([
+        patterned_depth("", start, min(start + len(PATTERN), length))
+        for start in range(0, length, len(PATTERN))
+    ])
+
+
+def check_against_raw(result, raw: np.ndarray):
+    """每个输出分箱与原始逐碱基数值对比"""
+    for b in result["bins"]:
+        window = raw[b["start"] - 1:b["end"]]
+        assert b["min"] == window.min() and b["max"] == window.max(), b
+        assert abs(b["mean"] - window.mean()) < 0.01, (b, window.mean())
+
+
+def test_pyramid_queries(tmp_dir: str) -> SummaryPyramid:
+    """随机窗口与原始数值对比"""
+    print("\n" + "="*60)
+    print("测试 1: 金字塔查询对比原始数值")
+    print("="*60)
+
+    lengths = {"chr1": 3_000_017, "chr2": 250_000_000, "chrM": 3000}
+    pyramid_dir = os.path.join(tmp_dir, "coverage")
+    build_summary_pyramid(lengths, patterned_depth, pyramid_dir, "test")
+    pyramid = SummaryPyramid(pyramid_dir)
+
+    raw = raw_depth(lengths["chr1"])
+    rng = random.Random(9)
+    for _ in range(100):
+        start = rng.randint(1, lengths["chr1"])
+        end = start + rng.choice([10_000, 200_000, 3_000_000])
+        bins = rng.choice([10, 100, 700])
+        result = pyramid.query("1", start, end, bins)
+        if result is None:
+            assert (min(end, lengths["chr1"]) - start + 1) / bins < pyramid.base_bin_size
+            continue
+        assert 0 < len(result["bins"]) <= bins
+        assert result["level_bin_size"] <= (result["end"] - start + 1) / bins
+        check_against_raw(result, raw)
+    print("✅ PASSED: 100 random windows match raw values")
+
+    whole = pyramid.query("chr1", 1, lengths["chr1"], 100)
+    assert whole["bins"][-1]["end"] == lengths["chr1"]
+    assert abs(whole["mean"] - raw.mean()) < 0.01
+    print("✅ PASSED: whole chromosome incl. partial last bin")
+
+    # 短于三个最细分箱的染色体：查询窗口两端都落在分箱中间
+    short = pyramid.query("MT", 1000, 3000, 1)
+    assert short["level_bin_size"] == 1024 and [(b["start"], b["end"]) for b in short["bins"]] == [(1, 3000)]
+    check_against_raw(short, patterned_depth("chrM", 0, 3000))
+    assert pyramid.query("chrM", 1, 3000, 3) is None, "1000 bp per bin is finer than the base level"
+    print("✅ PASSED: partial bins at both window edges are widened to level boundaries")
+
+    for i in range(100):
+        try:
+            pyramid.query(f"unknown{i}", 1, 100)
+        except KeyError:
+            pass
+    assert set(pyramid._resolved) <= {"1", "chr1", "MT", "chrM"}, "Unknown names are not cached"
+    return pyramid
+
+
+def test_level_selection(pyramid: SummaryPyramid):
+    """选择分箱不大于 区域长度 / bins 的最粗一层"""
+    print("\n" + "="*60)
+    print("测试 2: 层级选择")
+    print("="*60)
+
+    expected_levels = {2_000_000: 1024, 4_095_999: 1024, 4_096_000: 4096, 10_000_000: 4096,
+                       100_000_000: 65536, 250_000_000: 65536}
+    for size, level_bin_size in expected_levels.items():
+        result = pyramid.query("chr2", 1, size, 1000)
+        assert result["level_bin_size"] == level_bin_size, (size, result["level_bin_size"])
+        assert len(result["bins"]) <= 1000 and result["bins"][-1]["end"] >= size
+        print(f"✅ PASSED: {size:>11,} bp -> level {level_bin_size:>6,} bp, {len(result['bins'])} bins")
+    assert pyramid.query("chr2", 1, 1_023_999, 1000) is None, "Finer than the base level"
+    assert pyramid.query("chr2", 1, 1_024_000, 1000)["level_bin_size"] == 1024
+    print("✅ PASSED: base level used from exactly 1024 bp per output bin")
+
+
+async def test_feature_density(tmp_dir: str):
+    """特征密度：金字塔和注释索引直接计算"""
+    print("\n" + "="*60)
+    print("测试 3: 特征密度")
+    print("="*60)
+
+    rng = random.Random(2)
+    genes = []
+    lines = []
+    for i in range(3000):
+        start = rng.randint(1, 20_000_000)
+        end = start + rng.randint(500, 200_000)
+        genes.append((start - 1, end))
+        lines.append(f"chr5\tsim\tgene\t{start}\t{end}\t.\t+\t.\tID=g{i};Name=G{i}")
+    gff_path = os.path.join(tmp_dir, "genes.gff3")
+    with open(gff_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    index_dir = os.path.join(tmp_dir, "features")
+    build_feature_index([gff_path], index_dir)
+
+    lengths, values = feature_density_values(index_dir, "gene")
+    raw = np.zeros(lengths["chr5"], dtype=np.int32)
+    for start, end in genes:
+        raw[start:end] += 1
+    assert np.array_equal(values("chr5", 0, lengths["chr5"]), raw)
+
+    settings.SUMMARY_PYRAMID_PATH = os.path.join(tmp_dir, "summaries")
+    build_summary_pyramid(lengths, values, os.path.join(settings.SUMMARY_PYRAMID_PATH, "density_gene"), "density:gene")
+
+    toolkit = JBrowseToolkit(feature_index=FeatureIntervalIndex(index_dir))
+    whole = await toolkit.get_feature_density("5", 1, lengths["chr5"], "gene", 200)
+    assert whole["status"] == "success", whole
+    assert whole["density"]["level_bin_size"] > 1
+    check_against_raw(whole["density"], raw)
+    print(f"✅ PASSED: whole chromosome from pyramid ({whole['density']['level_bin_size']:,} bp level)")
+
+    detail = await toolkit.get_feature_density("chr5", 1_000_000, 1_100_000, "gene", 1000)
+    assert detail["density"]["level_bin_size"] == 1
+    check_against_raw(detail["density"], raw)
+    print("✅ PASSED: fine resolution computed from the feature index")
+
+
+def test_pyramid_cache(tmp_dir: str):
+    """服务运行中构建的金字塔下次调用即可使用"""
+    print("\n" + "="*60)
+    print("测试 4: 金字塔缓存")
+    print("="*60)
+
+    root = os.path.join(tmp_dir, "later")
+    assert get_summary_pyramid("coverage", root) is None, "Not built yet"
+    build_summary_pyramid({"chrM": 3000}, patterned_depth, os.path.join(root, "coverage"), "test")
+    pyramid = get_summary_pyramid("coverage", root)
+    assert pyramid is not None and get_summary_pyramid("coverage", root) is pyramid
+    print("✅ PASSED: pyramid built after the first lookup is loaded, then cached")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("汇总金字塔测试套件")
+    print("🧪"*30)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pyramid = test_pyramid_queries(tmp_dir)
+            test_level_selection(pyramid)
+            await test_feature_density(tmp_dir)
+            test_pyramid_cache(tmp_dir)
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
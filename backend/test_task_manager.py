@@ -0,0 +1,123 @@
+"""
+测试 WebSocket 连接任务管理（并发上限、按 ID 取消、断开时取消全部）
+"""
+
+import asyncio
+import gc
+import os
+import sys
+import warnings
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.services.task_manager import ConnectionTaskManager
+
+
+class Handler:
+    """记录开始、完成和取消情况的消息处理协程"""
+
+    def __init__(self):
+        self.started = []
+        self.finished = []
+        self.cancelled = []
+
+    async def run(self, name: str, delay: float = 3600):
+        self.started.append(name)
+        try:
+            await asyncio.sleep(delay)
+            self.finished.append(name)
+            return name
+        except asyncio.CancelledError:
+            self.cancelled.append(name)
+            raise
+
+
+async def test_concurrency_and_cancel():
+    """并发上限和按请求 ID 取消"""
+    print("\n" + "="*60)
+    print("测试 1: 并发上限与取消")
+    print("="*60)
+
+    handler = Handler()
+    tasks = ConnectionTaskManager(max_concurrency=2)
+    for name in ("a", "b", "c"):
+        tasks.spawn(name, handler.run(name))
+    tasks.spawn("ack", handler.run("ack", 0), limited=False)
+    await asyncio.sleep(0.01)
+    assert handler.started == ["a", "b", "ack"], handler.started
+    assert handler.finished == ["ack"] and tasks.active_count == 3
+    print("✅ PASSED: third limited task waits, unlimited task runs immediately")
+
+    assert tasks.cancel("a")
+    await asyncio.sleep(0.01)
+    assert handler.cancelled == ["a"] and handler.started[-1] == "c", "Queued task starts when a slot frees"
+    assert not tasks.cancel("a") and not tasks.cancel("missing")
+    print("✅ PASSED: cancel by request id frees a slot")
+
+    replaced = tasks.spawn("b", handler.run("b2", 0))
+    assert await replaced == "b2"
+    await asyncio.sleep(0)
+    assert "b" in handler.cancelled, "Reused request id cancels the previous task"
+    await tasks.cancel_all()
+    print("✅ PASSED: reused request id replaces the previous task")
+
+
+async def test_cancel_all_on_disconnect():
+    """连接断开时取消所有运行中和排队中的任务"""
+    print("\n" + "="*60)
+    print("测试 2: 断开时取消全部任务")
+    print("="*60)
+
+    handler = Handler()
+    tasks = ConnectionTaskManager(max_concurrency=2)
+    spawned = [tasks.spawn(f"query-{i}", handler.run(f"query-{i}")) for i in range(5)]
+    await asyncio.sleep(0.01)
+    assert len(handler.started) == 2 and tasks.active_count == 5
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        # websocket_endpoint 在连接断开后的 finally 中调用
+        await tasks.cancel_all()
+        gc.collect()
+
+    assert all(task.cancelled() for task in spawned)
+    assert sorted(handler.cancelled) == sorted(handler.started), "Running handlers saw CancelledError"
+    assert handler.finished == [] and tasks.active_count == 0
+    assert not [w for w in caught if "never awaited" in str(w.message)], "Queued coroutines are closed"
+    print("✅ PASSED: 2 running and 3 queued tasks cancelled, no leaked coroutines")
+
+    await tasks.cancel_all()
+    assert tasks.active_count == 0
+    print("✅ PASSED: cancel_all on an idle connection is a no-op")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("连接任务管理测试套件")
+    print("🧪"*30)
+
+    try:
+        await test_concurrency_and_cancel()
+        await test_cancel_all_on_disconnect()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,226 @@
+"""
+测试变异批量注释（所在基因、区域类型、最近基因距离）
+"""
+
+import asyncio
+import random
+import sys
+import os
+import tempfile
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.genomics.bgzf import BgzfWriter
+from app.genomics.interval_index import FeatureIntervalIndex, build_feature_index
+from app.genomics.tabix import build_tabix_index
+from app.genomics.variant_annotator import VariantAnnotator
+from app.genomics.vcf_reader import VcfReader
+from app.tools.jbrowse_tools import JBrowseToolkit
+
+
+def write_annotation(path: str, seed: int = 6):
+    """随机基因（含嵌套基因），每个基因两个外显子：第一个是 5'UTR + CDS，第二个是 CDS"""
+    rng = random.Random(seed)
+    genes, exons, utrs, cds = [], [], [], []
+    lines = ["##gff-version 3"]
+    for chrom, count in (("chr1", 400), ("chr2", 150)):
+        for i in range(count):
+            start = rng.randint(1, 5_000_000)
+            end = start + rng.randint(2000, 300_000) if i % 10 else start + rng.randint(500_000, 900_000)
+            name = f"{chrom.upper()}G{i}"
+            exon1 = (start, start + 999)
+            exon2 = (end - 499, end)
+            genes.append((chrom, start, end, name))
+            exons += [(chrom, *exon1), (chrom, *exon2)]
+            utrs.append((chrom, start, start + 199))
+            cds += [(chrom, start + 200, start + 999), (chrom, *exon2)]
+            lines.append(f"{chrom}\tsim\tgene\t{start}\t{end}\t.\t+\t.\tID={name};Name={name}")
+            lines.append(f"{chrom}\tsim\tmRNA\t{start}\t{end}\t.\t+\t.\tID={name}.1;Parent={name}")
+            for lo, hi in (exon1, exon2):
+                lines.append(f"{chrom}\tsim\texon\t{lo}\t{hi}\t.\t+\t.\tParent={name}.1")
+            lines.append(f"{chrom}\tsim\tfive_prime_UTR\t{start}\t{start + 199}\t.\t+\t.\tParent={name}.1")
+            lines.append(f"{chrom}\tsim\tCDS\t{start + 200}\t{start + 999}\t.\t+\t0\tParent={name}.1")
+            lines.append(f"{chrom}\tsim\tCDS\t{exon2[0]}\t{exon2[1]}\t.\t+\t0\tParent={name}.1")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return genes, exons, utrs, cds
+
+
+def brute_force(features, chrom: str, position: int):
+    genes, exons, utrs, cds = features
+
+    def overlapping(intervals):
+        return [x for x in intervals if x[0] == chrom and x[1] <= position <= x[2]]
+
+    inside = overlapping(genes)
+    distances = [
+        (0 if start <= position <= end else min(abs(start - position), abs(position - end)), name)
+        for c, start, end, name in genes if c == chrom
+    ]
+    if not inside:
+        region = "intergenic"
+    elif overlapping(utrs) and not overlapping(cds):
+        region = "UTR"
+    elif overlapping(exons):
+        region = "exon"
+    else:
+        region = "intron"
+    return inside, region, bool(inside and overlapping(cds)), min(distances) if distances else None
+
+
+def test_against_brute_force(tmp_dir: str) -> FeatureIntervalIndex:
+    """与逐个变异、逐个基因的暴力计算对比"""
+    print("\n" + "="*60)
+    print("测试 1: 注释结果对比暴力计算")
+    print("="*60)
+
+    features = write_annotation(os.path.join(tmp_dir, "genes.gff3"))
+    index_dir = os.path.join(tmp_dir, "features")
+    build_feature_index([os.path.join(tmp_dir, "genes.gff3")], index_dir)
+    index = FeatureIntervalIndex(index_dir)
+    annotator = VariantAnnotator(index)
+
+    rng = random.Random(1)
+    for chrom in ("chr1", "2", "chr3"):
+        positions = [rng.randint(1, 6_500_000) for _ in range(1500)]
+        # 基因边界及其两侧
+        positions += [g[1] + d for g in features[0][:50] for d in (-1, 0, 1)]
+        annotations = annotator.annotate(chrom, positions)
+        name = chrom if chrom.startswith("chr") else f"chr{chrom}"
+        for position, annotation in zip(positions, annotations):
+            inside, region, coding, nearest = brute_force(features, name, position)
+            assert annotation["gene_count"] == len(inside), (position, annotation)
+            assert annotation["region"] == region, (position, annotation, region)
+            assert annotation["coding"] == coding, (position, annotation)
+            if inside:
+                # 多个基因重叠时取终点最远的基因
+                assert annotation["gene"] in {g[3] for g in inside if g[2] == max(x[2] for x in inside)}
+            else:
+                assert annotation["gene"] is None
+            if nearest is None:
+                assert annotation["nearest_gene"] is None and annotation["distance"] is None
+            else:
+                assert annotation["distance"] == nearest[0], (position, annotation, nearest)
+                gene = next(g for g in features[0] if g[3] == annotation["nearest_gene"])
+                assert brute_force(([gene], [], [], []), name, position)[3][0] == nearest[0]
+    print("✅ PASSED: 4,950 positions on 3 chromosomes (gene, region, coding, nearest gene)")
+    return index
+
+
+def test_edge_cases(tmp_dir: str):
+    """特征边界、嵌套基因、被长基因遮挡的短基因和等距的最近基因"""
+    print("\n" + "="*60)
+    print("测试 2: 边界情况")
+    print("="*60)
+
+    lines = [
+        "chr7\tsim\tgene\t1000\t2000\t.\t+\t.\tID=A;Name=A",
+        "chr7\tsim\texon\t1000\t1199\t.\t+\t.\tParent=A",
+        "chr7\tsim\tfive_prime_UTR\t1000\t1099\t.\t+\t.\tParent=A",
+        "chr7\tsim\tCDS\t1100\t1199\t.\t+\t0\tParent=A",
+        "chr7\tsim\texon\t1901\t2000\t.\t+\t.\tParent=A",
+        "chr7\tsim\tthree_prime_UTR\t1901\t2000\t.\t+\t.\tParent=A",
+        # 嵌套在 A 的内含子中
+        "chr7\tsim\tgene\t1500\t1600\t.\t-\t.\tID=B;Name=B",
+        "chr7\tsim\texon\t1500\t1600\t.\t-\t.\tParent=B",
+        "chr7\tsim\tCDS\t1500\t1600\t.\t-\t0\tParent=B",
+        # D 完全落在 C 内，D 之后的位置只能通过终点前缀最大值找到 C
+        "chr7\tsim\tgene\t5001\t20000\t.\t+\t.\tID=C;Name=C",
+        "chr7\tsim\tgene\t6000\t7000\t.\t+\t.\tID=D;Name=D",
+        "chr7\tsim\tgene\t30001\t30100\t.\t+\t.\tID=E;Name=E",
+    ]
+    gff_path = os.path.join(tmp_dir, "edges.gff3")
+    with open(gff_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    index_dir = os.path.join(tmp_dir, "edges")
+    build_feature_index([gff_path], index_dir)
+    annotator = VariantAnnotator(FeatureIntervalIndex(index_dir))
+
+    # 位置 -> (gene, gene_count, region, coding, nearest_gene, distance)
+    expected = {
+        -5: (None, 0, "intergenic", False, "A", 999),
+        999: (None, 0, "intergenic", False, "A", 1),
+        1000: ("A", 1, "UTR", False, "A", 0),
+        1099: ("A", 1, "UTR", False, "A", 0),
+        1100: ("A", 1, "exon", True, "A", 0),
+        1200: ("A", 1, "intron", False, "A", 0),
+        1500: ("A", 2, "exon", True, "A", 0),
+        1601: ("A", 1, "intron", False, "A", 0),
+        2000: ("A", 1, "UTR", False, "A", 0),
+        2001: (None, 0, "intergenic", False, "A", 1),
+        3500: (None, 0, "intergenic", False, "A", 1500),  # 等距时取左侧基因
+        3501: (None, 0, "intergenic", False, "C", 1500),
+        6500: ("C", 2, "intron", False, "C", 0),
+        8000: ("C", 1, "intron", False, "C", 0),
+        25000: (None, 0, "intergenic", False, "C", 5000),
+        2**40: (None, 0, "intergenic", False, "E", 2**31 - 1 - 30100),
+    }
+    positions = list(expected)[::-1] + [1500]
+    annotations = annotator.annotate("7", positions)
+    for position, annotation in zip(positions, annotations):
+        assert tuple(annotation.values()) == expected[position], (position, annotation)
+    print(f"✅ PASSED: {len(expected)} boundary positions (unsorted, duplicated and out-of-range input)")
+
+    variants = [{"chromosome": "chr7", "position": 1100}, {"chromosome": "chrUn", "position": 5},
+                {"chromosome": "7", "position": 999}]
+    annotations = annotator.annotate_variants(variants)
+    assert [a["region"] for a in annotations] == ["exon", "intergenic", "intergenic"]
+    assert annotations[1]["nearest_gene"] is None and annotations[1]["distance"] is None
+    print("✅ PASSED: mixed chromosome names keep input order, no genes -> no nearest gene")
+
+
+async def test_search_variants(tmp_dir: str, index: FeatureIntervalIndex):
+    """search_variants 附带注释"""
+    print("\n" + "="*60)
+    print("测试 3: search_variants 注释")
+    print("="*60)
+
+    path = os.path.join(tmp_dir, "variants.vcf.gz")
+    with BgzfWriter(path) as writer:
+        writer.write(b"##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for position in range(1000, 2_000_000, 997):
+            writer.write(f"chr1\t{position}\t.\tA\tG\t50\tPASS\t.\n".encode("ascii"))
+    build_tabix_index(path)
+
+    toolkit = JBrowseToolkit(feature_index=index, vcf_reader=VcfReader(path))
+    result = await toolkit.search_variants("chr1", 1, 500_000)
+    annotator = VariantAnnotator(index)
+    for variant in result["variants"]:
+        assert variant["annotation"] == annotator.annotate("chr1", [variant["position"]])[0]
+    result = await toolkit.search_variants("chr1", 1, 500_000, annotate=False)
+    assert "annotation" not in result["variants"][0]
+    print(f"✅ PASSED: {len(result['variants'])} variants annotated in place")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("变异批量注释测试套件")
+    print("🧪"*30)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = test_against_brute_force(tmp_dir)
+            test_edge_cases(tmp_dir)
+            await test_search_variants(tmp_dir, index)
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
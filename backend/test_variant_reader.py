@@ -0,0 +1,193 @@
+"""
+测试 BGZF / tabix 读取和 search_variants 区域查询
+"""
+
+import asyncio
+import random
+import sys
+import os
+import tempfile
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.genomics.bgzf import BgzfReader, BgzfWriter
+from app.genomics.tabix import TabixIndex, build_tabix_index
+from app.genomics.vcf_reader import VcfReader, classify_variant, get_vcf_reader
+from app.tools.jbrowse_tools import JBrowseToolkit
+
+VCF_HEADER = """##fileformat=VCFv4.2
+##INFO=<ID=AF,Number=A,Type=Float,Description="Allele Frequency">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+"""
+
+
+def write_vcf(path: str, seed: int = 11):
+    """生成随机 VCF，按小块刷新以产生大量 BGZF 块"""
+    rng = random.Random(seed)
+    records = []
+    with BgzfWriter(path) as writer:
+        writer.write(VCF_HEADER.encode("utf-8"))
+        for chrom in ("17", "X"):
+            position = 0
+            for i in range(20000):
+                position += rng.randint(1, 400)
+                kind = rng.random()
+                if kind < 0.7:
+                    ref, alt = "A", rng.choice("CGT")
+                elif kind < 0.8:
+                    ref, alt = "A", "ATTG"
+                elif kind < 0.9:
+                    ref, alt = "ACGTA", "A"
+                elif kind < 0.95:
+                    ref, alt = "AC", "GT,A"
+                else:
+                    ref, alt = "N", "<DEL>"
+                info = f"AF={rng.random():.3f}"
+                end = position + len(ref) - 1
+                if alt == "<DEL>":
+                    end = position + rng.randint(100, 20000)
+                    info += f";END={end}"
+                variant_id = f"rs{chrom}{i}" if i % 3 else "."
+                records.append((chrom, position, end, ref, alt))
+                writer.write(f"{chrom}\t{position}\t{variant_id}\t{ref}\t{alt}\t50\tPASS\t{info}\n".encode("utf-8"))
+                if i % 200 == 199:
+                    writer.flush()
+    return records
+
+
+def test_classify_variant():
+    """测试变异类型判断"""
+    print("\n" + "="*60)
+    print("测试 1: 变异类型")
+    print("="*60)
+
+    assert classify_variant(b"A", b"G") == "SNV"
+    assert classify_variant(b"AC", b"GT") == "MNV"
+    assert classify_variant(b"A", b"ATTG") == "INS"
+    assert classify_variant(b"ACGT", b"A") == "DEL"
+    assert classify_variant(b"ACG", b"T") == "INDEL"
+    assert classify_variant(b"N", b"<DUP>") == "SV"
+    print("✅ PASSED: SNV / MNV / INS / DEL / INDEL / SV")
+
+
+def test_region_queries(tmp_dir: str) -> VcfReader:
+    """与暴力扫描对比区域查询结果"""
+    print("\n" + "="*60)
+    print("测试 2: tabix 区域查询")
+    print("="*60)
+
+    path = os.path.join(tmp_dir, "variants.vcf.gz")
+    records = write_vcf(path)
+    build_tabix_index(path)
+    index = TabixIndex.for_file(path)
+    assert index.names == ["17", "X"], index.names
+
+    # 整个文件逐行读取，验证跨块拼接
+    lines = [line for _, line in BgzfReader(path).iter_lines() if not line.startswith(b"#")]
+    assert len(lines) == len(records)
+
+    reader = VcfReader(path)
+    rng = random.Random(3)
+    for _ in range(200):
+        chrom = rng.choice(["17", "X"])
+        start = rng.randint(1, 4_000_000)
+        end = start + rng.choice([0, 500, 50_000])
+        expected = [(c, p) for c, p, e, _, _ in records if c == chrom and p <= end and e >= start]
+        found = [(v["chromosome"], v["position"]) for v in reader.query(f"chr{chrom}", start, end)]
+        assert found == expected, (chrom, start, end, len(found), len(expected))
+    print("✅ PASSED: 200 random regions match brute force (chr prefix resolved)")
+
+    # 小区域只应解压少量块（先清空共享块缓存）
+    reader.bgzf.block_cache.clear()
+    reader.bgzf.blocks_read = 0
+    list(reader.query("17", 2_000_000, 2_001_000))
+    assert reader.bgzf.blocks_read <= 6, reader.bgzf.blocks_read
+    print(f"✅ PASSED: 1 kb query decompressed {reader.bgzf.blocks_read} block(s)")
+
+    snvs = list(reader.query("17", 1, 500_000, "snp"))
+    assert snvs and all(v["type"] == "SNV" for v in snvs)
+    indels = list(reader.query("17", 1, 500_000, "indel"))
+    # 多等位位点只要有一个 ALT 匹配即返回
+    assert indels and all(v["type"] in ("INS", "DEL", "INDEL", "MIXED") for v in indels)
+    assert all(0.0 <= v["frequency"] <= 1.0 for v in snvs)
+    print(f"✅ PASSED: type filter ({len(snvs)} SNVs, {len(indels)} indels)")
+
+    result = reader.fetch("17", 1, 10_000_000, limit=10)
+    assert len(result["variants"]) == 10 and result["truncated"]
+    assert list(reader.query("chrY", 1, 1000)) == []
+    return reader
+
+
+async def test_search_variants(reader: VcfReader):
+    """测试 JBrowseToolkit.search_variants"""
+    print("\n" + "="*60)
+    print("测试 3: search_variants")
+    print("="*60)
+
+    toolkit = JBrowseToolkit(vcf_reader=reader)
+    result = await toolkit.search_variants("chr17", 100_000, 110_000, "SNV")
+    assert result["status"] == "success", result
+    assert result["count"] == len(result["variants"]) > 0
+    assert not result["truncated"]
+    print(f"✅ PASSED: {result['message']}")
+
+    result = await toolkit.search_variants("chr17", 1, 100_000, "bogus")
+    assert result["status"] == "error", result
+    result = await JBrowseToolkit().search_variants("chr17", 1, 100)
+    assert result["status"] == "error", "No VCF configured"
+    print("✅ PASSED: invalid type and missing VCF reported")
+
+
+def test_reader_cache(tmp_dir: str):
+    """文件或索引稍后才出现时，下次调用即可打开"""
+    print("\n" + "="*60)
+    print("测试 4: 读取器缓存")
+    print("="*60)
+
+    path = os.path.join(tmp_dir, "later.vcf.gz")
+    assert get_vcf_reader(path) is None, "VCF not written yet"
+    write_vcf(path)
+    assert get_vcf_reader(path) is None, "No .tbi yet"
+    build_tabix_index(path)
+    reader = get_vcf_reader(path)
+    assert reader is not None and get_vcf_reader(path) is reader
+    assert get_vcf_reader("") is None
+    reader.close()
+    print("✅ PASSED: missing file and index retried, successful open cached")
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("VCF 区域查询测试套件")
+    print("🧪"*30)
+
+    try:
+        test_classify_variant()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            reader = test_region_queries(tmp_dir)
+            await test_search_variants(reader)
+            test_reader_cache(tmp_dir)
+            reader.close()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,372 @@
+"""
+测试 WebSocketManager 跨 worker 消息分发
+使用本地的最小 RESP 代理模拟 Redis，两个 WebSocketManager 模拟两个 uvicorn worker
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+# 添加 app 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '.'))
+
+from app.services.pubsub import InProcessBackend, RedisPubSubBackend, RespConnection, SESSION_REGISTRY_KEY
+from app.services.websocket_manager import WebSocketManager
+
+
+class StandInBroker:
+    """最小化的 Redis 替身：支持 PUBLISH/SUBSCRIBE/HSET/HGET/HDEL/HGETALL/SET PX/EXISTS/DEL"""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.hashes = {}
+        # 键 -> 过期时间（monotonic）
+        self.strings = {}
+        self.server = None
+        self.writers = []
+
+    async def start(self, port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def drop_connections(self):
+        """模拟代理重启：断开所有客户端连接，订阅关系随之丢失"""
+        for writer in self.writers:
+            writer.close()
+        self.writers.clear()
+        self.subscribers.clear()
+
+    async def _handle(self, reader, writer):
+        self.writers.append(writer)
+        conn = RespConnection(reader, writer)
+        try:
+            while True:
+                args = await conn.read_reply()
+                command = args[0].upper()
+                if command == "SUBSCRIBE":
+                    for channel in args[1:]:
+                        self.subscribers.setdefault(channel, []).append(writer)
+                        writer.write(b"*3\r\n$9\r\nsubscribe\r\n" + self._bulk(channel) + b":1\r\n")
+                elif command == "PUBLISH":
+                    targets = self.subscribers.get(args[1], [])
+                    for target in targets:
+                        target.write(RespConnection.encode("message", args[1], args[2]))
+                    writer.write(b":%d\r\n" % len(targets))
+                elif command == "HSET":
+                    pairs = dict(zip(args[2::2], args[3::2]))
+                    self.hashes.setdefault(args[1], {}).update(pairs)
+                    writer.write(b":%d\r\n" % len(pairs))
+                elif command == "HGETALL":
+                    items = [v for pair in self.hashes.get(args[1], {}).items() for v in pair]
+                    writer.write(RespConnection.encode(*items))
+                elif command == "SET":
+                    assert args[3].upper() == "PX"
+                    self.strings[args[1]] = time.monotonic() + int(args[4]) / 1000
+                    writer.write(b"+OK\r\n")
+                elif command == "EXISTS":
+                    alive = self.strings.get(args[1], 0) > time.monotonic()
+                    writer.write(b":%d\r\n" % alive)
+                elif command == "DEL":
+                    writer.write(b":%d\r\n" % (self.strings.pop(args[1], None) is not None))
+                elif command == "HGET":
+                    value = self.hashes.get(args[1], {}).get(args[2])
+                    writer.write(b"$-1\r\n" if value is None else self._bulk(value))
+                elif command == "HDEL":
+                    removed = [self.hashes.get(args[1], {}).pop(field, None) for field in args[2:]]
+                    writer.write(b":%d\r\n" % sum(r is not None for r in removed))
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+    @staticmethod
+    def _bulk(value: str) -> bytes:
+        data = value.encode("utf-8")
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+class FakeWebSocket:
+    """记录收到消息的假 WebSocket"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+class StalledWebSocket(FakeWebSocket):
+    """永远发送不出去的慢客户端"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def send_text(self, message: str):
+        await self.release.wait()
+        self.sent.append(message)
+
+
+async def wait_for(predicate, timeout: float = 2.0):
+    """等待异步投递完成"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("Timed out waiting for message delivery")
+        await asyncio.sleep(0.01)
+
+
+async def test_in_process_backend():
+    """测试单进程后端"""
+    print("\n" + "="*60)
+    print("测试 1: 单进程后端")
+    print("="*60)
+
+    manager = WebSocketManager(InProcessBackend())
+    ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+    session_a = await manager.connect(ws_a)
+    await manager.connect(ws_b)
+
+    await manager.broadcast("hello")
+    await wait_for(lambda: ws_a.sent == ["hello"] and ws_b.sent == ["hello"])
+    print("✅ PASSED: broadcast")
+
+    assert await manager.send_to_session(session_a, "direct")
+    await wait_for(lambda: ws_a.sent[-1] == "direct")
+    assert ws_b.sent == ["hello"]
+    print("✅ PASSED: send_to_session")
+
+    await manager.disconnect(ws_a)
+    assert not await manager.send_to_session(session_a, "gone")
+    assert len(manager.active_connections) == 1
+    print("✅ PASSED: disconnect unregisters session")
+
+    await manager.close()
+
+
+async def test_cross_worker_routing():
+    """测试跨 worker 的广播和会话路由"""
+    print("\n" + "="*60)
+    print("测试 2: 跨 worker 路由（本地替身代理）")
+    print("="*60)
+
+    broker = StandInBroker()
+    port = await broker.start()
+    url = f"redis://127.0.0.1:{port}/0"
+
+    worker_1 = WebSocketManager(RedisPubSubBackend(url))
+    worker_2 = WebSocketManager(RedisPubSubBackend(url))
+    await worker_1.start()
+    await worker_2.start()
+
+    ws_1, ws_2 = FakeWebSocket(), FakeWebSocket()
+    await worker_1.connect(ws_1)
+    session_2 = await worker_2.connect(ws_2)
+
+    # worker 1 产生的消息需要送达 worker 2 上的会话
+    assert await worker_1.send_to_session(session_2, "navigate")
+    await wait_for(lambda: ws_2.sent == ["navigate"])
+    assert ws_1.sent == []
+    print("✅ PASSED: message routed to the session's worker")
+
+    await worker_2.broadcast("everyone")
+    await wait_for(lambda: "everyone" in ws_1.sent and "everyone" in ws_2.sent)
+    print("✅ PASSED: broadcast reaches all workers")
+
+    await worker_2.disconnect(ws_2)
+    assert not await worker_1.send_to_session(session_2, "gone")
+    print("✅ PASSED: disconnected session removed from registry")
+
+    await worker_1.close()
+    await worker_2.close()
+    await broker.stop()
+
+
+async def test_worker_liveness():
+    """崩溃 worker 的会话路由随存活标记过期而失效"""
+    print("\n" + "="*60)
+    print("测试 3: worker 存活标记")
+    print("="*60)
+
+    broker = StandInBroker()
+    port = await broker.start()
+    url = f"redis://127.0.0.1:{port}/0"
+
+    worker_1 = WebSocketManager(RedisPubSubBackend(url), worker_ttl=0.15)
+    worker_2 = WebSocketManager(RedisPubSubBackend(url), worker_ttl=0.15)
+    await worker_1.connect(FakeWebSocket())
+    ws_2 = FakeWebSocket()
+    session_2 = await worker_2.connect(ws_2)
+
+    # 心跳续期：超过一个 TTL 后会话仍然可达，被删除的路由由心跳重新登记
+    broker.hashes[SESSION_REGISTRY_KEY].pop(session_2)
+    await asyncio.sleep(0.3)
+    assert await worker_1.send_to_session(session_2, "still alive")
+    await wait_for(lambda: ws_2.sent == ["still alive"])
+    print("✅ PASSED: heartbeat keeps the worker alive and re-registers its sessions")
+
+    # 模拟 worker 2 崩溃：心跳停止，会话未注销
+    worker_2._heartbeat_task.cancel()
+    await worker_2.backend.close()
+    await asyncio.sleep(0.2)
+    assert not await worker_1.send_to_session(session_2, "lost")
+    assert session_2 not in broker.hashes[SESSION_REGISTRY_KEY], "Stale route dropped on lookup"
+    print("✅ PASSED: crashed worker's session no longer reported as sent")
+
+    # 新 worker 启动时清理遗留的会话路由
+    broker.hashes[SESSION_REGISTRY_KEY].update({"orphan-1": "dead", "orphan-2": "dead"})
+    worker_3 = WebSocketManager(RedisPubSubBackend(url), worker_ttl=0.15)
+    await worker_3.start()
+    assert set(broker.hashes[SESSION_REGISTRY_KEY]) == set(worker_1.active_connections)
+    print("✅ PASSED: stale routes pruned on worker start")
+
+    await worker_1.close()
+    assert f"ws:worker-alive:{worker_1.worker_id}" not in broker.strings, "Liveness key removed on clean shutdown"
+    assert broker.hashes[SESSION_REGISTRY_KEY] == {}
+    await worker_3.close()
+    broker.drop_connections()
+    await broker.stop()
+    print("✅ PASSED: clean shutdown removes liveness key and sessions")
+
+
+async def test_reconnect():
+    """代理断开后重连并重新订阅"""
+    print("\n" + "="*60)
+    print("测试 4: 断线重连")
+    print("="*60)
+
+    broker = StandInBroker()
+    port = await broker.start()
+    url = f"redis://127.0.0.1:{port}/0"
+
+    worker_1 = WebSocketManager(RedisPubSubBackend(url, reconnect_delay=0.01, max_reconnect_delay=0.05))
+    worker_2 = WebSocketManager(RedisPubSubBackend(url, reconnect_delay=0.01, max_reconnect_delay=0.05))
+    ws_1, ws_2 = FakeWebSocket(), FakeWebSocket()
+    await worker_1.connect(ws_1)
+    session_2 = await worker_2.connect(ws_2)
+
+    # 代理下线一段时间（重连失败后退避），再在同一端口恢复
+    broker.drop_connections()
+    await broker.stop()
+    await asyncio.sleep(0.1)
+    await broker.start(port)
+    await wait_for(lambda: f"ws:worker:{worker_2.worker_id}" in broker.subscribers)
+    assert "ws:broadcast" in broker.subscribers
+    print("✅ PASSED: subscriber reconnected and resubscribed every channel")
+
+    # 代理重启后会话表为空，worker 心跳会重新登记；命令连接在下一次命令时重连
+    await worker_2.backend.refresh_worker(worker_2.worker_id, [session_2], worker_2.worker_ttl)
+    assert await worker_1.send_to_session(session_2, "after restart")
+    await wait_for(lambda: ws_2.sent == ["after restart"])
+    await worker_1.broadcast("everyone")
+    await wait_for(lambda: "everyone" in ws_1.sent and "everyone" in ws_2.sent)
+    print("✅ PASSED: publish and routing work after reconnect")
+
+    await worker_1.close()
+    await worker_2.close()
+    broker.drop_connections()
+    await broker.stop()
+
+
+async def test_slow_consumer_policies():
+    """测试慢客户端不会阻塞其他连接，以及各溢出策略"""
+    print("\n" + "="*60)
+    print("测试 5: 发送队列与慢客户端")
+    print("="*60)
+
+    manager = WebSocketManager(InProcessBackend(), max_queue_size=2, overflow_policy="drop_oldest")
+    slow, fast = StalledWebSocket(), FakeWebSocket()
+    slow_session = await manager.connect(slow)
+    await manager.connect(fast)
+
+    await manager.broadcast("m0")
+    await asyncio.sleep(0.01)  # 写任务取出 m0 后阻塞在慢客户端上
+    for i in range(1, 5):
+        await manager.broadcast(f"m{i}")
+        await asyncio.sleep(0)  # 让快客户端的写任务及时发送
+    await wait_for(lambda: len(fast.sent) == 5)
+    print("✅ PASSED: fast client not blocked by stalled peer")
+
+    stats = manager.get_stats()
+    # 慢客户端队列容量 2，m1/m2 被丢弃
+    assert stats["dropped"] == 2, stats
+    assert manager.get_connection(slow_session).queue_depth == 2
+    slow.release.set()
+    await wait_for(lambda: slow.sent == ["m0", "m3", "m4"])
+    print(f"✅ PASSED: drop_oldest {stats}")
+    await manager.close()
+
+    manager = WebSocketManager(InProcessBackend(), max_queue_size=2, overflow_policy="coalesce")
+    slow = StalledWebSocket()
+    await manager.connect(slow)
+    await manager.broadcast('{"type": "chunk"}')
+    await asyncio.sleep(0.01)
+    for message in ['{"type": "navigation", "n": 1}', '{"type": "chunk"}',
+                    '{"type": "navigation", "n": 2}', '{"type": "navigation", "n": 3}']:
+        await manager.broadcast(message)
+    slow.release.set()
+    await wait_for(lambda: len(slow.sent) == 3)
+    # 导航指令只保留最新一条，其他消息不受影响
+    assert slow.sent == ['{"type": "chunk"}', '{"type": "navigation", "n": 3}', '{"type": "chunk"}'], slow.sent
+    assert manager.get_stats()["coalesced"] == 2
+    assert manager.get_stats()["dropped"] == 0
+    print(f"✅ PASSED: coalesce {manager.get_stats()}")
+    await manager.close()
+
+    manager = WebSocketManager(InProcessBackend(), max_queue_size=1, overflow_policy="disconnect")
+    slow = StalledWebSocket()
+    await manager.connect(slow)
+    for i in range(3):
+        await manager.broadcast(f"m{i}")
+    await wait_for(lambda: not manager.active_connections)
+    assert slow.closed_with == 1013
+    assert manager.get_stats()["slow_consumer_disconnects"] == 1
+    print(f"✅ PASSED: disconnect {manager.get_stats()}")
+    await manager.close()
+
+
+async def main():
+    """运行所有测试"""
+    print("\n" + "🧪"*30)
+    print("WebSocketManager 跨 worker 测试套件")
+    print("🧪"*30)
+
+    try:
+        await test_in_process_backend()
+        await test_cross_worker_routing()
+        await test_worker_liveness()
+        await test_reconnect()
+        await test_slow_consumer_policies()
+
+        print("\n" + "="*60)
+        print("🎉 所有测试通过！")
+        print("="*60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 测试出错: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)